@@ -0,0 +1,476 @@
+"""On-disk IVF (inverted file) index for campus-wide face identification.
+
+An index root holds a ``CURRENT`` link to one complete version, exactly
+like the embedding store::
+
+    CURRENT -> versions/20250101T120000Z-1234
+    versions/20250101T120000Z-1234/
+
+Every build or insert writes a new version directory and then swaps
+``CURRENT`` with an atomic rename, so a reader always sees one consistent
+set of files.  Files are never rewritten once published; an insert
+hard-links the unchanged main segment into its new version.  A version
+holds::
+
+    meta.json        nlist, dimension, dtype, model and a generation counter
+    centroids.npy    (nlist, d) float32 coarse quantizer, L2-normalised
+    vectors.npy      (n, d) embeddings grouped so each inverted list is one
+                     contiguous slice
+    offsets.npy      (nlist + 1,) int64 row offsets of each inverted list
+    ids.json         student ID of every row of vectors.npy
+    delta.npy        (m, d) embeddings inserted since the last compaction
+    delta_ids.json   student ID of every row of delta.npy
+    tombstones.json  rows of vectors.npy that were replaced or removed since
+                     the last compaction (optional, empty when missing)
+
+``vectors.npy`` and ``delta.npy`` are opened with ``mmap_mode="r"`` so every
+gunicorn worker on a host shares the same page-cache pages.  A search scores
+the query against the centroids, scans the ``nprobe`` closest inverted lists
+plus the (small) delta segment, and returns the best matches.
+
+Re-enrolling a student replaces their rows: older delta rows are dropped and
+main-segment rows are tombstoned until the next compaction removes them.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+try:
+    from .embedding_store import (
+        CURRENT_LINK,
+        EMBEDDINGS_FILENAME,
+        atomic_write,
+        make_current,
+        new_version_directory,
+        read_embedding_index,
+        read_student_ids,
+        resolve_store_directory,
+    )
+except ImportError:  # pragma: no cover - fallback for script execution
+    from embedding_store import (
+        CURRENT_LINK,
+        EMBEDDINGS_FILENAME,
+        atomic_write,
+        make_current,
+        new_version_directory,
+        read_embedding_index,
+        read_student_ids,
+        resolve_store_directory,
+    )
+
+
+META_FILENAME = "meta.json"
+CENTROIDS_FILENAME = "centroids.npy"
+VECTORS_FILENAME = "vectors.npy"
+OFFSETS_FILENAME = "offsets.npy"
+IDS_FILENAME = "ids.json"
+DELTA_FILENAME = "delta.npy"
+DELTA_IDS_FILENAME = "delta_ids.json"
+TOMBSTONES_FILENAME = "tombstones.json"
+LOCK_FILENAME = ".lock"
+MAIN_SEGMENT_FILENAMES = (CENTROIDS_FILENAME, VECTORS_FILENAME, OFFSETS_FILENAME, IDS_FILENAME)
+
+DEFAULT_NPROBE = 8
+# Inserts are folded into the inverted lists once the delta segment grows past
+# this many rows or this fraction of the main segment, whichever is larger.
+DELTA_COMPACT_ROWS = 1024
+DELTA_COMPACT_FRACTION = 0.05
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _assign(vectors, centroids, chunk_size=8192):
+    """Return the closest centroid for every row, chunked to bound memory."""
+
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors, nlist, iterations=20, sample_size=None, seed=0):
+    """Spherical k-means over (a sample of) ``vectors``."""
+
+    rng = np.random.default_rng(seed)
+    count = len(vectors)
+    sample_size = sample_size or min(count, nlist * 256)
+    sample_rows = np.sort(rng.choice(count, size=min(sample_size, count), replace=False))
+    sample = _normalize(vectors[sample_rows])
+
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists from random sample points.
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+def default_nlist(count):
+    return max(1, min(count, int(4 * math.sqrt(max(count, 1)))))
+
+
+@contextlib.contextmanager
+def _index_lock(directory):
+    import fcntl
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILENAME), "a") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _write_json(path, payload):
+    atomic_write(path, lambda handle: json.dump(payload, handle, separators=(",", ":")), mode="w")
+
+
+def _write_npy(path, array):
+    atomic_write(path, lambda handle: np.save(handle, array))
+
+
+def _write_segments(directory, centroids, vectors, student_ids, meta, dtype):
+    assignments = _assign(vectors, centroids)
+    order = np.argsort(assignments, kind="stable")
+    counts = np.bincount(assignments, minlength=len(centroids))
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    _write_npy(os.path.join(directory, CENTROIDS_FILENAME), centroids.astype(np.float32))
+    _write_npy(os.path.join(directory, VECTORS_FILENAME), np.ascontiguousarray(np.asarray(vectors)[order], dtype=dtype))
+    _write_npy(os.path.join(directory, OFFSETS_FILENAME), offsets)
+    _write_json(os.path.join(directory, IDS_FILENAME), [student_ids[row] for row in order])
+    _write_npy(os.path.join(directory, DELTA_FILENAME), np.zeros((0, centroids.shape[1]), dtype=dtype))
+    _write_json(os.path.join(directory, DELTA_IDS_FILENAME), [])
+    _write_json(os.path.join(directory, TOMBSTONES_FILENAME), [])
+
+    meta = dict(meta)
+    meta.update({
+        "nlist": int(len(centroids)),
+        "dimension": int(centroids.shape[1]),
+        "dtype": dtype,
+        "count": int(len(student_ids)),
+        "deltaCount": 0,
+        "tombstoneCount": 0,
+        "generation": int(meta.get("generation", 0)) + 1,
+    })
+    _write_json(os.path.join(directory, META_FILENAME), meta)
+    return meta
+
+
+def resolve_index_directory(root):
+    """Return the version directory ``CURRENT`` points at, or None.
+
+    An index written before versioning (files directly in ``root``) is used
+    as-is until the next build or insert publishes a version.
+    """
+
+    link = os.path.join(root, CURRENT_LINK)
+    if os.path.islink(link):
+        return os.path.realpath(link)
+    if os.path.exists(os.path.join(root, META_FILENAME)):
+        return root
+    return None
+
+
+@contextlib.contextmanager
+def _publishing(root):
+    """Yield a new version directory and make it current if the block succeeds."""
+
+    version_dir = new_version_directory(root)
+    try:
+        yield version_dir
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    make_current(root, version_dir)
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def build_ivf_index(directory, student_ids, vectors, model_name, nlist=None, dtype="float16", iterations=20):
+    """Train the coarse quantizer and publish a fresh index under ``directory``."""
+
+    # Store rows are already L2-normalised; keep them in their stored dtype
+    # rather than materialising a float32 copy of the whole matrix.
+    vectors = np.asarray(vectors)
+    if len(vectors) == 0:
+        raise ValueError("Cannot build an index from zero embeddings.")
+    nlist = nlist or default_nlist(len(vectors))
+    centroids = train_centroids(vectors, nlist, iterations=iterations)
+
+    with _index_lock(directory):
+        current = resolve_index_directory(directory)
+        previous = (_read_meta(current) if current else None) or {}
+        meta = {"model": model_name, "generation": previous.get("generation", 0)}
+        with _publishing(directory) as version_dir:
+            meta = _write_segments(version_dir, centroids, vectors, list(student_ids), meta, dtype)
+        return meta
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILENAME), "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return default
+
+
+def _replace_rows(directory, student_ids, vectors):
+    """Drop every row of ``student_ids`` and append ``vectors`` as their new rows."""
+
+    replaced = {str(student_id) for student_id in student_ids}
+    with _index_lock(directory):
+        current = resolve_index_directory(directory)
+        meta = _read_meta(current) if current else None
+        if meta is None:
+            raise FileNotFoundError(f"No index found in {directory}")
+        dtype = meta["dtype"]
+
+        delta = np.load(os.path.join(current, DELTA_FILENAME))
+        delta_ids = _read_json(os.path.join(current, DELTA_IDS_FILENAME), [])
+        main_ids = _read_json(os.path.join(current, IDS_FILENAME), [])
+        tombstones = set(_read_json(os.path.join(current, TOMBSTONES_FILENAME), []))
+        tombstones.update(row for row, student_id in enumerate(main_ids) if student_id in replaced)
+
+        kept = [row for row, student_id in enumerate(delta_ids) if student_id not in replaced]
+        new_rows = vectors if vectors is not None else np.zeros((0, delta.shape[1]), dtype=np.float32)
+        delta = np.concatenate([delta[kept].astype(np.float32), new_rows], axis=0)
+        delta_ids = [delta_ids[row] for row in kept]
+        if vectors is not None:
+            delta_ids += [str(student_id) for student_id in student_ids]
+
+        threshold = max(DELTA_COMPACT_ROWS, int(meta["count"] * DELTA_COMPACT_FRACTION))
+        with _publishing(directory) as version_dir:
+            if len(delta_ids) + len(tombstones) > threshold:
+                centroids = np.load(os.path.join(current, CENTROIDS_FILENAME))
+                main = np.load(os.path.join(current, VECTORS_FILENAME), mmap_mode="r")
+                live = [row for row in range(len(main_ids)) if row not in tombstones]
+                merged = np.concatenate([np.asarray(main[live]), delta.astype(main.dtype)], axis=0)
+                if len(merged) == 0:
+                    raise ValueError("Cannot compact the index down to zero embeddings.")
+                merged_ids = [main_ids[row] for row in live] + delta_ids
+                return _write_segments(version_dir, centroids, merged, merged_ids, meta, dtype)
+
+            for name in MAIN_SEGMENT_FILENAMES:
+                _link_or_copy(os.path.join(current, name), os.path.join(version_dir, name))
+            _write_npy(os.path.join(version_dir, DELTA_FILENAME), delta.astype(dtype))
+            _write_json(os.path.join(version_dir, DELTA_IDS_FILENAME), delta_ids)
+            _write_json(os.path.join(version_dir, TOMBSTONES_FILENAME), sorted(tombstones))
+            meta["deltaCount"] = len(delta_ids)
+            meta["tombstoneCount"] = len(tombstones)
+            meta["generation"] = int(meta.get("generation", 0)) + 1
+            _write_json(os.path.join(version_dir, META_FILENAME), meta)
+        return meta
+
+
+def add_to_index(directory, student_ids, vectors):
+    """Insert enrollments, replacing any rows the same students already have.
+
+    The delta segment is compacted into the inverted lists when it (plus the
+    tombstoned rows) grows large.
+    """
+
+    return _replace_rows(directory, student_ids, _normalize(vectors))
+
+
+def remove_from_index(directory, student_ids):
+    """Remove every row of ``student_ids`` from the index."""
+
+    return _replace_rows(directory, student_ids, None)
+
+
+class IVFIndex:
+    """Read-only, memory-mapped view of one index version.
+
+    ``directory`` may be the index root, in which case the current version
+    is opened.
+    """
+
+    def __init__(self, directory):
+        directory = resolve_index_directory(directory) or directory
+        self.directory = directory
+        self.meta = _read_meta(directory)
+        if self.meta is None:
+            raise FileNotFoundError(f"No index found in {directory}")
+        self.generation = self.meta.get("generation", 0)
+        self.centroids = np.load(os.path.join(directory, CENTROIDS_FILENAME))
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILENAME))
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILENAME), mmap_mode="r")
+        self.delta = np.load(os.path.join(directory, DELTA_FILENAME), mmap_mode="r")
+        with open(os.path.join(directory, IDS_FILENAME), "r", encoding="utf-8") as handle:
+            self.ids = json.load(handle)
+        with open(os.path.join(directory, DELTA_IDS_FILENAME), "r", encoding="utf-8") as handle:
+            self.delta_ids = json.load(handle)
+        self.live = np.ones(len(self.ids), dtype=bool)
+        self.live[_read_json(os.path.join(directory, TOMBSTONES_FILENAME), [])] = False
+
+    @property
+    def model(self):
+        return self.meta.get("model")
+
+    def __len__(self):
+        return int(self.live.sum()) + len(self.delta_ids)
+
+    def search(self, query, k=1, nprobe=DEFAULT_NPROBE):
+        """Return up to ``k`` ``(student_id, cosine_distance)`` pairs, best first.
+
+        Each student appears at most once, at their best-scoring row.
+        """
+
+        query = _normalize(query).reshape(-1)
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        row_ids = []
+        scores = []
+        for list_id in probe:
+            start, end = int(self.offsets[list_id]), int(self.offsets[list_id + 1])
+            if start == end:
+                continue
+            rows = np.arange(start, end)
+            live = self.live[start:end]
+            if not live.all():
+                rows = rows[live]
+                if not len(rows):
+                    continue
+                scores.append(np.asarray(self.vectors[rows], dtype=np.float32) @ query)
+            else:
+                scores.append(np.asarray(self.vectors[start:end], dtype=np.float32) @ query)
+            row_ids.append(rows)
+
+        candidates = []
+        if scores:
+            all_scores = np.concatenate(scores)
+            all_rows = np.concatenate(row_ids)
+            top = np.argsort(-all_scores)[: k * 4]
+            candidates.extend((self.ids[all_rows[i]], float(all_scores[i])) for i in top)
+
+        if len(self.delta_ids):
+            delta_scores = np.asarray(self.delta, dtype=np.float32) @ query
+            top = np.argsort(-delta_scores)[: k * 4]
+            candidates.extend((self.delta_ids[i], float(delta_scores[i])) for i in top)
+
+        best = {}
+        for student_id, score in candidates:
+            if score > best.get(student_id, -np.inf):
+                best[student_id] = score
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(student_id, 1.0 - score) for student_id, score in ranked]
+
+
+class IndexHandle:
+    """Per-process lazy loader that follows the index's ``CURRENT`` link.
+
+    Opening happens on first use, i.e. after gunicorn has forked, and the
+    link is re-checked at most every ``refresh_seconds``.
+    """
+
+    def __init__(self, directory, refresh_seconds=10.0):
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._index = None
+        self._pid = None
+        self._checked_at = 0.0
+
+    def get(self):
+        if not self.directory:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            stale_process = self._pid != os.getpid()
+            if self._index is None or stale_process or now - self._checked_at >= self.refresh_seconds:
+                self._checked_at = now
+                current = resolve_index_directory(self.directory)
+                if current is None:
+                    self._index = None
+                elif stale_process or self._index is None or self._index.directory != current:
+                    self._index = IVFIndex(current)
+                self._pid = os.getpid()
+            return self._index
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="Build or extend the campus-wide face index.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build = subcommands.add_parser("build", help="Build a new index from an embedding store.")
+    build.add_argument("--store", required=True, help="Embedding store root written by backend.enrollment.")
+    build.add_argument("--index", required=True, help="Index root to publish a new version under.")
+    build.add_argument("--nlist", type=int, default=None, help="Number of inverted lists (default 4*sqrt(n)).")
+    build.add_argument("--dtype", choices=("float16", "float32"), default="float16")
+
+    add = subcommands.add_parser("add", help="Insert the embeddings from a store into an existing index.")
+    add.add_argument("--store", required=True, help="Embedding store holding the new enrollments.")
+    add.add_argument("--index", required=True, help="Existing index root.")
+
+    remove = subcommands.add_parser("remove", help="Remove students' embeddings from an existing index.")
+    remove.add_argument("--index", required=True, help="Existing index root.")
+    remove.add_argument("student_ids", nargs="+", help="Student IDs to remove.")
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    if args.command == "remove":
+        print(json.dumps(remove_from_index(args.index, args.student_ids), indent=2, sort_keys=True))
+        return 0
+
+    store_dir = resolve_store_directory(args.store)
+    if store_dir is None:
+        raise SystemExit(f"No embedding store found in {args.store}")
+    store_index = read_embedding_index(store_dir)
+    student_ids = read_student_ids(store_dir)
+    vectors = np.load(os.path.join(store_dir, EMBEDDINGS_FILENAME), mmap_mode="r")
+
+    if args.command == "build":
+        meta = build_ivf_index(args.index, student_ids, vectors, store_index.get("model"), nlist=args.nlist, dtype=args.dtype)
+    else:
+        meta = add_to_index(args.index, student_ids, vectors)
+
+    print(json.dumps(meta, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
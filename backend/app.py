@@ -3,7 +3,7 @@ import base64
 import cv2
 import numpy as np
 import firebase_admin
-from firebase_admin import credentials, firestore, storage, auth as firebase_auth
+from firebase_admin import credentials, firestore, auth as firebase_auth
 import datetime
 import ipaddress
 import os
@@ -11,13 +11,72 @@ from deepface import DeepFace
 from zoneinfo import ZoneInfo
 import csv
 import io
+import functools
+import hashlib
+import hmac
+import json
+import threading
+import time
 
 from ipaddress import ip_address
 
 try:
     from .allowed_networks import UNT_EAGLENET_NETWORKS
+    from .attendance_stream import AttendanceStatusBroadcaster, StreamLimitReached, format_sse
+    from .rate_limit import RequestCoalescer, TokenBucketLimiter
+    from . import face_detection, face_embeddings
+    from .ann_index import IndexHandle
+    from .embedding_store import EmbeddingStoreHandle
+    from .face_templates import FaceTemplateStore, best_match, stack_templates
+    from .schedule import build_schedule_index, get_attendance_status, schedule_for_class
+    from .kiosk import FrameStreamError, KioskSession, KioskSessionRegistry, read_frames
+    from .frame_quality import assess_frame_quality
+    from .detector_cascade import FAST_DETECTOR_MARGIN, build_default_cascade
+    from .deferred_verification import DeferredVerifier, InferenceLoadMonitor
+    from .audit_queue import AuditWriteQueue, drain_on_sigterm
+    from .clients import WorkerClientProxy, WorkerClients
+    from .seed_data import load_firestore_seed, load_storage_seed
+    from .memory_store import transactional as memory_transactional, verify_id_token as memory_verify_id_token
+    from .class_membership import ClassMembershipIndex, TeacherProfileCache, assigned_teachers
+    from .export_jobs import ExportJobRunner, RangeNotSatisfiable, parse_byte_range
+    from .stream_compression import compress_stream, negotiate_encoding
+    from .record_keys import ATTENDANCE_KEY_LAYOUT, candidate_record_ids, find_record, other_layout_id, record_id
+    from .group_attendance import assign_faces, student_distance_matrix
+    from .attendance_import import ImportHeaderError, apply_import, iter_import_rows
+    from .model_artifacts import ModelArtifactManager, required_weight_files
+    from .profiling import RequestProfiler
+    from .memory_watchdog import MemoryWatchdog
+    from .attendance_archive import AttendanceArchive
+    from .pagination import PageTokenError, decode_page_token, encode_page_token, fetch_page, query_fingerprint
 except ImportError:  # pragma: no cover - fallback for script execution
     from allowed_networks import UNT_EAGLENET_NETWORKS
+    from attendance_stream import AttendanceStatusBroadcaster, StreamLimitReached, format_sse
+    from rate_limit import RequestCoalescer, TokenBucketLimiter
+    import face_detection
+    import face_embeddings
+    from ann_index import IndexHandle
+    from embedding_store import EmbeddingStoreHandle
+    from face_templates import FaceTemplateStore, best_match, stack_templates
+    from schedule import build_schedule_index, get_attendance_status, schedule_for_class
+    from kiosk import FrameStreamError, KioskSession, KioskSessionRegistry, read_frames
+    from frame_quality import assess_frame_quality
+    from detector_cascade import FAST_DETECTOR_MARGIN, build_default_cascade
+    from deferred_verification import DeferredVerifier, InferenceLoadMonitor
+    from audit_queue import AuditWriteQueue, drain_on_sigterm
+    from clients import WorkerClientProxy, WorkerClients
+    from seed_data import load_firestore_seed, load_storage_seed
+    from memory_store import transactional as memory_transactional, verify_id_token as memory_verify_id_token
+    from class_membership import ClassMembershipIndex, TeacherProfileCache, assigned_teachers
+    from export_jobs import ExportJobRunner, RangeNotSatisfiable, parse_byte_range
+    from stream_compression import compress_stream, negotiate_encoding
+    from record_keys import ATTENDANCE_KEY_LAYOUT, candidate_record_ids, find_record, other_layout_id, record_id
+    from group_attendance import assign_faces, student_distance_matrix
+    from attendance_import import ImportHeaderError, apply_import, iter_import_rows
+    from model_artifacts import ModelArtifactManager, required_weight_files
+    from profiling import RequestProfiler
+    from memory_watchdog import MemoryWatchdog
+    from attendance_archive import AttendanceArchive
+    from pagination import PageTokenError, decode_page_token, encode_page_token, fetch_page, query_fingerprint
 
 app = Flask(__name__)
 
@@ -28,19 +87,58 @@ def add_cors_headers(response):
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return response
 
-# Define the path for credentials
-secret_path = '/etc/secrets/firebase_credentials.json'
-if os.path.exists(secret_path):
-    cred = credentials.Certificate(secret_path)
+# "firebase" (production), "emulator" (local Firebase emulators) or "memory"
+# (in-process stand-ins, seeded from LOCAL_SEED_FIRESTORE/LOCAL_SEED_STORAGE_DIR).
+BACKEND_DATA_MODE = os.environ.get("BACKEND_DATA_MODE", "firebase").strip().lower()
+DEFAULT_PROJECT_ID = "csce-4095---it-capstone-i" if BACKEND_DATA_MODE == "firebase" else "demo-attendance"
+FIREBASE_PROJECT_ID = os.environ.get("FIREBASE_PROJECT_ID", DEFAULT_PROJECT_ID)
+FIREBASE_STORAGE_BUCKET = os.environ.get("FIREBASE_STORAGE_BUCKET", f"{FIREBASE_PROJECT_ID}.firebasestorage.app")
+
+if BACKEND_DATA_MODE == "firebase":
+    # Define the path for credentials
+    secret_path = '/etc/secrets/firebase_credentials.json'
+    if os.path.exists(secret_path):
+        cred = credentials.Certificate(secret_path)
+    else:
+        cred = credentials.Certificate("backend/firebase/firebase_credentials.json")
 else:
-    cred = credentials.Certificate("backend/firebase/firebase_credentials.json")
+    # Ports match the emulators block in frontend/firebase.json.  Local runs
+    # need no service account; ID tokens are checked by the auth emulator,
+    # or in memory mode by memory_store.verify_id_token.
+    if BACKEND_DATA_MODE == "emulator":
+        os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:8080")
+        os.environ.setdefault("STORAGE_EMULATOR_HOST", "http://localhost:9199")
+        os.environ.setdefault("FIREBASE_AUTH_EMULATOR_HOST", "localhost:9099")
+    cred = None
+
+firebase_options = {
+    "projectId": FIREBASE_PROJECT_ID,
+    "storageBucket": FIREBASE_STORAGE_BUCKET,
+}
 
 # Initialize Firebase app with storage configuration
-firebase_admin.initialize_app(cred, {
-    "storageBucket": "csce-4095---it-capstone-i.firebasestorage.app"
-})
-db = firestore.client()
-bucket = storage.bucket()  # Initialize storage bucket 
+firebase_admin.initialize_app(cred, firebase_options)
+
+
+def _seed_memory_store(memory_db, memory_bucket):
+    seed_path = os.environ.get("LOCAL_SEED_FIRESTORE")
+    if seed_path:
+        load_firestore_seed(memory_db, seed_path)
+    seed_dir = os.environ.get("LOCAL_SEED_STORAGE_DIR")
+    if seed_dir:
+        load_storage_seed(memory_bucket, seed_dir)
+
+
+# Firestore, Storage and auth clients are created inside each worker process
+# on first use, never before gunicorn forks (see backend/clients.py).
+worker_clients = WorkerClients(
+    cred,
+    firebase_options,
+    mode=BACKEND_DATA_MODE,
+    memory_initializer=_seed_memory_store,
+)
+db = WorkerClientProxy(worker_clients.firestore)
+bucket = WorkerClientProxy(worker_clients.bucket)
 
 # Timezone for Central Time
 CENTRAL_TZ = ZoneInfo("America/Chicago")
@@ -126,57 +224,33 @@ def is_request_from_eaglenet(flask_request):
     ip_address = extract_request_ip(flask_request)
     return bool(ip_address and is_ip_allowlisted(ip_address))
 
-def parse_time_12h(timestr):
-    
-    # Parse a 12-hour formatted time string into a datetime.time object.
-    timestr = timestr.strip().upper()
-    return datetime.datetime.strptime(timestr, "%I:%M%p").time()
+def _attendance_doc_id(class_id, student_id, date_str):
+    """ID for a new attendance record in the configured ``ATTENDANCE_KEY_LAYOUT``."""
 
-def parse_schedule(schedule_str):
-    """
-    Expects a schedule string like "MWF 8:30AM - 9:50AM"
-    The days like MWF are ignored
-    Returns start_time and  end_time as datetime.time objects
-    """
-    parts = schedule_str.strip().split()
-    if parts and not any(char.isdigit() for char in parts[0]):
-        time_range_str = " ".join(parts[1:])
-    else:
-        time_range_str = " ".join(parts)
-    if "-" not in time_range_str:
-        return None, None
-    start_str, end_str = time_range_str.split("-", 1)
-    start_time = parse_time_12h(start_str)
-    end_time = parse_time_12h(end_str)
-    return start_time, end_time
-
-def get_attendance_status(now_dt, start_dt, end_dt):
-    # Students can start scanning their attendance 5 minutes before class starts
-    allowed_start = start_dt - datetime.timedelta(minutes=5)
-    # Up to 15 minutes after class start is considered present
-    present_cutoff = start_dt + datetime.timedelta(minutes=15)
-    
-    if now_dt < allowed_start:
-        return None, "Attendance cannot be recorded before the allowed time." # If attempted before allowed time
-    if now_dt > end_dt:
-        return None, "Attendance cannot be recorded after the allowed time." # If attempted after class end time
-    if now_dt <= present_cutoff:
-        return "Present", None
-    else:
-        return "Late", None
+    return record_id(class_id, student_id, date_str, ATTENDANCE_KEY_LAYOUT)
+
+
+def _find_attendance_record(class_id, student_id, date_str):
+    """Snapshot of the day's record under either key layout, or None."""
+
+    return find_record(db, "attendance", class_id, student_id, date_str, ATTENDANCE_KEY_LAYOUT)
 
 
 def _resolve_record_id(payload):
-    record_id = payload.get("recordId")
-    if record_id:
-        return record_id
+    explicit_id = payload.get("recordId")
+    if explicit_id:
+        return explicit_id
 
     class_id = payload.get("classId")
     student_id = payload.get("studentId")
     date_str = payload.get("date")
 
     if class_id and student_id and date_str:
-        return f"{class_id}_{student_id}_{date_str}"
+        # Records written before a layout switch keep their old IDs.
+        snapshot = _find_attendance_record(class_id, student_id, date_str)
+        if snapshot is not None:
+            return snapshot.id
+        return _attendance_doc_id(class_id, student_id, date_str)
 
     return None
 
@@ -273,126 +347,312 @@ def _lookup_student_names(student_ids):
     return resolved
 
 
-@app.route("/api/attendance/export", methods=["GET"])
-def export_attendance():
-    class_id = (request.args.get("classId") or "").strip()
-    start_date_raw = (request.args.get("startDate") or "").strip()
-    end_date_raw = (request.args.get("endDate") or "").strip()
+# Teacher -> class membership, kept current by a listener on ``classes``.
+class_membership = ClassMembershipIndex(lambda: db, logger=app.logger)
+teacher_profiles = TeacherProfileCache(
+    _load_teacher_profile,
+    ttl_seconds=float(os.environ.get("TEACHER_PROFILE_TTL_SECONDS", "300")),
+    db_getter=lambda: db,
+    logger=app.logger,
+)
 
-    if not class_id or not start_date_raw or not end_date_raw:
-        return jsonify({
-            "status": "error",
-            "message": "classId, startDate, and endDate are required query parameters.",
-        }), 400
 
-    try:
-        start_date = datetime.datetime.strptime(start_date_raw, "%Y-%m-%d").date()
-        end_date = datetime.datetime.strptime(end_date_raw, "%Y-%m-%d").date()
-    except ValueError:
-        return jsonify({
-            "status": "error",
-            "message": "Dates must be in YYYY-MM-DD format.",
-        }), 400
+def _authenticate_teacher(bearer_token, permission_message):
+    """Verify that the bearer token belongs to a teacher.
 
-    if start_date > end_date:
-        return jsonify({
-            "status": "error",
-            "message": "startDate must be on or before endDate.",
-        }), 400
+    Returns ``(teacher_doc_id, teacher_identifiers, None)`` on success or
+    ``(None, None, error_response)``.
+    """
 
-    bearer_token = _extract_bearer_token(request.headers.get("Authorization"))
     if not bearer_token:
-        return jsonify({
+        return None, None, (jsonify({
             "status": "error",
             "message": "Missing or invalid Authorization header.",
-        }), 401
+        }), 401)
 
     try:
-        decoded_token = firebase_auth.verify_id_token(bearer_token)
+        if BACKEND_DATA_MODE == "memory":
+            decoded_token = memory_verify_id_token(bearer_token, FIREBASE_PROJECT_ID)
+        else:
+            decoded_token = firebase_auth.verify_id_token(bearer_token, app=worker_clients.firebase_app())
     except (firebase_auth.InvalidIdTokenError, firebase_auth.ExpiredIdTokenError, firebase_auth.RevokedIdTokenError, ValueError):
-        return jsonify({
+        return None, None, (jsonify({
             "status": "error",
             "message": "Authentication token is invalid or expired.",
-        }), 401
+        }), 401)
     except Exception:
-        return jsonify({
+        return None, None, (jsonify({
             "status": "error",
             "message": "Unable to verify authentication token.",
-        }), 401
+        }), 401)
 
-    teacher_doc_id, teacher_profile = _load_teacher_profile(decoded_token)
+    teacher_doc_id, teacher_profile = teacher_profiles.get(decoded_token)
     if not teacher_doc_id:
-        return jsonify({
+        return None, None, (jsonify({
             "status": "error",
             "message": "Unable to locate teacher profile for the authenticated user.",
-        }), 403
+        }), 403)
 
     teacher_role = str(teacher_profile.get("role", "")).lower()
     if teacher_role != "teacher":
-        return jsonify({
+        return None, None, (jsonify({
             "status": "error",
-            "message": "You do not have permission to export attendance records.",
-        }), 403
+            "message": permission_message,
+        }), 403)
 
     teacher_identifiers = {teacher_doc_id}
     alternate_identifier = teacher_profile.get("id")
     if alternate_identifier:
         teacher_identifiers.add(str(alternate_identifier))
+    return teacher_doc_id, teacher_identifiers, None
 
-    class_doc = db.collection("classes").document(class_id).get()
-    if not class_doc.exists:
-        return jsonify({
-            "status": "error",
-            "message": "Class not found.",
-        }), 404
 
-    class_data = class_doc.to_dict() or {}
+def _authorize_class_teacher(class_id, bearer_token, permission_message):
+    """Verify that the bearer token belongs to a teacher assigned to ``class_id``.
 
-    assigned_teachers = set()
-    for key in ("teacher", "teacherId", "teacherID", "teachers"):
-        value = class_data.get(key)
-        if isinstance(value, str):
-            assigned_teachers.add(value)
-        elif isinstance(value, list):
-            assigned_teachers.update(str(item) for item in value if item)
+    Returns ``(teacher_doc_id, None)`` on success or ``(None, error_response)``
+    where ``error_response`` is a ready-to-return Flask response tuple.
+    """
 
-    if assigned_teachers and not (teacher_identifiers & assigned_teachers):
-        return jsonify({
+    teacher_doc_id, teacher_identifiers, auth_error = _authenticate_teacher(bearer_token, permission_message)
+    if auth_error:
+        return None, auth_error
+
+    membership = class_membership.teachers_for(class_id)
+    if membership is not None and membership[0]:
+        assigned = membership[1]
+    else:
+        # Index not synced yet, or a class it has not seen: read it directly.
+        class_doc = db.collection("classes").document(class_id).get()
+        if not class_doc.exists:
+            return None, (jsonify({
+                "status": "error",
+                "message": "Class not found.",
+            }), 404)
+        assigned = assigned_teachers(class_doc.to_dict() or {})
+
+    if assigned and not (teacher_identifiers & assigned):
+        return None, (jsonify({
             "status": "error",
             "message": "You are not assigned to this class.",
-        }), 403
+        }), 403)
 
-    if not assigned_teachers:
-        return jsonify({
+    if not assigned:
+        return None, (jsonify({
             "status": "error",
             "message": "This class does not have an assigned teacher.",
-        }), 403
+        }), 403)
 
-    start_dt = datetime.datetime.combine(start_date, datetime.time.min, tzinfo=CENTRAL_TZ)
-    end_dt = datetime.datetime.combine(end_date, datetime.time.max, tzinfo=CENTRAL_TZ)
+    return teacher_doc_id, None
+
+
+# Operational endpoints (profiles, memory) are gated by a shared token sent
+# in X-Admin-Token; they are disabled while ADMIN_API_TOKEN is unset.
+ADMIN_API_TOKEN = os.environ.get("ADMIN_API_TOKEN", "").strip()
+
+
+def _is_admin_token(value):
+    return bool(ADMIN_API_TOKEN and value and hmac.compare_digest(value.strip(), ADMIN_API_TOKEN))
+
+
+def require_admin_token(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _is_admin_token(request.headers.get("X-Admin-Token")):
+            return jsonify({"status": "error", "message": "Admin token required."}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+request_profiler = RequestProfiler(
+    os.environ.get("PROFILING_DIR", "/tmp/attendance-profiles"),
+    sample_rate=float(os.environ.get("PROFILING_SAMPLE_RATE", "0")),
+    interval=float(os.environ.get("PROFILING_INTERVAL_SECONDS", "0.005")),
+    max_files=int(os.environ.get("PROFILING_MAX_FILES", "200")),
+    max_concurrent=int(os.environ.get("PROFILING_MAX_CONCURRENT", "2")),
+    logger=app.logger,
+)
+
+
+# Started per worker by gunicorn's post_worker_init hook; a worker whose RSS
+# stays above MEMORY_RSS_CEILING_MB is sent SIGTERM and replaced gracefully.
+memory_watchdog = MemoryWatchdog(
+    ceiling_bytes=int(float(os.environ.get("MEMORY_RSS_CEILING_MB", "0")) * 2**20),
+    check_interval=float(os.environ.get("MEMORY_CHECK_INTERVAL_SECONDS", "15")),
+    consecutive_checks=int(os.environ.get("MEMORY_CEILING_CONSECUTIVE_CHECKS", "2")),
+    recycle_jitter=float(os.environ.get("MEMORY_RECYCLE_JITTER_SECONDS", "30")),
+    tracemalloc_frames=int(os.environ.get("MEMORY_TRACEMALLOC_FRAMES", "0")),
+    logger=app.logger,
+)
+
+
+def profiled(view):
+    """Route decorator: sample-profile this request when asked to.
+
+    Requests are profiled with probability ``PROFILING_SAMPLE_RATE``, or always
+    when ``X-Profile-Request`` carries the admin token.  A streamed response
+    (exports, compressed bodies) is generated after the view returns, so its
+    profile runs until the server closes the response.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        forced = _is_admin_token(request.headers.get("X-Profile-Request"))
+        stop = request_profiler.start(view.__name__) if request_profiler.should_profile(forced) else None
+        if stop is None:
+            return view(*args, **kwargs)
+        try:
+            result = view(*args, **kwargs)
+        except BaseException:
+            stop()
+            raise
+        response = result[0] if isinstance(result, tuple) else result
+        if getattr(response, "is_streamed", False):
+            response.call_on_close(stop)
+        else:
+            stop()
+        return result
+
+    return wrapper
+
+
+def require_class_teacher(permission_message, allow_query_token=False):
+    """Route decorator: authorize the caller as a teacher of ``classId``.
+
+    The view is called with the validated ``class_id`` as its first argument.
+    With ``allow_query_token`` the token may also come from ``access_token``
+    (EventSource cannot send headers).
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            class_id = (request.args.get("classId") or "").strip()
+            if not class_id:
+                return jsonify({
+                    "status": "error",
+                    "message": "classId is a required query parameter.",
+                }), 400
+
+            bearer_token = _extract_bearer_token(request.headers.get("Authorization"))
+            if not bearer_token and allow_query_token:
+                bearer_token = (request.args.get("access_token") or "").strip() or None
+
+            _teacher_doc_id, auth_error = _authorize_class_teacher(class_id, bearer_token, permission_message)
+            if auth_error:
+                return auth_error
+            return view(class_id, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+EXPORT_COMPRESSION = os.environ.get("EXPORT_COMPRESSION", "1").strip().lower() not in {"0", "false", "no"}
+
+EXPORT_CSV_HEADER = [
+    "studentName",
+    "studentId",
+    "date",
+    "status",
+    "checkInAt",
+    "decidedAt",
+    "decisionMethod",
+]
+
+
+def _parse_export_range(args):
+    """Validate ``startDate``/``endDate`` query args.
+
+    Returns ``(start_date, end_date, None)`` or ``(None, None, error_response)``.
+    """
+
+    start_date_raw = (args.get("startDate") or "").strip()
+    end_date_raw = (args.get("endDate") or "").strip()
+
+    if not start_date_raw or not end_date_raw:
+        return None, None, (jsonify({
+            "status": "error",
+            "message": "startDate and endDate are required query parameters.",
+        }), 400)
 
     try:
-        attendance_query = (
-            db.collection("attendance")
-            .where("classID", "==", class_id)
-            .where("date", ">=", start_dt)
-            .where("date", "<=", end_dt)
-        )
-        attendance_docs = list(attendance_query.stream())
-    except Exception as exc:
-        return jsonify({
+        start_date = datetime.datetime.strptime(start_date_raw, "%Y-%m-%d").date()
+        end_date = datetime.datetime.strptime(end_date_raw, "%Y-%m-%d").date()
+    except ValueError:
+        return None, None, (jsonify({
             "status": "error",
-            "message": f"Failed to fetch attendance records: {exc}",
-        }), 500
+            "message": "Dates must be in YYYY-MM-DD format.",
+        }), 400)
+
+    if start_date > end_date:
+        return None, None, (jsonify({
+            "status": "error",
+            "message": "startDate must be on or before endDate.",
+        }), 400)
+
+    return start_date, end_date, None
+
+
+def _export_filename(class_id, start_date, end_date):
+    return f"attendance-{class_id}-{start_date.isoformat()}-to-{end_date.isoformat()}.csv"
+
+
+# Finalized records moved out of Firestore by ``python -m backend.attendance_archive``;
+# exports read them back from here.  "off" (the default), "local" or "bucket".
+ATTENDANCE_ARCHIVE = os.environ.get("ATTENDANCE_ARCHIVE", "off").strip().lower()
+attendance_archive = None
+if ATTENDANCE_ARCHIVE != "off":
+    attendance_archive = AttendanceArchive(
+        ATTENDANCE_ARCHIVE,
+        output_dir=os.environ.get("ATTENDANCE_ARCHIVE_DIR", "/var/lib/attendance-archive"),
+        bucket_getter=lambda: bucket,
+        tz=CENTRAL_TZ,
+        logger=app.logger,
+    )
+
+
+def _load_export_records(class_id, start_date, end_date, report=None):
+    """Fetch a class's records in the range, sorted by date, plus student names.
+
+    Archived records are merged in; a record that is also still live is
+    taken from Firestore.
+    """
+
+    start_dt = datetime.datetime.combine(start_date, datetime.time.min, tzinfo=CENTRAL_TZ)
+    end_dt = datetime.datetime.combine(end_date, datetime.time.max, tzinfo=CENTRAL_TZ)
+
+    attendance_query = (
+        db.collection("attendance")
+        .where("classID", "==", class_id)
+        .where("date", ">=", start_dt)
+        .where("date", "<=", end_dt)
+    )
 
     attendance_records = []
+    live_ids = set()
     student_ids = set()
-    for doc_snapshot in attendance_docs:
+    for doc_snapshot in attendance_query.stream():
         data = doc_snapshot.to_dict() or {}
         attendance_records.append(data)
+        live_ids.add(doc_snapshot.id)
         student_id = data.get("studentID") or data.get("studentId")
         if student_id:
             student_ids.add(str(student_id))
+        if report is not None:
+            report(phase="reading", rowsRead=len(attendance_records))
+
+    if attendance_archive is not None:
+        for doc_id, data in attendance_archive.read_range(class_id, start_dt, end_dt):
+            if doc_id in live_ids:
+                continue
+            attendance_records.append(data)
+            student_id = data.get("studentID") or data.get("studentId")
+            if student_id:
+                student_ids.add(str(student_id))
+        if report is not None:
+            report(phase="reading", rowsRead=len(attendance_records))
 
     student_names = _lookup_student_names(student_ids) if student_ids else {}
 
@@ -410,57 +670,453 @@ def export_attendance():
         return datetime.datetime.min
 
     attendance_records.sort(key=sort_key)
-
-    csv_header = [
-        "studentName",
-        "studentId",
-        "date",
-        "status",
-        "checkInAt",
-        "decidedAt",
-        "decisionMethod",
+    return attendance_records, student_names
+
+
+def _export_row(record, student_names):
+    student_id = str(record.get("studentID") or record.get("studentId") or "")
+    student_name = student_names.get(student_id, student_id)
+    date_value = record.get("date")
+    check_in_value = record.get("checkInAt") or record.get("createdAt") or date_value
+    decided_value = record.get("decidedAt") or record.get("finalizedAt") or record.get("updatedAt")
+    decision_method = record.get("decisionMethod") or record.get("decisionSource") or ""
+
+    return [
+        student_name,
+        student_id,
+        _to_central_date(date_value),
+        record.get("status", ""),
+        _to_central_iso(check_in_value),
+        _to_central_iso(decided_value),
+        decision_method,
     ]
 
-    def row_for_record(record):
-        student_id = str(record.get("studentID") or record.get("studentId") or "")
-        student_name = student_names.get(student_id, student_id)
-        date_value = record.get("date")
-        check_in_value = record.get("checkInAt") or record.get("createdAt") or date_value
-        decided_value = record.get("decidedAt") or record.get("finalizedAt") or record.get("updatedAt")
-        decision_method = record.get("decisionMethod") or record.get("decisionSource") or ""
 
-        return [
-            student_name,
-            student_id,
-            _to_central_date(date_value),
-            record.get("status", ""),
-            _to_central_iso(check_in_value),
-            _to_central_iso(decided_value),
-            decision_method,
-        ]
+def _iter_export_csv(attendance_records, student_names, report=None):
+    """Yield the export CSV, one chunk per row after the header."""
 
-    def generate():
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(csv_header)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_CSV_HEADER)
+    yield output.getvalue()
+    output.seek(0)
+    output.truncate(0)
+
+    for index, record in enumerate(attendance_records, start=1):
+        writer.writerow(_export_row(record, student_names))
         yield output.getvalue()
         output.seek(0)
         output.truncate(0)
+        if report is not None:
+            report(phase="writing", rowsWritten=index)
 
-        for record in attendance_records:
-            writer.writerow(row_for_record(record))
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
 
-    filename = f"attendance-{class_id}-{start_date_raw}-to-{end_date_raw}.csv"
-    response = Response(stream_with_context(generate()), mimetype="text/csv")
+@app.route("/api/attendance/export", methods=["GET"])
+@profiled
+@require_class_teacher("You do not have permission to export attendance records.")
+def export_attendance(class_id):
+    start_date, end_date, range_error = _parse_export_range(request.args)
+    if range_error:
+        return range_error
+
+    try:
+        attendance_records, student_names = _load_export_records(class_id, start_date, end_date)
+    except Exception as exc:
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to fetch attendance records: {exc}",
+        }), 500
+
+    filename = _export_filename(class_id, start_date, end_date)
+    body = _iter_export_csv(attendance_records, student_names)
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding")) if EXPORT_COMPRESSION else None
+    if encoding:
+        body = compress_stream(body, encoding)
+    response = Response(stream_with_context(body), mimetype="text/csv")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
     response.headers["Content-Disposition"] = f"attachment; filename=\"{filename}\""
     response.headers["Cache-Control"] = "no-store"
 
     return response
 
 
+ATTENDANCE_IMPORT_MAX_ROWS = int(os.environ.get("ATTENDANCE_IMPORT_MAX_ROWS", "10000"))
+# Firestore caps "in" filters at 30 values.
+FIRESTORE_IN_LIMIT = 30
+
+
+def _resolve_student_ids(student_ids):
+    """Return the IDs in ``student_ids`` that belong to a user.
+
+    Like ``_lookup_student_names``, a user matches by document ID or by its
+    ``id`` field, but all lookups are batched.
+    """
+
+    users_collection = db.collection("users")
+    found = {
+        snapshot.id
+        for snapshot in db.get_all([users_collection.document(student_id) for student_id in student_ids])
+        if snapshot.exists
+    }
+    remaining = [student_id for student_id in student_ids if student_id not in found]
+    for start in range(0, len(remaining), FIRESTORE_IN_LIMIT):
+        query = users_collection.where("id", "in", remaining[start:start + FIRESTORE_IN_LIMIT])
+        for snapshot in query.stream():
+            found.add(str((snapshot.to_dict() or {}).get("id")))
+    return found
+
+
+@app.route("/api/attendance/import", methods=["POST"])
+@require_class_teacher("You do not have permission to import attendance records.")
+def import_attendance(class_id):
+    """Upsert attendance from a CSV in the export layout.
+
+    The CSV is the request body (``text/csv``) or a multipart ``file`` field.
+    ``dryRun=1`` validates and reports without writing.
+    """
+
+    upload = request.files.get("file")
+    raw_stream = upload.stream if upload is not None else request.stream
+    lines = io.TextIOWrapper(raw_stream, encoding="utf-8-sig", newline="")
+    dry_run = (request.args.get("dryRun") or "").strip().lower() in {"1", "true", "yes"}
+
+    class_doc = db.collection("classes").document(class_id).get()
+    if not class_doc.exists:
+        return jsonify({"status": "error", "message": "Class not found"}), 404
+
+    try:
+        report = apply_import(
+            db,
+            class_id,
+            iter_import_rows(lines, CENTRAL_TZ, max_rows=ATTENDANCE_IMPORT_MAX_ROWS),
+            _resolve_student_ids,
+            CENTRAL_TZ,
+            firestore.SERVER_TIMESTAMP,
+            firestore.DELETE_FIELD,
+            roster=_class_roster(class_doc.to_dict() or {}),
+            layout=ATTENDANCE_KEY_LAYOUT,
+            dry_run=dry_run,
+        )
+    except ImportHeaderError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+    except (UnicodeDecodeError, csv.Error) as exc:
+        return jsonify({"status": "error", "message": f"Could not read the CSV: {exc}"}), 400
+
+    report["dryRun"] = dry_run
+    report["status"] = "success" if not report["failed"] and not report["rowLimitReached"] else "partial"
+    return jsonify(report), 200
+
+
+EXPORT_JOB_DIR = os.environ.get("EXPORT_JOB_DIR", "/tmp/attendance-exports")
+export_jobs = ExportJobRunner(
+    lambda: db,
+    lambda: bucket,
+    EXPORT_JOB_DIR,
+    storage=os.environ.get("EXPORT_JOB_STORAGE", "local"),
+    max_workers=int(os.environ.get("EXPORT_JOB_WORKERS", "1")),
+    stale_seconds=float(os.environ.get("EXPORT_JOB_STALE_SECONDS", "300")),
+    retention_hours=float(os.environ.get("EXPORT_JOB_RETENTION_HOURS", "24")),
+    logger=app.logger,
+)
+
+
+@app.route("/api/attendance/export/jobs", methods=["POST"])
+@require_class_teacher("You do not have permission to export attendance records.")
+def submit_export_job(class_id):
+    start_date, end_date, range_error = _parse_export_range(request.args)
+    if range_error:
+        return range_error
+
+    compression = (request.args.get("compression") or "none").strip().lower()
+    if compression not in ("none", "gzip"):
+        return jsonify({"status": "error", "message": "compression must be none or gzip."}), 400
+
+    def produce(report):
+        attendance_records, student_names = _load_export_records(class_id, start_date, end_date, report)
+        report(force=True, phase="writing", totalRows=len(attendance_records), rowsWritten=0)
+        yield from _iter_export_csv(attendance_records, student_names, report)
+
+    job_id = export_jobs.submit(
+        {
+            "classID": class_id,
+            "startDate": start_date.isoformat(),
+            "endDate": end_date.isoformat(),
+        },
+        produce,
+        _export_filename(class_id, start_date, end_date),
+        compress=compression == "gzip",
+    )
+
+    return jsonify({
+        "status": "accepted",
+        "jobId": job_id,
+        "statusUrl": f"/api/attendance/export/jobs/{job_id}",
+    }), 202
+
+
+def _authorized_export_job(job_id):
+    """Load a job and check the caller teaches its class: ``(job, error)``."""
+
+    job = export_jobs.get(job_id)
+    if job is None:
+        return None, (jsonify({"status": "error", "message": "Export job not found."}), 404)
+
+    bearer_token = _extract_bearer_token(request.headers.get("Authorization"))
+    if not bearer_token:
+        bearer_token = (request.args.get("access_token") or "").strip() or None
+    _teacher_doc_id, auth_error = _authorize_class_teacher(
+        job.get("classID", ""),
+        bearer_token,
+        "You do not have permission to export attendance records.",
+    )
+    if auth_error:
+        return None, auth_error
+    return job, None
+
+
+@app.route("/api/attendance/export/jobs/<job_id>", methods=["GET"])
+def export_job_status(job_id):
+    job, error = _authorized_export_job(job_id)
+    if error:
+        return error
+
+    payload = {"status": "success", "jobId": job_id}
+    for field in ("state", "phase", "rowsRead", "rowsWritten", "totalRows", "sizeBytes", "filename", "error"):
+        if job.get(field) is not None:
+            payload[field] = job[field]
+    for field in ("createdAt", "startedAt", "completedAt"):
+        if job.get(field) is not None:
+            payload[field] = _to_central_iso(job[field])
+    if job.get("totalRows"):
+        payload["progress"] = round(min(1.0, (job.get("rowsWritten") or 0) / job["totalRows"]), 4)
+    if job.get("state") == "succeeded":
+        payload["downloadUrl"] = f"/api/attendance/export/jobs/{job_id}/download"
+    return jsonify(payload), 200
+
+
+@app.route("/api/attendance/export/jobs/<job_id>/download", methods=["GET"])
+def download_export_job(job_id):
+    job, error = _authorized_export_job(job_id)
+    if error:
+        return error
+    if job.get("state") != "succeeded":
+        return jsonify({"status": "error", "message": "Export is not ready yet."}), 409
+
+    size = export_jobs.object_size(job)
+    if size is None:
+        return jsonify({"status": "error", "message": "Export file is no longer available."}), 410
+
+    try:
+        byte_range = parse_byte_range(request.headers.get("Range"), size)
+    except RangeNotSatisfiable:
+        return Response("", status=416, headers={"Content-Range": f"bytes */{size}"})
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    mimetype = "application/gzip" if job.get("compressed") else "text/csv"
+    response = Response(
+        export_jobs.iter_bytes(job, start, end) if size else iter(()),
+        mimetype=mimetype,
+        status=206 if byte_range else 200,
+    )
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Content-Length"] = str(end - start + 1 if size else 0)
+    if byte_range:
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.headers["Content-Disposition"] = f"attachment; filename=\"{job.get('filename', job_id)}\""
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+ATTENDANCE_PAGE_SIZE_DEFAULT = 50
+ATTENDANCE_PAGE_SIZE_MAX = int(os.environ.get("ATTENDANCE_PAGE_SIZE_MAX", "500"))
+# Fields a client may request with ``fields=``; the default leaves out the
+# bulky audit maps.
+ATTENDANCE_QUERY_FIELDS = (
+    "studentID",
+    "classID",
+    "date",
+    "status",
+    "proposedStatus",
+    "isPending",
+    "pendingRecheckAt",
+    "finalizedAt",
+    "rejectionReason",
+    "createdAt",
+    "updatedAt",
+    "networkEvidence",
+    "verification",
+)
+ATTENDANCE_DEFAULT_FIELDS = ("studentID", "date", "status", "proposedStatus", "isPending")
+
+
+def _serialize_attendance_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return _to_central_iso(value)
+    if isinstance(value, dict):
+        return {key: _serialize_attendance_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_serialize_attendance_value(item) for item in value]
+    return value
+
+
+@app.route("/api/attendance", methods=["GET"])
+@profiled
+@require_class_teacher("You do not have permission to view attendance records.")
+def list_attendance(class_id):
+    """Return one page of a class's attendance records, newest first."""
+
+    try:
+        page_size = int(request.args.get("pageSize") or ATTENDANCE_PAGE_SIZE_DEFAULT)
+    except ValueError:
+        return jsonify({"status": "error", "message": "pageSize must be an integer."}), 400
+    if page_size < 1 or page_size > ATTENDANCE_PAGE_SIZE_MAX:
+        return jsonify({
+            "status": "error",
+            "message": f"pageSize must be between 1 and {ATTENDANCE_PAGE_SIZE_MAX}.",
+        }), 400
+
+    fields_raw = (request.args.get("fields") or "").strip()
+    fields = [field.strip() for field in fields_raw.split(",") if field.strip()] or list(ATTENDANCE_DEFAULT_FIELDS)
+    unknown_fields = sorted(set(fields) - set(ATTENDANCE_QUERY_FIELDS))
+    if unknown_fields:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown fields: {', '.join(unknown_fields)}.",
+        }), 400
+    if "date" not in fields:
+        # The cursor is built from the last row's date.
+        fields.append("date")
+
+    start_date_raw = (request.args.get("startDate") or "").strip()
+    end_date_raw = (request.args.get("endDate") or "").strip()
+    try:
+        start_date = datetime.datetime.strptime(start_date_raw, "%Y-%m-%d").date() if start_date_raw else None
+        end_date = datetime.datetime.strptime(end_date_raw, "%Y-%m-%d").date() if end_date_raw else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Dates must be in YYYY-MM-DD format."}), 400
+
+    fingerprint = query_fingerprint(classId=class_id, startDate=start_date_raw, endDate=end_date_raw)
+    cursor = None
+    page_token = (request.args.get("pageToken") or "").strip()
+    if page_token:
+        try:
+            cursor = decode_page_token(page_token, fingerprint)
+        except PageTokenError as exc:
+            return jsonify({"status": "error", "message": str(exc)}), 400
+
+    attendance_collection = db.collection("attendance")
+    query = attendance_collection.where("classID", "==", class_id)
+    if start_date:
+        query = query.where("date", ">=", datetime.datetime.combine(start_date, datetime.time.min, tzinfo=CENTRAL_TZ))
+    if end_date:
+        query = query.where("date", "<=", datetime.datetime.combine(end_date, datetime.time.max, tzinfo=CENTRAL_TZ))
+    query = query.select(fields)
+
+    try:
+        snapshots, next_cursor = fetch_page(query, attendance_collection, "date", page_size, cursor)
+    except Exception as exc:
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to fetch attendance records: {exc}",
+        }), 500
+
+    records = []
+    for snapshot in snapshots:
+        data = snapshot.to_dict() or {}
+        record = {"recordId": snapshot.id}
+        for field in fields:
+            record[field] = _serialize_attendance_value(data.get(field))
+        records.append(record)
+
+    return jsonify({
+        "status": "success",
+        "records": records,
+        "nextPageToken": encode_page_token(*next_cursor, fingerprint) if next_cursor else None,
+    }), 200
+
+
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+# Each open stream holds a gthread worker thread.  By default a quarter of a
+# worker's threads may serve streams, leaving the rest for scans, and a
+# stream ends after five minutes so EventSource reconnects (possibly to a
+# less busy worker).
+SSE_MAX_STREAMS_PER_WORKER = int(os.environ.get(
+    "SSE_MAX_STREAMS_PER_WORKER",
+    str(max(1, int(os.environ.get("GUNICORN_THREADS", "8")) // 4)),
+))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get("SSE_MAX_STREAM_SECONDS", "300"))
+SSE_RETRY_AFTER_SECONDS = int(os.environ.get("SSE_RETRY_AFTER_SECONDS", "15"))
+
+# One Firestore listener per class is shared by every open dashboard stream.
+attendance_broadcaster = AttendanceStatusBroadcaster(
+    lambda: db,
+    CENTRAL_TZ,
+    max_subscribers=SSE_MAX_STREAMS_PER_WORKER,
+)
+
+
+@app.route("/api/attendance/stream", methods=["GET"])
+@require_class_teacher("You do not have permission to view attendance records.", allow_query_token=True)
+def stream_attendance(class_id):
+    try:
+        subscription = attendance_broadcaster.subscribe(class_id)
+    except StreamLimitReached:
+        return jsonify({
+            "status": "busy",
+            "message": "Too many live attendance streams are open; retry shortly.",
+            "retryAfter": SSE_RETRY_AFTER_SECONDS,
+        }), 503, {"Retry-After": str(SSE_RETRY_AFTER_SECONDS)}
+    except Exception as exc:
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to subscribe to attendance updates: {exc}",
+        }), 500
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            for item in subscription.events(SSE_HEARTBEAT_SECONDS, SSE_MAX_STREAM_SECONDS):
+                if item is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(*item)
+        finally:
+            subscription.close()
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+
+    return response
+
+
+def _rejection_updates(record, reason, rejected_at):
+    """Fields that mark a pending attendance record as rejected."""
+
+    updates = {
+        "status": "Rejected",
+        "rejectionReason": reason,
+        "finalizedAt": rejected_at,
+    }
+
+    for field in ("proposedStatus", "pendingStatus"):
+        if field in record:
+            updates[field] = firestore.DELETE_FIELD
+
+    if "isPending" in record:
+        updates["isPending"] = firestore.DELETE_FIELD
+
+    if "templateCandidate" in record:
+        updates["templateCandidate"] = firestore.DELETE_FIELD
+
+    return updates
+
+
+FINALIZE_DEFERRED_RETRY_SECONDS = int(os.environ.get("FINALIZE_DEFERRED_RETRY_SECONDS", "30"))
+
+
 @app.route("/api/attendance/finalize", methods=["POST"])
 def finalize_attendance():
     payload = request.get_json(silent=True) or {}
@@ -475,6 +1131,13 @@ def finalize_attendance():
     attendance_ref = db.collection("attendance").document(record_id)
     snapshot = attendance_ref.get()
 
+    if not snapshot.exists and payload.get("recordId"):
+        # The client may hold an ID issued before a key-layout migration.
+        alternate_ref = db.collection("attendance").document(other_layout_id(record_id))
+        alternate = alternate_ref.get()
+        if alternate.exists:
+            record_id, attendance_ref, snapshot = alternate_ref.id, alternate_ref, alternate
+
     if not snapshot.exists:
         return jsonify({
             "status": "error",
@@ -491,6 +1154,23 @@ def finalize_attendance():
             "message": "Pending attendance record has expired."
         }), 410
 
+    # A deferred scan has not been matched against the student's face yet,
+    # and one whose verification errored never will be without review.
+    verification_state = record.get("verificationState")
+    if verification_state == "deferred":
+        return jsonify({
+            "status": "verification_pending",
+            "message": "Face verification for this scan has not finished yet.",
+            "recordId": record_id,
+            "retryAfter": FINALIZE_DEFERRED_RETRY_SECONDS,
+        }), 409, {"Retry-After": str(FINALIZE_DEFERRED_RETRY_SECONDS)}
+    if verification_state == "error":
+        return jsonify({
+            "status": "verification_failed",
+            "message": "Face verification for this scan could not be completed; ask your instructor to review it.",
+            "recordId": record_id,
+        }), 409
+
     pending_status = record.get("proposedStatus")
 
     if pending_status is None:
@@ -506,20 +1186,7 @@ def finalize_attendance():
 
     if not is_request_from_eaglenet(request):
         rejection_reason = "Follow-up request must originate from EagleNet."
-        updates = {
-            "status": "Rejected",
-            "rejectionReason": rejection_reason,
-            "finalizedAt": now_central,
-        }
-
-        for field in ("proposedStatus", "pendingStatus"):
-            if field in record:
-                updates[field] = firestore.DELETE_FIELD
-
-        if "isPending" in record:
-            updates["isPending"] = firestore.DELETE_FIELD
-
-        attendance_ref.update(updates)
+        attendance_ref.update(_rejection_updates(record, rejection_reason, now_central))
 
         return jsonify({
             "status": "rejected",
@@ -542,8 +1209,18 @@ def finalize_attendance():
     if "rejectionReason" in record:
         updates["rejectionReason"] = firestore.DELETE_FIELD
 
+    template_candidate = record.get("templateCandidate")
+    if template_candidate is not None:
+        updates["templateCandidate"] = firestore.DELETE_FIELD
+
     attendance_ref.update(updates)
 
+    if FACE_TEMPLATE_PROMOTION and template_candidate is not None:
+        try:
+            face_templates.promote_candidate(record.get("studentID"), template_candidate)
+        except Exception:
+            app.logger.exception("Failed to promote a face template for record %s", record_id)
+
     return jsonify({
         "status": "success",
         "message": "Attendance finalized.",
@@ -574,155 +1251,528 @@ def is_ip_allowed(ip_str):
         return False
     return any(client_ip in network for network in UNT_EAGLENET_NETWORKS)
 
-def _process_face_recognition_request():
-    # Temporary filenames for the captured face and the known face downloaded from storage
-    temp_captured_path = "temp_captured_face.jpg"
-    temp_known_path = "temp_known_face.jpg"
+# Model weights come from a prepared, checksummed directory instead of
+# DeepFace's on-demand downloads (see backend/model_artifacts.py).  A missing
+# or corrupt file stops the worker from booting.
+MODEL_ARTIFACT_DIR = os.environ.get("MODEL_ARTIFACT_DIR", "").strip()
+model_artifacts = None
+if MODEL_ARTIFACT_DIR:
+    _cascade_backends = [
+        name.strip()
+        for name in os.environ.get("FACE_DETECTOR_CASCADE", "").lower().split(",")
+        if name.strip() not in {"", "0", "off", "false", "no", "haar", "yunet"}
+    ]
+    model_artifacts = ModelArtifactManager(
+        MODEL_ARTIFACT_DIR,
+        required=required_weight_files(
+            face_embeddings.MODEL_NAME,
+            [face_embeddings.DETECTOR_BACKEND, *_cascade_backends],
+        ),
+        logger=app.logger,
+    )
+    model_artifacts.activate(
+        verify=os.environ.get("MODEL_ARTIFACT_VERIFY", "1").strip().lower() not in {"0", "false", "no"}
+    )
+    if os.environ.get("MODEL_ARTIFACT_USE_CONVERTED", "1").strip().lower() not in {"0", "false", "no"}:
+        converted_dir = model_artifacts.converted_model_dir(face_embeddings.MODEL_NAME)
+        if converted_dir:
+            face_embeddings.use_converted_model(converted_dir)
+
+# Campus-wide identification index built by ``python -m backend.ann_index``.
+campus_face_index = IndexHandle(os.environ.get("FACE_INDEX_DIR", ""))
+# Enrollment embeddings published by ``python -m backend.enrollment``.  Opened
+# lazily inside each worker; students missing from the store fall back to the
+# known_faces/ image in the bucket.
+known_face_store = EmbeddingStoreHandle(os.environ.get("EMBEDDING_STORE_DIR", ""))
+
+# Promoted templates from confirmed scans, stored next to the enrollment
+# embeddings in faceTemplates/{studentId}.
+FACE_TEMPLATE_PROMOTION = os.environ.get("FACE_TEMPLATE_PROMOTION", "0").strip().lower() in {"1", "true", "yes"}
+face_templates = FaceTemplateStore(
+    lambda: db,
+    face_embeddings.MODEL_NAME,
+    max_promoted=int(os.environ.get("FACE_TEMPLATE_MAX_PROMOTED", "4")),
+    promote_max_distance=float(os.environ.get("FACE_TEMPLATE_PROMOTE_MAX_DISTANCE", "0.4")),
+    min_novelty=float(os.environ.get("FACE_TEMPLATE_MIN_NOVELTY", "0.15")),
+    ttl_seconds=float(os.environ.get("FACE_TEMPLATE_CACHE_SECONDS", "60")),
+    logger=app.logger,
+    transactional=memory_transactional if BACKEND_DATA_MODE == "memory" else None,
+)
+
+
+def _decode_data_url_image(image_b64):
+    """Decode a ``data:image/...;base64,`` payload into a BGR image or None."""
+
+    image_data = base64.b64decode(image_b64.split(',')[1])
+    np_arr = np.frombuffer(image_data, np.uint8)
+    return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+
+# Reject blurry, badly lit, tiny or tilted faces before running the model.
+FRAME_QUALITY_GATING = os.environ.get("FRAME_QUALITY_GATING", "1").strip().lower() not in {"0", "false", "no"}
+
+
+def _check_frame_quality(captured_img):
+    """Run the quality gate; returns ``(rejection, haar_faces)``.
+
+    ``rejection`` is a 422 retry response if the frame is unusable, else
+    None.  ``haar_faces`` holds the gate's ``(box, eyes)`` for the detector
+    cascade, or is None when the gate did not run.
+    """
 
-    try:
-        data = request.get_json()
-        image_b64 = data.get("image")
-        class_id = data.get("classId")
-        student_id = data.get("studentId")
+    if not FRAME_QUALITY_GATING:
+        return None, None
+    quality = assess_frame_quality(captured_img)
+    if quality.ok:
+        return None, [(quality.face_box, quality.eyes)]
+    return (jsonify({
+        "status": "retry",
+        "reason": quality.reason,
+        "message": quality.message,
+        "quality": quality.metrics,
+    }), 422), None
 
-        if not image_b64 or not class_id or not student_id:
-            return jsonify({"status": "error", "message": "Missing image, classId, or studentId"}), 400
 
-        # Download the known face image from storage
-        # Assumes that known face images are stored under the "known_faces/" folder in our bucket
-        blob = bucket.blob(f"known_faces/{student_id}.jpg")
-        if not blob.exists():
-            return jsonify({"status": "error", "message": "No known face image found for this student."}), 404
-        blob.download_to_filename(temp_known_path)
-
-        # Decode the base64 image and save it as the captured face
-        image_data = base64.b64decode(image_b64.split(',')[1])
-        np_arr = np.frombuffer(image_data, np.uint8)
-        captured_img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        if captured_img is None:
-            return jsonify({"status": "error", "message": "Captured image could not be decoded."}), 400
-        cv2.imwrite(temp_captured_path, captured_img)
-
-        # Use DeepFace to verify the face. Compare the captured face with the known face downloaded from storage
-        """
-        print("Running DeepFace.verify...")
-        verify_result = DeepFace.verify(
-        img1_path=temp_captured_path,
-        img2_path=temp_known_path,
-        model_name="VGG-Face",
-        enforce_detection=False
-        )
-        print("DeepFace.verify completed.")
-        """
-        # Verified result for testing purposes
-        # Uncomment the above DeepFace.verify code and comment the below lines for real scan
-        verify_result = {
-        "verified": True,
-        "distance": 0.12,
-        "max_threshold_to_verify": 0.3
-        }
+face_detector = build_default_cascade(logger=app.logger)
 
-        print("DeepFace verify result:", verify_result)
-        if not verify_result.get("verified", False):
-            return jsonify({"status": "fail", "message": "Face not recognized"}), 404
 
-        # Get current central time
-        now_central = datetime.datetime.now(CENTRAL_TZ)
-        today_str = now_central.strftime("%Y-%m-%d")
-        doc_id = f"{class_id}_{student_id}_{today_str}"
-
-        # Check if attendance record already exists
-        attendance_doc_ref = db.collection("attendance").document(doc_id)
-        attendance_doc = attendance_doc_ref.get()
-        if attendance_doc.exists:
-            existing_record = attendance_doc.to_dict() or {}
-            if existing_record.get("status") == "pending":
-                existing_recheck_due = existing_record.get("pendingRecheckAt")
-                if isinstance(existing_recheck_due, datetime.datetime):
-                    existing_recheck_due_iso = existing_recheck_due.isoformat()
-                else:
-                    existing_recheck_due_iso = None
-                return jsonify({
-                    "status": "pending",
-                    "message": "Attendance scan is awaiting manual verification.",
-                    "recognized_student": student_id,
-                    "pending": True,
-                    "proposed_attendance_status": existing_record.get("proposedStatus"),
-                    "recheck_due_at": existing_recheck_due_iso,
-                }), 202
-            return jsonify({"status": "already_marked", "message": "Attendance already recorded today."}), 200
+def _embed_captured_face(captured_img, haar_faces=None):
+    """Embed the largest face in ``captured_img``.
+
+    ``haar_faces`` are the quality gate's Haar results for this frame.
+    Returns ``(embedding, detector_stage)``, or ``(None, None)`` if no face is found.
+    """
+
+    with inference_load.track():
+        faces, stage = face_detector.detect(captured_img, haar_faces)
+        if not faces:
+            return None, None
+        # Kiosks and webcams may catch people in the background; use the largest face.
+        face_rgb = max(faces, key=lambda face: face.facial_area.get("w", 0) * face.facial_area.get("h", 0)).face_rgb
+        return face_embeddings.embed_faces([face_rgb])[0], stage
+
+
+def _student_templates(student_id):
+    """Return ``(templates, enrolled_count)`` for a student; templates may be None.
+
+    Enrolled embeddings come first, followed by any promoted templates.
+    """
+
+    store = known_face_store.get()
+    enrolled_embeddings = store.embeddings_for(student_id) if store is not None else None
+    promoted_embeddings = None
+    if FACE_TEMPLATE_PROMOTION:
+        dimension = enrolled_embeddings.shape[1] if enrolled_embeddings is not None else None
+        promoted_embeddings = face_templates.promoted_for(student_id, dimension)
+    enrolled_count = len(enrolled_embeddings) if enrolled_embeddings is not None else 0
+    return stack_templates(enrolled_embeddings, promoted_embeddings), enrolled_count
+
+
+def _score_templates(captured_img, templates, enrolled_count, haar_faces=None):
+    """Embed the captured face and match it against every template at once.
+
+    Returns ``(verify_result, embedding)``; both are None if no face is found.
+    """
+
+    captured_embedding, detector_stage = _embed_captured_face(captured_img, haar_faces)
+    if captured_embedding is None:
+        return None, None
+    distance, template_row = best_match(captured_embedding, templates)
+    threshold = face_embeddings.distance_threshold(detector_stage)
+    verify_result = {
+        "verified": distance <= threshold,
+        "distance": distance,
+        "max_threshold_to_verify": threshold,
+        "details": {
+            "detector": detector_stage,
+            "templates": len(templates),
+            "matchedTemplate": "enrolled" if template_row < enrolled_count else "promoted",
+        },
+    }
+    return verify_result, captured_embedding
+
+
+def _process_identification_request(data):
+    """Identify the student in the frame without a claimed studentId."""
+
+    image_b64 = data.get("image")
+    if not image_b64:
+        return jsonify({"status": "error", "message": "Missing image"}), 400
 
+    index = campus_face_index.get()
+    if index is None:
+        return jsonify({
+            "status": "error",
+            "message": "Campus-wide identification is not configured.",
+        }), 503
+
+    captured_img = _decode_data_url_image(image_b64)
+    if captured_img is None:
+        return jsonify({"status": "error", "message": "Captured image could not be decoded."}), 400
+
+    rejection, haar_faces = _check_frame_quality(captured_img)
+    if rejection is not None:
+        return rejection
+
+    embedding, detector_stage = _embed_captured_face(captured_img, haar_faces)
+    if embedding is None:
+        return jsonify({"status": "fail", "message": "No face detected"}), 400
+
+    matches = index.search(embedding, k=1)
+    threshold = face_embeddings.distance_threshold(detector_stage)
+    verification = {
+        "threshold": threshold,
+        "model": index.model or face_embeddings.MODEL_NAME,
+        "mode": "identify",
+        "detector": detector_stage,
+    }
+
+    if not matches or matches[0][1] > threshold:
+        verification["distance"] = matches[0][1] if matches else None
+        return jsonify({
+            "status": "fail",
+            "message": "Face not recognized",
+            "verification": verification,
+        }), 404
+
+    student_id, distance = matches[0]
+    verification["distance"] = distance
+
+    return jsonify({
+        "status": "identified",
+        "recognized_student": student_id,
+        "verification": verification,
+    }), 200
+
+
+def _network_evidence(req):
+    """Request metadata stored with each scan to support audit trails."""
+
+    return {
+        "remoteAddr": req.remote_addr,
+        "xForwardedFor": req.headers.get("X-Forwarded-For"),
+        "xRealIp": req.headers.get("X-Real-IP"),
+        "userAgent": req.headers.get("User-Agent"),
+        "forwardedProto": req.headers.get("X-Forwarded-Proto"),
+        "requestId": req.headers.get("X-Request-Id"),
+    }
+
+
+# Audit maps are written behind the response in batched commits.
+AUDIT_WRITE_BEHIND = os.environ.get("AUDIT_WRITE_BEHIND", "1").strip().lower() not in {"0", "false", "no"}
+audit_write_queue = AuditWriteQueue(
+    lambda: db,
+    max_batch_size=int(os.environ.get("AUDIT_BATCH_SIZE", "500")),
+    max_queue_size=int(os.environ.get("AUDIT_QUEUE_MAX_SIZE", "10000")),
+    flush_interval=float(os.environ.get("AUDIT_FLUSH_INTERVAL_SECONDS", "0.5")),
+    enqueue_timeout=float(os.environ.get("AUDIT_ENQUEUE_TIMEOUT_SECONDS", "2")),
+    logger=app.logger,
+)
+
+
+def _attendance_status_now(class_id, now_central, class_data=None):
+    """Return ``(status, None)`` for a scan at ``now_central``, or ``(None, (payload, code))``."""
+
+    if class_data is None:
         # Retrieve class document to fetch the class schedule
         class_doc = db.collection("classes").document(class_id).get()
         if not class_doc.exists:
-            return jsonify({"status": "error", "message": "Class not found"}), 404
+            return None, ({"status": "error", "message": "Class not found"}, 404)
         class_data = class_doc.to_dict()
-        schedule_str = class_data.get("schedule", "").strip()
-        if not schedule_str:
-            return jsonify({"status": "error", "message": "No schedule defined for this class"}), 400
-
-        start_time, end_time = parse_schedule(schedule_str)
-        if not start_time or not end_time:
-            return jsonify({"status": "error", "message": "Invalid schedule format"}), 400
-
-        start_dt = datetime.datetime(
-            now_central.year, now_central.month, now_central.day,
-            start_time.hour, start_time.minute, 0, 0,
-            tzinfo=CENTRAL_TZ
-        )
-        end_dt = datetime.datetime(
-            now_central.year, now_central.month, now_central.day,
-            end_time.hour, end_time.minute, 0, 0,
-            tzinfo=CENTRAL_TZ
-        )
+    try:
+        class_schedule = schedule_for_class(class_data, CENTRAL_TZ)
+    except (ValueError, KeyError, TypeError):
+        return None, ({"status": "error", "message": "Invalid schedule format"}, 400)
+    if class_schedule is None:
+        return None, ({"status": "error", "message": "No schedule defined for this class"}, 400)
 
-        status, error_msg = get_attendance_status(now_central, start_dt, end_dt)
-        if error_msg:
-            return jsonify({"status": "fail", "message": error_msg}), 400
+    meeting = class_schedule.session_for(now_central)
+    if meeting is None:
+        return None, ({"status": "fail", "message": "This class does not meet today."}, 400)
 
-        print("Computed attendance status:", status)
+    start_dt, end_dt = meeting.on_date(now_central.date(), CENTRAL_TZ)
 
-        network_evidence = {
-            "remoteAddr": request.remote_addr,
-            "xForwardedFor": request.headers.get("X-Forwarded-For"),
-            "xRealIp": request.headers.get("X-Real-IP"),
-            "userAgent": request.headers.get("User-Agent"),
-            "forwardedProto": request.headers.get("X-Forwarded-Proto"),
-            "requestId": request.headers.get("X-Request-Id"),
-        }
+    status, error_msg = get_attendance_status(now_central, start_dt, end_dt)
+    if error_msg:
+        return None, ({"status": "fail", "message": error_msg}, 400)
+    return status, None
 
-        pending_recheck_at = now_central + datetime.timedelta(minutes=45)
 
-        # Create attendance record document in Firebase marked as pending review
-        attendance_record = {
-            "studentID": student_id,
-            "classID": class_id,
-            "date": now_central,
-            "status": "pending",
-            "isPending": True,
-            "proposedStatus": status,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "updatedAt": firestore.SERVER_TIMESTAMP,
-            "pendingRecheckAt": pending_recheck_at,
-            "networkEvidence": network_evidence,
-            "verification": {
-                "distance": verify_result.get("distance"),
-                "threshold": verify_result.get("max_threshold_to_verify"),
-                "model": "VGG-Face",
-            },
-        }
-        attendance_doc_ref.set(attendance_record)
+def _existing_attendance_response(attendance_doc, student_id):
+    """The ``(payload, status_code)`` for a scan when today's record already exists."""
 
-        response_payload = {
+    existing_record = attendance_doc.to_dict() or {}
+    if existing_record.get("status") == "pending":
+        existing_recheck_due = existing_record.get("pendingRecheckAt")
+        if isinstance(existing_recheck_due, datetime.datetime):
+            existing_recheck_due_iso = existing_recheck_due.isoformat()
+        else:
+            existing_recheck_due_iso = None
+        return {
             "status": "pending",
+            "message": "Attendance scan is awaiting manual verification.",
+            "record_id": attendance_doc.id,
             "recognized_student": student_id,
             "pending": True,
-            "proposed_attendance_status": status,
-            "recheck_due_at": pending_recheck_at.isoformat(),
+            "proposed_attendance_status": existing_record.get("proposedStatus"),
+            "recheck_due_at": existing_recheck_due_iso,
+        }, 202
+    return {"status": "already_marked", "message": "Attendance already recorded today."}, 200
+
+
+def _record_verified_attendance(class_id, student_id, verify_result, network_evidence, record_fields=None):
+    """Create the pending attendance record for a verified scan.
+
+    Returns ``(payload, status_code)``; callers wrap the payload in their own
+    response format.  ``verify_result["details"]`` is merged into the stored
+    ``verification`` map and ``record_fields`` into the record itself.
+    """
+
+    # Get current central time
+    now_central = datetime.datetime.now(CENTRAL_TZ)
+    today_str = now_central.strftime("%Y-%m-%d")
+    doc_id = _attendance_doc_id(class_id, student_id, today_str)
+
+    # Check if attendance record already exists (under either key layout)
+    attendance_doc_ref = db.collection("attendance").document(doc_id)
+    attendance_doc = _find_attendance_record(class_id, student_id, today_str)
+    if attendance_doc is not None:
+        return _existing_attendance_response(attendance_doc, student_id)
+
+    status, status_error = _attendance_status_now(class_id, now_central)
+    if status_error:
+        return status_error
+
+    print("Computed attendance status:", status)
+
+    pending_recheck_at = now_central + datetime.timedelta(minutes=45)
+
+    # Create attendance record document in Firebase marked as pending review
+    attendance_record = {
+        "studentID": student_id,
+        "classID": class_id,
+        "date": now_central,
+        "status": "pending",
+        "isPending": True,
+        "proposedStatus": status,
+        "createdAt": firestore.SERVER_TIMESTAMP,
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+        "pendingRecheckAt": pending_recheck_at,
+        **(record_fields or {}),
+    }
+    audit_fields = {
+        "networkEvidence": network_evidence,
+        "verification": {
+            "distance": verify_result.get("distance"),
+            "threshold": verify_result.get("max_threshold_to_verify"),
+            "model": "VGG-Face",
+            **verify_result.get("details", {}),
+        },
+    }
+    # A deferred record's verification map is filled in later by the
+    # verifier, so its placeholder is written inline rather than queued where
+    # a late flush could land on top of the real result.
+    if AUDIT_WRITE_BEHIND and "verificationState" not in attendance_record:
+        attendance_doc_ref.set(attendance_record)
+        audit_write_queue.submit("attendance", doc_id, audit_fields)
+    else:
+        attendance_doc_ref.set({**attendance_record, **audit_fields})
+
+    response_payload = {
+        "status": "pending",
+        "record_id": doc_id,
+        "recognized_student": student_id,
+        "pending": True,
+        "proposed_attendance_status": status,
+        "recheck_due_at": pending_recheck_at.isoformat(),
+    }
+
+    # Inform the frontend that the scan is pending manual follow-up
+    return response_payload, 202
+
+
+# Under load, scans are recorded as pending right away and verified later by
+# a background thread (see backend/deferred_verification.py).
+DEFERRED_VERIFICATION = os.environ.get("DEFERRED_VERIFICATION", "1").strip().lower() not in {"0", "false", "no"}
+inference_load = InferenceLoadMonitor(
+    max_in_flight=int(os.environ.get("INFERENCE_MAX_IN_FLIGHT", "4")),
+    p99_threshold_seconds=float(os.environ.get("INFERENCE_P99_THRESHOLD_SECONDS", "8")),
+    window_seconds=float(os.environ.get("INFERENCE_LATENCY_WINDOW_SECONDS", "60")),
+    hold_seconds=float(os.environ.get("INFERENCE_SHED_HOLD_SECONDS", "15")),
+)
+
+
+def _verify_deferred_frame(image_bytes, record):
+    captured_img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if captured_img is None:
+        raise ValueError("Stored frame could not be decoded.")
+    student_id = str(record.get("studentID") or "")
+    templates, enrolled_count = _student_templates(student_id)
+    if templates is None:
+        raise LookupError(f"No face templates for student {student_id}.")
+    verify_result, _embedding = _score_templates(captured_img, templates, enrolled_count)
+    if verify_result is None:
+        return {
+            "verified": False,
+            "distance": None,
+            "max_threshold_to_verify": face_embeddings.DISTANCE_THRESHOLD,
+            "details": {"reason": "no_face"},
         }
+    return verify_result
+
+
+deferred_verifier = DeferredVerifier(
+    lambda: db,
+    lambda: bucket,
+    _verify_deferred_frame,
+    busy=lambda: inference_load.overload_reason() is not None,
+    max_queue_size=int(os.environ.get("DEFERRED_QUEUE_MAX_SIZE", "1000")),
+    sweep_interval=float(os.environ.get("DEFERRED_SWEEP_INTERVAL_SECONDS", "60")),
+    stale_seconds=float(os.environ.get("DEFERRED_STALE_SECONDS", "120")),
+    reject_updates=lambda record: _rejection_updates(
+        record,
+        "Deferred face verification did not match the enrolled student.",
+        datetime.datetime.now(CENTRAL_TZ),
+    ),
+    logger=app.logger,
+    transactional=memory_transactional if BACKEND_DATA_MODE == "memory" else None,
+)
+
+
+def _defer_verification(class_id, student_id, captured_img, reason):
+    """Store the frame, record the scan as pending, and verify it later."""
+
+    today_str = datetime.datetime.now(CENTRAL_TZ).strftime("%Y-%m-%d")
+    # Check before storing anything: a repeat scan must not replace the
+    # frame a still-deferred record is waiting to be verified against.
+    attendance_doc = _find_attendance_record(class_id, student_id, today_str)
+    if attendance_doc is not None:
+        return _existing_attendance_response(attendance_doc, student_id)
+
+    doc_id = _attendance_doc_id(class_id, student_id, today_str)
+    encoded, jpeg = cv2.imencode(".jpg", captured_img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+    if not encoded:
+        return {"status": "error", "message": "Captured image could not be stored."}, 500
+    frame_path = deferred_verifier.store_frame(doc_id, jpeg.tobytes())
+
+    verify_result = {
+        "distance": None,
+        "max_threshold_to_verify": face_embeddings.DISTANCE_THRESHOLD,
+        "details": {"deferred": True, "deferReason": reason},
+    }
+    record_fields = {
+        "verificationState": "deferred",
+        "deferredFrame": frame_path,
+        "deferredAt": datetime.datetime.now(datetime.timezone.utc),
+    }
+    payload, status_code = _record_verified_attendance(
+        class_id,
+        student_id,
+        verify_result,
+        _network_evidence(request),
+        record_fields=record_fields,
+    )
+    inference_load.record_deferral()
+    # Always queued: if no deferred record was created the worker just
+    # removes the stored frame.
+    deferred_verifier.submit(doc_id)
+    app.logger.info("Deferred verification of %s (%s)", doc_id, reason)
+    return payload, status_code
+
+
+def _process_face_recognition_request():
+    # Temporary filenames for the captured face and the known face downloaded from storage
+    temp_captured_path = "temp_captured_face.jpg"
+    temp_known_path = "temp_known_face.jpg"
 
-        # Inform the frontend that the scan is pending manual follow-up
-        return jsonify(response_payload), 202
+    try:
+        data = request.get_json()
+        if str(data.get("mode") or "").lower() == "identify":
+            return _process_identification_request(data)
+
+        image_b64 = data.get("image")
+        class_id = data.get("classId")
+        student_id = data.get("studentId")
+
+        if not image_b64 or not class_id or not student_id:
+            return jsonify({"status": "error", "message": "Missing image, classId, or studentId"}), 400
+
+        # Decode the base64 image of the captured face
+        captured_img = _decode_data_url_image(image_b64)
+        if captured_img is None:
+            return jsonify({"status": "error", "message": "Captured image could not be decoded."}), 400
+
+        rejection, haar_faces = _check_frame_quality(captured_img)
+        if rejection is not None:
+            return rejection
+
+        known_embeddings, enrolled_count = _student_templates(student_id)
+        captured_embedding = None
+
+        if known_embeddings is not None:
+            overload = inference_load.overload_reason() if DEFERRED_VERIFICATION else None
+            if overload:
+                payload, status_code = _defer_verification(class_id, student_id, captured_img, overload)
+                return jsonify(payload), status_code
+
+            # Compare against every template at once: the precomputed
+            # enrollment embeddings (memory-mapped and shared by every worker
+            # on the host) plus any promoted from earlier scans.
+            verify_result, captured_embedding = _score_templates(
+                captured_img, known_embeddings, enrolled_count, haar_faces,
+            )
+            if verify_result is None:
+                return jsonify({"status": "fail", "message": "No face detected"}), 400
+        else:
+            # Download the known face image from storage
+            # Assumes that known face images are stored under the "known_faces/" folder in our bucket
+            blob = bucket.blob(f"known_faces/{student_id}.jpg")
+            if not blob.exists():
+                return jsonify({"status": "error", "message": "No known face image found for this student."}), 404
+            blob.download_to_filename(temp_known_path)
+
+            cv2.imwrite(temp_captured_path, captured_img)
+
+            # Use DeepFace to verify the face. Compare the captured face with the known face downloaded from storage
+            """
+            print("Running DeepFace.verify...")
+            verify_result = DeepFace.verify(
+            img1_path=temp_captured_path,
+            img2_path=temp_known_path,
+            model_name="VGG-Face",
+            enforce_detection=False
+            )
+            print("DeepFace.verify completed.")
+            """
+            # Verified result for testing purposes
+            # Uncomment the above DeepFace.verify code and comment the below lines for real scan
+            verify_result = {
+            "verified": True,
+            "distance": 0.12,
+            "max_threshold_to_verify": 0.3
+            }
+
+        print("DeepFace verify result:", verify_result)
+        if not verify_result.get("verified", False):
+            return jsonify({"status": "fail", "message": "Face not recognized"}), 404
+        face_scan_limiter.charge(f"student:{student_id}")
+
+        # The embedding rides along on the pending record and is promoted
+        # only when finalization confirms the attendance.
+        record_fields = None
+        if FACE_TEMPLATE_PROMOTION and captured_embedding is not None:
+            template_candidate = face_templates.candidate(captured_embedding, verify_result["distance"])
+            if template_candidate is not None:
+                record_fields = {"templateCandidate": template_candidate}
+
+        payload, status_code = _record_verified_attendance(
+            class_id,
+            student_id,
+            verify_result,
+            _network_evidence(request),
+            record_fields,
+        )
+        return jsonify(payload), status_code
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -735,7 +1785,38 @@ def _process_face_recognition_request():
             os.remove(temp_known_path)
 
 
+# Per-student limits cap how often one student's scans are accepted; the per-IP
+# limit is much looser because a whole building can share one EagleNet NAT
+# address.
+face_scan_limiter = TokenBucketLimiter(
+    rate_per_minute=float(os.environ.get("FACE_SCAN_IP_RATE_PER_MINUTE", "300")),
+    burst=float(os.environ.get("FACE_SCAN_IP_BURST", "60")),
+    scopes={
+        "student": (
+            float(os.environ.get("FACE_SCAN_STUDENT_RATE_PER_MINUTE", "6")),
+            float(os.environ.get("FACE_SCAN_STUDENT_BURST", "3")),
+        ),
+    },
+)
+# Only submissions of the same frame are coalesced (a double-tapped button
+# or a client retry); a different frame for the same student is scored.
+face_scan_coalescer = RequestCoalescer()
+
+
+def _clone_view_result(result):
+    """Copy a view result so coalesced callers do not share a Response object."""
+
+    if not isinstance(result, tuple):
+        result = (result,)
+    body = result[0]
+    if hasattr(body, "get_data"):
+        body = Response(body.get_data(), status=body.status_code, headers=body.headers.copy())
+    extra = tuple(dict(item) if isinstance(item, dict) else item for item in result[1:])
+    return (body,) + extra
+
+
 @app.route("/api/face-recognition", methods=["POST", "OPTIONS"])
+@profiled
 def face_recognition():
     if request.method == "OPTIONS":
         return "", 200
@@ -748,8 +1829,458 @@ def face_recognition():
             "message": "Access denied: client IP is not authorized to use this service."
         }), 403
 
-    return _process_face_recognition_request()
+    payload = request.get_json(silent=True) or {}
+    class_id = str(payload.get("classId") or "").strip()
+    student_id = str(payload.get("studentId") or "").strip()
+
+    # The student ID is only claimed by the client, so its bucket is checked
+    # here but charged only once a scan verifies as that student; otherwise
+    # anyone could use up a classmate's allowance.  A request the student
+    # limit refuses does not use up the shared IP's allowance either.
+    allowed, retry_after = face_scan_limiter.try_acquire(
+        f"ip:{client_ip}",
+        check=[f"student:{student_id}"] if student_id else (),
+    )
+    if not allowed:
+        retry_after_seconds = max(1, int(retry_after + 0.999)) if retry_after is not None else 60
+        app.logger.info("Rate limited face recognition request from %s for student %s", client_ip, student_id)
+        return jsonify({
+            "status": "rate_limited",
+            "message": "Too many scan attempts. Please wait a moment and try again.",
+            "retry_after": retry_after_seconds,
+        }), 429, {"Retry-After": str(retry_after_seconds)}
+
+    if DEFERRED_VERIFICATION:
+        # Starts this worker's verifier, whose sweep also resumes records
+        # left deferred by a worker that exited.
+        deferred_verifier.start()
+
+    if not class_id or not student_id:
+        return _process_face_recognition_request()
+
+    today_str = datetime.datetime.now(CENTRAL_TZ).strftime("%Y-%m-%d")
+    frame_hash = hashlib.sha256(str(payload.get("image") or "").encode("utf-8")).hexdigest()
+    result, shared = face_scan_coalescer.run(
+        (class_id, student_id, today_str, frame_hash),
+        _process_face_recognition_request,
+    )
+    if shared:
+        return _clone_view_result(result)
+    return result
+
+KIOSK_MAX_FRAME_BYTES = int(os.environ.get("KIOSK_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+KIOSK_MIN_SHARPNESS = float(os.environ.get("KIOSK_MIN_SHARPNESS", "60"))
+KIOSK_SESSION_TTL_SECONDS = float(os.environ.get("KIOSK_SESSION_TTL_SECONDS", "120"))
+KIOSK_SESSION_ID_MAX_LENGTH = 64
+CLASS_CATALOG_TTL_SECONDS = float(os.environ.get("CLASS_CATALOG_TTL_SECONDS", "300"))
+
+kiosk_sessions = KioskSessionRegistry(ttl_seconds=KIOSK_SESSION_TTL_SECONDS)
+
+_class_catalog_lock = threading.Lock()
+_class_catalog = {"loaded_at": None, "index": None, "rosters": {}, "teachers": {}}
+
+
+def _class_roster(class_data):
+    """Return the student IDs enrolled in a class document."""
+
+    roster = set()
+    for key in ("students", "studentIds", "enrolledStudents"):
+        value = class_data.get(key)
+        if isinstance(value, list):
+            roster.update(str(item) for item in value if item)
+    return roster
+
+
+def _get_class_catalog():
+    """Schedule index, rosters and teachers for every class, refreshed periodically."""
+
+    with _class_catalog_lock:
+        loaded_at = _class_catalog["loaded_at"]
+        if loaded_at is None or time.monotonic() - loaded_at >= CLASS_CATALOG_TTL_SECONDS:
+            snapshots = list(db.collection("classes").stream())
+            _class_catalog["index"] = build_schedule_index(snapshots, CENTRAL_TZ, app.logger)
+            _class_catalog["rosters"] = {
+                snapshot.id: _class_roster(snapshot.to_dict() or {}) for snapshot in snapshots
+            }
+            _class_catalog["teachers"] = {
+                snapshot.id: assigned_teachers(snapshot.to_dict() or {}) for snapshot in snapshots
+            }
+            _class_catalog["loaded_at"] = time.monotonic()
+        return _class_catalog["index"], _class_catalog["rosters"], _class_catalog["teachers"]
+
+
+def _teacher_class_ids(teacher_identifiers):
+    """Return the IDs of the classes assigned to any of ``teacher_identifiers``."""
+
+    class_ids = class_membership.classes_for(teacher_identifiers)
+    if class_ids is None:
+        # Membership index not synced yet: use the cached catalog.
+        _schedule_index, _rosters, teachers = _get_class_catalog()
+        class_ids = {class_id for class_id, assigned in teachers.items() if assigned & teacher_identifiers}
+    return class_ids
+
+
+def _open_class_for_student(student_id, class_ids, now=None):
+    """Return the class among ``class_ids`` that the student is enrolled in and is open now."""
+
+    schedule_index, rosters, _teachers = _get_class_catalog()
+    now = now or datetime.datetime.now(CENTRAL_TZ)
+    for class_id, _block in schedule_index.open_classes(now):
+        if class_id in class_ids and student_id in rosters.get(class_id, ()):
+            return class_id
+    return None
+
+
+def _kiosk_face_rgb(image, box, eyes):
+    return face_detection.aligned_face_rgb(image, box, eyes, FAST_DETECTOR_MARGIN)
+
+
+def _build_kiosk_identifier(roster):
+    """Return ``identify(image, box, eyes)`` for a kiosk session, or None if unavailable.
+
+    With a class roster, faces are matched against the roster's enrollment
+    embeddings; otherwise, against the campus-wide index.  Crops are
+    eye-aligned like the enrollment faces before embedding.
+    """
+
+    threshold = face_embeddings.distance_threshold("haar")
+
+    store = known_face_store.get()
+    if roster and store is not None:
+        owners = []
+        templates = []
+        for student_id in sorted(roster):
+            embeddings = store.embeddings_for(student_id)
+            if embeddings is not None:
+                owners.extend([student_id] * len(embeddings))
+                templates.append(embeddings)
+        if templates:
+            roster_matrix = np.concatenate(templates, axis=0)
+
+            def identify(image, box, eyes):
+                embedding = face_embeddings.embed_faces([_kiosk_face_rgb(image, box, eyes)])[0]
+                distances = face_embeddings.cosine_distances(embedding, roster_matrix)
+                best = int(np.argmin(distances))
+                distance = float(distances[best])
+                if distance > threshold:
+                    return None, distance
+                return owners[best], distance
+
+            return identify
+
+    index = campus_face_index.get()
+    if index is None:
+        return None
+
+    def identify(image, box, eyes):
+        embedding = face_embeddings.embed_faces([_kiosk_face_rgb(image, box, eyes)])[0]
+        matches = index.search(embedding, k=1)
+        if not matches:
+            return None, None
+        student_id, distance = matches[0]
+        if distance > threshold:
+            return None, distance
+        return student_id, distance
+
+    return identify
+
+
+@app.route("/api/kiosk/stream", methods=["POST", "OPTIONS"])
+def kiosk_stream():
+    if request.method == "OPTIONS":
+        return "", 200
+
+    client_ip = get_client_ip(request)
+    if not is_ip_allowed(client_ip):
+        app.logger.warning("Rejected kiosk stream from unauthorized IP %s", client_ip)
+        return jsonify({
+            "status": "forbidden",
+            "message": "Access denied: client IP is not authorized to use this service."
+        }), 403
+
+    bearer_token = _extract_bearer_token(request.headers.get("Authorization"))
+    permission_message = "You do not have permission to run an attendance kiosk."
+    class_id = (request.args.get("classId") or "").strip() or None
+    if class_id:
+        teacher_doc_id, auth_error = _authorize_class_teacher(class_id, bearer_token, permission_message)
+        if auth_error:
+            return auth_error
+        class_doc = db.collection("classes").document(class_id).get()
+        roster = _class_roster(class_doc.to_dict() or {}) if class_doc.exists else set()
+        kiosk_class_ids = {class_id}
+    else:
+        teacher_doc_id, teacher_identifiers, auth_error = _authenticate_teacher(bearer_token, permission_message)
+        if auth_error:
+            return auth_error
+        roster = None
+        kiosk_class_ids = _teacher_class_ids(teacher_identifiers)
+        if not kiosk_class_ids:
+            return jsonify({"status": "error", "message": "You are not assigned to any class."}), 403
+
+    session_id = (request.args.get("sessionId") or "").strip()
+    if len(session_id) > KIOSK_SESSION_ID_MAX_LENGTH:
+        return jsonify({
+            "status": "error",
+            "message": f"sessionId must be at most {KIOSK_SESSION_ID_MAX_LENGTH} characters.",
+        }), 400
+
+    identify = _build_kiosk_identifier(roster)
+    if identify is None:
+        return jsonify({
+            "status": "error",
+            "message": "Kiosk identification requires an embedding store or campus index.",
+        }), 503
+
+    network_evidence = _network_evidence(request)
+
+    def record(student_id, distance):
+        if class_id:
+            if student_id not in roster:
+                return {"status": "fail", "message": "Student is not enrolled in this class."}, 403
+            target_class = class_id
+        else:
+            target_class = _open_class_for_student(student_id, kiosk_class_ids)
+            if not target_class:
+                return {"status": "fail", "message": "None of your classes is open for this student right now."}, 404
+        verify_result = {
+            "verified": True,
+            "distance": distance,
+            "max_threshold_to_verify": face_embeddings.distance_threshold("haar"),
+            "details": {"method": "kiosk"},
+        }
+        try:
+            return _record_verified_attendance(target_class, student_id, verify_result, network_evidence)
+        except Exception:
+            app.logger.exception("Kiosk attendance write failed for %s in %s", student_id, target_class)
+            return {"status": "error", "message": "Attendance could not be recorded; retrying."}, 500
+
+    def new_session():
+        return KioskSession(identify, record, min_sharpness=KIOSK_MIN_SHARPNESS)
+
+    if session_id:
+        # Later batches of the same kiosk keep its tracker and recorded students.
+        session = kiosk_sessions.get((teacher_doc_id, class_id, session_id), new_session)
+        session.identify = identify
+        session.record = record
+    else:
+        session = new_session()
+
+    def generate():
+        try:
+            for frame_bytes in read_frames(request.stream, KIOSK_MAX_FRAME_BYTES):
+                image = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    yield json.dumps({"event": "error", "message": "Frame could not be decoded."}) + "\n"
+                    continue
+                with session.lock:
+                    events = session.process_frame(image)
+                for event in events:
+                    yield json.dumps(event, default=str) + "\n"
+        except FrameStreamError as exc:
+            yield json.dumps({"event": "error", "message": str(exc)}) + "\n"
+        with session.lock:
+            summary = session.summary()
+        yield json.dumps(summary) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+GROUP_PHOTO_MAX_FACES = int(os.environ.get("GROUP_PHOTO_MAX_FACES", "150"))
+# Firestore rejects batches with more than 500 writes.
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def _roster_templates(roster):
+    """Stack every roster student's templates: ``(templates, owners)``, or ``(None, [])``."""
+
+    owners = []
+    matrices = []
+    for student_id in sorted(roster):
+        templates, _enrolled_count = _student_templates(student_id)
+        if templates is not None:
+            owners.extend([student_id] * len(templates))
+            matrices.append(templates)
+    if not matrices:
+        return None, []
+    return np.concatenate(matrices, axis=0), owners
+
+
+@app.route("/api/attendance/group-photo", methods=["POST"])
+@profiled
+@require_class_teacher("You do not have permission to take attendance for this class.")
+def group_photo_attendance(class_id):
+    data = request.get_json(silent=True) or {}
+    image_b64 = data.get("image")
+    if not image_b64:
+        return jsonify({"status": "error", "message": "Missing image"}), 400
+    try:
+        captured_img = _decode_data_url_image(image_b64)
+    except (ValueError, IndexError):
+        captured_img = None
+    if captured_img is None:
+        return jsonify({"status": "error", "message": "Captured image could not be decoded."}), 400
+
+    overload = inference_load.overload_reason()
+    if overload is not None:
+        response = jsonify({
+            "status": "busy",
+            "reason": overload,
+            "message": "Face recognition is busy; try the photo again shortly.",
+        })
+        response.headers["Retry-After"] = "15"
+        return response, 503
+
+    class_doc = db.collection("classes").document(class_id).get()
+    if not class_doc.exists:
+        return jsonify({"status": "error", "message": "Class not found"}), 404
+    class_data = class_doc.to_dict() or {}
+
+    now_central = datetime.datetime.now(CENTRAL_TZ)
+    status, status_error = _attendance_status_now(class_id, now_central, class_data)
+    if status_error:
+        payload, status_code = status_error
+        return jsonify(payload), status_code
+
+    templates, owners = _roster_templates(_class_roster(class_data))
+    if templates is None:
+        return jsonify({
+            "status": "error",
+            "message": "No enrolled face embeddings are available for this class roster.",
+        }), 503
+
+    # One detection pass and one batched embedding for every face in the photo.
+    with inference_load.track():
+        faces, detector_stage = face_detector.detect(captured_img)
+        faces = sorted(
+            faces,
+            key=lambda face: face.facial_area.get("w", 0) * face.facial_area.get("h", 0),
+            reverse=True,
+        )[:GROUP_PHOTO_MAX_FACES]
+        if not faces:
+            return jsonify({"status": "fail", "message": "No faces detected"}), 400
+        embeddings = face_embeddings.embed_faces([face.face_rgb for face in faces])
+
+    distances, student_ids = student_distance_matrix(embeddings, templates, owners)
+    threshold = face_embeddings.distance_threshold(detector_stage)
+    matches, unmatched = assign_faces(distances, student_ids, threshold)
+
+    # Fetch every matched student's existing record (either key layout) in one round trip.
+    today_str = now_central.strftime("%Y-%m-%d")
+    attendance_collection = db.collection("attendance")
+    candidate_refs = [
+        attendance_collection.document(doc_id)
+        for _face_index, student_id, _distance in matches
+        for doc_id in candidate_record_ids(class_id, student_id, today_str, ATTENDANCE_KEY_LAYOUT)
+    ]
+    existing = {}
+    for snapshot in db.get_all(candidate_refs):
+        if snapshot.exists:
+            record = snapshot.to_dict() or {}
+            existing[str(record.get("studentID") or "")] = (snapshot.id, record)
+
+    network_evidence = _network_evidence(request)
+    recorded = []
+    already_recorded = []
+    batch = db.batch()
+    batched_writes = 0
+    for face_index, student_id, distance in matches:
+        if student_id in existing:
+            doc_id, record = existing[student_id]
+            already_recorded.append({"studentId": student_id, "recordId": doc_id, "status": record.get("status")})
+            continue
+        doc_id = _attendance_doc_id(class_id, student_id, today_str)
+        batch.set(attendance_collection.document(doc_id), {
+            "studentID": student_id,
+            "classID": class_id,
+            "date": now_central,
+            "status": status,
+            "decisionMethod": "group_photo",
+            "decidedAt": now_central,
+            "finalizedAt": now_central,
+            "createdAt": firestore.SERVER_TIMESTAMP,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+            "networkEvidence": network_evidence,
+            "verification": {
+                "distance": distance,
+                "threshold": threshold,
+                "model": face_embeddings.MODEL_NAME,
+                "mode": "group_photo",
+                "detector": detector_stage,
+                "facialArea": faces[face_index].facial_area,
+            },
+        })
+        batched_writes += 1
+        recorded.append({"studentId": student_id, "recordId": doc_id, "status": status, "distance": distance})
+        if batched_writes == FIRESTORE_BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            batched_writes = 0
+    if batched_writes:
+        batch.commit()
+
+    matched_students = {student_id for _face_index, student_id, _distance in matches}
+    return jsonify({
+        "status": "success",
+        "classId": class_id,
+        "attendanceStatus": status,
+        "detector": detector_stage,
+        "facesDetected": len(faces),
+        "recorded": recorded,
+        "alreadyRecorded": already_recorded,
+        "unmatchedFaces": [
+            {
+                "facialArea": faces[face_index].facial_area,
+                "nearestDistance": float(distances[face_index].min()) if distances.shape[1] else None,
+            }
+            for face_index in unmatched
+        ],
+        "notRecognized": sorted(set(student_ids) - matched_students),
+    }), 200
+
+
+@app.route("/api/admin/profiles", methods=["GET"])
+@require_admin_token
+def list_request_profiles():
+    return jsonify({"status": "success", "profiles": request_profiler.list_profiles()}), 200
+
+
+@app.route("/api/admin/profiles/<name>", methods=["GET"])
+@require_admin_token
+def get_request_profile(name):
+    text = request_profiler.read_profile(name)
+    if text is None:
+        return jsonify({"status": "error", "message": "Profile not found."}), 404
+    response = Response(text, mimetype="text/plain")
+    response.headers["Content-Disposition"] = f"attachment; filename=\"{name}\""
+    return response
+
+
+@app.route("/api/admin/memory", methods=["GET"])
+@require_admin_token
+def get_worker_memory():
+    try:
+        top = max(1, min(int(request.args.get("top", "20")), 200))
+    except ValueError:
+        return jsonify({"status": "error", "message": "top must be an integer."}), 400
+    return jsonify({"status": "success", "memory": memory_watchdog.report(tracemalloc_limit=top)}), 200
+
+
+@app.route("/api/admin/inference", methods=["GET"])
+@require_admin_token
+def get_inference_stats():
+    return jsonify({
+        "status": "success",
+        "pid": os.getpid(),
+        "detector": face_detector.stats(),
+        "load": inference_load.stats(),
+        "deferred": deferred_verifier.stats(),
+    }), 200
+
 
 if __name__ == "__main__":
+    drain_on_sigterm(audit_write_queue)
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,362 @@
+"""Archival of finalized attendance records into compressed partition files.
+
+Old terms are exported far more often than they change, but every export
+range-queries the live ``attendance`` collection.  ``archive_finalized``
+moves finalized records dated before a cutoff out of Firestore into one
+file per class and month::
+
+    attendance_archive/{classID}/{YYYY-MM}.json.gz
+
+Each file is gzip-compressed JSON laid out by column (one list per field,
+plus ``_id``), so the repeated field names of a row layout are stored once
+and the columns compress well.  Datetimes are tagged so they round-trip.
+Files live in a local directory or in the storage bucket.
+
+``AttendanceArchive.read_range`` returns archived records for an export; the
+export merges them with the live query, and a record that is still live (for
+example while an archival run is between writing a partition and deleting
+its documents) wins over its archived copy.  Documents are deleted only if
+they are unchanged since they were read, so a correction that lands during a
+run (an import fixing an old month, say) stays live and is archived by the
+next run.
+
+Run the archival with::
+
+    python -m backend.attendance_archive --before 2025-01-01 [--dry-run]
+"""
+
+import argparse
+import contextlib
+import datetime
+import gzip
+import json
+import logging
+import os
+import sys
+
+try:
+    from google.api_core.exceptions import FailedPrecondition, PreconditionFailed
+except ImportError:  # pragma: no cover - google-cloud is optional in memory mode
+    try:
+        from .memory_store import FailedPrecondition, PreconditionFailed
+    except ImportError:
+        from memory_store import FailedPrecondition, PreconditionFailed
+
+
+ARCHIVE_PREFIX = "attendance_archive/"
+ARCHIVE_VERSION = 1
+# One delete per archived record; Firestore allows 500 writes per batch.
+ARCHIVE_DELETE_BATCH = 400
+# Attempts at merging into a bucket partition another run keeps rewriting.
+PARTITION_WRITE_ATTEMPTS = 5
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: _encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if set(value) == {"$dt"}:
+            return datetime.datetime.fromisoformat(value["$dt"])
+        if set(value) == {"$date"}:
+            return datetime.date.fromisoformat(value["$date"])
+        return {key: _decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+def encode_partition(class_id, month, records):
+    """Serialize ``{doc_id: record}`` as a compressed column layout.
+
+    Fields a record does not have are stored as null and dropped again on
+    read, so a field explicitly set to None is not preserved.
+    """
+
+    doc_ids = sorted(records)
+    fields = sorted({field for record in records.values() for field in record})
+    columns = {"_id": doc_ids}
+    for field in fields:
+        columns[field] = [_encode_value(records[doc_id].get(field)) for doc_id in doc_ids]
+    payload = {
+        "version": ARCHIVE_VERSION,
+        "classID": class_id,
+        "month": month,
+        "count": len(doc_ids),
+        "columns": columns,
+    }
+    return gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_partition(data):
+    payload = json.loads(gzip.decompress(data).decode("utf-8"))
+    if payload.get("version") != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported archive version {payload.get('version')!r}")
+    columns = payload["columns"]
+    doc_ids = columns.pop("_id")
+    records = {doc_id: {} for doc_id in doc_ids}
+    for field, values in columns.items():
+        for doc_id, value in zip(doc_ids, values):
+            if value is not None:
+                records[doc_id][field] = _decode_value(value)
+    return records
+
+
+def month_key(value, tz):
+    return value.astimezone(tz).strftime("%Y-%m")
+
+
+def months_between(start_date, end_date):
+    """``YYYY-MM`` keys for every month touching ``start_date``..``end_date``."""
+
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def is_finalized(record):
+    """Whether a record can no longer change: decided and its verification settled."""
+
+    status = str(record.get("status", "")).lower()
+    return bool(status) and status != "pending" and record.get("verificationState") not in ("deferred", "error")
+
+
+class AttendanceArchive:
+    """Reads and writes archive partitions.
+
+    ``storage`` is ``"local"`` (files under ``output_dir``) or ``"bucket"``
+    (objects under ``attendance_archive/`` in the storage bucket).
+    """
+
+    def __init__(self, storage, output_dir=None, bucket_getter=None, tz=datetime.timezone.utc, logger=None):
+        if storage not in ("local", "bucket"):
+            raise ValueError(f"Unknown archive storage {storage!r}")
+        self.storage = storage
+        self.output_dir = output_dir
+        self._bucket_getter = bucket_getter
+        self.tz = tz
+        self._logger = logger or logging.getLogger(__name__)
+
+    @staticmethod
+    def partition_name(class_id, month):
+        return f"{ARCHIVE_PREFIX}{class_id}/{month}.json.gz"
+
+    def _local_path(self, name):
+        return os.path.join(self.output_dir, *name.split("/"))
+
+    def _read_bytes(self, name):
+        """Return ``(data, generation)``; ``(None, 0)`` for a missing partition."""
+
+        if self.storage == "bucket":
+            blob = self._bucket_getter().get_blob(name)
+            if blob is None:
+                return None, 0
+            # Read the generation first: if the object changes before the
+            # download, the write below fails its precondition and retries.
+            generation = blob.generation
+            return blob.download_as_bytes(), generation
+        path = self._local_path(name)
+        if not os.path.exists(path):
+            return None, 0
+        with open(path, "rb") as handle:
+            return handle.read(), None
+
+    def _write_bytes(self, name, data, generation):
+        if self.storage == "bucket":
+            self._bucket_getter().blob(name).upload_from_string(
+                data, content_type="application/gzip", if_generation_match=generation,
+            )
+            return
+        path = self._local_path(name)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(temp_path, path)
+
+    @contextlib.contextmanager
+    def _partition_lock(self, name):
+        """Serialize local read-modify-writes of one partition across processes.
+
+        Bucket partitions rely on generation-match preconditions instead.
+        """
+
+        if self.storage == "bucket":
+            yield
+            return
+        import fcntl
+
+        path = self._local_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.lock", "a") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def read_partition(self, class_id, month):
+        """``{doc_id: record}`` for one class and month (empty if not archived)."""
+
+        data, _ = self._read_bytes(self.partition_name(class_id, month))
+        return decode_partition(data) if data is not None else {}
+
+    def write_partition(self, class_id, month, records):
+        """Merge ``records`` into the partition; returns its new record count.
+
+        A concurrent archiver's write is never overwritten: local partitions
+        are merged under a file lock, and a bucket write only succeeds if the
+        object is still the generation that was read, otherwise it is re-read
+        and merged again.
+        """
+
+        name = self.partition_name(class_id, month)
+        for attempt in range(PARTITION_WRITE_ATTEMPTS):
+            with self._partition_lock(name):
+                try:
+                    data, generation = self._read_bytes(name)
+                    merged = decode_partition(data) if data is not None else {}
+                    merged.update(records)
+                    self._write_bytes(name, encode_partition(class_id, month, merged), generation)
+                except PreconditionFailed:
+                    if attempt + 1 == PARTITION_WRITE_ATTEMPTS:
+                        raise
+                    self._logger.info("Archive partition %s changed while merging; retrying", name)
+                    continue
+            return len(merged)
+
+    def read_range(self, class_id, start_dt, end_dt):
+        """Archived ``(doc_id, record)`` pairs whose ``date`` is in the range."""
+
+        start_local = start_dt.astimezone(self.tz).date()
+        end_local = end_dt.astimezone(self.tz).date()
+        matches = []
+        for month in months_between(start_local, end_local):
+            for doc_id, record in self.read_partition(class_id, month).items():
+                value = record.get("date")
+                if isinstance(value, datetime.datetime) and start_dt <= value <= end_dt:
+                    matches.append((doc_id, record))
+        return matches
+
+
+def _delete_unchanged(db, collection, versions):
+    """Delete ``{doc_id: update_time}`` documents that still have that version.
+
+    Returns the number deleted; changed (or already deleted) documents stay.
+    """
+
+    deleted = 0
+    doc_ids = list(versions)
+    for offset in range(0, len(doc_ids), ARCHIVE_DELETE_BATCH):
+        chunk = doc_ids[offset:offset + ARCHIVE_DELETE_BATCH]
+        batch = db.batch()
+        for doc_id in chunk:
+            batch.delete(collection.document(doc_id), option=db.write_option(last_update_time=versions[doc_id]))
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            # One changed document fails the whole batch; retry them one by one.
+            for doc_id in chunk:
+                try:
+                    collection.document(doc_id).delete(option=db.write_option(last_update_time=versions[doc_id]))
+                except FailedPrecondition:
+                    continue
+                deleted += 1
+        else:
+            deleted += len(chunk)
+    return deleted
+
+
+def archive_finalized(db, archive, cutoff, collection_name="attendance", dry_run=False, logger=print):
+    """Move finalized records dated before ``cutoff`` into ``archive``.
+
+    Records are read in date order and each month's partitions are written
+    and their documents deleted once the scan moves past that month, so only
+    one month is held in memory.  Every partition is written before any of
+    its documents is deleted, so an interrupted run leaves records in both
+    places (exports de-duplicate them) rather than in neither; re-running it
+    finishes the move.  A document that changed after it was read is not
+    deleted and is counted as ``changed``; the next run archives its new
+    version.  Returns ``{"scanned", "archived", "skipped", "changed",
+    "partitions"}``.
+    """
+
+    collection = db.collection(collection_name)
+    counts = {"scanned": 0, "archived": 0, "skipped": 0, "changed": 0, "partitions": 0}
+    partitions = {}
+    current_month = None
+
+    def flush():
+        for (class_id, month), (records, versions) in sorted(partitions.items()):
+            counts["partitions"] += 1
+            counts["archived"] += len(records)
+            if dry_run:
+                continue
+            total = archive.write_partition(class_id, month, records)
+            logger(f"Archived {len(records)} records to {archive.partition_name(class_id, month)} ({total} total)")
+            counts["changed"] += len(versions) - _delete_unchanged(db, collection, versions)
+        partitions.clear()
+
+    for snapshot in collection.where("date", "<", cutoff).order_by("date").stream():
+        counts["scanned"] += 1
+        record = snapshot.to_dict() or {}
+        class_id = record.get("classID")
+        date_value = record.get("date")
+        if not class_id or not isinstance(date_value, datetime.datetime) or not is_finalized(record):
+            counts["skipped"] += 1
+            continue
+        month = month_key(date_value, archive.tz)
+        if month != current_month:
+            flush()
+            current_month = month
+        records, versions = partitions.setdefault((class_id, month), ({}, {}))
+        records[snapshot.id] = record
+        versions[snapshot.id] = snapshot.update_time
+    flush()
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive finalized attendance records older than a date.")
+    parser.add_argument("--before", required=True, help="Archive records dated before this YYYY-MM-DD (Central).")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the records that would be archived.")
+    args = parser.parse_args(argv)
+
+    # Imported lazily so the archive format works without the Firebase stack.
+    try:
+        from .app import CENTRAL_TZ, attendance_archive, db
+    except ImportError:  # pragma: no cover - fallback for script execution
+        from app import CENTRAL_TZ, attendance_archive, db
+
+    if attendance_archive is None:
+        print("Set ATTENDANCE_ARCHIVE=local or bucket so exports can read the archive.")
+        return 1
+
+    before = datetime.datetime.strptime(args.before, "%Y-%m-%d").date()
+    cutoff = datetime.datetime.combine(before, datetime.time.min, tzinfo=CENTRAL_TZ)
+    counts = archive_finalized(db, attendance_archive, cutoff, dry_run=args.dry_run)
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(
+        f"{verb} {counts['archived']} of {counts['scanned']} records into "
+        f"{counts['partitions']} partitions ({counts['skipped']} not finalized or incomplete, "
+        f"{counts['changed']} changed during the run and left live)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
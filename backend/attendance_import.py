@@ -0,0 +1,268 @@
+"""Bulk import of manual attendance corrections from CSV.
+
+The accepted layout is the one ``GET /api/attendance/export`` produces, so a
+teacher can export a day, fix it in a spreadsheet and upload it back.
+``studentId``, ``date`` and ``status`` are required; ``checkInAt``,
+``decidedAt`` and ``decisionMethod`` are used when present and
+``studentName`` is ignored.
+
+Rows are validated as they are read (``iter_import_rows``) and written in
+chunks (``apply_import``): each chunk resolves its students in bulk, fetches
+the chunk's existing records (under either key layout) with one ``get_all``
+and upserts them in one batch commit.  Nothing is rejected wholesale; every
+row that could not be imported is listed in the report with its line number.
+"""
+
+import csv
+import datetime
+from collections import namedtuple
+
+try:
+    from .record_keys import candidate_record_ids, record_id
+except ImportError:  # pragma: no cover - fallback for script execution
+    from record_keys import candidate_record_ids, record_id
+
+
+IMPORT_STATUSES = {"present": "Present", "late": "Late", "absent": "Absent"}
+REQUIRED_COLUMNS = ("studentId", "date", "status")
+DEFAULT_DECISION_METHOD = "manual_import"
+# Up to two document reads per row and one write; Firestore batches hold 500 writes.
+IMPORT_CHUNK_ROWS = 400
+_PENDING_FIELDS = ("isPending", "proposedStatus", "pendingStatus", "rejectionReason", "templateCandidate")
+
+ImportRow = namedtuple(
+    "ImportRow",
+    ["line", "student_id", "date_str", "status", "check_in_at", "decided_at", "decision_method", "errors",
+     "limit_reached"],
+    defaults=(False,),
+)
+
+
+class ImportHeaderError(ValueError):
+    """Raised when the CSV header lacks a required column."""
+
+
+def parse_timestamp(value, tz):
+    """Parse an ISO 8601 timestamp; naive values are taken as ``tz`` local time."""
+
+    parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed
+
+
+def iter_import_rows(lines, tz, max_rows=None):
+    """Yield one validated ``ImportRow`` per CSV data row.
+
+    Rows with problems are still yielded, with ``errors`` filled in.  After
+    ``max_rows`` data rows, one error row for the limit (with
+    ``limit_reached`` set) is yielded and reading stops.
+    """
+
+    reader = csv.DictReader(lines)
+    header = [name.strip() for name in (reader.fieldnames or [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ImportHeaderError(f"Missing required column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+
+    first_line_for_key = {}
+    for count, raw in enumerate(reader, start=1):
+        line = reader.line_num
+        if max_rows is not None and count > max_rows:
+            yield ImportRow(line, "", "", None, None, None, None, [
+                f"Row limit of {max_rows} reached; this and later rows were not imported.",
+            ], True)
+            break
+        values = {key: (value or "").strip() for key, value in raw.items() if key is not None}
+        if not any(values.values()):
+            continue
+        errors = []
+
+        student_id = values.get("studentId", "")
+        if not student_id:
+            errors.append("studentId is required.")
+
+        date_str = values.get("date", "")
+        try:
+            datetime.datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            errors.append("date must be in YYYY-MM-DD format.")
+            date_str = ""
+
+        status = IMPORT_STATUSES.get(values.get("status", "").lower())
+        if status is None:
+            errors.append(f"status must be one of {', '.join(IMPORT_STATUSES.values())}.")
+
+        timestamps = {}
+        for column in ("checkInAt", "decidedAt"):
+            timestamps[column] = None
+            if values.get(column):
+                try:
+                    timestamps[column] = parse_timestamp(values[column], tz)
+                except ValueError:
+                    errors.append(f"{column} must be an ISO 8601 timestamp.")
+        check_in_at = timestamps["checkInAt"]
+        if check_in_at is not None and date_str and check_in_at.astimezone(tz).strftime("%Y-%m-%d") != date_str:
+            errors.append("checkInAt is not on the row's date.")
+
+        if student_id and date_str:
+            key = (student_id, date_str)
+            if key in first_line_for_key:
+                errors.append(f"Duplicate of line {first_line_for_key[key]}.")
+            else:
+                first_line_for_key[key] = line
+
+        yield ImportRow(
+            line,
+            student_id,
+            date_str,
+            status,
+            check_in_at,
+            timestamps["decidedAt"],
+            values.get("decisionMethod") or DEFAULT_DECISION_METHOD,
+            errors,
+        )
+
+
+def _record_date(row, tz):
+    if row.check_in_at is not None:
+        return row.check_in_at.astimezone(tz)
+    day = datetime.datetime.strptime(row.date_str, "%Y-%m-%d").date()
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=tz)
+
+
+def _matches_record(row, record):
+    if record.get("status") != row.status or record.get("decisionMethod") != row.decision_method:
+        return False
+    # Timestamps the row leaves blank are not corrections.
+    if row.check_in_at is not None and record.get("checkInAt") != row.check_in_at:
+        return False
+    return row.decided_at is None or record.get("decidedAt") == row.decided_at
+
+
+def apply_import(
+    db,
+    class_id,
+    rows,
+    resolve_students,
+    tz,
+    server_timestamp,
+    delete_field,
+    roster=None,
+    layout=None,
+    chunk_size=IMPORT_CHUNK_ROWS,
+    dry_run=False,
+    collection_name="attendance",
+    now=None,
+):
+    """Upsert validated rows; returns the per-import report.
+
+    ``resolve_students(student_ids)`` returns the subset that exists.  When
+    ``roster`` is non-empty, students outside it are refused.  Existing
+    records keep their document ID; pending or deferred fields are cleared
+    because the imported status is final.  A row that matches its existing
+    record (status, decision method and any ``checkInAt``/``decidedAt`` it
+    gives) is counted as unchanged and not written.
+    """
+
+    collection = db.collection(collection_name)
+    now = now or datetime.datetime.now(tz)
+    report = {
+        "rows": 0, "created": 0, "updated": 0, "unchanged": 0, "failed": 0, "rowLimitReached": False, "errors": [],
+    }
+
+    def fail(row, message):
+        report["failed"] += 1
+        report["errors"].append({"line": row.line, "studentId": row.student_id, "errors": [message]})
+
+    def flush(chunk):
+        known = set(resolve_students(sorted({row.student_id for row in chunk})))
+        candidates = {
+            row.line: candidate_record_ids(class_id, row.student_id, row.date_str, layout)
+            for row in chunk
+        }
+        existing = {
+            snapshot.id: snapshot.to_dict() or {}
+            for snapshot in db.get_all([
+                collection.document(doc_id) for doc_ids in candidates.values() for doc_id in doc_ids
+            ])
+            if snapshot.exists
+        }
+
+        batch = db.batch()
+        planned = []
+        for row in chunk:
+            if row.student_id not in known:
+                fail(row, f"Unknown student {row.student_id}.")
+                continue
+            if roster and row.student_id not in roster:
+                fail(row, f"Student {row.student_id} is not enrolled in this class.")
+                continue
+
+            fields = {
+                "status": row.status,
+                "decisionMethod": row.decision_method,
+                "decidedAt": row.decided_at or now,
+                "finalizedAt": now,
+                "importedAt": now,
+                "updatedAt": server_timestamp,
+            }
+            if row.check_in_at is not None:
+                fields["checkInAt"] = row.check_in_at
+
+            existing_id = next((doc_id for doc_id in candidates[row.line] if doc_id in existing), None)
+            if existing_id is None:
+                doc_id = record_id(class_id, row.student_id, row.date_str, layout)
+                batch.set(collection.document(doc_id), dict(
+                    fields,
+                    studentID=row.student_id,
+                    classID=class_id,
+                    date=_record_date(row, tz),
+                    createdAt=server_timestamp,
+                ))
+                planned.append((row, "created"))
+                continue
+
+            record = existing[existing_id]
+            stale = [field for field in _PENDING_FIELDS if field in record]
+            if record.get("verificationState") == "deferred":
+                stale.append("verificationState")
+            if not stale and _matches_record(row, record):
+                report["unchanged"] += 1
+                continue
+            for field in stale:
+                fields[field] = delete_field
+            batch.update(collection.document(existing_id), fields)
+            planned.append((row, "updated"))
+
+        if not planned:
+            return
+        if not dry_run:
+            try:
+                batch.commit()
+            except Exception as exc:
+                for row, _outcome in planned:
+                    fail(row, f"Write failed: {exc}")
+                return
+        for _row, outcome in planned:
+            report[outcome] += 1
+
+    chunk = []
+    for row in rows:
+        if row.limit_reached:
+            report["rowLimitReached"] = True
+            report["errors"].append({"line": row.line, "studentId": row.student_id, "errors": row.errors})
+            continue
+        report["rows"] += 1
+        if row.errors:
+            report["failed"] += 1
+            report["errors"].append({"line": row.line, "studentId": row.student_id, "errors": row.errors})
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return report
@@ -0,0 +1,234 @@
+"""Fan-out of Firestore attendance changes to Server-Sent Events subscribers.
+
+Each class gets at most one Firestore ``on_snapshot`` listener per day, no
+matter how many teacher dashboards are watching it.  Snapshot callbacks run on
+the Firestore watch thread and push events into bounded per-subscriber queues
+that the SSE response generators drain.
+
+Under gunicorn's gthread workers every open stream occupies a worker thread,
+so the broadcaster caps how many subscriptions a process holds at once
+(``max_subscribers``) and each stream ends after ``max_seconds``; the browser's
+EventSource reconnects on its own and receives a fresh snapshot.
+"""
+
+import datetime
+import json
+import queue
+import threading
+import time
+
+
+# Fields that affect how a record is rendered on a dashboard.  Changes that only
+# touch audit data (networkEvidence, verification, ...) are not broadcast.
+STATUS_FIELDS = (
+    "status",
+    "proposedStatus",
+    "isPending",
+    "pendingRecheckAt",
+    "finalizedAt",
+    "rejectionReason",
+)
+
+
+def _serialize_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _event_for_snapshot(doc_snapshot):
+    data = doc_snapshot.to_dict() or {}
+    event = {
+        "recordId": doc_snapshot.id,
+        "studentId": data.get("studentID") or data.get("studentId"),
+    }
+    for field in STATUS_FIELDS:
+        event[field] = _serialize_value(data.get(field))
+    return event
+
+
+def format_sse(event_name, payload):
+    """Render a single SSE message."""
+
+    data = json.dumps(payload, separators=(",", ":"), default=str)
+    return f"event: {event_name}\ndata: {data}\n\n"
+
+
+class StreamLimitReached(Exception):
+    """Raised by ``subscribe`` when the process already holds ``max_subscribers`` streams."""
+
+
+class Subscription:
+    """A single dashboard connection fed by a shared class listener."""
+
+    def __init__(self, broadcaster, key, max_queue_size):
+        self._broadcaster = broadcaster
+        self.key = key
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = threading.Event()
+        self.overflowed = False
+
+    def offer(self, event_name, payload):
+        if self._closed.is_set():
+            return
+        try:
+            self._queue.put_nowait((event_name, payload))
+        except queue.Full:
+            # A stalled client must not block the Firestore watch thread; drop
+            # it and let EventSource reconnect to receive a fresh snapshot.
+            self.overflowed = True
+            self._closed.set()
+
+    def events(self, heartbeat_seconds, max_seconds=None, clock=time.monotonic):
+        """Yield ``(event_name, payload)`` pairs, or ``None`` as a heartbeat.
+
+        Stops after ``max_seconds`` so the client reconnects and frees the
+        worker thread in the meantime.
+        """
+
+        deadline = clock() + max_seconds if max_seconds else None
+        while not self._closed.is_set():
+            timeout = heartbeat_seconds
+            if deadline is not None:
+                remaining = deadline - clock()
+                if remaining <= 0:
+                    return
+                timeout = min(timeout, remaining)
+            try:
+                yield self._queue.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is None or clock() < deadline:
+                    yield None
+
+        if self.overflowed:
+            yield "reset", {"reason": "Subscriber fell behind; reconnect to resynchronize."}
+
+    def close(self):
+        self._closed.set()
+        self._broadcaster.unsubscribe(self)
+
+
+class _ClassListener:
+    """Holds the Firestore watch and latest state for one class/day."""
+
+    def __init__(self):
+        self.watch = None
+        self.subscribers = set()
+        self.records = {}
+        self.ready = False
+
+
+class AttendanceStatusBroadcaster:
+    """Share one Firestore listener per class across many SSE subscribers."""
+
+    def __init__(self, db_getter, timezone, max_queue_size=256, max_subscribers=None):
+        self._db_getter = db_getter
+        self._timezone = timezone
+        self._max_queue_size = max_queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._listeners = {}
+
+    def listener_count(self):
+        with self._lock:
+            return len(self._listeners)
+
+    def subscriber_count(self):
+        with self._lock:
+            return self._open_subscriptions()
+
+    def _open_subscriptions(self):
+        return sum(len(listener.subscribers) for listener in self._listeners.values())
+
+    def subscribe(self, class_id, now=None):
+        now = now or datetime.datetime.now(self._timezone)
+        key = (class_id, now.strftime("%Y-%m-%d"))
+        subscription = Subscription(self, key, self._max_queue_size)
+
+        with self._lock:
+            if self.max_subscribers and self._open_subscriptions() >= self.max_subscribers:
+                raise StreamLimitReached(f"{self.max_subscribers} attendance streams are already open")
+            listener = self._listeners.get(key)
+            start_watch = listener is None
+            if start_watch:
+                listener = _ClassListener()
+                self._listeners[key] = listener
+            listener.subscribers.add(subscription)
+            if listener.ready:
+                subscription.offer("snapshot", {"records": list(listener.records.values())})
+
+        if start_watch:
+            day_start = datetime.datetime.combine(now.date(), datetime.time.min, tzinfo=self._timezone)
+            query = (
+                self._db_getter()
+                .collection("attendance")
+                .where("classID", "==", class_id)
+                .where("date", ">=", day_start)
+            )
+            try:
+                watch = query.on_snapshot(lambda docs, changes, read_time: self._on_snapshot(key, changes))
+            except Exception:
+                with self._lock:
+                    self._listeners.pop(key, None)
+                raise
+            with self._lock:
+                if key in self._listeners:
+                    listener.watch = watch
+                    watch = None
+            if watch is not None:
+                # Every subscriber left before the watch was established.
+                watch.unsubscribe()
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        watch = None
+        with self._lock:
+            listener = self._listeners.get(subscription.key)
+            if listener is None:
+                return
+            listener.subscribers.discard(subscription)
+            if not listener.subscribers:
+                self._listeners.pop(subscription.key, None)
+                watch = listener.watch
+
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+
+    def _on_snapshot(self, key, changes):
+        with self._lock:
+            listener = self._listeners.get(key)
+            if listener is None:
+                return
+
+            updates = []
+            for change in changes:
+                doc_snapshot = change.document
+                change_type = change.type.name.lower()
+                if change_type == "removed":
+                    if listener.records.pop(doc_snapshot.id, None) is not None:
+                        updates.append({"recordId": doc_snapshot.id, "change": "removed"})
+                    continue
+
+                event = _event_for_snapshot(doc_snapshot)
+                if listener.records.get(doc_snapshot.id) == event:
+                    continue
+                listener.records[doc_snapshot.id] = event
+                updates.append(dict(event, change=change_type))
+
+            if not listener.ready:
+                # The first callback carries the full result set.
+                listener.ready = True
+                snapshot = {"records": list(listener.records.values())}
+                for subscription in list(listener.subscribers):
+                    subscription.offer("snapshot", snapshot)
+                return
+
+            subscribers = list(listener.subscribers)
+
+        for update in updates:
+            for subscription in subscribers:
+                subscription.offer("status", update)
@@ -0,0 +1,206 @@
+"""Write-behind buffer for attendance audit fields.
+
+The scan response only depends on the record's status fields, so the bulky
+audit maps (``networkEvidence``, ``verification``) are written after the
+response has gone out.  A background thread per worker process drains a
+bounded queue into Firestore write batches of up to 500 operations.  When the
+queue is full, callers block briefly (backpressure) and then fall back to
+writing inline, so audit data is never dropped.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+
+# Firestore rejects batches with more than 500 writes.
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+
+class AuditWriteQueue:
+    """Buffers ``(collection, document_id, fields)`` updates for batch commits.
+
+    ``db_getter`` is called on the writer thread so the Firestore client is
+    looked up in the worker process that does the writing.
+    """
+
+    def __init__(
+        self,
+        db_getter,
+        max_batch_size=FIRESTORE_MAX_BATCH_WRITES,
+        max_queue_size=10000,
+        flush_interval=0.5,
+        enqueue_timeout=2.0,
+        logger=None,
+    ):
+        self._db_getter = db_getter
+        self.max_batch_size = max(1, min(int(max_batch_size), FIRESTORE_MAX_BATCH_WRITES))
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue_size)))
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.written = 0
+        self.failed = 0
+        self.written_inline = 0
+
+    def _ensure_writer(self):
+        # Threads do not survive fork, so each worker process starts its own.
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                atexit.register(self.close)
+            self._pid = pid
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-write-behind", daemon=True)
+            self._thread.start()
+
+    def submit(self, collection, document_id, fields):
+        """Queue ``fields`` to be merged into ``collection/document_id``.
+
+        Returns True if the write was queued and False if it was written
+        inline because the queue stayed full or the queue is shut down.
+        """
+
+        item = (collection, document_id, dict(fields))
+        if not self._stop.is_set():
+            self._ensure_writer()
+            try:
+                self._queue.put(item, timeout=self.enqueue_timeout)
+                return True
+            except queue.Full:
+                self._logger.warning("Audit queue full; writing %s/%s inline", collection, document_id)
+        self._write_items([item])
+        self.written_inline += 1
+        return False
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        items = [first]
+        while len(items) < self.max_batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._next_batch()
+            if items:
+                try:
+                    self._write_items(items)
+                finally:
+                    for _ in items:
+                        self._queue.task_done()
+            elif self._stop.is_set():
+                return
+
+    def _write_items(self, items):
+        db = self._db_getter()
+        try:
+            batch = db.batch()
+            for collection, document_id, fields in items:
+                batch.update(db.collection(collection).document(document_id), fields)
+            batch.commit()
+            self.written += len(items)
+            return
+        except Exception as exc:  # pragma: no cover - depends on Firestore errors
+            if len(items) == 1:
+                self._record_failure(items[0], exc)
+                return
+            self._logger.warning("Audit batch of %d writes failed (%s); retrying individually", len(items), exc)
+
+        # One missing document (e.g. deleted by a teacher) fails the whole
+        # batch; write the rest one by one so only that entry is lost.
+        for item in items:
+            collection, document_id, fields = item
+            try:
+                db.collection(collection).document(document_id).update(fields)
+                self.written += 1
+            except Exception as exc:
+                self._record_failure(item, exc)
+
+    def _record_failure(self, item, exc):
+        self.failed += 1
+        self._logger.error("Failed to write audit fields for %s/%s: %s", item[0], item[1], exc)
+
+    def flush(self, timeout=10.0):
+        """Wait until everything queued so far is written. Returns True if drained."""
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                break
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout=10.0):
+        """Stop accepting queued writes and drain what is buffered."""
+
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(leftovers), self.max_batch_size):
+            self._write_items(leftovers[start:start + self.max_batch_size])
+        for _ in leftovers:
+            self._queue.task_done()
+        return not self._queue.unfinished_tasks
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "written": self.written,
+            "writtenInline": self.written_inline,
+            "failed": self.failed,
+        }
+
+
+def drain_on_sigterm(write_queue, timeout=10.0):
+    """Drain ``write_queue`` before the process handles SIGTERM.
+
+    Chains to the previously installed handler (e.g. gunicorn's graceful
+    shutdown).  Only possible from the main thread; returns False otherwise.
+    """
+
+    if threading.current_thread() is not threading.main_thread():
+        return False
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handler(signum, frame):
+        write_queue.close(timeout)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, handler)
+    return True
@@ -0,0 +1,266 @@
+"""Cached teacher/class membership for authorizing teacher endpoints.
+
+``ClassMembershipIndex`` keeps ``class_id -> assigned teachers`` and the
+inverse ``teacher -> class IDs`` in memory, fed by one Firestore
+``on_snapshot`` listener on the ``classes`` collection per worker process.  An
+authorization check is then a set lookup.  Until the listener has delivered
+its first snapshot (or if it could not be started) ``teachers_for`` and
+``classes_for`` return None and callers fall back to reading the class
+documents.  A listener that stops after an error is noticed on the next
+lookup: the index is dropped, lookups fall back to direct reads, and a new
+listener is started (at most every ``retry_seconds``).
+
+``TeacherProfileCache`` memoises the token-uid -> teacher profile lookup for a
+short TTL, so repeated requests from the same dashboard skip the users read.
+A second listener on teacher profiles evicts entries as soon as the profile
+changes.  The backend itself never writes ``users`` or ``classes``; both are
+edited from the dashboard, so listeners are the only place to invalidate.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+
+
+# ``role`` values (any case) the backend accepts as a teacher.
+TEACHER_ROLES = ("teacher", "Teacher", "TEACHER")
+# Class document fields that may name the assigned teacher(s).
+TEACHER_FIELDS = ("teacher", "teacherId", "teacherID", "teachers")
+
+
+def assigned_teachers(class_data):
+    """Return the set of teacher identifiers assigned in a class document."""
+
+    teachers = set()
+    for key in TEACHER_FIELDS:
+        value = class_data.get(key)
+        if isinstance(value, str):
+            if value:
+                teachers.add(value)
+        elif isinstance(value, list):
+            teachers.update(str(item) for item in value if item)
+    return teachers
+
+
+class _CollectionListener:
+    """Lazily started, per-process ``on_snapshot`` listener with restarts.
+
+    Subclasses provide ``_query(db)``, ``_clear()`` (drop derived state) and
+    ``_apply(changes)``; both run under ``self._lock``.
+    """
+
+    def __init__(self, db_getter, retry_seconds=60.0, logger=None, clock=time.monotonic):
+        self._db_getter = db_getter
+        self.retry_seconds = retry_seconds
+        self._logger = logger or logging.getLogger(__name__)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pid = None
+        self._watch = None
+        self._generation = 0
+        self._ready = False
+        self._next_attempt = 0.0
+
+    def _ensure_listening(self):
+        # Listener threads do not survive fork; each worker starts its own.
+        pid = os.getpid()
+        stopped = None
+        with self._lock:
+            if self._pid == pid and self._watch is not None and not getattr(self._watch, "is_active", True):
+                # The listener's stream failed, so later changes would never
+                # arrive; stop trusting the derived state and start over.
+                self._logger.warning("%s listener stopped; reading directly until it restarts", type(self).__name__)
+                stopped, self._watch = self._watch, None
+                self._reset()
+            if self._pid == pid and (self._watch is not None or self._clock() < self._next_attempt):
+                return
+            if self._pid != pid:
+                self._watch = None
+                self._reset()
+                self._pid = pid
+            self._next_attempt = self._clock() + self.retry_seconds
+            generation = self._generation
+
+        if stopped is not None:
+            try:
+                stopped.unsubscribe()
+            except Exception:
+                pass
+
+        try:
+            watch = self._query(self._db_getter()).on_snapshot(
+                functools.partial(self._on_snapshot, generation)
+            )
+        except Exception as exc:
+            self._logger.warning("%s listener unavailable, reading directly: %s", type(self).__name__, exc)
+            return
+
+        with self._lock:
+            if self._watch is None and self._pid == pid and self._generation == generation:
+                self._watch = watch
+                watch = None
+        if watch is not None:
+            watch.unsubscribe()
+
+    def _reset(self):
+        # Callbacks from an earlier listener are ignored once the generation moves on.
+        self._generation += 1
+        self._ready = False
+        self._clear()
+
+    def _on_snapshot(self, generation, _docs, changes, _read_time):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._apply(changes)
+            self._ready = True
+
+    @property
+    def ready(self):
+        return self._ready and self._pid == os.getpid()
+
+    def close(self):
+        with self._lock:
+            watch, self._watch = self._watch, None
+            self._reset()
+        if watch is not None and self._pid == os.getpid():
+            watch.unsubscribe()
+
+
+class ClassMembershipIndex(_CollectionListener):
+    def __init__(self, db_getter, retry_seconds=60.0, logger=None, clock=time.monotonic):
+        self._class_teachers = {}
+        self._teacher_classes = {}
+        super().__init__(db_getter, retry_seconds=retry_seconds, logger=logger, clock=clock)
+
+    def _query(self, db):
+        return db.collection("classes")
+
+    def _clear(self):
+        self._class_teachers = {}
+        self._teacher_classes = {}
+
+    def _apply(self, changes):
+        for change in changes:
+            class_id = change.document.id
+            self._remove_class(class_id)
+            if change.type.name != "REMOVED":
+                teachers = frozenset(assigned_teachers(change.document.to_dict() or {}))
+                self._class_teachers[class_id] = teachers
+                for teacher in teachers:
+                    self._teacher_classes.setdefault(teacher, set()).add(class_id)
+
+    def _remove_class(self, class_id):
+        for teacher in self._class_teachers.pop(class_id, ()):
+            classes = self._teacher_classes.get(teacher)
+            if classes is not None:
+                classes.discard(class_id)
+                if not classes:
+                    del self._teacher_classes[teacher]
+
+    def teachers_for(self, class_id):
+        """Return ``(known, teachers)``; ``known`` is False for missing classes.
+
+        Returns None when the index is not available yet.
+        """
+
+        self._ensure_listening()
+        with self._lock:
+            if not self.ready:
+                return None
+            teachers = self._class_teachers.get(class_id)
+        if teachers is None:
+            return False, frozenset()
+        return True, teachers
+
+    def classes_for(self, teacher_identifiers):
+        """Return the class IDs assigned to any of ``teacher_identifiers``, or None."""
+
+        self._ensure_listening()
+        with self._lock:
+            if not self.ready:
+                return None
+            classes = set()
+            for identifier in teacher_identifiers:
+                classes.update(self._teacher_classes.get(identifier, ()))
+        return classes
+
+
+class _TeacherProfileWatch(_CollectionListener):
+    def __init__(self, cache, db_getter, **kwargs):
+        self._cache = cache
+        super().__init__(db_getter, **kwargs)
+
+    def _query(self, db):
+        return db.collection("users").where("role", "in", list(TEACHER_ROLES))
+
+    def _clear(self):
+        # Changes may have been missed while no listener was running.
+        self._cache.invalidate()
+
+    def _apply(self, changes):
+        self._cache.invalidate_documents({change.document.id for change in changes})
+
+
+class TeacherProfileCache:
+    """Small TTL cache in front of a ``loader(decoded_token)`` profile lookup.
+
+    With ``db_getter`` it also listens to teacher profiles in ``users``, so a
+    profile that is edited, deleted or loses (or gains) the teacher role is
+    dropped at once instead of when its TTL runs out.
+    """
+
+    def __init__(self, loader, ttl_seconds=300.0, max_entries=4096, clock=time.monotonic,
+                 db_getter=None, retry_seconds=60.0, logger=None):
+        self._loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._watch = None
+        if db_getter is not None:
+            self._watch = _TeacherProfileWatch(self, db_getter, retry_seconds=retry_seconds, logger=logger, clock=clock)
+
+    def get(self, decoded_token):
+        if self._watch is not None:
+            self._watch._ensure_listening()
+        key = decoded_token.get("uid") or decoded_token.get("email")
+        now = self._clock()
+        if key:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        result = self._loader(decoded_token)
+        # Only cache hits; a missing profile may be created at any moment.
+        if key and result[0]:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    if len(self._entries) >= self.max_entries:
+                        self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (now + self.ttl_seconds, result)
+        return result
+
+    def invalidate(self, uid=None):
+        with self._lock:
+            if uid is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(uid, None)
+
+    def invalidate_documents(self, doc_ids):
+        """Drop every cached profile loaded from one of ``doc_ids``."""
+
+        with self._lock:
+            self._entries = {
+                key: entry for key, entry in self._entries.items() if entry[1][0] not in doc_ids
+            }
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.close()
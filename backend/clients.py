@@ -0,0 +1,204 @@
+"""Per-worker Firebase clients.
+
+gRPC channels and pooled HTTP connections must not cross a ``fork()``, and a
+single Firestore channel serialises a worker's concurrent requests.  The
+factory here builds a worker's clients on first use in that process, keyed
+by PID:
+
+* a named ``firebase_admin`` app (used for ID-token verification),
+* ``FIRESTORE_CHANNEL_POOL_SIZE`` Firestore clients, each building its own
+  gRPC channel, handed out round-robin per thread,
+* a Storage client whose HTTP session keeps ``STORAGE_HTTP_POOL_SIZE``
+  connections per host.
+
+Clients are built and closed through the libraries' public constructors and
+``close()``.  ``firestore.Client`` has no public way to pass gRPC channel
+arguments, so channel options such as keepalive are not configurable here;
+the pool size is the only Firestore channel setting.
+
+``db`` and ``bucket`` in ``app.py`` are :class:`WorkerClientProxy` objects, so
+existing ``db.collection(...)`` call sites are unchanged.
+
+``mode`` selects the backing services: ``"firebase"`` (production),
+``"emulator"`` (the Firebase emulators named by ``FIRESTORE_EMULATOR_HOST``
+and ``STORAGE_EMULATOR_HOST``, with anonymous credentials) or ``"memory"``
+(the in-process stand-ins from ``memory_store``).
+"""
+
+import itertools
+import logging
+import os
+import threading
+
+
+FIRESTORE_CHANNEL_POOL_SIZE = int(os.environ.get("FIRESTORE_CHANNEL_POOL_SIZE", "4"))
+STORAGE_HTTP_POOL_SIZE = int(os.environ.get("STORAGE_HTTP_POOL_SIZE", "32"))
+
+logger = logging.getLogger(__name__)
+
+
+def _close_client(client, description):
+    try:
+        client.close()
+    except Exception:  # pragma: no cover - best effort on shutdown
+        logger.exception("Failed to close %s client", description)
+
+
+DATA_MODES = ("firebase", "emulator", "memory")
+
+
+class _WorkerState:
+    def __init__(self, pid, firebase_app):
+        self.pid = pid
+        self.firebase_app = firebase_app
+        self.memory_store = None
+        self.firestore_pool = []
+        self.bucket = None
+        self.lock = threading.Lock()
+        self.round_robin = itertools.count()
+        self.local = threading.local()
+
+
+class WorkerClients:
+    """Builds and caches Firebase clients for the current process."""
+
+    def __init__(self, credential, options, pool_size=None, http_pool_size=None, mode="firebase",
+                 memory_initializer=None):
+        if mode not in DATA_MODES:
+            raise ValueError(f"Unknown data mode {mode!r}; expected one of {', '.join(DATA_MODES)}")
+        self.mode = mode
+        # Called as ``memory_initializer(db, bucket)`` once per process in memory mode.
+        self._memory_initializer = memory_initializer
+        self._credential = credential
+        self._options = dict(options or {})
+        self.pool_size = max(1, pool_size or FIRESTORE_CHANNEL_POOL_SIZE)
+        self.http_pool_size = max(1, http_pool_size or STORAGE_HTTP_POOL_SIZE)
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _current(self):
+        pid = os.getpid()
+        state = self._state
+        if state is not None and state.pid == pid:
+            return state
+        with self._lock:
+            state = self._state
+            if state is None or state.pid != pid:
+                # Never touch the parent's clients after fork; just drop them.
+                import firebase_admin
+
+                firebase_app = firebase_admin.initialize_app(
+                    self._credential,
+                    self._options,
+                    name=f"worker-{pid}",
+                )
+                state = _WorkerState(pid, firebase_app)
+                self._state = state
+            return state
+
+    def firebase_app(self):
+        return self._current().firebase_app
+
+    def _google_credentials(self, state):
+        if self.mode == "emulator":
+            from google.auth.credentials import AnonymousCredentials
+
+            return AnonymousCredentials()
+        return state.firebase_app.credential.get_credential()
+
+    def _project_id(self, state):
+        return self._options.get("projectId") or state.firebase_app.project_id
+
+    def _memory(self, state):
+        with state.lock:
+            if state.memory_store is None:
+                try:
+                    from .memory_store import InMemoryBucket, InMemoryFirestore
+                except ImportError:  # pragma: no cover - fallback for script execution
+                    from memory_store import InMemoryBucket, InMemoryFirestore
+
+                store = (InMemoryFirestore(), InMemoryBucket(self._options.get("storageBucket", "local-bucket")))
+                if self._memory_initializer is not None:
+                    self._memory_initializer(*store)
+                state.memory_store = store
+        return state.memory_store
+
+    def firestore(self):
+        """Return this thread's Firestore client from the worker's pool."""
+
+        state = self._current()
+        if self.mode == "memory":
+            return self._memory(state)[0]
+        client = getattr(state.local, "firestore", None)
+        if client is not None:
+            return client
+        with state.lock:
+            if not state.firestore_pool:
+                from google.cloud import firestore as gcloud_firestore
+
+                credentials = self._google_credentials(state)
+                project = self._project_id(state)
+                for _ in range(self.pool_size):
+                    state.firestore_pool.append(gcloud_firestore.Client(project=project, credentials=credentials))
+            client = state.firestore_pool[next(state.round_robin) % len(state.firestore_pool)]
+        state.local.firestore = client
+        return client
+
+    def bucket(self):
+        state = self._current()
+        if self.mode == "memory":
+            return self._memory(state)[1]
+        if state.bucket is not None:
+            return state.bucket
+        with state.lock:
+            if state.bucket is None:
+                import requests
+                from google.auth.transport.requests import AuthorizedSession
+                from google.cloud import storage as gcloud_storage
+
+                credentials = self._google_credentials(state)
+                # STORAGE_EMULATOR_HOST, when set, redirects this client.  The
+                # session goes in through the constructor's documented ``_http``
+                # argument, and client.close() closes it.
+                session = AuthorizedSession(credentials)
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=self.http_pool_size,
+                    pool_maxsize=self.http_pool_size,
+                    max_retries=3,
+                )
+                session.mount("https://", adapter)
+                client = gcloud_storage.Client(
+                    project=self._project_id(state),
+                    credentials=credentials,
+                    _http=session,
+                )
+                state.bucket = client.bucket(self._options["storageBucket"])
+        return state.bucket
+
+    def close(self):
+        """Close this worker's channels (e.g. from gunicorn's ``worker_exit``)."""
+
+        with self._lock:
+            state = self._state
+            if state is None or state.pid != os.getpid():
+                return
+            self._state = None
+        for client in state.firestore_pool:
+            _close_client(client, "Firestore")
+        if state.bucket is not None:
+            _close_client(state.bucket.client, "Storage")
+
+
+class WorkerClientProxy:
+    """Forwards attribute access to the client returned by ``getter()``."""
+
+    __slots__ = ("_getter",)
+
+    def __init__(self, getter):
+        object.__setattr__(self, "_getter", getter)
+
+    def __getattr__(self, name):
+        return getattr(self._getter(), name)
+
+    def __repr__(self):
+        return f"<WorkerClientProxy for {self._getter!r}>"
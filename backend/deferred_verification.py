@@ -0,0 +1,408 @@
+"""Load shedding for face inference and deferred verification of scans.
+
+``InferenceLoadMonitor`` counts inference calls in flight and keeps a
+sliding window of their latencies.  When the in-flight count or the window's
+p99 crosses its threshold, the scan endpoint stops running inference inline:
+it stores the captured frame, creates the usual pending attendance record
+marked ``verificationState: "deferred"``, and answers immediately.  The
+monitor stays in that mode for at least ``hold_seconds`` so it does not flap
+at the edge of a class-start spike.
+
+``DeferredVerifier`` is the background side: one thread per worker process
+verifies deferred records, writes their ``verification`` map, rejects
+records whose face did not match, and deletes the stored frame.  Records
+whose worker died are picked up again by a periodic sweep.  A record is
+claimed in a transaction (``deferredClaimId``) before it is verified, and the
+result is only written while that claim still holds, so two workers never
+both verify and finalize one record.
+"""
+
+import atexit
+import collections
+import contextlib
+import datetime
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+
+
+DEFERRED_FRAMES_PREFIX = "pending_scans/"
+STATE_DEFERRED = "deferred"
+STATE_VERIFIED = "verified"
+STATE_FAILED = "failed"
+STATE_ERROR = "error"
+
+
+class InferenceLoadMonitor:
+    def __init__(
+        self,
+        max_in_flight=4,
+        p99_threshold_seconds=8.0,
+        window_seconds=60.0,
+        min_samples=20,
+        hold_seconds=15.0,
+        clock=time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.p99_threshold_seconds = p99_threshold_seconds
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.hold_seconds = hold_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._samples = collections.deque()
+        self._shedding_until = 0.0
+        self.deferred = 0
+
+    @contextlib.contextmanager
+    def track(self):
+        """Count the enclosed inference as in flight and record its latency."""
+
+        with self._lock:
+            self._in_flight += 1
+        started = self._clock()
+        try:
+            yield
+        finally:
+            finished = self._clock()
+            with self._lock:
+                self._in_flight -= 1
+                self._samples.append((finished, finished - started))
+                self._trim(finished)
+
+    def _trim(self, now):
+        cutoff = now - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def _p99(self):
+        if len(self._samples) < self.min_samples:
+            return None
+        latencies = sorted(latency for _, latency in self._samples)
+        return latencies[min(len(latencies) - 1, math.ceil(0.99 * len(latencies)) - 1)]
+
+    def overload_reason(self):
+        """Return why inference should be deferred right now, or None."""
+
+        now = self._clock()
+        with self._lock:
+            self._trim(now)
+            reason = None
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                reason = "queue_depth"
+            else:
+                p99 = self._p99()
+                if self.p99_threshold_seconds and p99 is not None and p99 > self.p99_threshold_seconds:
+                    reason = "p99_latency"
+            if reason is not None:
+                self._shedding_until = now + self.hold_seconds
+                return reason
+            if now < self._shedding_until:
+                return "cooling_down"
+            return None
+
+    def record_deferral(self):
+        with self._lock:
+            self.deferred += 1
+
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            self._trim(now)
+            p99 = self._p99()
+            return {
+                "inFlight": self._in_flight,
+                "samples": len(self._samples),
+                "p99Seconds": round(p99, 3) if p99 is not None else None,
+                "shedding": now < self._shedding_until,
+                "deferred": self.deferred,
+            }
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _firestore_transactional(func):
+    from google.cloud.firestore import transactional
+
+    return transactional(func)
+
+
+def _default_reject_updates(_record):
+    return {
+        "status": "Rejected",
+        "rejectionReason": "Deferred face verification did not match the enrolled student.",
+        "finalizedAt": _utcnow(),
+    }
+
+
+class DeferredVerifier:
+    """Verifies deferred attendance records on a background thread.
+
+    ``verify_frame(image_bytes, record)`` runs the real verification and
+    returns ``{"verified": bool, "distance": ..., "details": {...}}``.
+    ``busy()`` is polled before each record so the verifier does not add
+    inference load while the endpoint itself is shedding.
+    ``reject_updates(record)`` returns the fields written when the face did
+    not match.
+    """
+
+    def __init__(
+        self,
+        db_getter,
+        bucket_getter,
+        verify_frame,
+        busy=None,
+        collection="attendance",
+        max_queue_size=1000,
+        sweep_interval=60.0,
+        stale_seconds=120.0,
+        max_attempts=3,
+        busy_backoff=1.0,
+        reject_updates=None,
+        logger=None,
+        transactional=None,
+    ):
+        self._db_getter = db_getter
+        self._bucket_getter = bucket_getter
+        self._verify_frame = verify_frame
+        self._busy = busy or (lambda: False)
+        self.collection = collection
+        self.sweep_interval = sweep_interval
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.busy_backoff = busy_backoff
+        self._reject_updates = reject_updates or _default_reject_updates
+        # ``memory_store.transactional`` for the in-memory backend.
+        self._transactional = transactional or _firestore_transactional
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue_size)))
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.verified = 0
+        self.rejected = 0
+        self.errors = 0
+
+    @staticmethod
+    def frame_path(doc_id):
+        return f"{DEFERRED_FRAMES_PREFIX}{doc_id}.jpg"
+
+    def store_frame(self, doc_id, jpeg_bytes):
+        path = self.frame_path(doc_id)
+        self._bucket_getter().blob(path).upload_from_string(jpeg_bytes, content_type="image/jpeg")
+        return path
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each worker process starts its own.
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                atexit.register(self.close)
+            self._pid = pid
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="deferred-verification", daemon=True)
+            self._thread.start()
+
+    def submit(self, doc_id):
+        """Queue ``doc_id``; when the queue is full the sweep picks it up later."""
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(doc_id)
+            return True
+        except queue.Full:
+            self._logger.warning("Deferred verification queue full; %s left for the sweep", doc_id)
+            return False
+
+    def start(self):
+        self._ensure_worker()
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._stop.is_set():
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                try:
+                    self.sweep()
+                except Exception:
+                    self._logger.exception("Deferred verification sweep failed")
+
+            try:
+                doc_id = self._queue.get(timeout=min(1.0, self.sweep_interval))
+            except queue.Empty:
+                continue
+            try:
+                while self._busy() and not self._stop.is_set():
+                    self._stop.wait(self.busy_backoff)
+                self.process(doc_id)
+            except Exception:
+                self._logger.exception("Deferred verification of %s failed", doc_id)
+            finally:
+                self._queue.task_done()
+
+    def sweep(self):
+        """Queue deferred records nobody has claimed for ``stale_seconds``."""
+
+        now = _utcnow()
+        query = self._db_getter().collection(self.collection).where("verificationState", "==", STATE_DEFERRED)
+        queued = 0
+        for snapshot in query.limit(200).stream():
+            record = snapshot.to_dict() or {}
+            claimed = record.get("deferredClaimedAt") or record.get("deferredAt")
+            if isinstance(claimed, datetime.datetime) and (now - claimed).total_seconds() < self.stale_seconds:
+                continue
+            try:
+                self._queue.put_nowait(snapshot.id)
+                queued += 1
+            except queue.Full:
+                break
+        return queued
+
+    def _claim(self, doc_ref):
+        """Claim a deferred record; returns ``(record, claim_id)``.
+
+        ``claim_id`` is None when the record is no longer deferred, or when
+        another worker's claim on it is not stale yet.
+        """
+
+        db = self._db_getter()
+        claim_id = uuid.uuid4().hex
+
+        @self._transactional
+        def claim(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            record = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            if record.get("verificationState") != STATE_DEFERRED:
+                return record, None
+            now = _utcnow()
+            claimed_at = record.get("deferredClaimedAt")
+            if (
+                record.get("deferredClaimId")
+                and isinstance(claimed_at, datetime.datetime)
+                and (now - claimed_at).total_seconds() < self.stale_seconds
+            ):
+                return record, None
+            transaction.update(doc_ref, {
+                "deferredClaimId": claim_id,
+                "deferredClaimedAt": now,
+                "deferredAttempts": int(record.get("deferredAttempts") or 0) + 1,
+            })
+            return record, claim_id
+
+        return claim(db.transaction())
+
+    def _write_if_claimed(self, doc_ref, claim_id, updates):
+        """Apply ``updates`` only while ``claim_id`` still holds the record."""
+
+        db = self._db_getter()
+
+        @self._transactional
+        def write(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            record = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            if record.get("verificationState") != STATE_DEFERRED or record.get("deferredClaimId") != claim_id:
+                return False
+            transaction.update(doc_ref, updates)
+            return True
+
+        return write(db.transaction())
+
+    def process(self, doc_id):
+        """Verify one deferred record; returns its new ``verificationState``."""
+
+        doc_ref = self._db_getter().collection(self.collection).document(doc_id)
+        record, claim_id = self._claim(doc_ref)
+        if claim_id is None:
+            if record.get("verificationState") != STATE_DEFERRED:
+                # The scan did not create a deferred record (or it was already
+                # handled), so any frame stored for it is no longer needed.
+                self._delete_frame(self.frame_path(doc_id))
+            # Otherwise another worker holds the claim.
+            return record.get("verificationState")
+
+        attempts = int(record.get("deferredAttempts") or 0) + 1
+        frame_path = record.get("deferredFrame") or self.frame_path(doc_id)
+
+        try:
+            image_bytes = self._bucket_getter().blob(frame_path).download_as_bytes()
+            result = self._verify_frame(image_bytes, record)
+        except Exception as exc:
+            if attempts < self.max_attempts:
+                # Release the claim so the next sweep retries the record.
+                self._write_if_claimed(doc_ref, claim_id, {
+                    "deferredClaimId": None,
+                    "deferredClaimedAt": None,
+                })
+                raise
+            if self._write_if_claimed(doc_ref, claim_id, {
+                "verificationState": STATE_ERROR,
+                "verification.error": str(exc),
+                "verification.deferred": True,
+            }):
+                self.errors += 1
+            return STATE_ERROR
+
+        verification = {
+            "distance": result.get("distance"),
+            "threshold": result.get("max_threshold_to_verify"),
+            "deferred": True,
+            "verifiedAt": _utcnow(),
+            **result.get("details", {}),
+        }
+        # Field paths rather than the whole map, so this write and any other
+        # writer of ``verification`` (e.g. a queued audit flush) only ever
+        # touch their own keys.
+        updates = {f"verification.{key}": value for key, value in verification.items()}
+        state = STATE_VERIFIED if result.get("verified") else STATE_FAILED
+        if state == STATE_FAILED:
+            updates.update(self._reject_updates(record))
+        updates["verificationState"] = state
+        if not self._write_if_claimed(doc_ref, claim_id, updates):
+            # Our claim went stale and another worker took the record over.
+            self._logger.warning("Deferred verification claim on %s was lost; result discarded", doc_id)
+            return None
+        if state == STATE_VERIFIED:
+            self.verified += 1
+        else:
+            self.rejected += 1
+        self._delete_frame(frame_path)
+        return state
+
+    def _delete_frame(self, frame_path):
+        try:
+            blob = self._bucket_getter().blob(frame_path)
+            if blob.exists():
+                blob.delete()
+        except Exception as exc:
+            self._logger.warning("Could not delete deferred frame %s: %s", frame_path, exc)
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def stats(self):
+        return {
+            "queued": self.pending(),
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+    def close(self, timeout=5.0):
+        """Stop the thread; unprocessed records stay deferred for the next sweep."""
+
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
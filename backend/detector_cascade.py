@@ -0,0 +1,203 @@
+"""Cascaded face detection for the scan path.
+
+Stages run cheapest first and the cascade stops at the first stage that finds
+a face it is confident about, so well-lit frontal webcam frames never reach
+the accurate-but-slow detector.  Only the final stage (DeepFace's configured
+backend, RetinaFace by default) is trusted unconditionally.
+
+Fast stages align their crops the way DeepFace does (level the eyes, then
+crop the box with no margin), and a fast stage is only accepted when it has
+eye landmarks: YuNet always reports them, and a Haar face without two eyes
+is scored below ``FAST_DETECTOR_MIN_CONFIDENCE``.  The crops still come from
+a different detector's box than the enrollment templates, so matches found
+through a fast stage are judged against
+``face_embeddings.FAST_DETECTOR_DISTANCE_THRESHOLD``.
+
+A caller that has already run Haar on the frame (the scan endpoint's quality
+gate) passes its ``(box, eyes)`` results as ``haar_faces``, and the Haar stage
+uses them instead of detecting again.
+
+Every stage returns ``Detection`` tuples in the shape of
+``face_embeddings.extract_aligned_faces``: an RGB crop scaled to 0-1, its
+facial area and a confidence.  Per-stage attempt/accept counts and timings
+are kept in ``stats()`` and logged every ``CASCADE_STATS_LOG_EVERY``
+detections.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from . import face_detection
+except ImportError:  # pragma: no cover - fallback for script execution
+    import face_detection
+
+
+FAST_DETECTOR_MIN_CONFIDENCE = float(os.environ.get("FAST_DETECTOR_MIN_CONFIDENCE", "0.8"))
+FAST_DETECTOR_MARGIN = float(os.environ.get("FAST_DETECTOR_MARGIN", "0.0"))
+CASCADE_STATS_LOG_EVERY = int(os.environ.get("CASCADE_STATS_LOG_EVERY", "500"))
+
+# Haar gives no score; a face whose two eyes are also found is treated as a
+# confident frontal detection, a face without them as a weak one.
+HAAR_CONFIDENCE_WITH_EYES = 0.9
+HAAR_CONFIDENCE_WITHOUT_EYES = 0.4
+
+Detection = namedtuple("Detection", ["face_rgb", "facial_area", "confidence"])
+Stage = namedtuple("Stage", ["name", "detect", "min_confidence"])
+
+
+def _to_detection(image_bgr, box, eyes, confidence, margin):
+    face_rgb = face_detection.aligned_face_rgb(image_bgr, box, eyes, margin)
+    if face_rgb.size == 0:
+        return None
+    x, y, w, h = box
+    return Detection(face_rgb, {"x": x, "y": y, "w": w, "h": h}, confidence)
+
+
+def _haar_faces(image_bgr):
+    gray = face_detection.to_gray(image_bgr)
+    return [(box, face_detection.eye_centers(gray, box)) for box in face_detection.detect_faces_fast(gray)]
+
+
+def haar_stage(min_confidence=FAST_DETECTOR_MIN_CONFIDENCE, margin=FAST_DETECTOR_MARGIN):
+    def detect(image_bgr, haar_faces=None):
+        if haar_faces is None:
+            haar_faces = _haar_faces(image_bgr)
+        detections = []
+        for box, eyes in haar_faces:
+            confidence = HAAR_CONFIDENCE_WITH_EYES if eyes else HAAR_CONFIDENCE_WITHOUT_EYES
+            detection = _to_detection(image_bgr, box, eyes, confidence, margin)
+            if detection is not None:
+                detections.append(detection)
+        return detections
+
+    return Stage("haar", detect, min_confidence)
+
+
+def yunet_stage(min_confidence=FAST_DETECTOR_MIN_CONFIDENCE, margin=FAST_DETECTOR_MARGIN):
+    def detect(image_bgr, haar_faces=None):
+        detections = []
+        for box, score, eyes in face_detection.detect_faces_yunet(image_bgr):
+            detection = _to_detection(image_bgr, box, eyes, score, margin)
+            if detection is not None:
+                detections.append(detection)
+        return detections
+
+    return Stage("yunet", detect, min_confidence)
+
+
+def deepface_stage(detector_backend=None):
+    """The accurate fallback; any face it returns is accepted."""
+
+    def detect(image_bgr, haar_faces=None):
+        try:
+            from . import face_embeddings
+        except ImportError:  # pragma: no cover - fallback for script execution
+            import face_embeddings
+        return [Detection(*face) for face in face_embeddings.extract_aligned_faces(image_bgr, detector_backend)]
+
+    return Stage(detector_backend or os.environ.get("FACE_DETECTOR_BACKEND", "retinaface"), detect, 0.0)
+
+
+class DetectorCascade:
+    def __init__(self, stages, logger=None, log_every=CASCADE_STATS_LOG_EVERY):
+        if not stages:
+            raise ValueError("A detector cascade needs at least one stage")
+        self.stages = list(stages)
+        self.log_every = log_every
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._no_face = 0
+        self._counters = {stage.name: {"attempts": 0, "accepted": 0, "seconds": 0.0} for stage in self.stages}
+
+    def detect(self, image_bgr, haar_faces=None):
+        """Return ``(detections, stage_name)``; ``([], None)`` when no stage finds a face.
+
+        A non-final stage is accepted only when its best detection reaches
+        the stage's ``min_confidence``.  ``haar_faces`` are ``(box, eyes)``
+        pairs already found on this frame, handed to every stage.
+        """
+
+        accepted_stage = None
+        detections = []
+        timings = []
+        last = len(self.stages) - 1
+        for position, stage in enumerate(self.stages):
+            started = time.perf_counter()
+            try:
+                found = stage.detect(image_bgr, haar_faces)
+            except Exception as exc:
+                if position == last:
+                    raise
+                self._logger.warning("Face detector stage %s failed, escalating: %s", stage.name, exc)
+                found = []
+            timings.append((stage.name, time.perf_counter() - started))
+
+            if found and (position == last or max(d.confidence for d in found) >= stage.min_confidence):
+                accepted_stage = stage.name
+                detections = found
+                break
+
+        self._record(timings, accepted_stage)
+        return detections, accepted_stage
+
+    def _record(self, timings, accepted_stage):
+        with self._lock:
+            self._frames += 1
+            if accepted_stage is None:
+                self._no_face += 1
+            for name, seconds in timings:
+                counters = self._counters[name]
+                counters["attempts"] += 1
+                counters["seconds"] += seconds
+                if name == accepted_stage:
+                    counters["accepted"] += 1
+            should_log = self.log_every and self._frames % self.log_every == 0
+        if should_log:
+            self._logger.info("Face detector cascade: %s", self.stats())
+
+    def stats(self):
+        """Frame counts plus, per stage, attempts, hit rate and mean latency."""
+
+        with self._lock:
+            stages = {}
+            for name, counters in self._counters.items():
+                attempts = counters["attempts"]
+                stages[name] = {
+                    "attempts": attempts,
+                    "accepted": counters["accepted"],
+                    "hitRate": round(counters["accepted"] / attempts, 4) if attempts else None,
+                    "meanMs": round(counters["seconds"] * 1000.0 / attempts, 2) if attempts else None,
+                }
+            return {"frames": self._frames, "noFace": self._no_face, "stages": stages}
+
+
+def build_default_cascade(spec=None, logger=None):
+    """Build the cascade named by ``FACE_DETECTOR_CASCADE``.
+
+    The spec is a comma-separated list of stages from ``yunet``, ``haar`` and
+    DeepFace backends; ``off`` runs only ``FACE_DETECTOR_BACKEND``.  The
+    default is YuNet when ``YUNET_MODEL_PATH`` is set, otherwise Haar,
+    followed by ``FACE_DETECTOR_BACKEND``.
+    """
+
+    spec = (spec if spec is not None else os.environ.get("FACE_DETECTOR_CASCADE", "")).strip().lower()
+    if spec in {"0", "off", "false", "no"}:
+        return DetectorCascade([deepface_stage()], logger=logger)
+    if not spec:
+        fast = yunet_stage() if face_detection.yunet_available() else haar_stage()
+        return DetectorCascade([fast, deepface_stage()], logger=logger)
+
+    stages = []
+    for name in (part.strip() for part in spec.split(",")):
+        if name == "haar":
+            stages.append(haar_stage())
+        elif name == "yunet":
+            stages.append(yunet_stage())
+        elif name:
+            stages.append(deepface_stage(name))
+    return DetectorCascade(stages, logger=logger)
@@ -0,0 +1,227 @@
+"""Compact, memory-mapped on-disk storage for known-face embeddings.
+
+A store root looks like::
+
+    CURRENT -> versions/20250101T120000Z-1234
+    versions/
+        20250101T120000Z-1234/
+            embeddings.npy   (n, d) float16/float32, L2-normalised rows
+            ids.npy          student ID of every row (fixed-width bytes)
+            id_sorted.npy    the same IDs sorted, for binary search
+            id_rows.npy      row number of every entry in id_sorted.npy
+            index.json       model, dtype, count and dimension
+
+Every array is opened with ``mmap_mode="r"``, so gunicorn workers on a host
+share the page cache instead of each holding a private copy, and a student
+lookup is a binary search over a shared array rather than a per-worker dict.
+Writers publish a complete new version and then swap ``CURRENT`` with an
+atomic rename; readers notice the new target and reopen.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+IDS_FILENAME = "ids.npy"
+ID_SORTED_FILENAME = "id_sorted.npy"
+ID_ROWS_FILENAME = "id_rows.npy"
+INDEX_FILENAME = "index.json"
+CURRENT_LINK = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+SUPPORTED_DTYPES = ("float16", "float32")
+KEEP_VERSIONS = 2
+
+
+def atomic_write(path, writer, mode="wb"):
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, mode) as handle:
+            writer(handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _encode_ids(student_ids):
+    encoded = [str(student_id).encode("utf-8") for student_id in student_ids]
+    width = max((len(value) for value in encoded), default=1) or 1
+    return np.array(encoded, dtype=f"S{width}")
+
+
+def write_embedding_store(directory, student_ids, embeddings, model_name, dtype="float16"):
+    """Write ``embeddings`` and their student IDs to ``directory``."""
+
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}, got {dtype!r}")
+
+    matrix = np.ascontiguousarray(embeddings, dtype=dtype)
+    if matrix.ndim != 2 or matrix.shape[0] != len(student_ids):
+        raise ValueError("embeddings must be a 2-D matrix with one row per student ID")
+
+    os.makedirs(directory, exist_ok=True)
+    ids = _encode_ids(student_ids)
+    order = np.argsort(ids, kind="stable")
+    index = {
+        "model": model_name,
+        "dtype": dtype,
+        "count": int(matrix.shape[0]),
+        "dimension": int(matrix.shape[1]) if matrix.shape[0] else 0,
+    }
+
+    atomic_write(os.path.join(directory, EMBEDDINGS_FILENAME), lambda handle: np.save(handle, matrix))
+    atomic_write(os.path.join(directory, IDS_FILENAME), lambda handle: np.save(handle, ids))
+    atomic_write(os.path.join(directory, ID_SORTED_FILENAME), lambda handle: np.save(handle, ids[order]))
+    atomic_write(os.path.join(directory, ID_ROWS_FILENAME), lambda handle: np.save(handle, order.astype(np.int64)))
+    atomic_write(
+        os.path.join(directory, INDEX_FILENAME),
+        lambda handle: json.dump(index, handle, separators=(",", ":")),
+        mode="w",
+    )
+
+
+def read_embedding_index(directory):
+    with open(os.path.join(directory, INDEX_FILENAME), "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def read_student_ids(directory):
+    """Return the row-ordered student IDs of a store version as strings."""
+
+    ids = np.load(os.path.join(directory, IDS_FILENAME), mmap_mode="r")
+    return [value.decode("utf-8") for value in ids]
+
+
+def new_version_directory(root):
+    """Create and return a new, empty version directory under ``root``."""
+
+    versions_dir = os.path.join(root, VERSIONS_DIRNAME)
+    os.makedirs(versions_dir, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    version_dir = os.path.join(versions_dir, f"{stamp}-{os.getpid()}")
+    os.makedirs(version_dir)
+    return version_dir
+
+
+def make_current(root, version_dir, keep=KEEP_VERSIONS):
+    """Atomically point ``root/CURRENT`` at ``version_dir`` and prune old versions."""
+
+    version_name = os.path.basename(version_dir)
+    temp_link = os.path.join(root, f".{CURRENT_LINK}-{version_name}")
+    os.symlink(os.path.join(VERSIONS_DIRNAME, version_name), temp_link)
+    os.replace(temp_link, os.path.join(root, CURRENT_LINK))
+    _prune_versions(os.path.join(root, VERSIONS_DIRNAME), keep=keep)
+
+
+def publish_embedding_store(root, student_ids, embeddings, model_name, dtype="float16"):
+    """Write a new store version under ``root`` and atomically make it current.
+
+    Returns the path of the new version directory.
+    """
+
+    version_dir = new_version_directory(root)
+    write_embedding_store(version_dir, student_ids, embeddings, model_name, dtype=dtype)
+    make_current(root, version_dir)
+    return version_dir
+
+
+def _prune_versions(versions_dir, keep):
+    # Workers that still map an older version keep their pages until they
+    # reopen; unlinking the files underneath them is safe on POSIX.
+    names = sorted(os.listdir(versions_dir))
+    for name in names[:-keep]:
+        shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+
+
+def resolve_store_directory(root):
+    """Return the directory holding the live store files under ``root``."""
+
+    link = os.path.join(root, CURRENT_LINK)
+    if os.path.islink(link):
+        return os.path.realpath(link)
+    if os.path.exists(os.path.join(root, EMBEDDINGS_FILENAME)):
+        return root
+    return None
+
+
+class EmbeddingStore:
+    """Read-only, memory-mapped view of one store version."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta = read_embedding_index(directory)
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILENAME), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, IDS_FILENAME), mmap_mode="r")
+        self.id_sorted = np.load(os.path.join(directory, ID_SORTED_FILENAME), mmap_mode="r")
+        self.id_rows = np.load(os.path.join(directory, ID_ROWS_FILENAME), mmap_mode="r")
+
+    @property
+    def model(self):
+        return self.meta.get("model")
+
+    def __len__(self):
+        return int(self.meta.get("count", len(self.ids)))
+
+    def rows_for(self, student_id):
+        """Return the row numbers enrolled for ``student_id`` (possibly empty)."""
+
+        key = str(student_id).encode("utf-8")
+        if len(key) > self.id_sorted.dtype.itemsize:
+            return np.zeros(0, dtype=np.int64)
+        left = np.searchsorted(self.id_sorted, key, side="left")
+        right = np.searchsorted(self.id_sorted, key, side="right")
+        return np.asarray(self.id_rows[left:right])
+
+    def embeddings_for(self, student_id):
+        """Return a float32 ``(k, d)`` matrix of the student's embeddings."""
+
+        rows = self.rows_for(student_id)
+        if not len(rows):
+            return None
+        return np.asarray(self.embeddings[np.sort(rows)], dtype=np.float32)
+
+
+class EmbeddingStoreHandle:
+    """Per-process lazy accessor that follows the ``CURRENT`` link.
+
+    The store is first opened on use, i.e. inside the forked worker, and the
+    link is re-checked at most every ``refresh_seconds`` so a published
+    version is picked up without restarting workers.
+    """
+
+    def __init__(self, root, refresh_seconds=10.0):
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._store = None
+        self._pid = None
+        self._checked_at = 0.0
+
+    def get(self):
+        if not self.root:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            stale_process = self._pid != os.getpid()
+            if stale_process or now - self._checked_at >= self.refresh_seconds:
+                self._checked_at = now
+                self._pid = os.getpid()
+                directory = resolve_store_directory(self.root)
+                if directory is None:
+                    self._store = None
+                elif stale_process or self._store is None or self._store.directory != directory:
+                    self._store = EmbeddingStore(directory)
+            return self._store
@@ -0,0 +1,230 @@
+"""Bulk enrollment of known faces into an embedding store.
+
+Usage::
+
+    python -m backend.enrollment --store-root /var/lib/attendance/embeddings
+
+Every ``known_faces/{student_id}.jpg`` blob, plus any extra reference images
+under ``known_faces/{student_id}/``, is downloaded with a bounded number of
+parallel requests, its face is detected and aligned, and the aligned crops
+are embedded in batches.  A student with several images gets one template
+row per image.  The result is published as a new
+version of the embedding store and swapped in atomically, so running workers
+pick it up without a restart.  Images with no face or more than one face are
+skipped and listed in ``enrollment_report.json`` inside the new version.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import sys
+
+import cv2
+import numpy as np
+
+try:
+    from . import face_embeddings
+    from .embedding_store import SUPPORTED_DTYPES, publish_embedding_store
+except ImportError:  # pragma: no cover - fallback for script execution
+    import face_embeddings
+    from embedding_store import SUPPORTED_DTYPES, publish_embedding_store
+
+
+logger = logging.getLogger("enrollment")
+
+KNOWN_FACES_PREFIX = "known_faces/"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+REPORT_FILENAME = "enrollment_report.json"
+
+
+def _student_id_for_blob(blob_name, prefix):
+    relative = blob_name[len(prefix):]
+    parts = relative.split("/")
+    if len(parts) > 2:
+        return None
+    stem, extension = os.path.splitext(parts[-1])
+    if extension.lower() not in IMAGE_EXTENSIONS or not stem:
+        return None
+    # known_faces/{id}.jpg or known_faces/{id}/{anything}.jpg
+    return parts[0] if len(parts) == 2 and parts[0] else stem
+
+
+def iter_known_face_blobs(bucket, prefix=KNOWN_FACES_PREFIX):
+    """Yield ``(student_id, blob)`` pairs, paging through the listing lazily."""
+
+    for blob in bucket.list_blobs(prefix=prefix):
+        student_id = _student_id_for_blob(blob.name, prefix)
+        if student_id:
+            yield student_id, blob
+
+
+def _download_image(blob):
+    data = blob.download_as_bytes()
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def download_images(blobs, workers):
+    """Yield ``(student_id, blob_name, image_or_None, error)`` with bounded parallelism.
+
+    At most ``2 * workers`` downloads are outstanding at any time, so memory
+    stays flat regardless of how many blobs the prefix contains.
+    """
+
+    window = max(1, workers * 2)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for student_id, blob in blobs:
+            pending.append((student_id, blob.name, executor.submit(_download_image, blob)))
+            if len(pending) >= window:
+                yield _resolve_download(*pending.popleft())
+        while pending:
+            yield _resolve_download(*pending.popleft())
+
+
+def _resolve_download(student_id, blob_name, future):
+    try:
+        image = future.result()
+    except Exception as exc:
+        return student_id, blob_name, None, f"download_failed: {exc}"
+    if image is None:
+        return student_id, blob_name, None, "decode_failed"
+    return student_id, blob_name, image, None
+
+
+def run_enrollment(
+    bucket,
+    store_root,
+    prefix=KNOWN_FACES_PREFIX,
+    workers=8,
+    batch_size=32,
+    detector_backend=None,
+    dtype="float16",
+    use_largest_face=False,
+    limit=None,
+):
+    """Enroll every known face under ``prefix`` and publish a new store version.
+
+    Returns the report dict that is also written to ``enrollment_report.json``.
+    """
+
+    student_ids = []
+    embedding_chunks = []
+    pending_ids = []
+    pending_faces = []
+    flagged = {}
+    processed = 0
+
+    def flush_batch():
+        if not pending_faces:
+            return
+        embedding_chunks.append(face_embeddings.embed_faces(pending_faces, batch_size=batch_size))
+        student_ids.extend(pending_ids)
+        pending_ids.clear()
+        pending_faces.clear()
+
+    blobs = iter_known_face_blobs(bucket, prefix)
+    for student_id, blob_name, image, error in download_images(blobs, workers):
+        processed += 1
+        if limit is not None and processed > limit:
+            break
+
+        if error:
+            flagged[blob_name] = error
+            continue
+
+        try:
+            faces = face_embeddings.extract_aligned_faces(image, detector_backend=detector_backend)
+        except Exception as exc:
+            flagged[blob_name] = f"detection_failed: {exc}"
+            continue
+
+        if not faces:
+            flagged[blob_name] = "no_face"
+            continue
+        if len(faces) > 1:
+            if not use_largest_face:
+                flagged[blob_name] = f"multiple_faces: {len(faces)}"
+                continue
+            faces.sort(key=lambda face: face[1].get("w", 0) * face[1].get("h", 0), reverse=True)
+
+        pending_ids.append(student_id)
+        pending_faces.append(faces[0][0])
+        if len(pending_faces) >= batch_size:
+            flush_batch()
+
+        if processed % 500 == 0:
+            logger.info("Processed %d images (%d enrolled, %d flagged)", processed, len(student_ids), len(flagged))
+
+    flush_batch()
+
+    if embedding_chunks:
+        matrix = np.concatenate(embedding_chunks, axis=0)
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+
+    version_dir = publish_embedding_store(store_root, student_ids, matrix, face_embeddings.MODEL_NAME, dtype=dtype)
+
+    report = {
+        "generatedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "prefix": prefix,
+        "version": os.path.basename(version_dir),
+        "model": face_embeddings.MODEL_NAME,
+        "enrolled": len(set(student_ids)),
+        "templates": len(student_ids),
+        "flaggedCount": len(flagged),
+        "flagged": flagged,
+    }
+    with open(os.path.join(version_dir, REPORT_FILENAME), "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+
+    return report
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="Precompute known-face embeddings for every enrolled student.")
+    parser.add_argument("--store-root", required=True, help="Embedding store root (EMBEDDING_STORE_DIR) to publish to.")
+    parser.add_argument("--prefix", default=KNOWN_FACES_PREFIX, help="Storage prefix holding known face images.")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum number of parallel downloads.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Faces per embedding batch.")
+    parser.add_argument("--detector", default=None, help="DeepFace detector backend (defaults to FACE_DETECTOR_BACKEND).")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="float16", help="Stored embedding precision.")
+    parser.add_argument("--use-largest-face", action="store_true", help="Enroll the largest face instead of flagging multi-face images.")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many images (for dry runs).")
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        from .app import bucket
+    except ImportError:  # pragma: no cover - fallback for script execution
+        from app import bucket
+
+    report = run_enrollment(
+        bucket,
+        args.store_root,
+        prefix=args.prefix,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        detector_backend=args.detector,
+        dtype=args.dtype,
+        use_largest_face=args.use_largest_face,
+        limit=args.limit,
+    )
+    logger.info(
+        "Enrolled %d students (%d templates); %d images flagged",
+        report["enrolled"],
+        report["templates"],
+        report["flaggedCount"],
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
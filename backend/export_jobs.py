@@ -0,0 +1,325 @@
+"""Background attendance export jobs.
+
+A job is submitted from a request, runs on a small per-process thread pool,
+and writes its CSV (optionally gzip-compressed) to a local directory or to
+the storage bucket.  Job state lives in the Firestore ``exportJobs``
+collection so any worker, on any host, can answer status requests; the
+running job refreshes ``updatedAt`` as it makes progress (and, while it
+does, the ``updatedAt`` of the jobs queued behind it in the same process),
+so a queued or running job whose heartbeat stops (its worker died) is
+reported as failed.  Job documents, local files and bucket objects older
+than the retention period are removed when a later job starts.
+
+Downloads are served in chunks with single-range ``Range`` support, from the
+local file or with ranged bucket reads.
+"""
+
+import datetime
+import gzip
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+JOB_COLLECTION = "exportJobs"
+# Expired job documents removed per cleanup pass.
+EXPIRED_JOBS_PER_PASS = 100
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised for a syntactically valid range outside the file."""
+
+
+def parse_byte_range(header_value, size):
+    """Return ``(start, end)`` (inclusive) for a ``Range`` header, or None.
+
+    None means "send the whole file": no header, a malformed header or a
+    multi-range request, all of which a server may answer with 200.
+    """
+
+    if not header_value:
+        return None
+    match = _RANGE_PATTERN.match(header_value.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header_value)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header_value)
+    return start, end
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class _ProgressReporter:
+    """Throttled ``update`` of the job document while the export runs."""
+
+    def __init__(self, job_ref, interval_seconds, clock=time.monotonic, on_flush=None):
+        self._job_ref = job_ref
+        self._interval = interval_seconds
+        self._clock = clock
+        self._on_flush = on_flush
+        self._last = 0.0
+        self._fields = {}
+
+    def __call__(self, force=False, **fields):
+        self._fields.update(fields)
+        now = self._clock()
+        if force or now - self._last >= self._interval:
+            self._job_ref.update(dict(self._fields, updatedAt=_utcnow()))
+            self._last = now
+            self._fields = {}
+            if self._on_flush is not None:
+                self._on_flush()
+
+
+class ExportJobRunner:
+    """Runs export jobs and tracks them in Firestore.
+
+    ``storage`` is ``"local"`` (files under ``output_dir``; only the host that
+    ran the job can serve the download) or ``"bucket"`` (uploaded under
+    ``exports/`` in the storage bucket).
+    """
+
+    def __init__(
+        self,
+        db_getter,
+        bucket_getter,
+        output_dir,
+        storage="local",
+        max_workers=1,
+        progress_interval=2.0,
+        stale_seconds=300.0,
+        retention_hours=24.0,
+        logger=None,
+    ):
+        if storage not in ("local", "bucket"):
+            raise ValueError(f"Unknown export storage {storage!r}")
+        self._db_getter = db_getter
+        self._bucket_getter = bucket_getter
+        self.output_dir = output_dir
+        self.storage = storage
+        self.max_workers = max_workers
+        self.progress_interval = progress_interval
+        self.stale_seconds = stale_seconds
+        self.retention_hours = retention_hours
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        # Jobs waiting for a thread in this process -> when their heartbeat
+        # was last refreshed (monotonic).
+        self._queued = {}
+
+    def _job_ref(self, job_id):
+        return self._db_getter().collection(JOB_COLLECTION).document(job_id)
+
+    def _get_executor(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export-job")
+                self._pid = pid
+            return self._executor
+
+    def submit(self, job_fields, produce, filename, compress=False):
+        """Queue a job and return its ID.
+
+        ``produce(report)`` yields CSV text chunks; it may call
+        ``report(**fields)`` to publish progress fields on the job document.
+        """
+
+        job_id = uuid.uuid4().hex
+        if compress:
+            filename += ".gz"
+        now = _utcnow()
+        self._job_ref(job_id).set(dict(
+            job_fields,
+            state="queued",
+            filename=filename,
+            compressed=bool(compress),
+            storage=self.storage,
+            createdAt=now,
+            updatedAt=now,
+        ))
+        with self._lock:
+            self._queued[job_id] = time.monotonic()
+        self._get_executor().submit(self._run, job_id, produce, filename, compress)
+        return job_id
+
+    def _touch_queued(self):
+        """Refresh the heartbeat of this process's queued jobs that need it."""
+
+        now = time.monotonic()
+        with self._lock:
+            due = [job_id for job_id, touched in self._queued.items() if now - touched >= self.stale_seconds / 3]
+            for job_id in due:
+                self._queued[job_id] = now
+        for job_id in due:
+            try:
+                self._job_ref(job_id).update({"updatedAt": _utcnow()})
+            except Exception:
+                self._logger.warning("Could not refresh queued export job %s", job_id)
+
+    def _local_path(self, job_id, filename):
+        return os.path.join(self.output_dir, f"{job_id}-{filename}")
+
+    def _run(self, job_id, produce, filename, compress):
+        with self._lock:
+            self._queued.pop(job_id, None)
+        job_ref = self._job_ref(job_id)
+        report = _ProgressReporter(job_ref, self.progress_interval, on_flush=self._touch_queued)
+        path = self._local_path(job_id, filename)
+        temp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._remove_expired_files()
+            self._remove_expired_jobs()
+            report(force=True, state="running", startedAt=_utcnow(), workerPid=os.getpid())
+
+            opener = gzip.open if compress else open
+            with opener(temp_path, "wt", encoding="utf-8", newline="") as handle:
+                for chunk in produce(report):
+                    handle.write(chunk)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+
+            location = path
+            if self.storage == "bucket":
+                blob_name = f"exports/{job_id}/{filename}"
+                content_type = "application/gzip" if compress else "text/csv"
+                self._bucket_getter().blob(blob_name).upload_from_filename(path, content_type=content_type)
+                os.remove(path)
+                location = blob_name
+
+            report(
+                force=True,
+                state="succeeded",
+                completedAt=_utcnow(),
+                sizeBytes=size,
+                location=location,
+            )
+        except Exception as exc:
+            self._logger.exception("Export job %s failed", job_id)
+            for leftover in (temp_path, path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            try:
+                report(force=True, state="failed", error=str(exc), completedAt=_utcnow())
+            except Exception:
+                self._logger.exception("Could not record failure of export job %s", job_id)
+
+    def _remove_expired_files(self):
+        cutoff = time.time() - self.retention_hours * 3600
+        for entry in os.scandir(self.output_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def _remove_expired_jobs(self):
+        """Delete job documents (and their bucket objects) past the retention period."""
+
+        cutoff = _utcnow() - datetime.timedelta(hours=self.retention_hours)
+        try:
+            expired = list(
+                self._db_getter().collection(JOB_COLLECTION)
+                .where("updatedAt", "<", cutoff)
+                .limit(EXPIRED_JOBS_PER_PASS)
+                .stream()
+            )
+        except Exception:
+            self._logger.warning("Could not list expired export jobs", exc_info=True)
+            return
+        for snapshot in expired:
+            job = snapshot.to_dict() or {}
+            if job.get("storage") == "bucket" and job.get("location") and not self._delete_blob(job["location"]):
+                # Keep the document so the next pass retries the object.
+                continue
+            try:
+                snapshot.reference.delete()
+            except Exception:
+                self._logger.warning("Could not delete expired export job %s", snapshot.id, exc_info=True)
+
+    def _delete_blob(self, name):
+        """Delete a bucket object; True once it is gone."""
+
+        blob = self._bucket_getter().blob(name)
+        try:
+            blob.delete()
+            return True
+        except Exception:
+            try:
+                if not blob.exists():
+                    return True
+            except Exception:
+                pass
+            self._logger.warning("Could not delete export %s", name, exc_info=True)
+            return False
+
+    def get(self, job_id):
+        """Return the job document as a dict, or None if there is no such job."""
+
+        snapshot = self._job_ref(job_id).get()
+        if not snapshot.exists:
+            return None
+        job = snapshot.to_dict() or {}
+        updated_at = job.get("updatedAt")
+        # A queued job is kept fresh by the job running ahead of it, so a
+        # stale queued job's worker died before it could start.
+        if (
+            job.get("state") in ("queued", "running")
+            and isinstance(updated_at, datetime.datetime)
+            and (_utcnow() - updated_at).total_seconds() > self.stale_seconds
+        ):
+            job["state"] = "failed"
+            job["error"] = "The export worker stopped before finishing."
+        return job
+
+    def object_size(self, job):
+        if job.get("storage") == "bucket":
+            return job.get("sizeBytes")
+        location = job.get("location")
+        if not location or not os.path.exists(location):
+            return None
+        return os.path.getsize(location)
+
+    def iter_bytes(self, job, start, end):
+        """Yield the job output from ``start`` to ``end`` inclusive, in chunks."""
+
+        if job.get("storage") == "bucket":
+            blob = self._bucket_getter().blob(job["location"])
+            position = start
+            while position <= end:
+                chunk_end = min(end, position + DOWNLOAD_CHUNK_BYTES - 1)
+                yield blob.download_as_bytes(start=position, end=chunk_end)
+                position = chunk_end + 1
+            return
+
+        with open(job["location"], "rb") as handle:
+            handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = handle.read(min(DOWNLOAD_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
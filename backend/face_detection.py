@@ -0,0 +1,184 @@
+"""Cheap OpenCV face detection and image measurements.
+
+These run in a few milliseconds per frame on CPU and are used to decide
+whether a frame is worth sending to the expensive recognition model at all.
+"""
+
+import math
+import os
+import threading
+
+import cv2
+
+
+# cv2.CascadeClassifier is not safe to share between threads.
+_local = threading.local()
+
+
+def _haar_cascade():
+    cascade = getattr(_local, "face_cascade", None)
+    if cascade is None:
+        path = os.environ.get("HAAR_CASCADE_PATH") or os.path.join(
+            cv2.data.haarcascades, "haarcascade_frontalface_default.xml"
+        )
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            raise RuntimeError(f"Unable to load Haar cascade from {path}")
+        _local.face_cascade = cascade
+    return cascade
+
+
+def _eye_cascade():
+    cascade = getattr(_local, "eye_cascade", None)
+    if cascade is None:
+        path = os.path.join(cv2.data.haarcascades, "haarcascade_eye.xml")
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            raise RuntimeError(f"Unable to load Haar cascade from {path}")
+        _local.eye_cascade = cascade
+    return cascade
+
+
+def to_gray(image_bgr):
+    if image_bgr.ndim == 2:
+        return image_bgr
+    return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+
+
+def detect_faces_fast(gray, max_width=320, min_face_fraction=0.08):
+    """Return ``(x, y, w, h)`` face boxes in ``gray``'s coordinates.
+
+    Detection runs on a copy downscaled to ``max_width`` pixels wide, which is
+    plenty for webcam-distance faces and keeps the cascade cheap.
+    """
+
+    height, width = gray.shape[:2]
+    scale = min(1.0, max_width / float(width))
+    small = gray if scale >= 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    small = cv2.equalizeHist(small)
+    min_side = max(20, int(min(small.shape[:2]) * min_face_fraction))
+
+    boxes = _haar_cascade().detectMultiScale(
+        small,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(min_side, min_side),
+    )
+    return [tuple(int(round(value / scale)) for value in box) for box in boxes]
+
+
+def detect_eyes(gray, box):
+    """Return eye boxes found in the upper half of face ``box``, face-relative."""
+
+    x, y, w, h = box
+    upper_face = gray[max(0, y):y + h // 2, max(0, x):x + w]
+    if upper_face.size == 0:
+        return []
+    min_side = max(8, w // 10)
+    eyes = _eye_cascade().detectMultiScale(
+        upper_face,
+        scaleFactor=1.1,
+        minNeighbors=6,
+        minSize=(min_side, min_side),
+    )
+    return [tuple(int(value) for value in eye) for eye in eyes]
+
+
+def eye_centers(gray, box):
+    """Return the ``(left, right)`` eye centres in image coordinates, or None.
+
+    Uses the two largest eye detections inside face ``box``.
+    """
+
+    eyes = detect_eyes(gray, box)
+    if len(eyes) < 2:
+        return None
+    eyes = sorted(eyes, key=lambda eye: eye[2] * eye[3], reverse=True)[:2]
+    (ax, ay, aw, ah), (bx, by, bw, bh) = sorted(eyes, key=lambda eye: eye[0])
+    x, y = box[0], box[1]
+    return (x + ax + aw / 2.0, y + ay + ah / 2.0), (x + bx + bw / 2.0, y + by + bh / 2.0)
+
+
+def _yunet_detector(width, height):
+    detector = getattr(_local, "yunet", None)
+    if detector is None:
+        path = os.environ.get("YUNET_MODEL_PATH")
+        if not path:
+            return None
+        detector = cv2.FaceDetectorYN.create(path, "", (width, height), score_threshold=0.5)
+        _local.yunet = detector
+    detector.setInputSize((width, height))
+    return detector
+
+
+def yunet_available():
+    return bool(os.environ.get("YUNET_MODEL_PATH")) and hasattr(cv2, "FaceDetectorYN")
+
+
+def detect_faces_yunet(image_bgr):
+    """Return ``(box, score, (left_eye, right_eye))`` per face from YuNet.
+
+    Needs the ONNX model at ``YUNET_MODEL_PATH``; returns an empty list when
+    it is not configured.
+    """
+
+    height, width = image_bgr.shape[:2]
+    detector = _yunet_detector(width, height)
+    if detector is None:
+        return []
+    _, faces = detector.detect(image_bgr)
+    results = []
+    for face in faces if faces is not None else ():
+        box = tuple(int(round(value)) for value in face[:4])
+        # Landmarks 0 and 1 are the eyes as seen in the image (left, right).
+        eyes = (float(face[4]), float(face[5])), (float(face[6]), float(face[7]))
+        results.append((box, float(face[14]), eyes))
+    return results
+
+
+def aligned_crop(image_bgr, box, eyes=None, margin=0.0):
+    """Crop ``box`` from ``image_bgr``, first rotating so the eyes are level."""
+
+    x, y, w, h = box
+    if eyes is not None:
+        (lx, ly), (rx, ry) = eyes
+        angle = math.degrees(math.atan2(ry - ly, rx - lx))
+        center = (x + w / 2.0, y + h / 2.0)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        image_bgr = cv2.warpAffine(
+            image_bgr,
+            rotation,
+            (image_bgr.shape[1], image_bgr.shape[0]),
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_REPLICATE,
+        )
+    pad = int(max(w, h) * margin)
+    height, width = image_bgr.shape[:2]
+    return image_bgr[max(0, y - pad):min(height, y + h + pad), max(0, x - pad):min(width, x + w + pad)]
+
+
+def aligned_face_rgb(image_bgr, box, eyes=None, margin=0.0):
+    """``aligned_crop`` as RGB scaled to 0-1, the form the embedding model takes.
+
+    With eye centres this follows DeepFace's own alignment (rotate the frame
+    so the eyes are level, then crop the detected box), so fast-detector
+    crops are comparable with the enrollment templates.
+    """
+
+    crop = aligned_crop(image_bgr, box, eyes, margin)
+    return crop[:, :, ::-1].astype("float32") / 255.0
+
+
+def laplacian_variance(gray, box=None):
+    """Focus measure: variance of the Laplacian (low means blurry)."""
+
+    if box is not None:
+        x, y, w, h = box
+        gray = gray[max(0, y):y + h, max(0, x):x + w]
+    if gray.size == 0:
+        return 0.0
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def box_area(box):
+    return box[2] * box[3]
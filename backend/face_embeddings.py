@@ -0,0 +1,138 @@
+"""Face detection, alignment and batched embedding on top of DeepFace.
+
+The helpers here follow the same preprocessing path as ``DeepFace.represent``
+so embeddings computed in bulk are comparable with the ones computed at scan
+time, but they run the recognition model on whole batches instead of one face
+per call.
+"""
+
+import os
+import threading
+
+import numpy as np
+from deepface import DeepFace
+
+
+MODEL_NAME = os.environ.get("FACE_MODEL_NAME", "VGG-Face")
+DETECTOR_BACKEND = os.environ.get("FACE_DETECTOR_BACKEND", "retinaface")
+# Cosine distance threshold DeepFace uses for VGG-Face.
+DISTANCE_THRESHOLD = float(os.environ.get("FACE_DISTANCE_THRESHOLD", "0.68"))
+# Faces found by the fast detector stages are eye-aligned like DeepFace's, but
+# boxed by a different detector; operators can tighten their threshold after
+# comparing distances on their own enrollment set.
+FAST_DETECTOR_STAGES = ("haar", "yunet")
+FAST_DETECTOR_DISTANCE_THRESHOLD = float(
+    os.environ.get("FAST_DETECTOR_DISTANCE_THRESHOLD", str(DISTANCE_THRESHOLD))
+)
+
+_model_lock = threading.Lock()
+_model = None
+_converted_model_dir = None
+
+
+class _ConvertedModel:
+    """A saved Keras model exposing what ``DeepFace.build_model`` clients do."""
+
+    def __init__(self, keras_model):
+        self.model = keras_model
+        self.input_shape = tuple(keras_model.input_shape[1:3])
+
+
+def use_converted_model(path):
+    """Load the recognition model from a SavedModel written by ``model_artifacts``."""
+
+    global _converted_model_dir
+    _converted_model_dir = path
+
+
+def get_recognition_model():
+    """Build the recognition model once per process."""
+
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if _converted_model_dir:
+                    import tensorflow as tf
+
+                    _model = _ConvertedModel(tf.keras.models.load_model(_converted_model_dir, compile=False))
+                else:
+                    _model = DeepFace.build_model(MODEL_NAME)
+    return _model
+
+
+def extract_aligned_faces(image_bgr, detector_backend=None, min_confidence=0.5):
+    """Return detected faces as ``(face_rgb, facial_area, confidence)`` tuples.
+
+    ``face_rgb`` is the aligned crop DeepFace produces (RGB, scaled to 0-1).
+    Detections below ``min_confidence`` are dropped; with
+    ``enforce_detection=False`` DeepFace reports "no face" as a single
+    whole-image region with zero confidence, which this filters out.
+    """
+
+    detections = DeepFace.extract_faces(
+        img_path=image_bgr,
+        detector_backend=detector_backend or DETECTOR_BACKEND,
+        enforce_detection=False,
+        align=True,
+    )
+
+    faces = []
+    for detection in detections:
+        confidence = float(detection.get("confidence") or 0.0)
+        if confidence < min_confidence:
+            continue
+        faces.append((detection["face"], detection.get("facial_area") or {}, confidence))
+    return faces
+
+
+def _prepare_face(face_rgb, target_size):
+    from deepface.modules import preprocessing
+
+    face_bgr = face_rgb[:, :, ::-1]
+    # resize_image pads to the model input and adds the batch dimension.
+    resized = preprocessing.resize_image(img=face_bgr, target_size=(target_size[1], target_size[0]))
+    return preprocessing.normalize_input(img=resized, normalization="base")
+
+
+def l2_normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def distance_threshold(detector_stage=None):
+    """The match threshold for a face found by ``detector_stage``."""
+
+    if detector_stage in FAST_DETECTOR_STAGES:
+        return FAST_DETECTOR_DISTANCE_THRESHOLD
+    return DISTANCE_THRESHOLD
+
+
+def embed_faces(faces_rgb, batch_size=32):
+    """Embed aligned face crops, returning an ``(n, d)`` float32 matrix.
+
+    Rows are L2-normalised so cosine distance is ``1 - a @ b``.
+    """
+
+    model = get_recognition_model()
+    target_size = model.input_shape
+    outputs = []
+
+    for start in range(0, len(faces_rgb), batch_size):
+        chunk = faces_rgb[start:start + batch_size]
+        batch = np.concatenate([_prepare_face(face, target_size) for face in chunk], axis=0)
+        embeddings = model.model.predict(batch, verbose=0)
+        outputs.append(np.asarray(embeddings, dtype=np.float32).reshape(len(chunk), -1))
+
+    if not outputs:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    return l2_normalize_rows(np.concatenate(outputs, axis=0))
+
+
+def cosine_distances(query, matrix):
+    """Cosine distance from one normalised query vector to each matrix row."""
+
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    return 1.0 - np.asarray(matrix, dtype=np.float32) @ query
@@ -0,0 +1,193 @@
+"""Per-student face templates promoted from confirmed scans.
+
+Enrollment embeddings live in the read-only embedding store.  On top of
+those, a verified scan whose face is clearly the student but still unlike
+every template they already have (new glasses, a haircut, another
+classroom's lighting) can be promoted into ``faceTemplates/{student_id}``.
+Scoring stacks the enrolled and promoted rows into one matrix and takes the
+best match with a single matrix-vector product.
+
+Only confirmed scans are promoted: the scan stores the embedding on its
+pending attendance record as ``templateCandidate`` and finalization promotes
+it once the attendance is confirmed.  The template document is updated in a
+Firestore transaction so concurrent promotions for one student do not
+overwrite each other.
+
+Each student keeps at most ``max_promoted`` promoted templates and the
+oldest is evicted first; enrolled templates are never evicted.  Promoted
+embeddings are stored as float16 bytes tagged with the model name, and rows
+from another model are ignored.
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+
+
+TEMPLATE_COLLECTION = "faceTemplates"
+
+
+def encode_embedding(embedding):
+    return np.asarray(embedding, dtype="<f2").reshape(-1).tobytes()
+
+
+def decode_embedding(data):
+    return np.frombuffer(bytes(data), dtype="<f2").astype(np.float32)
+
+
+def stack_templates(*matrices):
+    """Stack the non-empty ``(k, d)`` matrices into one contiguous float32 matrix."""
+
+    present = [np.asarray(matrix, dtype=np.float32) for matrix in matrices if matrix is not None and len(matrix)]
+    if not present:
+        return None
+    if len(present) == 1:
+        return np.ascontiguousarray(present[0])
+    return np.ascontiguousarray(np.concatenate(present, axis=0))
+
+
+def best_match(query, templates):
+    """Return ``(distance, row)`` of the closest template by cosine distance.
+
+    ``query`` and the template rows must be L2-normalised.
+    """
+
+    distances = 1.0 - templates @ np.asarray(query, dtype=np.float32).reshape(-1)
+    row = int(np.argmin(distances))
+    return float(distances[row]), row
+
+
+def _firestore_transactional(func):
+    from google.cloud.firestore import transactional
+
+    return transactional(func)
+
+
+class FaceTemplateStore:
+    """Reads, caches and promotes a student's promoted templates."""
+
+    def __init__(
+        self,
+        db_getter,
+        model_name,
+        max_promoted=4,
+        promote_max_distance=0.4,
+        min_novelty=0.15,
+        ttl_seconds=60.0,
+        max_entries=4096,
+        logger=None,
+        clock=time.monotonic,
+        transactional=None,
+    ):
+        self._db_getter = db_getter
+        self.model_name = model_name
+        self.max_promoted = max_promoted
+        self.promote_max_distance = promote_max_distance
+        self.min_novelty = min_novelty
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._logger = logger or logging.getLogger(__name__)
+        self._clock = clock
+        # ``memory_store.transactional`` for the in-memory backend.
+        self._transactional = transactional or _firestore_transactional
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _doc(self, student_id):
+        return self._db_getter().collection(TEMPLATE_COLLECTION).document(str(student_id))
+
+    def _matrix(self, entries, dimension=None):
+        rows = []
+        for entry in entries:
+            if entry.get("model") != self.model_name or not entry.get("embedding"):
+                continue
+            row = decode_embedding(entry["embedding"])
+            if dimension is not None and row.shape[0] != dimension:
+                continue
+            rows.append(row)
+        if not rows:
+            return None
+        return np.vstack(rows)
+
+    def promoted_for(self, student_id, dimension=None):
+        """Return the student's promoted templates as ``(k, d)`` float32, or None."""
+
+        now = self._clock()
+        with self._lock:
+            cached = self._cache.get(student_id)
+        if cached is not None and cached[0] > now:
+            entries = cached[1]
+        else:
+            snapshot = self._doc(student_id).get()
+            entries = list((snapshot.to_dict() or {}).get("templates") or []) if snapshot.exists else []
+            with self._lock:
+                if len(self._cache) >= self.max_entries:
+                    self._cache = {key: value for key, value in self._cache.items() if value[0] > now}
+                    if len(self._cache) >= self.max_entries:
+                        self._cache.pop(next(iter(self._cache)))
+                self._cache[student_id] = (now + self.ttl_seconds, entries)
+        return self._matrix(entries, dimension)
+
+    def should_promote(self, distance):
+        """A match is worth keeping when it is confident but not a near-duplicate.
+
+        ``distance`` is the best-match distance over all current templates, so
+        it doubles as the novelty of the new embedding.
+        """
+
+        return self.max_promoted > 0 and self.min_novelty <= distance <= self.promote_max_distance
+
+    def candidate(self, embedding, distance):
+        """Return the ``templateCandidate`` map for a scan, or None if it would not qualify."""
+
+        if not self.should_promote(distance):
+            return None
+        return {
+            "embedding": encode_embedding(embedding),
+            "model": self.model_name,
+            "distance": round(float(distance), 4),
+        }
+
+    def promote_candidate(self, student_id, candidate, source="scan"):
+        """Promote a stored ``templateCandidate``; returns True when stored."""
+
+        if not candidate or candidate.get("model") != self.model_name or not candidate.get("embedding"):
+            return False
+        return self.maybe_promote(student_id, decode_embedding(candidate["embedding"]), candidate.get("distance"), source)
+
+    def maybe_promote(self, student_id, embedding, distance, source="scan"):
+        """Promote ``embedding`` if it qualifies; returns True when stored."""
+
+        if distance is None or not self.should_promote(distance):
+            return False
+
+        db = self._db_getter()
+        doc_ref = db.collection(TEMPLATE_COLLECTION).document(str(student_id))
+        new_entry = {
+            "embedding": encode_embedding(embedding),
+            "model": self.model_name,
+            "distance": round(float(distance), 4),
+            "source": source,
+            "addedAt": datetime.datetime.now(datetime.timezone.utc),
+        }
+
+        @self._transactional
+        def promote(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            entries = list((snapshot.to_dict() or {}).get("templates") or []) if snapshot.exists else []
+            entries = [entry for entry in entries if entry.get("model") == self.model_name]
+            entries.append(new_entry)
+            # Oldest first; appearance drifts, so the newest templates are the useful ones.
+            entries = entries[-self.max_promoted:]
+            transaction.set(doc_ref, {"templates": entries, "updatedAt": new_entry["addedAt"]})
+            return entries
+
+        entries = promote(db.transaction())
+
+        with self._lock:
+            self._cache[student_id] = (self._clock() + self.ttl_seconds, entries)
+        self._logger.info("Promoted a face template for student %s (distance %.3f)", student_id, distance)
+        return True
@@ -0,0 +1,126 @@
+"""Pre-inference quality checks for captured frames.
+
+A frame that is blurry, badly exposed, has no usable face or shows a tilted
+head produces meaningless distances from the recognition model (which runs
+with ``enforce_detection=False``).  These checks use only OpenCV/NumPy array
+operations and the cheap Haar detector, so a bad frame is rejected in a few
+milliseconds with a reason the client can act on.  The face box and eyes the
+checks found are kept on the result, so the detector cascade can reuse them
+instead of running Haar on the same frame again.
+"""
+
+import math
+import os
+
+import numpy as np
+
+try:
+    from . import face_detection
+except ImportError:  # pragma: no cover - fallback for script execution
+    import face_detection
+
+
+MIN_FACE_SHARPNESS = float(os.environ.get("FRAME_MIN_SHARPNESS", "40"))
+MIN_BRIGHTNESS = float(os.environ.get("FRAME_MIN_BRIGHTNESS", "50"))
+MAX_BRIGHTNESS = float(os.environ.get("FRAME_MAX_BRIGHTNESS", "210"))
+MAX_CLIPPED_FRACTION = float(os.environ.get("FRAME_MAX_CLIPPED_FRACTION", "0.35"))
+MIN_FACE_FRACTION = float(os.environ.get("FRAME_MIN_FACE_FRACTION", "0.15"))
+MAX_ROLL_DEGREES = float(os.environ.get("FRAME_MAX_ROLL_DEGREES", "20"))
+MAX_YAW_OFFSET = float(os.environ.get("FRAME_MAX_YAW_OFFSET", "0.18"))
+
+RETRY_MESSAGES = {
+    "no_face": "No face was found. Center your face in the camera and try again.",
+    "face_too_small": "Your face is too far from the camera. Move closer and try again.",
+    "too_dark": "The image is too dark. Find better lighting and try again.",
+    "too_bright": "The image is overexposed. Move away from bright light and try again.",
+    "too_blurry": "The image is blurry. Hold still and try again.",
+    "head_tilted": "Keep your head level and try again.",
+    "face_turned": "Look straight at the camera and try again.",
+}
+
+class FrameQuality:
+    """Outcome of the quality stage: ``ok``, a retry ``reason`` and metrics.
+
+    ``face_box`` is the largest Haar face and ``eyes`` its eye centers, or
+    None when the checks stopped before finding them.
+    """
+
+    __slots__ = ("ok", "reason", "metrics", "face_box", "eyes")
+
+    def __init__(self, ok, reason=None, metrics=None, face_box=None, eyes=None):
+        self.ok = ok
+        self.reason = reason
+        self.metrics = metrics or {}
+        self.face_box = face_box
+        self.eyes = eyes
+
+    @property
+    def message(self):
+        return RETRY_MESSAGES.get(self.reason, "")
+
+
+def exposure_metrics(gray):
+    """Mean brightness and the fraction of crushed/blown-out pixels."""
+
+    pixel_count = float(gray.size) or 1.0
+    clipped = np.count_nonzero((gray <= 5) | (gray >= 250)) / pixel_count
+    return float(gray.mean()), float(clipped)
+
+
+def pose_metrics(box, eyes):
+    """Estimate roll (degrees) and a yaw proxy from the two eye centers.
+
+    The frontal Haar cascade already only fires on roughly frontal faces; this
+    catches the remaining head tilt and strong turns.  Returns ``(None, None)``
+    when two eyes were not located, in which case pose is not judged.
+    """
+
+    x, _y, w, _h = box
+    if eyes is None:
+        return None, None
+
+    left, right = (np.array(eye) for eye in eyes)
+    dx, dy = right - left
+    roll = math.degrees(math.atan2(dy, dx))
+    yaw_offset = abs((left[0] + right[0]) / 2.0 - x - w / 2.0) / float(w)
+    return roll, yaw_offset
+
+
+def assess_frame_quality(image_bgr):
+    """Run the cheap checks in order of cost and stop at the first failure."""
+
+    gray = face_detection.to_gray(image_bgr)
+    brightness, clipped = exposure_metrics(gray)
+    metrics = {"brightness": round(brightness, 1), "clippedFraction": round(clipped, 3)}
+
+    if brightness < MIN_BRIGHTNESS or (clipped > MAX_CLIPPED_FRACTION and brightness < 128):
+        return FrameQuality(False, "too_dark", metrics)
+    if brightness > MAX_BRIGHTNESS or clipped > MAX_CLIPPED_FRACTION:
+        return FrameQuality(False, "too_bright", metrics)
+
+    boxes = face_detection.detect_faces_fast(gray)
+    if not boxes:
+        return FrameQuality(False, "no_face", metrics)
+
+    box = max(boxes, key=face_detection.box_area)
+    face_fraction = box[2] / float(min(gray.shape[:2]))
+    metrics["faceFraction"] = round(face_fraction, 3)
+    if face_fraction < MIN_FACE_FRACTION:
+        return FrameQuality(False, "face_too_small", metrics, box)
+
+    sharpness = face_detection.laplacian_variance(gray, box)
+    metrics["sharpness"] = round(sharpness, 1)
+    if sharpness < MIN_FACE_SHARPNESS:
+        return FrameQuality(False, "too_blurry", metrics, box)
+
+    eyes = face_detection.eye_centers(gray, box)
+    roll, yaw_offset = pose_metrics(box, eyes)
+    if roll is not None:
+        metrics["rollDegrees"] = round(roll, 1)
+        metrics["yawOffset"] = round(yaw_offset, 3)
+        if abs(roll) > MAX_ROLL_DEGREES:
+            return FrameQuality(False, "head_tilted", metrics, box, eyes)
+        if yaw_offset > MAX_YAW_OFFSET:
+            return FrameQuality(False, "face_turned", metrics, box, eyes)
+
+    return FrameQuality(True, None, metrics, box, eyes)
@@ -0,0 +1,86 @@
+"""Matching every face in a classroom photo to the class roster.
+
+All detected faces are embedded in one batch and compared with every roster
+template in one matrix product.  Each student's cost for a face is the
+distance to their closest template, and ``assign_faces`` solves the
+face-to-student assignment with the Hungarian method
+(``scipy.optimize.linear_sum_assignment``), so two faces can never be
+credited to the same student and one face can never mark two students.
+Pairs farther apart than the verification threshold are left unmatched.
+
+Without SciPy the assignment falls back to a greedy pass over pairs in
+ascending distance, which keeps the one-to-one guarantee but may pick a
+slightly worse overall pairing when two students look alike.
+"""
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # pragma: no cover - exercised when SciPy is not installed
+    linear_sum_assignment = None
+
+
+def student_distance_matrix(face_embeddings, templates, owners):
+    """Return ``(distances, student_ids)``.
+
+    ``distances[i, j]`` is the cosine distance from face ``i`` to the closest
+    template of ``student_ids[j]``; ``owners[k]`` is the student of
+    ``templates[k]``.  Embeddings and templates must be L2-normalised.
+    """
+
+    student_ids = sorted(set(owners))
+    column = {student_id: position for position, student_id in enumerate(student_ids)}
+    faces = np.asarray(face_embeddings, dtype=np.float32)
+    template_distances = 1.0 - faces @ np.asarray(templates, dtype=np.float32).T
+    distances = np.full((len(faces), len(student_ids)), np.inf, dtype=np.float32)
+    for row, owner in enumerate(owners):
+        position = column[owner]
+        np.minimum(distances[:, position], template_distances[:, row], out=distances[:, position])
+    return distances, student_ids
+
+
+def _greedy_assignment(cost):
+    pairs = []
+    used_rows, used_cols = set(), set()
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        row, col = divmod(int(flat), cost.shape[1])
+        if row in used_rows or col in used_cols:
+            continue
+        pairs.append((row, col))
+        used_rows.add(row)
+        used_cols.add(col)
+    return pairs
+
+
+def assign_faces(distances, student_ids, threshold):
+    """Match faces to students one-to-one.
+
+    Returns ``(matches, unmatched)``: ``matches`` is a list of
+    ``(face_index, student_id, distance)`` and ``unmatched`` the indices of
+    faces with no student within ``threshold``.
+    """
+
+    face_count = distances.shape[0]
+    if face_count == 0 or not student_ids:
+        return [], list(range(face_count))
+
+    # Pairs over the threshold cost more than any allowed pair, so the solver
+    # only uses them when a face has no acceptable student left.
+    penalty = float(threshold) + 1.0
+    cost = np.where(distances <= threshold, distances, penalty)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(cost)
+        pairs = list(zip(rows.tolist(), cols.tolist()))
+    else:
+        pairs = _greedy_assignment(cost)
+
+    matches = []
+    matched_faces = set()
+    for row, col in pairs:
+        distance = float(distances[row, col])
+        if distance <= threshold:
+            matches.append((row, student_ids[col], distance))
+            matched_faces.add(row)
+    matches.sort()
+    return matches, [row for row in range(face_count) if row not in matched_faces]
@@ -0,0 +1,67 @@
+"""Gunicorn settings for the backend.
+
+Run from the repository root with::
+
+    gunicorn -c backend/gunicorn.conf.py backend.app:app
+
+Firebase clients are created per worker after the fork (``backend/clients.py``);
+the hooks below warm them up in preloaded workers and close them, after
+draining buffered audit writes, when a worker exits.  Each worker also starts
+the memory watchdog, which recycles it (SIGTERM, then a normal graceful exit)
+once its RSS crosses ``MEMORY_RSS_CEILING_MB``; ``max_requests`` is a blunter
+alternative.
+"""
+
+import os
+import sys
+
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+if os.environ.get("BACKEND_DATA_MODE", "").strip().lower() == "memory":
+    # Each process holds its own in-memory store; a second worker would
+    # serve reads that miss the first one's writes.
+    workers = 1
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0").strip().lower() in {"1", "true", "yes"}
+
+
+def _loaded_app_module():
+    return sys.modules.get("backend.app") or sys.modules.get("app")
+
+
+def post_fork(server, worker):
+    app_module = _loaded_app_module()
+    if app_module is None:
+        # Not preloaded: the app is imported in the worker and builds its
+        # clients on first use.
+        return
+    try:
+        app_module.worker_clients.firestore()
+    except Exception:
+        server.log.exception("Failed to create Firebase clients in worker %s", worker.pid)
+
+
+def post_worker_init(worker):
+    app_module = _loaded_app_module()
+    if app_module is not None:
+        app_module.memory_watchdog.start()
+
+
+def worker_exit(server, worker):
+    app_module = _loaded_app_module()
+    if app_module is None:
+        return
+    app_module.memory_watchdog.stop()
+    if not app_module.audit_write_queue.close(timeout=graceful_timeout / 2):
+        server.log.warning("Worker %s exited with audit writes still queued", worker.pid)
+    app_module.class_membership.close()
+    app_module.teacher_profiles.close()
+    app_module.deferred_verifier.close()
+    app_module.worker_clients.close()
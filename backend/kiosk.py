@@ -0,0 +1,300 @@
+"""Continuous frame scanning for classroom-door kiosks.
+
+A kiosk keeps one HTTP request open and streams frames as length-prefixed
+binary chunks (a 4-byte big-endian length followed by the JPEG bytes; a zero
+length ends the stream).  Every frame gets the cheap OpenCV detector; faces
+are tracked across frames by box overlap, and only a sharp view of a face that
+has not been identified yet is sent to the recognition model.
+
+Browser ``fetch`` uploads are half-duplex, so browser kiosks send a few
+seconds of frames per request instead.  Requests naming the same session ID
+continue one :class:`KioskSession` through :class:`KioskSessionRegistry`.
+"""
+
+import collections
+import struct
+import threading
+import time
+
+try:
+    from . import face_detection
+except ImportError:  # pragma: no cover - fallback for script execution
+    import face_detection
+
+
+FRAME_HEADER = struct.Struct(">I")
+
+
+class FrameStreamError(ValueError):
+    """Raised when the kiosk frame stream is malformed."""
+
+
+def _read_exact(stream, size, allow_eof=False):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if allow_eof and remaining == size:
+                return None
+            raise FrameStreamError("Frame stream ended in the middle of a frame.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_frames(stream, max_frame_bytes):
+    """Yield raw frame payloads from a length-prefixed binary stream."""
+
+    while True:
+        header = _read_exact(stream, FRAME_HEADER.size, allow_eof=True)
+        if header is None:
+            return
+        (length,) = FRAME_HEADER.unpack(header)
+        if length == 0:
+            return
+        if length > max_frame_bytes:
+            raise FrameStreamError(f"Frame of {length} bytes exceeds the {max_frame_bytes} byte limit.")
+        yield _read_exact(stream, length)
+
+
+def _iou(first, second):
+    ax, ay, aw, ah = first
+    bx, by, bw, bh = second
+    overlap_w = min(ax + aw, bx + bw) - max(ax, bx)
+    overlap_h = min(ay + ah, by + bh) - max(ay, by)
+    if overlap_w <= 0 or overlap_h <= 0:
+        return 0.0
+    intersection = overlap_w * overlap_h
+    return intersection / float(aw * ah + bw * bh - intersection)
+
+
+class Track:
+    __slots__ = (
+        "track_id", "box", "last_seen", "student_id", "distance", "attempts", "record_attempts",
+        "last_attempt_frame", "finished",
+    )
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = frame_index
+        self.student_id = None
+        self.distance = None
+        self.attempts = 0
+        self.record_attempts = 0
+        self.last_attempt_frame = None
+        self.finished = False
+
+
+class FaceTracker:
+    """Greedy IoU tracker that keeps identities attached to moving boxes."""
+
+    def __init__(self, iou_threshold=0.3, max_missing_frames=15):
+        self.iou_threshold = iou_threshold
+        self.max_missing_frames = max_missing_frames
+        self._tracks = {}
+        self._next_id = 1
+
+    def update(self, boxes, frame_index):
+        """Match ``boxes`` to existing tracks and return the tracks seen now."""
+
+        pairs = sorted(
+            (
+                (_iou(track.box, box), track_id, box_index)
+                for track_id, track in self._tracks.items()
+                for box_index, box in enumerate(boxes)
+            ),
+            reverse=True,
+        )
+        matched_tracks = set()
+        matched_boxes = set()
+        current = []
+        for overlap, track_id, box_index in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if track_id in matched_tracks or box_index in matched_boxes:
+                continue
+            track = self._tracks[track_id]
+            track.box = boxes[box_index]
+            track.last_seen = frame_index
+            matched_tracks.add(track_id)
+            matched_boxes.add(box_index)
+            current.append(track)
+
+        for box_index, box in enumerate(boxes):
+            if box_index in matched_boxes:
+                continue
+            track = Track(self._next_id, box, frame_index)
+            self._next_id += 1
+            self._tracks[track.track_id] = track
+            current.append(track)
+
+        for track_id in [
+            track_id
+            for track_id, track in self._tracks.items()
+            if frame_index - track.last_seen > self.max_missing_frames
+        ]:
+            del self._tracks[track_id]
+
+        return current
+
+
+class KioskSession:
+    """Per-kiosk state: tracker, recorded students and counters.
+
+    ``identify`` and ``record`` are plain attributes, so each request that
+    continues a kept-alive session installs its own.  Callers hold ``lock``
+    around ``process_frame`` and ``summary``.
+
+    ``identify(image_bgr, box, eyes)`` returns ``(student_id_or_None, distance)``;
+    it is only called for faces whose two eyes were found, so the crop can be
+    aligned like the enrollment faces.
+    ``record(student_id, distance)`` writes attendance and returns
+    ``(payload, status_code)``; a status of 400 or above is a failed write.
+    """
+
+    def __init__(
+        self,
+        identify,
+        record,
+        min_sharpness=60.0,
+        retry_interval_frames=5,
+        max_attempts=3,
+        tracker=None,
+    ):
+        self.identify = identify
+        self.record = record
+        self.lock = threading.Lock()
+        self.min_sharpness = min_sharpness
+        self.retry_interval_frames = retry_interval_frames
+        self.max_attempts = max_attempts
+        self.tracker = tracker or FaceTracker()
+        self.recorded = {}
+        self.frames = 0
+        self.detections = 0
+        self.embeddings = 0
+
+    def _should_embed(self, track, sharpness):
+        if track.finished or sharpness < self.min_sharpness:
+            return False
+        if track.last_attempt_frame is None:
+            return True
+        return self.frames - track.last_attempt_frame >= self.retry_interval_frames
+
+    def process_frame(self, image_bgr):
+        """Run detection/tracking on one frame and return the resulting events."""
+
+        self.frames += 1
+        gray = face_detection.to_gray(image_bgr)
+        boxes = face_detection.detect_faces_fast(gray)
+        self.detections += len(boxes)
+
+        events = []
+        for track in self.tracker.update(boxes, self.frames):
+            if track.finished:
+                continue
+            if track.student_id is not None:
+                # Identified, but the attendance write failed: retry the write
+                # without embedding the face again.
+                if self.frames - track.last_attempt_frame >= self.retry_interval_frames:
+                    events.append(self._record_track(track))
+                continue
+
+            sharpness = face_detection.laplacian_variance(gray, track.box)
+            if not self._should_embed(track, sharpness):
+                continue
+            # Without eye landmarks the crop cannot be aligned; wait for a
+            # frame where the student faces the camera.
+            eyes = face_detection.eye_centers(gray, track.box)
+            if eyes is None:
+                continue
+
+            track.attempts += 1
+            track.last_attempt_frame = self.frames
+            self.embeddings += 1
+            student_id, distance = self.identify(image_bgr, track.box, eyes)
+
+            if student_id is None:
+                if track.attempts >= self.max_attempts:
+                    track.finished = True
+                    events.append({"event": "unrecognized", "trackId": track.track_id, "distance": distance})
+                continue
+
+            track.student_id = student_id
+            track.distance = distance
+            events.append(self._record_track(track))
+
+        return events
+
+    def _record_track(self, track):
+        event = {
+            "event": "identified",
+            "trackId": track.track_id,
+            "studentId": track.student_id,
+            "distance": track.distance,
+        }
+        if track.student_id in self.recorded:
+            track.finished = True
+            event["duplicate"] = True
+            event["attendance"] = self.recorded[track.student_id]
+            return event
+
+        track.record_attempts += 1
+        track.last_attempt_frame = self.frames
+        payload, status_code = self.record(track.student_id, track.distance)
+        event["attendance"] = payload
+        event["httpStatus"] = status_code
+        # Only successful writes are cached; a failed one is retried on a
+        # later frame, up to ``max_attempts`` times per track.
+        if status_code < 400:
+            self.recorded[track.student_id] = payload
+            track.finished = True
+        elif track.record_attempts >= self.max_attempts:
+            track.finished = True
+        else:
+            event["retrying"] = True
+        return event
+
+    def summary(self):
+        return {
+            "event": "summary",
+            "frames": self.frames,
+            "detections": self.detections,
+            "embeddings": self.embeddings,
+            "identified": sorted(self.recorded),
+        }
+
+
+class KioskSessionRegistry:
+    """Keeps kiosk sessions alive between the requests of one kiosk.
+
+    Sessions idle for more than ``ttl_seconds`` are dropped, and at most
+    ``max_sessions`` are kept.  The registry lives in one worker process, so
+    a request served by another worker starts a fresh session there.
+    """
+
+    def __init__(self, ttl_seconds=120.0, max_sessions=256, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions = collections.OrderedDict()
+
+    def get(self, key, factory):
+        """Return the live session for ``key``, creating it with ``factory()``."""
+
+        now = self._clock()
+        with self._lock:
+            # Least recently used first, so expired sessions are at the front.
+            while self._sessions:
+                oldest_key, (_session, used_at) = next(iter(self._sessions.items()))
+                if now - used_at <= self.ttl_seconds:
+                    break
+                del self._sessions[oldest_key]
+            entry = self._sessions.pop(key, None)
+            session = entry[0] if entry is not None else factory()
+            self._sessions[key] = (session, now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
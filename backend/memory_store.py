@@ -0,0 +1,772 @@
+"""In-process stand-ins for Firestore and Cloud Storage.
+
+Used when ``BACKEND_DATA_MODE=memory`` so the export, stream and scan paths
+can be exercised and profiled end to end without network access.  Only the
+API surface the backend uses is implemented, with Firestore's semantics:
+
+* ``where`` with ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=``, ``in``,
+  ``not-in``, ``array_contains`` and ``array_contains_any`` (positional or
+  ``filter=FieldFilter(...)``), comparing only values of the same type class;
+* ``order_by`` with documents missing an ordered field excluded, an implicit
+  order on the inequality field, and the document ID as the final tiebreaker;
+* ``limit``, ``offset``, ``start_at``/``start_after``/``end_at``/``end_before``
+  cursors (snapshots, dicts or value lists) and ``select`` projections;
+* ``stream``/``get``, ``on_snapshot`` with ADDED/MODIFIED/REMOVED changes,
+  write batches, ``SERVER_TIMESTAMP`` and ``DELETE_FIELD``;
+* transactions through ``transaction()`` and this module's ``transactional``
+  decorator, which retries when a document the transaction read was changed
+  before it committed;
+* ``write_option(last_update_time=...)`` preconditions on deletes, which fail
+  the whole write (or batch) when the document has changed since, raising
+  google-cloud's ``FailedPrecondition`` like Firestore does.
+
+Bucket objects carry a ``generation`` that changes on every upload, and
+``upload_from_string(..., if_generation_match=...)`` raises
+``PreconditionFailed`` like Cloud Storage (0 means "must not exist").
+
+``verify_id_token`` stands in for Firebase Auth: it accepts the unsigned
+tokens ``seed_data.mint_emulator_id_token`` produces, so memory mode needs no
+auth emulator either.  Every process holds its own store, so memory mode
+must run a single worker (``backend/gunicorn.conf.py`` enforces this).
+"""
+
+import base64
+import copy
+import datetime
+import enum
+import functools
+import itertools
+import json
+import threading
+import time
+import uuid
+
+try:
+    from google.api_core.exceptions import FailedPrecondition, PreconditionFailed
+except ImportError:  # pragma: no cover - google-cloud is optional in memory mode
+    class FailedPrecondition(Exception):
+        """Stand-in for ``google.api_core.exceptions.FailedPrecondition``."""
+
+    class PreconditionFailed(Exception):
+        """Stand-in for ``google.api_core.exceptions.PreconditionFailed``."""
+
+
+class NotFound(Exception):
+    """Raised by ``update`` on a missing document, like Firestore's NotFound."""
+
+
+class Aborted(Exception):
+    """Raised when a transaction's reads went stale before it committed."""
+
+
+def verify_id_token(id_token, project_id, now=None):
+    """Decode an unsigned local ID token and return its claims with ``uid``.
+
+    Checks the audience, issuer, expiry and subject the way Firebase Auth
+    does, but not a signature.  Raises ``ValueError`` when any check fails.
+    """
+
+    try:
+        _, payload, _ = id_token.split(".")
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise ValueError("ID token is malformed.") from exc
+    if not isinstance(claims, dict):
+        raise ValueError("ID token is malformed.")
+    if claims.get("aud") != project_id:
+        raise ValueError("ID token has the wrong audience.")
+    if claims.get("iss") != f"https://securetoken.google.com/{project_id}":
+        raise ValueError("ID token has the wrong issuer.")
+    if not isinstance(claims.get("exp"), (int, float)) or claims["exp"] <= (time.time() if now is None else now):
+        raise ValueError("ID token has expired.")
+    uid = claims.get("sub")
+    if not isinstance(uid, str) or not uid:
+        raise ValueError("ID token has no subject.")
+    return dict(claims, uid=uid)
+
+
+class LastUpdateOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class DocumentChange:
+    __slots__ = ("type", "document")
+
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+def _default_sentinels():
+    try:
+        from google.cloud.firestore_v1 import transforms
+    except ImportError:
+        return None, None
+    return transforms.SERVER_TIMESTAMP, transforms.DELETE_FIELD
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# Firestore orders values of different types by type class.
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, (list, tuple)):
+        return 7
+    if isinstance(value, dict):
+        return 8
+    return 6
+
+
+def _normalize(value):
+    if value is None:
+        return 0
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=datetime.timezone.utc)
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time.min, tzinfo=datetime.timezone.utc)
+    if isinstance(value, (list, tuple)):
+        return tuple(_value_key(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _value_key(item)) for key, item in value.items()))
+    if _type_rank(value) == 6:
+        return repr(value)
+    return value
+
+
+def _value_key(value):
+    return (_type_rank(value), _normalize(value))
+
+
+_MISSING = object()
+
+
+def _get_field(data, field_path):
+    if field_path == "__name__":
+        return _MISSING
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _matches(value, op, target):
+    if value is _MISSING:
+        # Documents without the field never match a filter on it.
+        return False
+    if op in ("==", "!="):
+        equal = _type_rank(value) == _type_rank(target) and _value_key(value) == _value_key(target)
+        return equal if op == "==" else (not equal and value is not None)
+    if op in ("<", "<=", ">", ">="):
+        if _type_rank(value) != _type_rank(target):
+            return False
+        left, right = _value_key(value), _value_key(target)
+        return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[op]
+    if op == "in":
+        return any(_matches(value, "==", item) for item in target)
+    if op == "not-in":
+        return value is not None and not any(_matches(value, "==", item) for item in target)
+    if op == "array_contains":
+        return isinstance(value, list) and any(_matches(item, "==", target) for item in value)
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(_matches(item, "in", target) for item in value)
+    raise ValueError(f"Unsupported filter operator {op!r}")
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, read_time=None, fields=None, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time
+        self.update_time = update_time
+        if data is not None and fields is not None:
+            self._data = {key: data[key] for key in fields if key in data}
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, store, collection_name, doc_id):
+        self._store = store
+        self._collection = collection_name
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection}/{self.id}"
+
+    @property
+    def parent(self):
+        return CollectionReference(self._store, self._collection)
+
+    def get(self, field_paths=None, transaction=None):
+        if transaction is not None:
+            return transaction.get(self)
+        return self._store._get(self._collection, self.id, field_paths)
+
+    def set(self, document_data, merge=False):
+        self._store._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data):
+        self._store._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates):
+        self._store._commit([("update", self, field_updates, False)])
+
+    def delete(self, option=None):
+        self._store._commit([("delete", self, option, False)])
+
+
+class Query:
+    def __init__(self, store, collection_name, filters=(), orders=(), limit=None, offset=0,
+                 start=None, end=None, projection=None):
+        self._store = store
+        self._collection = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._start = start
+        self._end = end
+        self._projection = projection
+
+    def _copy(self, **changes):
+        values = dict(
+            filters=self._filters,
+            orders=self._orders,
+            limit=self._limit,
+            offset=self._offset,
+            start=self._start,
+            end=self._end,
+            projection=self._projection,
+        )
+        values.update(changes)
+        return Query(self._store, self._collection, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        descending = str(direction).upper().endswith("DESCENDING")
+        return self._copy(orders=self._orders + ((field_path, descending),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, count):
+        return self._copy(offset=count)
+
+    def select(self, field_paths):
+        return self._copy(projection=tuple(field_paths))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        ordered_fields = {field for field, _ in orders}
+        for field, op, _ in self._filters:
+            if op in ("<", "<=", ">", ">=", "!=", "not-in") and field not in ordered_fields:
+                orders.append((field, False))
+                ordered_fields.add(field)
+        descending = orders[-1][1] if orders else False
+        if "__name__" not in ordered_fields:
+            orders.append(("__name__", descending))
+        return orders
+
+    def _cursor_values(self, cursor, orders):
+        if isinstance(cursor, DocumentSnapshot):
+            data = cursor._data or {}
+            return [cursor.id if field == "__name__" else _get_field(data, field) for field, _ in orders]
+        if isinstance(cursor, dict):
+            return [_get_field(cursor, field) for field, _ in orders]
+        # Document-ID positions take a DocumentReference, as in Firestore.
+        return [value.id if isinstance(value, DocumentReference) else value for value in cursor]
+
+    def _compare_to_cursor(self, row_values, cursor_values, orders):
+        for value, cursor_value, (_, descending) in zip(row_values, cursor_values, orders):
+            if cursor_value is _MISSING:
+                break
+            left, right = _value_key(value), _value_key(cursor_value)
+            if left != right:
+                result = -1 if left < right else 1
+                return -result if descending else result
+        return 0
+
+    def _run(self, documents):
+        orders = self._effective_orders()
+        rows = []
+        for doc_id, data in documents.items():
+            if not all(_matches(_get_field(data, field), op, value) for field, op, value in self._filters):
+                continue
+            values = [doc_id if field == "__name__" else _get_field(data, field) for field, _ in orders]
+            if any(value is _MISSING for value in values):
+                continue
+            rows.append((values, doc_id, data))
+
+        for index in range(len(orders) - 1, -1, -1):
+            descending = orders[index][1]
+            rows.sort(key=lambda row: _value_key(row[0][index]), reverse=descending)
+
+        if self._start is not None:
+            cursor, inclusive = self._start
+            cursor_values = self._cursor_values(cursor, orders)
+            rows = [
+                row for row in rows
+                if self._compare_to_cursor(row[0], cursor_values, orders) > (-1 if inclusive else 0)
+            ]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            cursor_values = self._cursor_values(cursor, orders)
+            rows = [
+                row for row in rows
+                if self._compare_to_cursor(row[0], cursor_values, orders) < (1 if inclusive else 0)
+            ]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [(doc_id, data) for _, doc_id, data in rows]
+
+    def stream(self, transaction=None):
+        read_time = _utcnow()
+        for doc_id, data, update_time in self._store._query(self):
+            reference = DocumentReference(self._store, self._collection, doc_id)
+            yield DocumentSnapshot(reference, data, read_time, self._projection, update_time)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._store._watch(self, callback)
+
+
+class CollectionReference(Query):
+    def __init__(self, store, collection_name):
+        super().__init__(store, collection_name)
+        self.id = collection_name
+
+    def document(self, document_id=None):
+        return DocumentReference(self._store, self._collection, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return _utcnow(), reference
+
+    def list_documents(self):
+        return [self.document(doc_id) for doc_id in self._store._document_ids(self._collection)]
+
+
+class WriteBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        self._writes.append(("update", reference, field_updates, False))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, option, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._store._commit(writes)
+        return [_utcnow() for _ in writes]
+
+    def __len__(self):
+        return len(self._writes)
+
+
+class Transaction(WriteBatch):
+    """Buffers writes and records the version of every document it reads."""
+
+    def __init__(self, store, max_attempts=5):
+        super().__init__(store)
+        self.max_attempts = max_attempts
+        self._read_versions = {}
+
+    def get(self, reference):
+        snapshot = self._store._get(reference._collection, reference.id)
+        self._read_versions.setdefault((reference._collection, reference.id), snapshot.update_time)
+        return snapshot
+
+    def _begin(self):
+        self._writes = []
+        self._read_versions = {}
+
+    def _commit(self):
+        writes, self._writes = self._writes, []
+        self._store._commit(writes, expected_versions=self._read_versions)
+
+
+def transactional(func):
+    """Run ``func(transaction, ...)`` and commit it, retrying on conflicts."""
+
+    @functools.wraps(func)
+    def wrapper(transaction, *args, **kwargs):
+        for _attempt in range(transaction.max_attempts):
+            transaction._begin()
+            result = func(transaction, *args, **kwargs)
+            try:
+                transaction._commit()
+            except Aborted:
+                continue
+            return result
+        raise ValueError(f"Failed to commit transaction in {transaction.max_attempts} attempts.")
+
+    return wrapper
+
+
+class Watch:
+    def __init__(self, store, query, callback):
+        self._store = store
+        self.query = query
+        self.callback = callback
+        self.results = {}
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._store._unwatch(self)
+
+
+class InMemoryFirestore:
+    """Thread-safe, process-local Firestore stand-in."""
+
+    def __init__(self, server_timestamp=None, delete_field=None):
+        default_timestamp, default_delete = _default_sentinels()
+        self._server_timestamp = server_timestamp if server_timestamp is not None else default_timestamp
+        self._delete_field = delete_field if delete_field is not None else default_delete
+        self._collections = {}
+        self._update_times = {}
+        self._last_commit = None
+        self._watches = []
+        self._lock = threading.RLock()
+
+    def collection(self, collection_name):
+        return CollectionReference(self, collection_name)
+
+    def document(self, document_path):
+        collection_name, doc_id = document_path.rsplit("/", 1)
+        return DocumentReference(self, collection_name, doc_id)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5):
+        return Transaction(self, max_attempts)
+
+    @staticmethod
+    def write_option(last_update_time):
+        return LastUpdateOption(last_update_time)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for reference in references:
+            yield self._get(reference._collection, reference.id, field_paths)
+
+    def collections(self):
+        with self._lock:
+            return [self.collection(name) for name in self._collections]
+
+    def _document_ids(self, collection_name):
+        with self._lock:
+            return list(self._collections.get(collection_name, {}))
+
+    def _get(self, collection_name, doc_id, field_paths=None):
+        reference = DocumentReference(self, collection_name, doc_id)
+        with self._lock:
+            data = self._collections.get(collection_name, {}).get(doc_id)
+            data = copy.deepcopy(data) if data is not None else None
+            update_time = self._update_times.get((collection_name, doc_id))
+        return DocumentSnapshot(reference, data, _utcnow(), field_paths, update_time)
+
+    def _query(self, query):
+        with self._lock:
+            rows = query._run(self._collections.get(query._collection, {}))
+            return [
+                (doc_id, copy.deepcopy(data), self._update_times.get((query._collection, doc_id)))
+                for doc_id, data in rows
+            ]
+
+    def _resolve(self, value, now):
+        if self._server_timestamp is not None and value is self._server_timestamp:
+            return now
+        if isinstance(value, dict):
+            return {
+                key: self._resolve(item, now)
+                for key, item in value.items()
+                if self._delete_field is None or item is not self._delete_field
+            }
+        if isinstance(value, list):
+            return [self._resolve(item, now) for item in value]
+        return copy.deepcopy(value)
+
+    def _apply_path(self, data, field_path, value, now):
+        parts = field_path.split(".")
+        target = data
+        for part in parts[:-1]:
+            child = target.get(part)
+            if not isinstance(child, dict):
+                if self._delete_field is not None and value is self._delete_field:
+                    return
+                child = target[part] = {}
+            target = child
+        if self._delete_field is not None and value is self._delete_field:
+            target.pop(parts[-1], None)
+        else:
+            target[parts[-1]] = self._resolve(value, now)
+
+    def _commit(self, writes, expected_versions=None):
+        with self._lock:
+            # Every commit gets a distinct, increasing time so it can serve as
+            # a document version.
+            now = _utcnow()
+            if self._last_commit is not None and now <= self._last_commit:
+                now = self._last_commit + datetime.timedelta(microseconds=1)
+            self._last_commit = now
+
+            for key, version in (expected_versions or {}).items():
+                if self._update_times.get(key) != version:
+                    raise Aborted(f"{key[0]}/{key[1]} changed during the transaction")
+            for kind, reference, payload, _merge in writes:
+                # A delete's payload is its write option.
+                if kind == "delete" and payload is not None:
+                    if self._update_times.get((reference._collection, reference.id)) != payload.last_update_time:
+                        raise FailedPrecondition(f"{reference.path} changed since {payload.last_update_time}")
+
+            staged = {}
+
+            def current(reference):
+                key = (reference._collection, reference.id)
+                if key not in staged:
+                    existing = self._collections.get(reference._collection, {}).get(reference.id)
+                    staged[key] = copy.deepcopy(existing) if existing is not None else None
+                return key
+
+            for kind, reference, payload, merge in writes:
+                key = current(reference)
+                if kind == "create":
+                    if staged[key] is not None:
+                        raise ValueError(f"Document {reference.path} already exists")
+                    staged[key] = self._resolve(payload, now)
+                elif kind == "set" and not merge:
+                    staged[key] = self._resolve(payload, now)
+                elif kind == "set":
+                    data = staged[key] or {}
+                    for field, value in payload.items():
+                        self._apply_path(data, field, value, now)
+                    staged[key] = data
+                elif kind == "update":
+                    if staged[key] is None:
+                        raise NotFound(f"No document to update: {reference.path}")
+                    for field_path, value in payload.items():
+                        self._apply_path(staged[key], field_path, value, now)
+                elif kind == "delete":
+                    staged[key] = None
+
+            changed = set()
+            for (collection_name, doc_id), data in staged.items():
+                documents = self._collections.setdefault(collection_name, {})
+                if data is None:
+                    self._update_times.pop((collection_name, doc_id), None)
+                    if documents.pop(doc_id, None) is not None:
+                        changed.add(collection_name)
+                else:
+                    documents[doc_id] = data
+                    self._update_times[(collection_name, doc_id)] = now
+                    changed.add(collection_name)
+
+            notifications = [
+                notification
+                for watch in list(self._watches)
+                if watch.query._collection in changed
+                for notification in [self._diff(watch)]
+                if notification is not None
+            ]
+
+        for watch, docs, changes in notifications:
+            watch.callback(docs, changes, now)
+
+    def _snapshot(self, watch, doc_id, data):
+        reference = DocumentReference(self, watch.query._collection, doc_id)
+        return DocumentSnapshot(reference, copy.deepcopy(data), fields=watch.query._projection)
+
+    def _diff(self, watch, initial=False):
+        rows = watch.query._run(self._collections.get(watch.query._collection, {}))
+        results = dict(rows)
+        changes = []
+        for doc_id, data in rows:
+            previous = watch.results.get(doc_id)
+            if previous is None:
+                change_type = ChangeType.ADDED
+            elif previous != data:
+                change_type = ChangeType.MODIFIED
+            else:
+                continue
+            changes.append(DocumentChange(change_type, self._snapshot(watch, doc_id, data)))
+        for doc_id, data in watch.results.items():
+            if doc_id not in results:
+                changes.append(DocumentChange(ChangeType.REMOVED, self._snapshot(watch, doc_id, data)))
+        watch.results = copy.deepcopy(results)
+        if not changes and not initial:
+            return None
+        return watch, [self._snapshot(watch, doc_id, data) for doc_id, data in rows], changes
+
+    def _watch(self, query, callback):
+        watch = Watch(self, query, callback)
+        with self._lock:
+            self._watches.append(watch)
+            notification = self._diff(watch, initial=True)
+        watch.callback(notification[1], notification[2], _utcnow())
+        return watch
+
+    def _unwatch(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+
+class Blob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def _entry(self):
+        entry = self.bucket._objects.get(self.name)
+        if entry is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        return entry
+
+    @property
+    def size(self):
+        entry = self.bucket._objects.get(self.name)
+        return len(entry[0]) if entry is not None else None
+
+    @property
+    def generation(self):
+        entry = self.bucket._objects.get(self.name)
+        return entry[2] if entry is not None else None
+
+    @property
+    def content_type(self):
+        entry = self.bucket._objects.get(self.name)
+        return entry[1] if entry is not None else None
+
+    def exists(self):
+        return self.name in self.bucket._objects
+
+    def download_as_bytes(self, start=None, end=None):
+        data = self._entry()[0]
+        if start is None and end is None:
+            return data
+        # Like GCS, ``end`` is inclusive.
+        return data[start or 0:None if end is None else end + 1]
+
+    def download_as_text(self, encoding="utf-8"):
+        return self.download_as_bytes().decode(encoding)
+
+    def download_to_filename(self, filename):
+        with open(filename, "wb") as handle:
+            handle.write(self._entry()[0])
+
+    def download_to_file(self, file_obj):
+        file_obj.write(self._entry()[0])
+
+    def upload_from_string(self, data, content_type="text/plain", if_generation_match=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.bucket._lock:
+            if if_generation_match is not None:
+                entry = self.bucket._objects.get(self.name)
+                if (entry[2] if entry is not None else 0) != if_generation_match:
+                    raise PreconditionFailed(f"{self.bucket.name}/{self.name} is not at generation {if_generation_match}")
+            self.bucket._objects[self.name] = (bytes(data), content_type, next(self.bucket._generations))
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self.upload_from_string(file_obj.read(), content_type or "application/octet-stream")
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, "rb") as handle:
+            self.upload_from_file(handle, content_type)
+
+    def delete(self):
+        with self.bucket._lock:
+            if self.bucket._objects.pop(self.name, None) is None:
+                raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+
+class InMemoryBucket:
+    """Process-local Cloud Storage bucket stand-in."""
+
+    def __init__(self, name="local-bucket"):
+        self.name = name
+        self._objects = {}
+        self._generations = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def blob(self, blob_name):
+        return Blob(self, blob_name)
+
+    def get_blob(self, blob_name):
+        return Blob(self, blob_name) if blob_name in self._objects else None
+
+    def list_blobs(self, prefix=None, max_results=None):
+        with self._lock:
+            names = sorted(name for name in self._objects if not prefix or name.startswith(prefix))
+        return [Blob(self, name) for name in itertools.islice(names, max_results)]
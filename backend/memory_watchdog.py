@@ -0,0 +1,212 @@
+"""Per-worker memory instrumentation and a recycle-on-ceiling watchdog.
+
+TensorFlow/DeepFace workers grow in RSS as allocator arenas fragment and
+model graphs are traced, and an OOM kill takes in-flight scans with it.
+``MemoryWatchdog`` samples the worker's RSS on a background thread and, once
+it stays above ``ceiling_bytes`` for ``consecutive_checks`` samples, sends
+the worker SIGTERM.  Under gunicorn that is a graceful shutdown: the worker
+stops accepting connections, finishes in-flight requests within
+``graceful_timeout``, runs the ``worker_exit`` hook (which drains the audit
+queue), and the arbiter forks a fresh replacement.
+
+``MemoryWatchdog.report`` collects what the admin endpoint shows: RSS and
+its recent history, a tracemalloc top-N (when ``tracemalloc_frames`` turns
+tracing on; it costs noticeable CPU and memory, so it is off by default) and
+TensorFlow's allocator stats for devices that report them.
+"""
+
+import collections
+import gc
+import logging
+import os
+import random
+import resource
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as handle:
+            resident_pages = int(handle.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def tensorflow_memory_stats():
+    """Allocator stats per TensorFlow device, if TensorFlow is already loaded.
+
+    TensorFlow is never imported here.  CPU devices do not report allocator
+    stats and are listed without them.
+    """
+
+    tf = sys.modules.get("tensorflow")
+    if tf is None:
+        return None
+    devices = []
+    try:
+        physical = tf.config.list_logical_devices()
+    except Exception as exc:
+        return {"error": str(exc)}
+    for device in physical:
+        entry = {"device": device.name, "type": device.device_type}
+        try:
+            info = tf.config.experimental.get_memory_info(device.name)
+            entry["currentBytes"] = int(info.get("current", 0))
+            entry["peakBytes"] = int(info.get("peak", 0))
+        except Exception:
+            pass
+        devices.append(entry)
+    return {"devices": devices}
+
+
+def tracemalloc_top(limit=20, key_type="lineno"):
+    """Largest Python allocation sites, or None if tracemalloc is not tracing."""
+
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    traced, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracedBytes": traced,
+        "peakTracedBytes": peak,
+        "top": [
+            {"site": str(stat.traceback), "sizeBytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(key_type)[:limit]
+        ],
+    }
+
+
+def _recycle_worker(_rss):
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+class MemoryWatchdog:
+    def __init__(
+        self,
+        ceiling_bytes=0,
+        check_interval=15.0,
+        consecutive_checks=2,
+        recycle_jitter=30.0,
+        history_size=240,
+        tracemalloc_frames=0,
+        on_exceed=None,
+        rss_reader=current_rss_bytes,
+        logger=None,
+        clock=time.time,
+    ):
+        self.ceiling_bytes = ceiling_bytes
+        self.check_interval = check_interval
+        self.consecutive_checks = max(1, int(consecutive_checks))
+        self.recycle_jitter = recycle_jitter
+        self.tracemalloc_frames = tracemalloc_frames
+        self._on_exceed = on_exceed or _recycle_worker
+        self._rss_reader = rss_reader
+        self._logger = logger or logging.getLogger(__name__)
+        self._clock = clock
+        self._history = collections.deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._over = 0
+        self.started_at = None
+        self.recycle_requested_at = None
+
+    def start(self):
+        """Start sampling in this process (call in each worker after fork)."""
+
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            if self.tracemalloc_frames and not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+            self._history.clear()
+            self._over = 0
+            self.recycle_requested_at = None
+            self.started_at = self._clock()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="memory-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                self._logger.exception("Memory watchdog check failed")
+
+    def check(self):
+        """Take one RSS sample; returns True when a recycle was requested."""
+
+        rss = self._rss_reader()
+        if rss is None:
+            return False
+        with self._lock:
+            self._history.append((self._clock(), rss))
+            if not self.ceiling_bytes or rss <= self.ceiling_bytes:
+                self._over = 0
+                return False
+            self._over += 1
+            if self._over < self.consecutive_checks or self.recycle_requested_at is not None:
+                return False
+            self.recycle_requested_at = self._clock()
+
+        # Spread recycles out so workers that grew together do not all
+        # restart in the same instant.
+        delay = random.uniform(0, self.recycle_jitter) if self.recycle_jitter else 0
+        self._logger.warning(
+            "Worker %s RSS %.0f MiB is over the %.0f MiB ceiling; recycling in %.0fs",
+            os.getpid(),
+            rss / 2**20,
+            self.ceiling_bytes / 2**20,
+            delay,
+        )
+        if delay:
+            self._stop.wait(delay)
+        self._on_exceed(rss)
+        return True
+
+    def history(self):
+        with self._lock:
+            return list(self._history)
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self, tracemalloc_limit=20):
+        rss = self._rss_reader()
+        history = self.history()
+        growth = None
+        if len(history) >= 2 and history[-1][0] > history[0][0]:
+            growth = (history[-1][1] - history[0][1]) / ((history[-1][0] - history[0][0]) / 3600.0)
+        return {
+            "pid": os.getpid(),
+            "rssBytes": rss,
+            "peakRssBytes": peak_rss_bytes(),
+            "ceilingBytes": self.ceiling_bytes or None,
+            "uptimeSeconds": round(self._clock() - self.started_at, 1) if self.started_at else None,
+            "rssGrowthBytesPerHour": round(growth) if growth is not None else None,
+            "recycleRequested": self.recycle_requested_at is not None,
+            "history": [{"at": at, "rssBytes": value} for at, value in history[-60:]],
+            "gcCounts": list(gc.get_count()),
+            "tracemalloc": tracemalloc_top(tracemalloc_limit),
+            "tensorflow": tensorflow_memory_stats(),
+        }
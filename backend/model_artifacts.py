@@ -0,0 +1,269 @@
+"""Local, checksummed model weights for the recognition path.
+
+DeepFace (and the RetinaFace package) download their weights into
+``$DEEPFACE_HOME/.deepface/weights`` the first time a model is built, so a
+fresh container's first scan waits on a large download and an offline one
+cannot scan at all.  ``ModelArtifactManager`` points ``DEEPFACE_HOME`` at a
+directory that already holds the weights and checks them against the
+SHA-256 sums in its ``manifest.json`` before the app serves anything.  A
+missing or corrupt file raises ``ModelArtifactError`` at import, which stops
+the worker from booting instead of failing the first scan.
+
+Hashing several hundred megabytes on every boot would undo part of the gain,
+so a verified file's size and mtime are remembered in ``.verified.json`` and
+it is re-hashed only when either changes.
+
+The directory is prepared at image build time, where network is available::
+
+    python -m backend.model_artifacts fetch --dir /models
+    python -m backend.model_artifacts convert --dir /models   # optional
+    python -m backend.model_artifacts verify --dir /models
+
+``convert`` saves the recognition network as a Keras SavedModel under
+``converted/``; ``face_embeddings`` loads it directly instead of rebuilding
+the architecture and reading the ``.h5`` weights.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+
+
+MANIFEST_NAME = "manifest.json"
+VERIFIED_STAMP_NAME = ".verified.json"
+WEIGHTS_SUBDIR = os.path.join(".deepface", "weights")
+CONVERTED_SUBDIR = "converted"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Weight files DeepFace 0.0.93 fetches for each model and detector backend.
+# Detectors shipped inside their pip packages (opencv, mtcnn) need none.
+RECOGNITION_WEIGHTS = {
+    "VGG-Face": ["vgg_face_weights.h5"],
+    "Facenet": ["facenet_weights.h5"],
+    "Facenet512": ["facenet512_weights.h5"],
+    "OpenFace": ["openface_weights.h5"],
+    "DeepID": ["deepid_keras_weights.h5"],
+    "ArcFace": ["arcface_weights.h5"],
+    "SFace": ["face_recognition_sface_2021dec.onnx"],
+    "GhostFaceNet": ["ghostfacenet_v1.h5"],
+}
+DETECTOR_WEIGHTS = {
+    "opencv": [],
+    "mtcnn": [],
+    "retinaface": ["retinaface.h5"],
+    "ssd": ["deploy.prototxt", "res10_300x300_ssd_iter_140000.caffemodel"],
+    "yunet": ["face_detection_yunet_2023mar.onnx"],
+    "centerface": ["centerface.onnx"],
+}
+
+
+class ModelArtifactError(RuntimeError):
+    """Raised when required model weights are missing or fail verification."""
+
+
+def required_weight_files(model_name, detector_backends=()):
+    """Weight file names needed for ``model_name`` and the detector backends.
+
+    Unknown names contribute nothing; the manifest still covers whatever
+    files were fetched for them.
+    """
+
+    names = list(RECOGNITION_WEIGHTS.get(model_name, []))
+    for backend in detector_backends:
+        names.extend(DETECTOR_WEIGHTS.get(backend, []))
+    return sorted(set(names))
+
+
+def converted_model_name(model_name):
+    return model_name.replace("/", "_")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, payload):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+class ModelArtifactManager:
+    def __init__(self, root, required=(), logger=None):
+        self.root = os.path.abspath(root)
+        self.required = list(required)
+        self._logger = logger or logging.getLogger(__name__)
+
+    @property
+    def weights_dir(self):
+        return os.path.join(self.root, WEIGHTS_SUBDIR)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def converted_model_dir(self, model_name):
+        """Path of the converted model if the manifest lists it, else None."""
+
+        manifest = _read_json(self.manifest_path, {})
+        relative = (manifest.get("converted") or {}).get(model_name)
+        return os.path.join(self.root, relative) if relative else None
+
+    def _artifact_files(self):
+        """Relative paths of every file the manifest should cover."""
+
+        files = []
+        for base, _dirs, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(base, name)
+                relative = os.path.relpath(path, self.root)
+                if relative in (MANIFEST_NAME, VERIFIED_STAMP_NAME) or name.endswith(".tmp"):
+                    continue
+                files.append(relative.replace(os.sep, "/"))
+        return sorted(files)
+
+    def write_manifest(self, converted=None):
+        """Hash every file under the root and record it in the manifest."""
+
+        manifest = _read_json(self.manifest_path, {})
+        files = {}
+        for relative in self._artifact_files():
+            path = os.path.join(self.root, relative)
+            files[relative] = {"sha256": file_sha256(path), "size": os.path.getsize(path)}
+        manifest["files"] = files
+        manifest["converted"] = dict(manifest.get("converted") or {}, **(converted or {}))
+        manifest["createdAt"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        _write_json(self.manifest_path, manifest)
+        return manifest
+
+    def verify(self):
+        """Check the manifest's files and the required weights.
+
+        Returns the number of files checked; raises ``ModelArtifactError``
+        listing every problem found.
+        """
+
+        manifest = _read_json(self.manifest_path, None)
+        if not manifest or not isinstance(manifest.get("files"), dict):
+            raise ModelArtifactError(f"No model manifest at {self.manifest_path}")
+        files = manifest["files"]
+
+        problems = []
+        for name in self.required:
+            relative = f"{WEIGHTS_SUBDIR.replace(os.sep, '/')}/{name}"
+            if relative not in files:
+                problems.append(f"{relative} is required but not in the manifest")
+
+        stamps = _read_json(os.path.join(self.root, VERIFIED_STAMP_NAME), {})
+        verified = {}
+        for relative, expected in sorted(files.items()):
+            path = os.path.join(self.root, relative)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                problems.append(f"{relative} is missing")
+                continue
+            if stat.st_size != expected.get("size"):
+                problems.append(f"{relative} is {stat.st_size} bytes, expected {expected.get('size')}")
+                continue
+            stamp = {"size": stat.st_size, "mtimeNs": stat.st_mtime_ns, "sha256": expected.get("sha256")}
+            if stamps.get(relative) != stamp:
+                actual = file_sha256(path)
+                if actual != expected.get("sha256"):
+                    problems.append(f"{relative} has checksum {actual}, expected {expected.get('sha256')}")
+                    continue
+            verified[relative] = stamp
+
+        if problems:
+            raise ModelArtifactError("Model artifacts failed verification: " + "; ".join(problems))
+        try:
+            _write_json(os.path.join(self.root, VERIFIED_STAMP_NAME), verified)
+        except OSError:
+            # A read-only image still works; it just re-hashes on the next boot.
+            pass
+        return len(verified)
+
+    def activate(self, verify=True):
+        """Verify the artifacts and point DeepFace at them."""
+
+        checked = self.verify() if verify else 0
+        os.environ["DEEPFACE_HOME"] = self.root
+        self._logger.info("Using model artifacts from %s (%d files verified)", self.root, checked)
+        return checked
+
+
+def _fetch(manager, model_name, detector_backends):
+    os.environ["DEEPFACE_HOME"] = manager.root
+    os.makedirs(manager.weights_dir, exist_ok=True)
+    from deepface import DeepFace
+
+    DeepFace.build_model(model_name)
+    for backend in detector_backends:
+        if backend in DETECTOR_WEIGHTS and DETECTOR_WEIGHTS[backend]:
+            DeepFace.build_model(backend, task="face_detector")
+    return manager.write_manifest()
+
+
+def _convert(manager, model_name):
+    manager.activate()
+    from deepface import DeepFace
+
+    relative = f"{CONVERTED_SUBDIR}/{converted_model_name(model_name)}"
+    DeepFace.build_model(model_name).model.save(os.path.join(manager.root, relative))
+    return manager.write_manifest(converted={model_name: relative})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare and verify local model weights.")
+    parser.add_argument("command", choices=("fetch", "manifest", "verify", "convert"))
+    parser.add_argument("--dir", default=os.environ.get("MODEL_ARTIFACT_DIR"), help="Artifact directory.")
+    parser.add_argument("--model", default=os.environ.get("FACE_MODEL_NAME", "VGG-Face"))
+    parser.add_argument(
+        "--detectors",
+        default=os.environ.get("FACE_DETECTOR_BACKEND", "retinaface"),
+        help="Comma-separated detector backends to fetch weights for.",
+    )
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("--dir or MODEL_ARTIFACT_DIR is required")
+
+    detectors = [name.strip() for name in args.detectors.split(",") if name.strip()]
+    manager = ModelArtifactManager(args.dir, required=required_weight_files(args.model, detectors))
+    try:
+        if args.command == "fetch":
+            manifest = _fetch(manager, args.model, detectors)
+            print(f"Fetched {len(manifest['files'])} files into {manager.root}")
+        elif args.command == "manifest":
+            manifest = manager.write_manifest()
+            print(f"Recorded {len(manifest['files'])} files in {manager.manifest_path}")
+        elif args.command == "convert":
+            manager.write_manifest()
+            manifest = _convert(manager, args.model)
+            print(f"Saved {args.model} to {manifest['converted'][args.model]}")
+        else:
+            print(f"Verified {manager.verify()} files in {manager.root}")
+    except ModelArtifactError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Cursor pagination over Firestore queries with opaque continuation tokens.
+
+A page is read with ``order_by(<field>) + order_by(__name__)`` and
+``start_after`` the last row of the previous page, so each page costs
+``page_size + 1`` document reads no matter how deep the client has paged.
+The token carries the cursor values plus a fingerprint of the query
+parameters, so a token cannot be replayed against a different class or
+filter.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+
+
+DOCUMENT_ID_FIELD = "__name__"
+
+
+class PageTokenError(ValueError):
+    """Raised when a continuation token is malformed or belongs to another query."""
+
+
+def query_fingerprint(**params):
+    canonical = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_page_token(order_value, document_id, fingerprint):
+    if isinstance(order_value, datetime.datetime):
+        encoded_value = {"t": order_value.isoformat()}
+    else:
+        encoded_value = {"v": order_value}
+    payload = json.dumps({"o": encoded_value, "id": document_id, "q": fingerprint}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_page_token(token, fingerprint):
+    """Return ``(order_value, document_id)`` from a token issued for ``fingerprint``."""
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        encoded_value = payload["o"]
+        if "t" in encoded_value:
+            order_value = datetime.datetime.fromisoformat(encoded_value["t"])
+        else:
+            order_value = encoded_value["v"]
+        document_id = str(payload["id"])
+        token_fingerprint = payload["q"]
+    except (ValueError, KeyError, TypeError) as exc:
+        raise PageTokenError("Invalid page token.") from exc
+
+    if token_fingerprint != fingerprint:
+        raise PageTokenError("Page token does not match this query.")
+    return order_value, document_id
+
+
+def fetch_page(query, collection, order_field, page_size, cursor=None, descending=True):
+    """Run one page of ``query`` and return ``(snapshots, last_cursor_or_None)``.
+
+    ``collection`` is the queried collection reference, used to turn the
+    cursor's document ID back into a reference.  The returned cursor is
+    ``(order_value, document_id)`` for the last row when more rows exist.
+    """
+
+    direction = "DESCENDING" if descending else "ASCENDING"
+    query = query.order_by(order_field, direction=direction).order_by(DOCUMENT_ID_FIELD, direction=direction)
+    if cursor is not None:
+        order_value, document_id = cursor
+        query = query.start_after([order_value, collection.document(document_id)])
+
+    snapshots = list(query.limit(page_size + 1).stream())
+    if len(snapshots) <= page_size:
+        return snapshots, None
+
+    snapshots = snapshots[:page_size]
+    last = snapshots[-1]
+    return snapshots, (last.get(order_field), last.id)
@@ -0,0 +1,194 @@
+"""On-demand sampling profiler for individual requests.
+
+A profiled request gets a sampler thread that snapshots the request thread's
+stack every ``interval`` seconds (``sys._current_frames``), so overhead is
+bounded by the sampling rate rather than by how many calls the code makes.
+Stacks are aggregated per function and written in the collapsed format
+(``outer;inner;leaf count`` per line) that ``flamegraph.pl``, speedscope and
+similar tools read directly.
+
+Profiles are written to ``output_dir`` as
+``{utc-stamp}_{endpoint}_{duration}ms_{pid}.collapsed`` and only the newest
+``max_files`` are kept.
+"""
+
+import collections
+import contextlib
+import datetime
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+
+PROFILE_SUFFIX = ".collapsed"
+_PROFILE_NAME = re.compile(r"^(\d{8}T\d{12}Z)_([A-Za-z0-9_.-]+)_(\d+)ms_(\d+)\.collapsed$")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack on a background thread."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.samples[";".join(reversed(labels))] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+
+def collapsed_lines(samples):
+    return [f"{stack} {count}" for stack, count in sorted(samples.items())]
+
+
+class RequestProfiler:
+    """Decides which requests to profile and stores their collapsed stacks."""
+
+    def __init__(
+        self,
+        output_dir,
+        sample_rate=0.0,
+        interval=0.005,
+        max_files=200,
+        max_concurrent=2,
+        logger=None,
+        rng=None,
+    ):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_files = max_files
+        self._slots = threading.BoundedSemaphore(max(1, int(max_concurrent)))
+        self._logger = logger or logging.getLogger(__name__)
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def should_profile(self, forced=False):
+        if forced:
+            return True
+        if self.sample_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.sample_rate
+
+    def start(self, label):
+        """Start profiling the calling thread; returns a ``stop()`` callable.
+
+        Returns None if too many profiles are running.  ``stop`` writes the
+        profile on its first call and does nothing after that, so it can be
+        handed to code that runs after the view returns (a streamed body).
+        """
+
+        if not self._slots.acquire(blocking=False):
+            return None
+        profiler = SamplingProfiler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        profiler.start()
+        stopped = threading.Event()
+
+        def stop():
+            if stopped.is_set():
+                return
+            stopped.set()
+            samples = profiler.stop()
+            self._slots.release()
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            try:
+                name = self._write(label, duration_ms, samples)
+                self._logger.info("Wrote request profile %s (%d samples)", name, sum(samples.values()))
+            except OSError:
+                self._logger.exception("Could not write request profile for %s", label)
+
+        return stop
+
+    @contextlib.contextmanager
+    def profile(self, label):
+        """Profile the enclosed block; skipped if too many profiles are running."""
+
+        stop = self.start(label)
+        try:
+            yield stop
+        finally:
+            if stop is not None:
+                stop()
+
+    def _write(self, label, duration_ms, samples):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        safe_label = re.sub(r"[^A-Za-z0-9_.-]", "-", label) or "request"
+        name = f"{stamp}_{safe_label}_{duration_ms}ms_{os.getpid()}{PROFILE_SUFFIX}"
+        path = os.path.join(self.output_dir, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write("\n".join(collapsed_lines(samples)))
+            handle.write("\n")
+        self._prune()
+        return name
+
+    def _prune(self):
+        names = sorted(name for name in os.listdir(self.output_dir) if _PROFILE_NAME.match(name))
+        for name in names[:-self.max_files] if self.max_files else ():
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+
+    def list_profiles(self):
+        """Newest-first metadata for the stored profiles."""
+
+        if not os.path.isdir(self.output_dir):
+            return []
+        profiles = []
+        for name in os.listdir(self.output_dir):
+            match = _PROFILE_NAME.match(name)
+            if not match:
+                continue
+            stamp, endpoint, duration_ms, pid = match.groups()
+            created = datetime.datetime.strptime(stamp, "%Y%m%dT%H%M%S%fZ").replace(tzinfo=datetime.timezone.utc)
+            profiles.append({
+                "name": name,
+                "endpoint": endpoint,
+                "durationMs": int(duration_ms),
+                "pid": int(pid),
+                "createdAt": created.isoformat(),
+                "sizeBytes": os.path.getsize(os.path.join(self.output_dir, name)),
+            })
+        profiles.sort(key=lambda profile: profile["name"], reverse=True)
+        return profiles
+
+    def read_profile(self, name):
+        """Return a stored profile's text, or None for unknown or invalid names."""
+
+        if not _PROFILE_NAME.match(name or ""):
+            return None
+        path = os.path.join(self.output_dir, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as handle:
+            return handle.read()
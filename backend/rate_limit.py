@@ -0,0 +1,137 @@
+"""In-process rate limiting and request coalescing for the scan endpoint."""
+
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by arbitrary strings (student ID, client IP, ...).
+
+    Each key refills at ``rate_per_minute`` tokens per minute up to ``burst``
+    tokens.  ``scopes`` gives keys of another kind their own limits, by the
+    prefix before the first ``:`` (``{"student": (6, 3)}``), so one
+    ``try_acquire`` can charge differently-limited buckets together.  Buckets
+    that have refilled completely carry no state and are pruned once the
+    table grows past ``max_keys``.
+    """
+
+    def __init__(self, rate_per_minute, burst, max_keys=10000, clock=time.monotonic, scopes=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = float(burst)
+        self.scopes = {
+            scope: (scope_rate / 60.0, float(scope_burst))
+            for scope, (scope_rate, scope_burst) in (scopes or {}).items()
+        }
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _limits(self, key):
+        """``(rate_per_second, burst)`` for ``key``."""
+
+        return self.scopes.get(key.partition(":")[0], (self.rate_per_second, self.burst))
+
+    def _refill(self, key, now):
+        rate_per_second, burst = self._limits(key)
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate_per_second)
+        return tokens
+
+    def try_acquire(self, *keys, check=()):
+        """Take one token from every bucket in ``keys`` or from none of them.
+
+        Buckets in ``check`` must also hold a token for the call to succeed,
+        but are not charged; ``charge`` takes their token later.
+        Returns ``(allowed, retry_after_seconds)``.
+        """
+
+        keys = [key for key in keys if key]
+        checked = [key for key in check if key]
+        with self._lock:
+            now = self._clock()
+            levels = {key: self._refill(key, now) for key in keys + checked}
+            short = [key for key, tokens in levels.items() if tokens < 1.0]
+            if short:
+                for key, tokens in levels.items():
+                    self._buckets[key] = (tokens, now)
+                rates = [self._limits(key)[0] for key in short]
+                if min(rates) <= 0:
+                    return False, None
+                wait = max((1.0 - levels[key]) / rate for key, rate in zip(short, rates))
+                return False, wait
+
+            for key in keys:
+                self._buckets[key] = (levels[key] - 1.0, now)
+
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+
+        return True, 0.0
+
+    def charge(self, *keys):
+        """Take one token from each bucket in ``keys``, never below empty."""
+
+        with self._lock:
+            now = self._clock()
+            for key in keys:
+                if key:
+                    self._buckets[key] = (max(0.0, self._refill(key, now) - 1.0), now)
+
+    def _prune(self, now):
+        for key in list(self._buckets):
+            if self._refill(key, now) >= self._limits(key)[1]:
+                del self._buckets[key]
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs ``func`` on its own thread; callers that
+    arrive while it is in flight wait for and share its result.
+    """
+
+    def __init__(self, wait_timeout=60.0):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, func):
+        """Return ``(result, shared)`` where ``shared`` marks a coalesced caller."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+
+        if not is_leader:
+            if call.done.wait(self.wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            # The leader is stuck; do the work rather than fail the request.
+            return func(), False
+
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,170 @@
+"""Attendance document ID layouts.
+
+The original layout, ``{classId}_{studentId}_{YYYY-MM-DD}``, sorts every scan
+for a class and day next to each other, so a class-start burst lands on one
+key range (and one Firestore tablet).  The ``hashed`` layout prefixes the
+same key with four hex digits of its SHA-256, which spreads those writes
+across the key space while staying deterministic: a record ID can still be
+computed from ``(class, student, date)`` without a query.
+
+``ATTENDANCE_KEY_LAYOUT`` picks the layout for new records.  Lookups try the
+configured layout first and then the other one, so records written before a
+switch keep resolving.  Existing records can be moved with::
+
+    python -m backend.record_keys --to hashed [--dry-run]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+
+
+KEY_LAYOUTS = ("legacy", "hashed")
+HASH_PREFIX_LENGTH = 4
+# Two writes (create + delete) per migrated record; Firestore allows 500.
+MIGRATION_BATCH_RECORDS = 200
+
+ATTENDANCE_KEY_LAYOUT = os.environ.get("ATTENDANCE_KEY_LAYOUT", "legacy").strip().lower()
+if ATTENDANCE_KEY_LAYOUT not in KEY_LAYOUTS:
+    raise ValueError(f"ATTENDANCE_KEY_LAYOUT must be one of {KEY_LAYOUTS}, got {ATTENDANCE_KEY_LAYOUT!r}")
+
+
+def legacy_record_id(class_id, student_id, date_str):
+    return f"{class_id}_{student_id}_{date_str}"
+
+
+def _hash_prefix(natural_key):
+    return hashlib.sha256(natural_key.encode("utf-8")).hexdigest()[:HASH_PREFIX_LENGTH]
+
+
+def hashed_record_id(class_id, student_id, date_str):
+    natural_key = legacy_record_id(class_id, student_id, date_str)
+    return f"{_hash_prefix(natural_key)}_{natural_key}"
+
+
+def other_layout_id(doc_id):
+    """The same record's ID under the other layout.
+
+    Works on the ID alone, so a client holding an ID from before a migration
+    can still be resolved.
+    """
+
+    prefix, _, natural_key = doc_id.partition("_")
+    if len(prefix) == HASH_PREFIX_LENGTH and natural_key and _hash_prefix(natural_key) == prefix:
+        return natural_key
+    return f"{_hash_prefix(doc_id)}_{doc_id}"
+
+
+def record_id(class_id, student_id, date_str, layout=None):
+    """The document ID for a new record under ``layout`` (default: configured)."""
+
+    layout = layout or ATTENDANCE_KEY_LAYOUT
+    if layout == "hashed":
+        return hashed_record_id(class_id, student_id, date_str)
+    return legacy_record_id(class_id, student_id, date_str)
+
+
+def candidate_record_ids(class_id, student_id, date_str, layout=None):
+    """IDs a record may have, the configured layout first."""
+
+    layout = layout or ATTENDANCE_KEY_LAYOUT
+    other = "legacy" if layout == "hashed" else "hashed"
+    return [record_id(class_id, student_id, date_str, layout), record_id(class_id, student_id, date_str, other)]
+
+
+def find_record(db, collection_name, class_id, student_id, date_str, layout=None):
+    """Return the snapshot of an existing record under either layout, or None.
+
+    Both candidates are fetched in one ``get_all`` round trip.
+    """
+
+    collection = db.collection(collection_name)
+    doc_ids = candidate_record_ids(class_id, student_id, date_str, layout)
+    found = {
+        snapshot.id: snapshot
+        for snapshot in db.get_all([collection.document(doc_id) for doc_id in doc_ids])
+        if snapshot.exists
+    }
+    for doc_id in doc_ids:
+        if doc_id in found:
+            return found[doc_id]
+    return None
+
+
+def migrate_records(db, target_layout, record_date, collection_name="attendance", dry_run=False, logger=print):
+    """Move records whose ID does not match ``target_layout``.
+
+    ``record_date(record)`` returns the record's ``YYYY-MM-DD`` key date.  Each
+    record is copied to its new ID and the old document deleted in the same
+    batch.  Returns ``{"scanned", "moved", "skipped"}``.
+    """
+
+    collection = db.collection(collection_name)
+    counts = {"scanned": 0, "moved": 0, "skipped": 0}
+    batch = db.batch()
+    pending = 0
+
+    for snapshot in collection.stream():
+        counts["scanned"] += 1
+        record = snapshot.to_dict() or {}
+        class_id = record.get("classID")
+        student_id = record.get("studentID") or record.get("studentId")
+        date_str = record_date(record)
+        if not class_id or not student_id or not date_str:
+            counts["skipped"] += 1
+            logger(f"Skipping {snapshot.id}: missing classID, studentID or date")
+            continue
+
+        target_id = record_id(class_id, student_id, date_str, target_layout)
+        if target_id == snapshot.id:
+            continue
+        if snapshot.id not in candidate_record_ids(class_id, student_id, date_str, target_layout):
+            counts["skipped"] += 1
+            logger(f"Skipping {snapshot.id}: ID does not match its fields")
+            continue
+
+        counts["moved"] += 1
+        if dry_run:
+            continue
+        batch.set(collection.document(target_id), record)
+        batch.delete(snapshot.reference)
+        pending += 1
+        if pending >= MIGRATION_BATCH_RECORDS:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move attendance records to another document ID layout.")
+    parser.add_argument("--to", choices=KEY_LAYOUTS, required=True, help="Target layout.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the records that would move.")
+    args = parser.parse_args(argv)
+
+    # Imported lazily so the key helpers work without the Firebase stack.
+    try:
+        from .app import CENTRAL_TZ, db
+    except ImportError:  # pragma: no cover - fallback for script execution
+        from app import CENTRAL_TZ, db
+
+    def record_date(record):
+        value = record.get("date")
+        if hasattr(value, "astimezone"):
+            return value.astimezone(CENTRAL_TZ).strftime("%Y-%m-%d")
+        return None
+
+    counts = migrate_records(db, args.to, record_date, dry_run=args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {counts['moved']} of {counts['scanned']} records ({counts['skipped']} skipped)")
+    if args.to != ATTENDANCE_KEY_LAYOUT:
+        print(f"Set ATTENDANCE_KEY_LAYOUT={args.to} so new records use the same layout.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
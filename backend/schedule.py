@@ -0,0 +1,348 @@
+"""Structured class schedules and a per-weekday "open for attendance" index.
+
+Class documents store their schedule either as the legacy string
+(``"MWF 8:30AM - 9:50AM"``, several blocks separated by ``;``) or as a list of
+``{"days": "TR", "start": "1:00PM", "end": "2:20PM"}`` maps.  Optional
+``termStart``/``termEnd`` dates and a ``holidays`` list bound when the class
+meets at all.  Schedules are parsed once and compiled into sorted interval
+lists, so checking a scan time is a binary search rather than a re-parse.
+"""
+
+import bisect
+import datetime
+import functools
+import json
+
+
+# Students can start scanning this many minutes before class starts.
+EARLY_SCAN_MINUTES = 5
+# Scans up to this many minutes after the start count as present.
+PRESENT_CUTOFF_MINUTES = 15
+
+ALL_DAYS = frozenset(range(7))
+_DAY_TOKENS = (
+    # Longest forms first: "Thu" is Thursday, not "Th" + "U" (Sunday), and
+    # "Th" is not "T" + "h".
+    ("MONDAY", 0), ("TUESDAY", 1), ("WEDNESDAY", 2), ("THURSDAY", 3),
+    ("FRIDAY", 4), ("SATURDAY", 5), ("SUNDAY", 6),
+    ("THURS", 3), ("TUES", 1), ("THUR", 3),
+    ("MON", 0), ("TUE", 1), ("WED", 2), ("THU", 3), ("FRI", 4), ("SAT", 5), ("SUN", 6),
+    ("TH", 3), ("TU", 1), ("SA", 5), ("SU", 6),
+    ("M", 0), ("T", 1), ("W", 2), ("R", 3), ("F", 4), ("S", 5), ("U", 6),
+)
+
+
+def parse_time_12h(timestr):
+    """Parse a 12-hour time such as ``"8:30AM"`` or ``"8:30 am"``."""
+
+    timestr = timestr.strip().upper().replace(" ", "")
+    return datetime.datetime.strptime(timestr, "%I:%M%p").time()
+
+
+def parse_days(text):
+    """Parse days such as ``"MWF"``, ``"TuTh"``, ``"Tue/Thu"`` or ``"Tuesday"``."""
+
+    remaining = text.strip().upper().replace(" ", "").replace("/", "").replace(",", "")
+    days = set()
+    while remaining:
+        for token, weekday in _DAY_TOKENS:
+            if remaining.startswith(token):
+                days.add(weekday)
+                remaining = remaining[len(token):]
+                break
+        else:
+            raise ValueError(f"Unrecognized meeting days: {text!r}")
+    return frozenset(days)
+
+
+def _seconds(time_value):
+    return time_value.hour * 3600 + time_value.minute * 60 + time_value.second
+
+
+class MeetingBlock:
+    """One recurring meeting: a set of weekdays and a start/end time."""
+
+    __slots__ = ("days", "start", "end")
+
+    def __init__(self, days, start, end):
+        if end <= start:
+            raise ValueError("Meeting end time must be after its start time.")
+        self.days = frozenset(days)
+        self.start = start
+        self.end = end
+
+    @property
+    def window_start_seconds(self):
+        return max(0, _seconds(self.start) - EARLY_SCAN_MINUTES * 60)
+
+    @property
+    def end_seconds(self):
+        return _seconds(self.end)
+
+    def on_date(self, day, tzinfo):
+        """Return ``(start_dt, end_dt)`` for this block on ``day``."""
+
+        return (
+            datetime.datetime.combine(day, self.start, tzinfo=tzinfo),
+            datetime.datetime.combine(day, self.end, tzinfo=tzinfo),
+        )
+
+    def __repr__(self):
+        return f"MeetingBlock(days={sorted(self.days)}, start={self.start}, end={self.end})"
+
+
+def parse_block(value):
+    """Parse a block from the legacy string form or a ``days/start/end`` map."""
+
+    if isinstance(value, dict):
+        days_value = value.get("days") or ""
+        days = parse_days(days_value) if days_value else ALL_DAYS
+        return MeetingBlock(days, parse_time_12h(str(value["start"])), parse_time_12h(str(value["end"])))
+
+    parts = str(value).strip().split()
+    if parts and not any(char.isdigit() for char in parts[0]):
+        days = parse_days(parts[0])
+        time_range_str = " ".join(parts[1:])
+    else:
+        # Legacy schedules without day letters meet every day.
+        days = ALL_DAYS
+        time_range_str = " ".join(parts)
+    if "-" not in time_range_str:
+        raise ValueError(f"Schedule block has no time range: {value!r}")
+    start_str, end_str = time_range_str.split("-", 1)
+    return MeetingBlock(days, parse_time_12h(start_str), parse_time_12h(end_str))
+
+
+def _parse_date(value, tzinfo):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None and tzinfo is not None:
+            value = value.astimezone(tzinfo)
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str) and value.strip():
+        return datetime.date.fromisoformat(value.strip()[:10])
+    return None
+
+
+def _parse_holidays(values, tzinfo):
+    holidays = set()
+    for value in values or ():
+        if isinstance(value, str) and ".." in value:
+            first, last = (_parse_date(part, tzinfo) for part in value.split("..", 1))
+            day = first
+            while day <= last:
+                holidays.add(day)
+                day += datetime.timedelta(days=1)
+            continue
+        parsed = _parse_date(value, tzinfo)
+        if parsed:
+            holidays.add(parsed)
+    return frozenset(holidays)
+
+
+class ClassSchedule:
+    """All meeting blocks of one class plus the term bounds and holidays."""
+
+    def __init__(self, blocks, term_start=None, term_end=None, holidays=()):
+        self.blocks = tuple(blocks)
+        self.term_start = term_start
+        self.term_end = term_end
+        self.holidays = frozenset(holidays)
+        # Per weekday: blocks sorted by scan-window start, plus the start keys
+        # for bisect.
+        self._by_weekday = {}
+        for weekday in range(7):
+            day_blocks = sorted(
+                (block for block in self.blocks if weekday in block.days),
+                key=lambda block: block.window_start_seconds,
+            )
+            self._by_weekday[weekday] = (
+                [block.window_start_seconds for block in day_blocks],
+                day_blocks,
+            )
+
+    def meets_on(self, day):
+        if self.term_start and day < self.term_start:
+            return False
+        if self.term_end and day > self.term_end:
+            return False
+        if day in self.holidays:
+            return False
+        return bool(self._by_weekday[day.weekday()][1])
+
+    def session_for(self, now):
+        """Return the block that governs a scan at ``now`` or None.
+
+        This is the block whose scan window contains ``now``; failing that,
+        the next block later today, or the last one that already ended, so
+        callers can report "too early" / "too late" precisely.
+        """
+
+        day = now.date()
+        if not self.meets_on(day):
+            return None
+
+        starts, blocks = self._by_weekday[day.weekday()]
+        seconds = _seconds(now.time())
+        position = bisect.bisect_right(starts, seconds)
+        if position == 0:
+            return blocks[0]
+        candidate = blocks[position - 1]
+        if seconds <= candidate.end_seconds or position == len(blocks):
+            return candidate
+        return blocks[position]
+
+
+def get_attendance_status(now_dt, start_dt, end_dt):
+    # Students can start scanning their attendance 5 minutes before class starts
+    allowed_start = start_dt - datetime.timedelta(minutes=EARLY_SCAN_MINUTES)
+    # Up to 15 minutes after class start is considered present
+    present_cutoff = start_dt + datetime.timedelta(minutes=PRESENT_CUTOFF_MINUTES)
+
+    if now_dt < allowed_start:
+        return None, "Attendance cannot be recorded before the allowed time." # If attempted before allowed time
+    if now_dt > end_dt:
+        return None, "Attendance cannot be recorded after the allowed time." # If attempted after class end time
+    if now_dt <= present_cutoff:
+        return "Present", None
+    else:
+        return "Late", None
+
+
+def _key_value(value, tzinfo):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return _parse_date(value, tzinfo).isoformat()
+    if isinstance(value, dict):
+        return {str(key): _key_value(item, tzinfo) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_key_value(item, tzinfo) for item in value]
+    return value
+
+
+def _schedule_cache_key(class_data, tzinfo):
+    fields = {
+        key: _key_value(class_data.get(key), tzinfo)
+        for key in ("schedule", "termStart", "termEnd", "holidays")
+    }
+    return json.dumps(fields, sort_keys=True, default=str)
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_schedule(cache_key, tzinfo):
+    fields = json.loads(cache_key)
+    raw_schedule = fields.get("schedule")
+    term_start = fields.get("termStart")
+    term_end = fields.get("termEnd")
+    holidays = fields.get("holidays")
+
+    if isinstance(raw_schedule, dict):
+        term_start = raw_schedule.get("termStart", term_start)
+        term_end = raw_schedule.get("termEnd", term_end)
+        holidays = raw_schedule.get("holidays", holidays)
+        raw_schedule = raw_schedule.get("blocks")
+
+    if isinstance(raw_schedule, str):
+        raw_blocks = [part for part in raw_schedule.split(";") if part.strip()]
+    else:
+        raw_blocks = list(raw_schedule or [])
+
+    if not raw_blocks:
+        return None
+
+    return ClassSchedule(
+        [parse_block(block) for block in raw_blocks],
+        term_start=_parse_date(term_start, tzinfo),
+        term_end=_parse_date(term_end, tzinfo),
+        holidays=_parse_holidays(holidays, tzinfo),
+    )
+
+
+def schedule_for_class(class_data, tzinfo=None):
+    """Return the compiled ``ClassSchedule`` for a class document, or None.
+
+    Compiled schedules are cached by the schedule fields' content, so repeated
+    scans against the same class do not re-parse the strings.  Raises
+    ``ValueError`` for malformed schedules.
+    """
+
+    return _compile_schedule(_schedule_cache_key(class_data, tzinfo), tzinfo)
+
+
+class ScheduleIndex:
+    """Answers "which classes are open for attendance right now?".
+
+    For each weekday the scan windows of every class are cut into elementary
+    segments between consecutive window boundaries, and each segment stores
+    the classes open throughout it.  A lookup is a single binary search on
+    the boundaries followed by the term/holiday check for the few classes in
+    that segment.
+    """
+
+    def __init__(self, schedules):
+        self._schedules = dict(schedules)
+        self._days = {}
+        for weekday in range(7):
+            intervals = []
+            for class_id, schedule in self._schedules.items():
+                for block in schedule.blocks:
+                    if weekday in block.days:
+                        # Windows are inclusive of the end minute.
+                        intervals.append((block.window_start_seconds, block.end_seconds + 1, class_id, block))
+
+            # Sweep over the window boundaries, keeping the set of open windows.
+            starts_at = {}
+            ends_at = {}
+            for interval in intervals:
+                starts_at.setdefault(interval[0], []).append(interval)
+                ends_at.setdefault(interval[1], []).append(interval)
+            boundaries = sorted(set(starts_at) | set(ends_at))
+            active = {}
+            segments = []
+            for point in boundaries[:-1]:
+                for interval in ends_at.get(point, ()):
+                    active.pop(id(interval), None)
+                for interval in starts_at.get(point, ()):
+                    active[id(interval)] = interval
+                segments.append(tuple((class_id, block) for _start, _end, class_id, block in active.values()))
+            self._days[weekday] = (boundaries, segments)
+
+    def __len__(self):
+        return len(self._schedules)
+
+    def schedule(self, class_id):
+        return self._schedules.get(class_id)
+
+    def open_classes(self, now):
+        """Return ``(class_id, block)`` pairs whose scan window contains ``now``."""
+
+        boundaries, segments = self._days[now.weekday()]
+        position = bisect.bisect_right(boundaries, _seconds(now.time())) - 1
+        if position < 0 or position >= len(segments):
+            return []
+        day = now.date()
+        return [
+            (class_id, block)
+            for class_id, block in segments[position]
+            if self._schedules[class_id].meets_on(day)
+        ]
+
+
+def build_schedule_index(class_snapshots, tzinfo=None, logger=None):
+    """Compile an index from ``classes`` collection snapshots.
+
+    Classes with a missing or malformed schedule are skipped.
+    """
+
+    schedules = {}
+    for snapshot in class_snapshots:
+        data = snapshot.to_dict() or {}
+        try:
+            schedule = schedule_for_class(data, tzinfo)
+        except (ValueError, KeyError, TypeError) as exc:
+            if logger is not None:
+                logger.warning("Skipping class %s with invalid schedule: %s", snapshot.id, exc)
+            continue
+        if schedule is not None:
+            schedules[snapshot.id] = schedule
+    return ScheduleIndex(schedules)
@@ -0,0 +1,235 @@
+"""Seed data for local runs against the emulators or the in-memory store.
+
+Firestore seed files are JSON objects of ``{collection: {doc_id: fields}}``.
+Timestamps are written as ``{"$timestamp": "2024-04-01T09:05:00-05:00"}`` so
+range filters on ``date`` behave as they do against real data.  Storage seeds
+are directories whose relative paths become blob names (``known_faces/...``).
+
+Load a seed into the emulators (``BACKEND_DATA_MODE=emulator``)::
+
+    python -m backend.seed_data --firestore seed.json --storage-dir seed_blobs
+
+or generate a synthetic data set for benchmarking the export path::
+
+    python -m backend.seed_data --generate 20 --students 60 --days 90 --output seed.json
+
+In ``BACKEND_DATA_MODE=memory`` the backend loads ``LOCAL_SEED_FIRESTORE`` and
+``LOCAL_SEED_STORAGE_DIR`` into each worker's store at startup.
+"""
+
+import argparse
+import base64
+import datetime
+import json
+import os
+import random
+import sys
+from zoneinfo import ZoneInfo
+
+try:
+    from .record_keys import record_id
+except ImportError:  # pragma: no cover - fallback for script execution
+    from record_keys import record_id
+
+
+BATCH_WRITE_LIMIT = 500
+CENTRAL_TZ = ZoneInfo("America/Chicago")
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if set(value) == {"$timestamp"}:
+            return datetime.datetime.fromisoformat(value["$timestamp"])
+        return {key: _decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"$timestamp": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: _encode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def read_firestore_seed(path):
+    with open(path, "r", encoding="utf-8") as handle:
+        return {
+            collection: {doc_id: _decode_value(fields) for doc_id, fields in documents.items()}
+            for collection, documents in json.load(handle).items()
+        }
+
+
+def write_firestore_seed(path, seed):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(
+            {
+                collection: {doc_id: _encode_value(fields) for doc_id, fields in documents.items()}
+                for collection, documents in seed.items()
+            },
+            handle,
+        )
+
+
+def load_firestore_seed(db, seed):
+    """Write ``seed`` (a dict or a seed file path) with batched commits."""
+
+    if isinstance(seed, str):
+        seed = read_firestore_seed(seed)
+
+    written = 0
+    batch = db.batch()
+    pending = 0
+    for collection, documents in seed.items():
+        for doc_id, fields in documents.items():
+            batch.set(db.collection(collection).document(doc_id), fields)
+            pending += 1
+            if pending == BATCH_WRITE_LIMIT:
+                batch.commit()
+                written += pending
+                batch = db.batch()
+                pending = 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
+
+
+def load_storage_seed(bucket, directory, prefix=""):
+    """Upload every file under ``directory`` into ``bucket``."""
+
+    count = 0
+    for root, _dirs, files in os.walk(directory):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = prefix + os.path.relpath(path, directory).replace(os.sep, "/")
+            bucket.blob(name).upload_from_filename(path)
+            count += 1
+    return count
+
+
+def synthetic_seed(class_count, students_per_class, days, start_date=None, seed=0):
+    """Build teachers, classes, students and ``days`` of finalized attendance."""
+
+    rng = random.Random(seed)
+    start_date = start_date or datetime.date.today() - datetime.timedelta(days=days)
+    data = {"users": {}, "classes": {}, "attendance": {}}
+
+    for class_index in range(class_count):
+        teacher_id = f"teacher{class_index:03d}"
+        class_id = f"CLS{class_index:03d}"
+        data["users"][teacher_id] = {
+            "role": "teacher",
+            "email": f"{teacher_id}@example.edu",
+            "fname": "Teacher",
+            "lname": str(class_index),
+        }
+        student_ids = [f"S{class_index:03d}{student:03d}" for student in range(students_per_class)]
+        for student_id in student_ids:
+            data["users"][student_id] = {
+                "role": "student",
+                "id": student_id,
+                "fname": "Student",
+                "lname": student_id,
+            }
+        data["classes"][class_id] = {
+            "name": f"Class {class_index}",
+            "teacher": teacher_id,
+            "schedule": "MWF 9:00 AM - 9:50 AM",
+            "students": student_ids,
+        }
+
+        for offset in range(days):
+            day = start_date + datetime.timedelta(days=offset)
+            if day.weekday() not in (0, 2, 4):
+                continue
+            class_start = datetime.datetime.combine(day, datetime.time(9, 0), tzinfo=CENTRAL_TZ)
+            for student_id in student_ids:
+                roll = rng.random()
+                if roll < 0.08:
+                    continue
+                minutes = rng.randint(-4, 14) if roll < 0.9 else rng.randint(16, 40)
+                scanned_at = class_start + datetime.timedelta(minutes=minutes)
+                status = "Present" if minutes <= 15 else "Late"
+                data["attendance"][record_id(class_id, student_id, day.isoformat())] = {
+                    "studentID": student_id,
+                    "classID": class_id,
+                    "date": scanned_at,
+                    "status": status,
+                    "proposedStatus": status,
+                    "finalizedAt": scanned_at + datetime.timedelta(minutes=45),
+                }
+    return data
+
+
+def mint_emulator_id_token(uid, email=None, project_id="demo-attendance"):
+    """Return an unsigned ID token accepted when FIREBASE_AUTH_EMULATOR_HOST is set."""
+
+    now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    claims = {
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "aud": project_id,
+        "auth_time": now,
+        "iat": now,
+        "exp": now + 3600,
+        "sub": uid,
+        "user_id": uid,
+        "firebase": {"sign_in_provider": "custom", "identities": {}},
+    }
+    if email:
+        claims["email"] = email
+
+    def segment(payload):
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    return f"{segment({'alg': 'none', 'typ': 'JWT'})}.{segment(claims)}."
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load or generate local seed data.")
+    parser.add_argument("--firestore", help="Firestore seed JSON to load.")
+    parser.add_argument("--storage-dir", help="Directory of files to upload to the bucket.")
+    parser.add_argument("--generate", type=int, metavar="CLASSES", help="Generate a synthetic seed instead.")
+    parser.add_argument("--students", type=int, default=40, help="Students per generated class.")
+    parser.add_argument("--days", type=int, default=60, help="Days of generated attendance.")
+    parser.add_argument("--output", help="Where to write the generated seed JSON.")
+    parser.add_argument("--mint-token", metavar="UID", help="Print an auth-emulator ID token for UID.")
+    parser.add_argument("--email", help="Email claim for --mint-token.")
+    parser.add_argument("--project", default="demo-attendance", help="Project ID for --mint-token.")
+    args = parser.parse_args(argv)
+
+    if args.mint_token:
+        print(mint_emulator_id_token(args.mint_token, args.email, args.project))
+        return 0
+
+    if args.generate:
+        if not args.output:
+            parser.error("--generate requires --output")
+        seed = synthetic_seed(args.generate, args.students, args.days)
+        write_firestore_seed(args.output, seed)
+        print(f"Wrote {sum(len(docs) for docs in seed.values())} documents to {args.output}")
+        return 0
+
+    if not args.firestore and not args.storage_dir:
+        parser.error("nothing to do: pass --firestore, --storage-dir, --generate or --mint-token")
+
+    # Imported lazily so the generator works without the Firebase stack.
+    from .app import BACKEND_DATA_MODE, bucket, db
+
+    if BACKEND_DATA_MODE == "firebase":
+        print("Refusing to seed the production project; set BACKEND_DATA_MODE=emulator.", file=sys.stderr)
+        return 1
+    if args.firestore:
+        print(f"Wrote {load_firestore_seed(db, args.firestore)} documents")
+    if args.storage_dir:
+        print(f"Uploaded {load_storage_seed(bucket, args.storage_dir)} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import numpy as np
+
+import backend.ann_index as ann_index
+from backend.ann_index import IndexHandle, IVFIndex, add_to_index, build_ivf_index, remove_from_index
+
+
+def _random_embeddings(count, dimension=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_search_finds_enrolled_student(tmp_path):
+    vectors = _random_embeddings(200)
+    student_ids = [f"S{i:04d}" for i in range(200)]
+    build_ivf_index(str(tmp_path), student_ids, vectors, "VGG-Face", nlist=8, dtype="float32")
+
+    index = IVFIndex(str(tmp_path))
+    matches = index.search(vectors[37], k=3, nprobe=8)
+
+    assert matches[0][0] == "S0037"
+    assert abs(matches[0][1]) < 1e-5
+    assert len({student_id for student_id, _ in matches}) == 3
+
+
+def test_incremental_insert_is_searchable_and_bumps_generation(tmp_path):
+    vectors = _random_embeddings(50)
+    build_ivf_index(str(tmp_path), [f"S{i}" for i in range(50)], vectors, "VGG-Face", nlist=4)
+    handle = IndexHandle(str(tmp_path), refresh_seconds=0)
+    first = handle.get()
+
+    new_vector = _random_embeddings(1, seed=99)
+    add_to_index(str(tmp_path), ["NEW1"], new_vector)
+
+    refreshed = handle.get()
+    assert refreshed is not first
+    assert refreshed.generation == first.generation + 1
+    assert refreshed.search(new_vector[0], k=1)[0][0] == "NEW1"
+
+
+def test_handle_without_directory_returns_none():
+    assert IndexHandle("").get() is None
+
+
+def test_inserts_publish_new_versions_and_leave_open_readers_consistent(tmp_path):
+    vectors = _random_embeddings(50)
+    build_ivf_index(str(tmp_path), [f"S{i}" for i in range(50)], vectors, "VGG-Face", nlist=4)
+    reader = IVFIndex(str(tmp_path))
+    assert (tmp_path / "CURRENT").is_symlink()
+
+    for seed in range(3):
+        add_to_index(str(tmp_path), [f"NEW{seed}"], _random_embeddings(1, seed=100 + seed))
+
+    # The reader's version is never rewritten, so its delta rows and IDs still agree.
+    assert len(reader.delta_ids) == len(reader.delta) == 0
+    assert reader.search(vectors[7], k=1)[0][0] == "S7"
+
+    latest = IVFIndex(str(tmp_path))
+    assert latest.directory != reader.directory
+    assert latest.delta_ids == ["NEW0", "NEW1", "NEW2"] and len(latest.delta) == 3
+    assert len(list((tmp_path / "versions").iterdir())) == 2
+
+
+def test_reenrolling_replaces_rows_in_both_segments(tmp_path):
+    vectors = _random_embeddings(50)
+    build_ivf_index(str(tmp_path), [f"S{i}" for i in range(50)], vectors, "VGG-Face", nlist=4)
+    add_to_index(str(tmp_path), ["NEW1"], _random_embeddings(1, seed=98))
+
+    replacement = _random_embeddings(2, seed=99)
+    add_to_index(str(tmp_path), ["S7", "NEW1"], replacement)
+
+    index = IVFIndex(str(tmp_path))
+    assert index.delta_ids == ["S7", "NEW1"]
+    assert len(index) == 51
+    # S7's original main-segment row is tombstoned, not matched.
+    assert all(student_id != "S7" for student_id, _ in index.search(vectors[7], k=5, nprobe=4))
+    assert index.search(replacement[0], k=1)[0][0] == "S7"
+
+    remove_from_index(str(tmp_path), ["S7"])
+    index = IVFIndex(str(tmp_path))
+    assert index.delta_ids == ["NEW1"] and len(index) == 50
+    assert all(student_id != "S7" for student_id, _ in index.search(replacement[0], k=5, nprobe=4))
+
+
+def test_compaction_drops_tombstoned_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "DELTA_COMPACT_ROWS", 1)
+    vectors = _random_embeddings(50)
+    build_ivf_index(str(tmp_path), [f"S{i}" for i in range(50)], vectors, "VGG-Face", nlist=4)
+
+    meta = add_to_index(str(tmp_path), ["S3", "S4"], _random_embeddings(2, seed=7))
+
+    index = IVFIndex(str(tmp_path))
+    assert meta["count"] == 50 and meta["tombstoneCount"] == 0
+    assert sorted(index.ids).count("S3") == 1 and index.live.all()
@@ -0,0 +1,149 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+from backend.attendance_archive import (
+    AttendanceArchive,
+    archive_finalized,
+    decode_partition,
+    encode_partition,
+    months_between,
+)
+from backend.memory_store import InMemoryBucket, InMemoryFirestore
+
+
+CENTRAL = ZoneInfo("America/Chicago")
+
+
+def _at(year, month, day, hour=9):
+    return datetime.datetime(year, month, day, hour, tzinfo=CENTRAL)
+
+
+def _seed(db):
+    records = {
+        "CSCE1_s1_2024-09-03": {"classID": "CSCE1", "studentID": "s1", "date": _at(2024, 9, 3), "status": "Present",
+                                "verification": {"distance": 0.31, "verifiedAt": _at(2024, 9, 3)}},
+        "CSCE1_s2_2024-09-03": {"classID": "CSCE1", "studentID": "s2", "date": _at(2024, 9, 3), "status": "Late"},
+        "CSCE1_s1_2024-10-01": {"classID": "CSCE1", "studentID": "s1", "date": _at(2024, 10, 1), "status": "Rejected"},
+        "CSCE1_s2_2024-10-01": {"classID": "CSCE1", "studentID": "s2", "date": _at(2024, 10, 1), "status": "pending"},
+        "CSCE2_s3_2024-09-04": {"classID": "CSCE2", "studentID": "s3", "date": _at(2024, 9, 4), "status": "Present"},
+        "CSCE2_s4_2024-09-04": {"classID": "CSCE2", "studentID": "s4", "date": _at(2024, 9, 4), "status": "Present",
+                                "verificationState": "error"},
+        "CSCE1_s1_2025-01-14": {"classID": "CSCE1", "studentID": "s1", "date": _at(2025, 1, 14), "status": "Present"},
+    }
+    for doc_id, record in records.items():
+        db.collection("attendance").document(doc_id).set(record)
+    return records
+
+
+def test_partition_round_trip_keeps_types_and_drops_missing_fields():
+    records = {
+        "a": {"status": "Present", "date": _at(2024, 9, 3), "verification": {"distance": 0.2}},
+        "b": {"status": "Late", "date": _at(2024, 9, 4), "day": datetime.date(2024, 9, 4)},
+    }
+    decoded = decode_partition(encode_partition("CSCE1", "2024-09", records))
+    assert decoded == records
+
+
+def test_months_between_spans_year_boundary():
+    assert months_between(datetime.date(2024, 11, 20), datetime.date(2025, 2, 1)) == [
+        "2024-11", "2024-12", "2025-01", "2025-02",
+    ]
+
+
+def test_archive_moves_only_finalized_records_before_cutoff():
+    db = InMemoryFirestore()
+    records = _seed(db)
+    bucket = InMemoryBucket()
+    archive = AttendanceArchive("bucket", bucket_getter=lambda: bucket, tz=CENTRAL)
+
+    counts = archive_finalized(db, archive, _at(2025, 1, 1, 0), logger=lambda message: None)
+
+    assert counts == {"scanned": 6, "archived": 4, "skipped": 2, "changed": 0, "partitions": 3}
+    remaining = sorted(doc.id for doc in db.collection("attendance").stream())
+    assert remaining == ["CSCE1_s1_2025-01-14", "CSCE1_s2_2024-10-01", "CSCE2_s4_2024-09-04"]
+    assert sorted(bucket._objects) == [
+        "attendance_archive/CSCE1/2024-09.json.gz",
+        "attendance_archive/CSCE1/2024-10.json.gz",
+        "attendance_archive/CSCE2/2024-09.json.gz",
+    ]
+    assert archive.read_partition("CSCE1", "2024-09") == {
+        doc_id: records[doc_id] for doc_id in ("CSCE1_s1_2024-09-03", "CSCE1_s2_2024-09-03")
+    }
+
+
+def test_dry_run_and_rerun_merge(tmp_path):
+    db = InMemoryFirestore()
+    _seed(db)
+    archive = AttendanceArchive("local", output_dir=str(tmp_path), tz=CENTRAL)
+
+    counts = archive_finalized(db, archive, _at(2025, 1, 1, 0), dry_run=True)
+    assert counts["archived"] == 4
+    assert not any(tmp_path.iterdir())
+    assert len(list(db.collection("attendance").stream())) == 7
+
+    archive_finalized(db, archive, _at(2024, 10, 1, 0), logger=lambda message: None)
+    archive_finalized(db, archive, _at(2025, 1, 1, 0), logger=lambda message: None)
+    assert len(archive.read_partition("CSCE1", "2024-09")) == 2
+    assert len(archive.read_partition("CSCE1", "2024-10")) == 1
+
+
+def test_records_changed_during_the_run_stay_live_until_the_next_run():
+    db = InMemoryFirestore()
+    _seed(db)
+    bucket = InMemoryBucket()
+    archive = AttendanceArchive("bucket", bucket_getter=lambda: bucket, tz=CENTRAL)
+    written = []
+    write_partition = archive.write_partition
+
+    def write_then_correct(class_id, month, records):
+        written.append(month)
+        total = write_partition(class_id, month, records)
+        if class_id == "CSCE1" and month == "2024-09":
+            # An import corrects the record after it was read, before its delete.
+            db.collection("attendance").document("CSCE1_s2_2024-09-03").update({"status": "Present"})
+        return total
+
+    archive.write_partition = write_then_correct
+    counts = archive_finalized(db, archive, _at(2025, 1, 1, 0), logger=lambda message: None)
+
+    assert counts["changed"] == 1 and counts["archived"] == 4
+    # Months are written as the date-ordered scan passes them.
+    assert written == ["2024-09", "2024-09", "2024-10"]
+    live = db.collection("attendance").document("CSCE1_s2_2024-09-03").get()
+    assert live.exists and live.to_dict()["status"] == "Present"
+    assert not db.collection("attendance").document("CSCE1_s1_2024-09-03").get().exists
+
+    archive.write_partition = write_partition
+    assert archive_finalized(db, archive, _at(2025, 1, 1, 0), logger=lambda message: None)["changed"] == 0
+    assert archive.read_partition("CSCE1", "2024-09")["CSCE1_s2_2024-09-03"]["status"] == "Present"
+    assert not db.collection("attendance").document("CSCE1_s2_2024-09-03").get().exists
+
+
+def test_concurrent_partition_writes_merge_instead_of_overwriting():
+    bucket = InMemoryBucket()
+    archive = AttendanceArchive("bucket", bucket_getter=lambda: bucket, tz=CENTRAL)
+    other = AttendanceArchive("bucket", bucket_getter=lambda: bucket, tz=CENTRAL)
+    read_bytes = archive._read_bytes
+    raced = []
+
+    def read_then_race(name):
+        result = read_bytes(name)
+        if not raced:
+            # Another archiver writes the same partition between our read and write.
+            raced.append(other.write_partition("CSCE1", "2024-09", {"b": {"status": "Late"}}))
+        return result
+
+    archive._read_bytes = read_then_race
+    assert archive.write_partition("CSCE1", "2024-09", {"a": {"status": "Present"}}) == 2
+    assert archive.read_partition("CSCE1", "2024-09") == {"a": {"status": "Present"}, "b": {"status": "Late"}}
+
+
+def test_read_range_filters_by_date(tmp_path):
+    db = InMemoryFirestore()
+    _seed(db)
+    archive = AttendanceArchive("local", output_dir=str(tmp_path), tz=CENTRAL)
+    archive_finalized(db, archive, _at(2025, 1, 1, 0), logger=lambda message: None)
+
+    matches = archive.read_range("CSCE1", _at(2024, 9, 1, 0), _at(2024, 9, 30, 23))
+    assert sorted(doc_id for doc_id, _ in matches) == ["CSCE1_s1_2024-09-03", "CSCE1_s2_2024-09-03"]
+    assert archive.read_range("CSCE1", _at(2023, 1, 1, 0), _at(2023, 2, 1, 0)) == []
@@ -0,0 +1,128 @@
+import datetime
+import io
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from backend.attendance_import import ImportHeaderError, apply_import, iter_import_rows
+from backend.memory_store import InMemoryFirestore
+from backend.record_keys import hashed_record_id, legacy_record_id
+
+
+CENTRAL = ZoneInfo("America/Chicago")
+SERVER_TIMESTAMP = object()
+DELETE_FIELD = object()
+NOW = datetime.datetime(2025, 3, 5, 15, 0, tzinfo=CENTRAL)
+
+CSV = """﻿studentName,studentId,date,status,checkInAt,decidedAt,decisionMethod
+Ada Lovelace,s1,2025-03-04,present,2025-03-04T09:02:00-06:00,,
+Alan Turing,s2,2025-03-04,Late,,,
+Grace Hopper,s3,2025-03-04,Absent,,,
+Nobody,s9,2025-03-04,Present,,,
+Ada Lovelace,s1,2025-03-04,Late,,,
+Bad Row,s4,03/04/2025,Sick,yesterday,,
+Edsger Dijkstra,s5,2025-03-04,Present,,,
+Outsider,s6,2025-03-04,Present,,,
+"""
+
+
+def _rows(text, max_rows=None):
+    return iter_import_rows(io.StringIO(text.lstrip("﻿"), newline=""), CENTRAL, max_rows=max_rows)
+
+
+def _import(db, text, max_rows=None, **kwargs):
+    return apply_import(
+        db,
+        "CSCE1",
+        _rows(text, max_rows=max_rows),
+        lambda ids: {"s1", "s2", "s3", "s5", "s6"} & set(ids),
+        CENTRAL,
+        SERVER_TIMESTAMP,
+        DELETE_FIELD,
+        roster={"s1", "s2", "s3", "s5"},
+        layout="legacy",
+        now=NOW,
+        **kwargs,
+    )
+
+
+def _db():
+    db = InMemoryFirestore(server_timestamp=SERVER_TIMESTAMP, delete_field=DELETE_FIELD)
+    attendance = db.collection("attendance")
+    # s2 has a pending scan stored under the hashed layout.
+    attendance.document(hashed_record_id("CSCE1", "s2", "2025-03-04")).set({
+        "studentID": "s2", "classID": "CSCE1", "date": datetime.datetime(2025, 3, 4, 9, 20, tzinfo=CENTRAL),
+        "status": "pending", "isPending": True, "proposedStatus": "Late", "verificationState": "deferred",
+    })
+    # s3 is already recorded as absent by an earlier import.
+    attendance.document(legacy_record_id("CSCE1", "s3", "2025-03-04")).set({
+        "studentID": "s3", "classID": "CSCE1", "status": "Absent", "decisionMethod": "manual_import",
+    })
+    return db
+
+
+def test_validation_reports_each_problem():
+    rows = list(_rows(CSV))
+    bad = {row.line: row.errors for row in rows if row.errors}
+    assert bad[6] == ["Duplicate of line 2."]
+    assert len(bad[7]) == 3
+    assert rows[0].status == "Present"
+    assert rows[0].check_in_at == datetime.datetime(2025, 3, 4, 9, 2, tzinfo=CENTRAL)
+
+
+def test_missing_required_column_is_rejected():
+    with pytest.raises(ImportHeaderError, match="status"):
+        list(_rows("studentId,date\ns1,2025-03-04\n"))
+
+
+def test_row_limit_is_reported():
+    rows = list(_rows(CSV, max_rows=2))
+    assert len(rows) == 3
+    assert "Row limit of 2" in rows[-1].errors[0] and rows[-1].limit_reached
+
+    report = _import(_db(), CSV.lstrip("﻿"), max_rows=2)
+    assert report["rows"] == 2 and report["failed"] == 0 and report["rowLimitReached"]
+    assert report["errors"][-1]["line"] == 4
+
+
+def test_import_upserts_and_reports_per_row_errors():
+    db = _db()
+    report = _import(db, CSV.lstrip("﻿"))
+
+    assert {key: report[key] for key in ("rows", "created", "updated", "unchanged", "failed")} == {
+        "rows": 8, "created": 2, "updated": 1, "unchanged": 1, "failed": 4,
+    }
+    assert sorted(error["line"] for error in report["errors"]) == [5, 6, 7, 9]
+
+    attendance = db.collection("attendance")
+    created = attendance.document(legacy_record_id("CSCE1", "s1", "2025-03-04")).get().to_dict()
+    assert created["status"] == "Present"
+    assert created["date"] == datetime.datetime(2025, 3, 4, 9, 2, tzinfo=CENTRAL)
+    assert created["decisionMethod"] == "manual_import"
+
+    updated = attendance.document(hashed_record_id("CSCE1", "s2", "2025-03-04")).get().to_dict()
+    assert updated["status"] == "Late"
+    assert not {"isPending", "proposedStatus", "verificationState"} & set(updated)
+    assert not attendance.document(legacy_record_id("CSCE1", "s2", "2025-03-04")).get().exists
+
+
+def test_dry_run_writes_nothing_and_chunks_commit_separately():
+    db = _db()
+    report = _import(db, CSV.lstrip("﻿"), dry_run=True, chunk_size=2)
+    assert report["created"] == 2 and report["updated"] == 1
+    assert len(list(db.collection("attendance").stream())) == 2
+
+
+def test_timestamp_only_corrections_are_written():
+    db = _db()
+    text = "studentId,date,status,checkInAt,decidedAt\n" + "s3,2025-03-04,Absent,,\n"
+    assert _import(db, text)["unchanged"] == 1
+
+    corrected = "studentId,date,status,checkInAt,decidedAt\n" + "s3,2025-03-04,Absent,,2025-03-04T17:00:00-06:00\n"
+    assert _import(db, corrected)["updated"] == 1
+    record = db.collection("attendance").document(legacy_record_id("CSCE1", "s3", "2025-03-04")).get().to_dict()
+    assert record["decidedAt"] == datetime.datetime(2025, 3, 4, 17, 0, tzinfo=CENTRAL)
+    assert _import(db, corrected)["unchanged"] == 1
+
+    check_in = "studentId,date,status,checkInAt\n" + "s3,2025-03-04,Absent,2025-03-04T09:10:00\n"
+    assert _import(db, check_in)["updated"] == 1
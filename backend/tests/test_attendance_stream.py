@@ -0,0 +1,155 @@
+import datetime
+import types
+
+import pytest
+
+from zoneinfo import ZoneInfo
+
+from backend.attendance_stream import AttendanceStatusBroadcaster, StreamLimitReached, format_sse
+
+
+CENTRAL_TZ = ZoneInfo("America/Chicago")
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeWatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.unsubscribed = False
+
+    def unsubscribe(self):
+        self.unsubscribed = True
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self._db = db
+        self.filters = []
+
+    def where(self, field, op, value):
+        self.filters.append((field, op, value))
+        return self
+
+    def on_snapshot(self, callback):
+        watch = FakeWatch(callback)
+        self._db.watches.append(watch)
+        return watch
+
+
+class FakeDb:
+    def __init__(self):
+        self.watches = []
+
+    def collection(self, _name):
+        return FakeQuery(self)
+
+
+def _change(kind, doc_id, data):
+    return types.SimpleNamespace(
+        type=types.SimpleNamespace(name=kind),
+        document=FakeSnapshot(doc_id, data),
+    )
+
+
+def _drain(subscription):
+    events = []
+    for item in subscription.events(heartbeat_seconds=0.01):
+        if item is None:
+            break
+        events.append(item)
+    return events
+
+
+def test_subscribers_share_one_listener_per_class():
+    db = FakeDb()
+    broadcaster = AttendanceStatusBroadcaster(lambda: db, CENTRAL_TZ)
+    now = datetime.datetime(2024, 4, 1, 9, 0, tzinfo=CENTRAL_TZ)
+
+    first = broadcaster.subscribe("CPSC101", now=now)
+    second = broadcaster.subscribe("CPSC101", now=now)
+
+    assert len(db.watches) == 1
+    assert broadcaster.listener_count() == 1
+
+    first.close()
+    assert not db.watches[0].unsubscribed
+    second.close()
+    assert db.watches[0].unsubscribed
+    assert broadcaster.listener_count() == 0
+
+
+def test_only_status_changes_are_broadcast():
+    db = FakeDb()
+    broadcaster = AttendanceStatusBroadcaster(lambda: db, CENTRAL_TZ)
+    now = datetime.datetime(2024, 4, 1, 9, 0, tzinfo=CENTRAL_TZ)
+    subscription = broadcaster.subscribe("CPSC101", now=now)
+    callback = db.watches[0].callback
+
+    pending = {"studentID": "A1", "status": "pending", "proposedStatus": "Present"}
+    callback([], [_change("ADDED", "rec-1", pending)], None)
+    callback([], [_change("MODIFIED", "rec-1", dict(pending, networkEvidence={"remoteAddr": "10.0.0.1"}))], None)
+    callback([], [_change("MODIFIED", "rec-1", dict(pending, status="Present"))], None)
+
+    events = _drain(subscription)
+
+    assert [name for name, _payload in events] == ["snapshot", "status"]
+    assert events[0][1]["records"][0]["status"] == "pending"
+    assert events[1][1]["change"] == "modified"
+    assert events[1][1]["status"] == "Present"
+
+
+def test_late_subscriber_receives_current_snapshot():
+    db = FakeDb()
+    broadcaster = AttendanceStatusBroadcaster(lambda: db, CENTRAL_TZ)
+    now = datetime.datetime(2024, 4, 1, 9, 0, tzinfo=CENTRAL_TZ)
+    broadcaster.subscribe("CPSC101", now=now)
+    db.watches[0].callback([], [_change("ADDED", "rec-1", {"studentID": "A1", "status": "Late"})], None)
+
+    late = broadcaster.subscribe("CPSC101", now=now)
+    events = _drain(late)
+
+    assert events[0][0] == "snapshot"
+    assert events[0][1]["records"][0]["recordId"] == "rec-1"
+
+
+def test_format_sse_renders_event_block():
+    message = format_sse("status", {"recordId": "rec-1"})
+    assert message == 'event: status\ndata: {"recordId":"rec-1"}\n\n'
+
+
+def test_subscriptions_are_capped_per_process():
+    db = FakeDb()
+    broadcaster = AttendanceStatusBroadcaster(lambda: db, CENTRAL_TZ, max_subscribers=2)
+    now = datetime.datetime(2024, 4, 1, 9, 0, tzinfo=CENTRAL_TZ)
+
+    first = broadcaster.subscribe("CPSC101", now=now)
+    broadcaster.subscribe("CPSC202", now=now)
+    with pytest.raises(StreamLimitReached):
+        broadcaster.subscribe("CPSC101", now=now)
+
+    first.close()
+    assert broadcaster.subscriber_count() == 1
+    broadcaster.subscribe("CPSC101", now=now).close()
+
+
+def test_stream_ends_after_its_lifetime():
+    db = FakeDb()
+    broadcaster = AttendanceStatusBroadcaster(lambda: db, CENTRAL_TZ)
+    subscription = broadcaster.subscribe("CPSC101", now=datetime.datetime(2024, 4, 1, 9, 0, tzinfo=CENTRAL_TZ))
+    now = [0.0]
+
+    def clock():
+        now[0] += 1.0
+        return now[0]
+
+    events = list(subscription.events(heartbeat_seconds=0.001, max_seconds=5, clock=clock))
+    assert events and all(item is None for item in events)
+    assert len(events) < 5
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from backend.audit_queue import AuditWriteQueue
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+
+    def update(self, fields):
+        self._db.apply(self.path, fields)
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self._db = db
+        self._name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self._db, f"{self._name}/{doc_id}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def update(self, ref, fields):
+        self._writes.append((ref.path, fields))
+
+    def commit(self):
+        self._db.batch_sizes.append(len(self._writes))
+        if any(path not in self._db.docs for path, _ in self._writes):
+            raise KeyError("missing document")
+        for path, fields in self._writes:
+            self._db.apply(path, fields)
+
+
+class FakeFirestore:
+    def __init__(self, doc_paths):
+        self.docs = {path: {} for path in doc_paths}
+        self.batch_sizes = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def apply(self, path, fields):
+        if path not in self.docs:
+            raise KeyError(path)
+        self.docs[path].update(fields)
+
+    def batch(self):
+        if threading.current_thread().name == "audit-write-behind":
+            self.gate.wait(5)
+        return FakeBatch(self)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+
+def test_queued_writes_are_batched_and_drained_on_close():
+    db = FakeFirestore([f"attendance/r{i}" for i in range(7)])
+    db.gate.clear()
+    audit = AuditWriteQueue(lambda: db, max_batch_size=3, flush_interval=0.01)
+
+    for i in range(7):
+        assert audit.submit("attendance", f"r{i}", {"networkEvidence": {"ip": i}})
+    db.gate.set()
+
+    assert audit.close(timeout=5)
+    assert all(db.docs[f"attendance/r{i}"]["networkEvidence"] == {"ip": i} for i in range(7))
+    assert max(db.batch_sizes) <= 3
+    assert audit.stats() == {"pending": 0, "written": 7, "writtenInline": 0, "failed": 0}
+
+    # After shutdown, writes go straight to Firestore.
+    assert not audit.submit("attendance", "r0", {"verification": {}})
+    assert db.docs["attendance/r0"]["verification"] == {}
+
+
+def test_full_queue_applies_backpressure_then_writes_inline():
+    db = FakeFirestore(["attendance/a", "attendance/b", "attendance/c"])
+    db.gate.clear()
+    audit = AuditWriteQueue(lambda: db, max_batch_size=1, max_queue_size=1, enqueue_timeout=0.05)
+
+    assert audit.submit("attendance", "a", {"n": 1})
+    while audit._queue.qsize():  # wait for the writer to take it and block
+        time.sleep(0.001)
+    assert audit.submit("attendance", "b", {"n": 2})  # fills the queue
+
+    assert not audit.submit("attendance", "c", {"n": 3})
+    assert db.docs["attendance/c"] == {"n": 3}
+    db.gate.set()
+    assert audit.close(timeout=5)
+    assert audit.written_inline == 1
+
+
+def test_failed_batch_retries_each_write_individually():
+    db = FakeFirestore(["attendance/a", "attendance/c"])
+    audit = AuditWriteQueue(lambda: db)
+
+    audit._write_items([
+        ("attendance", "a", {"n": 1}),
+        ("attendance", "deleted", {"n": 2}),
+        ("attendance", "c", {"n": 3}),
+    ])
+
+    assert db.docs == {"attendance/a": {"n": 1}, "attendance/c": {"n": 3}}
+    assert (audit.written, audit.failed) == (2, 1)
@@ -0,0 +1,123 @@
+from backend.class_membership import ClassMembershipIndex, TeacherProfileCache, assigned_teachers
+from backend.memory_store import InMemoryFirestore
+
+
+def test_assigned_teachers_reads_every_teacher_field():
+    class_data = {"teacher": "t1", "teacherId": "", "teacherID": "T-9", "teachers": ["t2", None, "t1"]}
+    assert assigned_teachers(class_data) == {"t1", "T-9", "t2"}
+
+
+def test_index_follows_class_changes():
+    db = InMemoryFirestore()
+    classes = db.collection("classes")
+    classes.document("c1").set({"teacher": "t1"})
+    classes.document("c2").set({"teachers": ["t1", "t2"]})
+
+    index = ClassMembershipIndex(lambda: db)
+    assert index.teachers_for("c1") == (True, frozenset({"t1"}))
+    assert index.classes_for({"t1"}) == {"c1", "c2"}
+    assert index.teachers_for("missing") == (False, frozenset())
+
+    classes.document("c1").update({"teacher": "t3"})
+    classes.document("c2").delete()
+    assert index.classes_for({"t1"}) == set()
+    assert index.classes_for({"t3", "t2"}) == {"c1"}
+
+    index.close()
+    assert db._watches == []
+
+
+def test_index_falls_back_and_resubscribes_after_the_listener_stops():
+    now = [0.0]
+    db = InMemoryFirestore()
+    classes = db.collection("classes")
+    classes.document("c1").set({"teacher": "t1"})
+    index = ClassMembershipIndex(lambda: db, retry_seconds=30, clock=lambda: now[0])
+    assert index.teachers_for("c1") == (True, frozenset({"t1"}))
+
+    # The listener's stream fails: it goes inactive and delivers nothing more.
+    watch = db._watches[0]
+    db._unwatch(watch)
+    watch.is_active = False
+    classes.document("c1").update({"teacher": "t2"})
+
+    assert index.teachers_for("c1") is None
+    assert index.classes_for({"t1"}) is None
+
+    now[0] = 31.0
+    assert index.teachers_for("c1") == (True, frozenset({"t2"}))
+    assert index.classes_for({"t1"}) == set()
+    index.close()
+
+
+class _NoListenerDb:
+    def __init__(self):
+        self.attempts = 0
+
+    def collection(self, name):
+        self.attempts += 1
+        raise RuntimeError("listeners unavailable")
+
+
+def test_index_reports_unknown_and_retries_later_without_listener():
+    now = [0.0]
+    db = _NoListenerDb()
+    index = ClassMembershipIndex(lambda: db, retry_seconds=30, clock=lambda: now[0])
+
+    assert index.teachers_for("c1") is None
+    assert index.teachers_for("c1") is None
+    assert db.attempts == 1
+
+    now[0] = 31.0
+    assert index.teachers_for("c1") is None
+    assert db.attempts == 2
+
+
+def test_profile_cache_expires_and_skips_misses():
+    now = [0.0]
+    calls = []
+
+    def loader(token):
+        calls.append(token["uid"])
+        return (token["uid"], {"role": "teacher"}) if token["uid"] != "ghost" else (None, {})
+
+    cache = TeacherProfileCache(loader, ttl_seconds=10, clock=lambda: now[0])
+    cache.get({"uid": "t1"})
+    cache.get({"uid": "t1"})
+    cache.get({"uid": "ghost"})
+    cache.get({"uid": "ghost"})
+    now[0] = 11.0
+    cache.get({"uid": "t1"})
+
+    assert calls == ["t1", "ghost", "ghost", "t1"]
+
+
+def test_profile_cache_evicts_profiles_that_change():
+    db = InMemoryFirestore()
+    users = db.collection("users")
+    users.document("t1").set({"role": "teacher", "email": "t1@example.edu"})
+    users.document("t2").set({"role": "Teacher"})
+    users.document("s1").set({"role": "student"})
+    calls = []
+
+    def loader(token):
+        calls.append(token["uid"])
+        snapshot = users.document(token["uid"]).get()
+        return (snapshot.id, snapshot.to_dict()) if snapshot.exists else (None, {})
+
+    cache = TeacherProfileCache(loader, ttl_seconds=300, db_getter=lambda: db)
+    for uid in ("t1", "t2", "s1"):
+        cache.get({"uid": uid})
+
+    # Revoking t1 removes it from the teacher-profile query.
+    users.document("t1").update({"role": "student"})
+    assert cache.get({"uid": "t1"})[1]["role"] == "student"
+    # Promoting s1 adds it to the query.
+    users.document("s1").update({"role": "teacher"})
+    assert cache.get({"uid": "s1"})[1]["role"] == "teacher"
+    # Unrelated profiles stay cached.
+    cache.get({"uid": "t2"})
+
+    assert calls == ["t1", "t2", "s1", "t1", "s1"]
+    cache.close()
+    assert db._watches == []
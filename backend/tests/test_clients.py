@@ -0,0 +1,107 @@
+import sys
+import threading
+import types
+
+from backend import clients
+from backend.clients import WorkerClientProxy, WorkerClients
+
+
+class FakeCredential:
+    def get_credential(self):
+        return "google-credentials"
+
+
+class FakeFirebaseApp:
+    def __init__(self, name):
+        self.name = name
+        self.credential = FakeCredential()
+        self.project_id = "demo-project"
+
+
+class FakeFirestoreClient:
+    def __init__(self, project, credentials):
+        self.project = project
+        self.credentials = credentials
+        self.closed = False
+
+    def collection(self, name):
+        return (self, name)
+
+    def close(self):
+        self.closed = True
+
+
+def _install_fakes(monkeypatch):
+    apps = []
+    firebase_admin = types.ModuleType("firebase_admin")
+
+    def initialize_app(credential, options=None, name="[DEFAULT]"):
+        apps.append(FakeFirebaseApp(name))
+        return apps[-1]
+
+    firebase_admin.initialize_app = initialize_app
+    google = types.ModuleType("google")
+    google_cloud = types.ModuleType("google.cloud")
+    google_cloud.firestore = types.SimpleNamespace(Client=FakeFirestoreClient)
+    google.cloud = google_cloud
+    monkeypatch.setitem(sys.modules, "firebase_admin", firebase_admin)
+    monkeypatch.setitem(sys.modules, "google", google)
+    monkeypatch.setitem(sys.modules, "google.cloud", google_cloud)
+    return apps
+
+
+def test_clients_are_rebuilt_in_each_process(monkeypatch):
+    apps = _install_fakes(monkeypatch)
+    factory = WorkerClients(object(), {"storageBucket": "b"}, pool_size=2)
+
+    monkeypatch.setattr(clients.os, "getpid", lambda: 100)
+    parent_client = factory.firestore()
+    assert factory.firestore() is parent_client
+    assert parent_client.project == "demo-project"
+
+    monkeypatch.setattr(clients.os, "getpid", lambda: 101)
+    child_client = factory.firestore()
+    assert child_client is not parent_client
+    assert [app.name for app in apps] == ["worker-100", "worker-101"]
+
+
+def test_threads_are_spread_over_the_channel_pool(monkeypatch):
+    _install_fakes(monkeypatch)
+    factory = WorkerClients(object(), {}, pool_size=2)
+    seen = []
+
+    def worker():
+        seen.append(factory.firestore())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, seen))) == 2
+    assert len(factory._state.firestore_pool) == 2
+
+
+def test_proxy_forwards_to_current_client(monkeypatch):
+    _install_fakes(monkeypatch)
+    factory = WorkerClients(object(), {}, pool_size=1)
+    db = WorkerClientProxy(factory.firestore)
+
+    client, name = db.collection("attendance")
+    assert client is factory.firestore()
+    assert name == "attendance"
+
+
+def test_close_uses_the_clients_public_close(monkeypatch):
+    _install_fakes(monkeypatch)
+    factory = WorkerClients(object(), {}, pool_size=2)
+    factory.firestore()
+    pool = list(factory._state.firestore_pool)
+    storage_client = FakeFirestoreClient("demo-project", None)
+    factory._state.bucket = types.SimpleNamespace(client=storage_client)
+
+    factory.close()
+
+    assert all(client.closed for client in pool) and storage_client.closed
+    assert factory._state is None
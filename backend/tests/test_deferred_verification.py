@@ -0,0 +1,167 @@
+import datetime
+
+import pytest
+
+from backend.deferred_verification import DeferredVerifier, InferenceLoadMonitor
+from backend.memory_store import InMemoryBucket, InMemoryFirestore, transactional
+
+
+def test_monitor_sheds_on_queue_depth_and_holds():
+    now = [0.0]
+    monitor = InferenceLoadMonitor(max_in_flight=2, p99_threshold_seconds=0, hold_seconds=10, clock=lambda: now[0])
+
+    with monitor.track():
+        assert monitor.overload_reason() is None
+        with monitor.track():
+            assert monitor.overload_reason() == "queue_depth"
+
+    now[0] = 5.0
+    assert monitor.overload_reason() == "cooling_down"
+    now[0] = 11.0
+    assert monitor.overload_reason() is None
+
+
+def test_monitor_sheds_on_p99_latency_over_the_window():
+    now = [0.0]
+    monitor = InferenceLoadMonitor(
+        max_in_flight=0,
+        p99_threshold_seconds=2.0,
+        window_seconds=60,
+        min_samples=5,
+        hold_seconds=0,
+        clock=lambda: now[0],
+    )
+    for latency in (0.5, 0.5, 0.5, 0.5, 3.0):
+        with monitor.track():
+            now[0] += latency
+    assert monitor.overload_reason() == "p99_latency"
+    assert monitor.stats()["p99Seconds"] == 3.0
+
+    now[0] += 61
+    assert monitor.overload_reason() is None
+
+
+def _deferred_record(db, bucket, doc_id, verifier, **fields):
+    bucket.blob(verifier.frame_path(doc_id)).upload_from_string(b"jpeg", content_type="image/jpeg")
+    db.collection("attendance").document(doc_id).set({
+        "studentID": "s1",
+        "status": "pending",
+        "proposedStatus": "Present",
+        "verificationState": "deferred",
+        "deferredFrame": verifier.frame_path(doc_id),
+        **fields,
+    })
+
+
+def _verifier(db, bucket, results, **kwargs):
+    def verify(image_bytes, record):
+        assert image_bytes == b"jpeg"
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return DeferredVerifier(lambda: db, lambda: bucket, verify, transactional=transactional, **kwargs)
+
+
+def test_process_records_verification_and_rejects_mismatches():
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    verifier = _verifier(db, bucket, [
+        {"verified": True, "distance": 0.2, "max_threshold_to_verify": 0.68, "details": {"detector": "haar"}},
+        {"verified": False, "distance": 0.9, "max_threshold_to_verify": 0.68},
+    ])
+    _deferred_record(db, bucket, "ok", verifier)
+    _deferred_record(db, bucket, "bad", verifier)
+
+    assert verifier.process("ok") == "verified"
+    record = db.collection("attendance").document("ok").get().to_dict()
+    assert record["status"] == "pending"
+    assert record["verification"]["distance"] == 0.2 and record["verification"]["deferred"] is True
+    assert record["verification"]["detector"] == "haar"
+
+    assert verifier.process("bad") == "failed"
+    record = db.collection("attendance").document("bad").get().to_dict()
+    assert record["status"] == "Rejected"
+    assert record["verificationState"] == "failed"
+
+    assert list(bucket.list_blobs(prefix="pending_scans/")) == []
+
+
+def test_process_keeps_other_verification_keys():
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    verifier = _verifier(db, bucket, [{"verified": True, "distance": 0.3, "max_threshold_to_verify": 0.68}])
+    _deferred_record(db, bucket, "audited", verifier, verification={"model": "VGG-Face", "reason": "queue_depth"})
+
+    assert verifier.process("audited") == "verified"
+    verification = db.collection("attendance").document("audited").get().to_dict()["verification"]
+    assert verification["distance"] == 0.3
+    assert verification["model"] == "VGG-Face" and verification["reason"] == "queue_depth"
+
+
+def test_frames_without_a_deferred_record_are_removed():
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    verifier = _verifier(db, bucket, [])
+    bucket.blob(verifier.frame_path("orphan")).upload_from_string(b"jpeg")
+    db.collection("attendance").document("orphan").set({"status": "Present"})
+
+    assert verifier.process("orphan") is None
+    assert not bucket.blob(verifier.frame_path("orphan")).exists()
+
+
+def test_errors_are_retried_then_recorded():
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    verifier = _verifier(db, bucket, [RuntimeError("model"), RuntimeError("model")], max_attempts=2)
+    _deferred_record(db, bucket, "flaky", verifier)
+
+    with pytest.raises(RuntimeError):
+        verifier.process("flaky")
+    assert verifier.process("flaky") == "error"
+    record = db.collection("attendance").document("flaky").get().to_dict()
+    assert record["status"] == "pending"
+    assert record["verification"]["error"] == "model"
+
+
+def test_a_claimed_record_is_verified_by_one_worker_only():
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    results = [{"verified": True, "distance": 0.2, "max_threshold_to_verify": 0.68}]
+    first = _verifier(db, bucket, results)
+    second = _verifier(db, bucket, results)
+    _deferred_record(db, bucket, "shared", first)
+
+    verify_frame = first._verify_frame
+
+    def verify_while_another_worker_tries(image_bytes, record):
+        # The sweep of another worker picks the record up mid-verification.
+        assert second.process("shared") == "deferred"
+        return verify_frame(image_bytes, record)
+
+    first._verify_frame = verify_while_another_worker_tries
+    assert first.process("shared") == "verified"
+    assert (first.verified, second.verified) == (1, 0)
+
+    # A worker whose claim went stale does not overwrite the new claimant's result.
+    _deferred_record(db, bucket, "stale", first)
+    first._verify_frame = lambda image_bytes, record: (
+        db.collection("attendance").document("stale").update({"deferredClaimId": "other-worker"})
+        or {"verified": False, "distance": 0.9}
+    )
+    assert first.process("stale") is None
+    record = db.collection("attendance").document("stale").get().to_dict()
+    assert record["verificationState"] == "deferred" and record["status"] == "pending"
+
+
+def test_sweep_requeues_only_stale_claims():
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    verifier = _verifier(db, bucket, [], stale_seconds=60)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    _deferred_record(db, bucket, "fresh", verifier, deferredAt=now)
+    _deferred_record(db, bucket, "stale", verifier, deferredAt=now - datetime.timedelta(minutes=5))
+
+    assert verifier.sweep() == 1
+    assert verifier._queue.get_nowait() == "stale"
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from backend import detector_cascade
+from backend.detector_cascade import Detection, DetectorCascade, Stage, build_default_cascade, haar_stage
+
+
+def _face(confidence, size=40):
+    return Detection(np.zeros((size, size, 3), dtype=np.float32), {"x": 0, "y": 0, "w": size, "h": size}, confidence)
+
+
+def _stage(name, results, min_confidence=0.8, calls=None):
+    def detect(_image, haar_faces=None):
+        if calls is not None:
+            calls.append(name)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return Stage(name, detect, min_confidence)
+
+
+def test_confident_fast_detection_skips_the_heavy_stage():
+    calls = []
+    cascade = DetectorCascade([
+        _stage("fast", [[_face(0.9)], [_face(0.4)], []], calls=calls),
+        _stage("heavy", [[_face(0.99)], []], min_confidence=0.0, calls=calls),
+    ])
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+
+    assert cascade.detect(image)[1] == "fast"
+    assert cascade.detect(image)[1] == "heavy"
+    assert cascade.detect(image) == ([], None)
+    assert calls == ["fast", "fast", "heavy", "fast", "heavy"]
+
+    stats = cascade.stats()
+    assert stats["frames"] == 3 and stats["noFace"] == 1
+    assert stats["stages"]["fast"]["attempts"] == 3
+    assert stats["stages"]["fast"]["hitRate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert stats["stages"]["heavy"]["accepted"] == 1
+
+
+def test_failing_fast_stage_escalates_but_final_stage_errors_propagate():
+    cascade = DetectorCascade([
+        _stage("fast", [RuntimeError("no model")]),
+        _stage("heavy", [RuntimeError("broken")], min_confidence=0.0),
+    ])
+    with pytest.raises(RuntimeError, match="broken"):
+        cascade.detect(np.zeros((10, 10, 3), dtype=np.uint8))
+
+
+def test_cascade_spec_selects_stages():
+    assert [stage.name for stage in build_default_cascade("haar,mtcnn").stages] == ["haar", "mtcnn"]
+    assert [stage.name for stage in build_default_cascade("off").stages] == ["retinaface"]
+
+
+def test_haar_stage_reuses_faces_found_earlier_on_the_frame(monkeypatch):
+    def detect_again(gray):
+        raise AssertionError("Haar ran twice on one frame")
+
+    monkeypatch.setattr(detector_cascade.face_detection, "detect_faces_fast", detect_again)
+    monkeypatch.setattr(
+        detector_cascade.face_detection, "aligned_face_rgb",
+        lambda image, box, eyes, margin: np.ones((box[2], box[3], 3), dtype=np.float32),
+    )
+    cascade = DetectorCascade([haar_stage(), _stage("heavy", [], min_confidence=0.0)])
+
+    detections, stage = cascade.detect(
+        np.zeros((100, 100, 3), dtype=np.uint8), haar_faces=[((10, 10, 40, 40), ((20, 25), (40, 25)))],
+    )
+
+    assert stage == "haar"
+    assert detections[0].facial_area == {"x": 10, "y": 10, "w": 40, "h": 40}
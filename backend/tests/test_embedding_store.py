@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+from backend.embedding_store import (
+    EmbeddingStore,
+    EmbeddingStoreHandle,
+    publish_embedding_store,
+    read_student_ids,
+    resolve_store_directory,
+)
+
+
+def _embeddings(count, dimension=8):
+    matrix = np.arange(count * dimension, dtype=np.float32).reshape(count, dimension) + 1.0
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def test_publish_writes_memory_mapped_store(tmp_path):
+    root = str(tmp_path)
+    version_dir = publish_embedding_store(root, ["B2", "A1", "C3"], _embeddings(3), "VGG-Face")
+
+    assert resolve_store_directory(root) == os.path.realpath(version_dir)
+    assert read_student_ids(version_dir) == ["B2", "A1", "C3"]
+
+    store = EmbeddingStore(version_dir)
+    assert isinstance(store.embeddings, np.memmap)
+    assert store.embeddings.dtype == np.float16
+    assert list(store.rows_for("A1")) == [1]
+    assert store.embeddings_for("missing") is None
+    assert store.embeddings_for("C3").shape == (1, 8)
+
+
+def test_repeated_ids_return_every_template(tmp_path):
+    version_dir = publish_embedding_store(str(tmp_path), ["A1", "B2", "A1"], _embeddings(3), "VGG-Face")
+    store = EmbeddingStore(version_dir)
+
+    assert sorted(store.rows_for("A1")) == [0, 2]
+    assert store.embeddings_for("A1").shape == (2, 8)
+
+
+def test_handle_follows_current_link_and_prunes_old_versions(tmp_path):
+    root = str(tmp_path)
+    publish_embedding_store(root, ["A1"], _embeddings(1), "VGG-Face")
+    handle = EmbeddingStoreHandle(root, refresh_seconds=0)
+    first = handle.get()
+    assert first.embeddings_for("B2") is None
+
+    publish_embedding_store(root, ["A1", "B2"], _embeddings(2), "VGG-Face")
+    publish_embedding_store(root, ["A1", "B2", "C3"], _embeddings(3), "VGG-Face")
+
+    current = handle.get()
+    assert current is not first
+    assert current.embeddings_for("C3") is not None
+    assert len(os.listdir(os.path.join(root, "versions"))) == 2
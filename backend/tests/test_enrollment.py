@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from backend.embedding_store import EmbeddingStore, resolve_store_directory
+from backend.memory_store import InMemoryBucket
+
+
+@pytest.fixture
+def enrollment(monkeypatch):
+    if "deepface" not in sys.modules:
+        deepface_module = types.ModuleType("deepface")
+        deepface_module.DeepFace = types.SimpleNamespace()
+        monkeypatch.setitem(sys.modules, "deepface", deepface_module)
+    from backend import enrollment as module
+
+    return module
+
+
+class _Blob:
+    def __init__(self, name, image=None, error=None):
+        self.name = name
+        self.image = image
+        self.error = error
+
+
+def _fake_download(blob):
+    if blob.error:
+        raise blob.error
+    return blob.image
+
+
+def test_student_id_for_blob(enrollment):
+    prefix = "known_faces/"
+    assert enrollment._student_id_for_blob("known_faces/S1.jpg", prefix) == "S1"
+    assert enrollment._student_id_for_blob("known_faces/S1.JPEG", prefix) == "S1"
+    assert enrollment._student_id_for_blob("known_faces/S1/side.png", prefix) == "S1"
+    assert enrollment._student_id_for_blob("known_faces/S1/extra/side.png", prefix) is None
+    assert enrollment._student_id_for_blob("known_faces/S1.txt", prefix) is None
+    assert enrollment._student_id_for_blob("known_faces/.jpg", prefix) is None
+    assert enrollment._student_id_for_blob("known_faces//side.jpg", prefix) == "side"
+
+
+def test_download_images_keeps_order_and_bounds_outstanding_downloads(enrollment, monkeypatch):
+    monkeypatch.setattr(enrollment, "_download_image", _fake_download)
+    pulled = []
+
+    def blobs():
+        for index in range(20):
+            pulled.append(index)
+            if index == 3:
+                yield f"S{index}", _Blob(f"b{index}", error=RuntimeError("gone"))
+            elif index == 4:
+                yield f"S{index}", _Blob(f"b{index}", image=None)
+            else:
+                yield f"S{index}", _Blob(f"b{index}", image=np.full((2, 2, 3), index, dtype=np.uint8))
+
+    results = []
+    for result in enrollment.download_images(blobs(), workers=2):
+        # Never more than 2 * workers blobs listed ahead of the caller.
+        assert len(pulled) - len(results) <= 4
+        results.append(result)
+
+    assert [name for _student, name, _image, _error in results] == [f"b{index}" for index in range(20)]
+    assert results[3][2] is None and results[3][3] == "download_failed: gone"
+    assert results[4][2] is None and results[4][3] == "decode_failed"
+    assert results[5][3] is None and int(results[5][2][0, 0, 0]) == 5
+
+
+def test_run_enrollment_flags_bad_images_and_honours_the_limit(enrollment, monkeypatch, tmp_path):
+    bucket = InMemoryBucket()
+    for name in ("A.jpg", "B.jpg", "C.jpg", "D.jpg", "E/side.jpg", "F.jpg"):
+        bucket.blob(f"known_faces/{name}").upload_from_string(name.encode("utf-8"), content_type="image/jpeg")
+
+    monkeypatch.setattr(enrollment, "_download_image", lambda blob: blob.name)
+
+    def extract(image, detector_backend=None):
+        face_box = lambda size: {"w": size, "h": size}
+        if image.endswith("B.jpg"):
+            return []
+        if image.endswith("C.jpg"):
+            return [("small", face_box(10)), ("large", face_box(40))]
+        if image.endswith("D.jpg"):
+            raise RuntimeError("detector crashed")
+        return [(image, face_box(20))]
+
+    embedded = []
+
+    def embed(faces, batch_size=32):
+        embedded.append(list(faces))
+        return np.eye(len(faces), 4, dtype=np.float32)
+
+    monkeypatch.setattr(enrollment.face_embeddings, "extract_aligned_faces", extract)
+    monkeypatch.setattr(enrollment.face_embeddings, "embed_faces", embed)
+
+    report = enrollment.run_enrollment(bucket, str(tmp_path), workers=2, batch_size=2, dtype="float32", limit=5)
+
+    assert report["flagged"] == {
+        "known_faces/B.jpg": "no_face",
+        "known_faces/C.jpg": "multiple_faces: 2",
+        "known_faces/D.jpg": "detection_failed: detector crashed",
+    }
+    # F.jpg is past the limit and never processed.
+    assert report["enrolled"] == 2 and report["templates"] == 2
+    assert embedded == [["known_faces/A.jpg", "known_faces/E/side.jpg"]]
+
+    version_dir = resolve_store_directory(str(tmp_path))
+    store = EmbeddingStore(version_dir)
+    assert store.embeddings_for("E").shape == (1, 4)
+    with open(os.path.join(version_dir, enrollment.REPORT_FILENAME), encoding="utf-8") as handle:
+        assert json.load(handle)["flaggedCount"] == 3
+
+    largest = enrollment.run_enrollment(bucket, str(tmp_path), workers=2, use_largest_face=True, limit=3)
+    assert "known_faces/C.jpg" not in largest["flagged"]
+    assert embedded[-1] == ["known_faces/A.jpg", "large"]
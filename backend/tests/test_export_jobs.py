@@ -0,0 +1,123 @@
+import datetime
+import gzip
+import threading
+import time
+
+import pytest
+
+from backend.export_jobs import ExportJobRunner, RangeNotSatisfiable, parse_byte_range
+from backend.memory_store import InMemoryBucket, InMemoryFirestore
+
+
+def test_parse_byte_range():
+    assert parse_byte_range(None, 100) is None
+    assert parse_byte_range("bytes=0-9", 100) == (0, 9)
+    assert parse_byte_range("bytes=90-", 100) == (90, 99)
+    assert parse_byte_range("bytes=-10", 100) == (90, 99)
+    assert parse_byte_range("bytes=50-500", 100) == (50, 99)
+    assert parse_byte_range("bytes=0-1,5-9", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_byte_range("bytes=100-", 100)
+
+
+def _wait_for(runner, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = runner.get(job_id)
+        if job["state"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("export job did not finish")
+
+
+def _produce(report):
+    yield "a,b\n"
+    for index in range(1000):
+        report(rowsWritten=index + 1)
+        yield f"{index},row-{index}\n"
+
+
+@pytest.mark.parametrize("storage", ["local", "bucket"])
+def test_job_writes_compressed_output_and_serves_ranges(tmp_path, storage):
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    runner = ExportJobRunner(lambda: db, lambda: bucket, str(tmp_path), storage=storage, progress_interval=0)
+
+    job_id = runner.submit({"classID": "c1"}, _produce, "out.csv", compress=True)
+    job = _wait_for(runner, job_id)
+
+    assert job["state"] == "succeeded"
+    assert job["filename"] == "out.csv.gz"
+    assert job["rowsWritten"] == 1000
+    size = runner.object_size(job)
+    assert size == job["sizeBytes"]
+
+    whole = b"".join(runner.iter_bytes(job, 0, size - 1))
+    text = gzip.decompress(whole).decode("utf-8")
+    assert text.startswith("a,b\n0,row-0\n") and text.endswith("999,row-999\n")
+    assert b"".join(runner.iter_bytes(job, 10, 19)) == whole[10:20]
+
+
+def test_failed_and_stale_jobs_report_failure(tmp_path):
+    db = InMemoryFirestore()
+    runner = ExportJobRunner(lambda: db, lambda: None, str(tmp_path))
+
+    def broken(report):
+        yield "a\n"
+        raise RuntimeError("boom")
+
+    job = _wait_for(runner, runner.submit({}, broken, "out.csv"))
+    assert job["state"] == "failed" and job["error"] == "boom"
+    assert list(tmp_path.iterdir()) == []
+
+    heartbeat = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=600)
+    db.collection("exportJobs").document("dead").set({"state": "running", "updatedAt": heartbeat})
+    assert runner.get("dead")["state"] == "failed"
+
+    # A queued job whose worker died before starting it stops heartbeating too.
+    db.collection("exportJobs").document("orphaned").set({"state": "queued", "updatedAt": heartbeat})
+    assert runner.get("orphaned")["state"] == "failed"
+
+
+def test_running_job_keeps_jobs_queued_behind_it_fresh(tmp_path):
+    db = InMemoryFirestore()
+    runner = ExportJobRunner(lambda: db, lambda: None, str(tmp_path), progress_interval=0)
+    started, reported, release = threading.Event(), threading.Event(), threading.Event()
+
+    def slow(report):
+        started.wait(5)
+        report(rowsWritten=1)
+        reported.set()
+        release.wait(5)
+        yield "a\n"
+
+    first = runner.submit({}, slow, "first.csv")
+    second = runner.submit({}, _produce, "second.csv")
+    stale = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=600)
+    db.collection("exportJobs").document(second).update({"updatedAt": stale})
+    runner._queued[second] -= runner.stale_seconds
+    assert runner.get(second)["state"] == "failed"
+
+    started.set()
+    assert reported.wait(5)
+    assert runner.get(second)["state"] == "queued"
+    release.set()
+    assert _wait_for(runner, first)["state"] == "succeeded"
+    assert _wait_for(runner, second)["state"] == "succeeded"
+
+
+def test_expired_jobs_and_bucket_exports_are_removed(tmp_path):
+    db = InMemoryFirestore()
+    bucket = InMemoryBucket()
+    runner = ExportJobRunner(lambda: db, lambda: bucket, str(tmp_path), storage="bucket", retention_hours=1)
+    jobs = db.collection("exportJobs")
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    bucket.blob("exports/old/out.csv").upload_from_string(b"a\n")
+    jobs.document("old").set({"state": "succeeded", "storage": "bucket", "location": "exports/old/out.csv", "updatedAt": old})
+    jobs.document("abandoned").set({"state": "queued", "updatedAt": old})
+
+    job_id = runner.submit({}, _produce, "new.csv")
+    assert _wait_for(runner, job_id)["state"] == "succeeded"
+
+    assert sorted(doc.id for doc in jobs.stream()) == [job_id]
+    assert sorted(bucket._objects) == [f"exports/{job_id}/new.csv"]
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from backend.face_templates import FaceTemplateStore, best_match, stack_templates
+from backend.memory_store import InMemoryFirestore, transactional
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_best_match_scores_every_template_at_once():
+    enrolled = np.stack([_unit(1, 0, 0), _unit(0, 1, 0)])
+    promoted = np.stack([_unit(0, 0, 1)])
+    templates = stack_templates(enrolled, None, promoted)
+
+    assert templates.shape == (3, 3) and templates.flags["C_CONTIGUOUS"]
+    distance, row = best_match(_unit(0.1, 0, 1), templates)
+    assert row == 2
+    assert distance == pytest.approx(1 - _unit(0.1, 0, 1)[2], abs=1e-6)
+    assert stack_templates(None, np.zeros((0, 3))) is None
+
+
+def test_promotion_skips_duplicates_and_weak_matches_and_evicts_oldest():
+    db = InMemoryFirestore()
+    store = FaceTemplateStore(
+        lambda: db, "VGG-Face", max_promoted=2, promote_max_distance=0.4, min_novelty=0.1, transactional=transactional,
+    )
+
+    assert not store.maybe_promote("s1", _unit(1, 0, 0), 0.05)
+    assert not store.maybe_promote("s1", _unit(1, 0, 0), 0.5)
+    assert store.promoted_for("s1") is None
+
+    for vector in (_unit(1, 0, 0), _unit(0, 1, 0), _unit(0, 0, 1)):
+        assert store.maybe_promote("s1", vector, 0.2)
+
+    promoted = store.promoted_for("s1")
+    assert promoted.shape == (2, 3)
+    np.testing.assert_allclose(promoted, [_unit(0, 1, 0), _unit(0, 0, 1)], atol=1e-3)
+
+    # A fresh store (another worker) reads the same templates back.
+    other = FaceTemplateStore(lambda: db, "VGG-Face")
+    assert other.promoted_for("s1").shape == (2, 3)
+    assert other.promoted_for("s1", dimension=128) is None
+    assert FaceTemplateStore(lambda: db, "Facenet").promoted_for("s1") is None
+
+
+def test_promoted_templates_are_cached_for_the_ttl():
+    db = InMemoryFirestore()
+    now = [0.0]
+    writer = FaceTemplateStore(lambda: db, "VGG-Face", transactional=transactional)
+    reader = FaceTemplateStore(lambda: db, "VGG-Face", ttl_seconds=30, clock=lambda: now[0])
+
+    assert reader.promoted_for("s1") is None
+    writer.maybe_promote("s1", _unit(1, 1, 0), 0.3)
+    assert reader.promoted_for("s1") is None
+
+    now[0] = 31.0
+    assert reader.promoted_for("s1").shape == (1, 3)
+
+
+def test_candidates_round_trip_and_only_qualifying_scans_produce_one():
+    db = InMemoryFirestore()
+    store = FaceTemplateStore(lambda: db, "VGG-Face", min_novelty=0.1, transactional=transactional)
+
+    assert store.candidate(_unit(1, 0, 0), 0.05) is None
+    candidate = store.candidate(_unit(0, 1, 0), 0.2)
+    assert candidate["model"] == "VGG-Face" and candidate["distance"] == 0.2
+
+    assert not FaceTemplateStore(lambda: db, "Facenet", transactional=transactional).promote_candidate("s1", candidate)
+    assert store.promote_candidate("s1", candidate)
+    np.testing.assert_allclose(store.promoted_for("s1"), [_unit(0, 1, 0)], atol=1e-3)
+
+
+def test_concurrent_promotions_are_both_kept():
+    db = InMemoryFirestore()
+    store = FaceTemplateStore(lambda: db, "VGG-Face", min_novelty=0.1, transactional=transactional)
+    other = FaceTemplateStore(lambda: db, "VGG-Face", min_novelty=0.1, transactional=transactional)
+
+    # Another worker promotes between this transaction's read and its commit.
+    original_get = db._get
+    interleaved = []
+
+    def racing_get(collection_name, doc_id, field_paths=None):
+        snapshot = original_get(collection_name, doc_id, field_paths)
+        if not interleaved:
+            interleaved.append(True)
+            other.maybe_promote("s1", _unit(0, 0, 1), 0.3)
+        return snapshot
+
+    db._get = racing_get
+    assert store.maybe_promote("s1", _unit(1, 0, 0), 0.2)
+    db._get = original_get
+
+    templates = db.collection("faceTemplates").document("s1").get().to_dict()["templates"]
+    assert [entry["distance"] for entry in templates] == [0.3, 0.2]
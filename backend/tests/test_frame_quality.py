@@ -0,0 +1,54 @@
+import numpy as np
+
+from backend import frame_quality
+from backend.frame_quality import assess_frame_quality
+
+
+def _textured_frame(mean=120, height=240, width=320):
+    rng = np.random.default_rng(0)
+    noise = rng.integers(-40, 40, size=(height, width, 3))
+    return np.clip(mean + noise, 0, 255).astype(np.uint8)
+
+
+def test_rejects_dark_and_overexposed_frames():
+    dark = assess_frame_quality(np.full((240, 320, 3), 15, dtype=np.uint8))
+    bright = assess_frame_quality(np.full((240, 320, 3), 252, dtype=np.uint8))
+
+    assert (dark.ok, dark.reason) == (False, "too_dark")
+    assert (bright.ok, bright.reason) == (False, "too_bright")
+    assert dark.message
+
+
+def test_rejects_missing_small_and_blurry_faces(monkeypatch):
+    frame = _textured_frame()
+    boxes = [[], [(10, 10, 20, 20)], [(60, 40, 120, 120)]]
+    monkeypatch.setattr(frame_quality.face_detection, "detect_faces_fast", lambda gray: boxes.pop(0))
+
+    assert assess_frame_quality(frame).reason == "no_face"
+    assert assess_frame_quality(frame).reason == "face_too_small"
+
+    blurry = np.full((240, 320, 3), 120, dtype=np.uint8)
+    result = assess_frame_quality(blurry)
+    assert result.reason == "too_blurry"
+    assert result.metrics["sharpness"] == 0.0
+
+
+def test_pose_checks_use_eye_positions(monkeypatch):
+    frame = _textured_frame()
+    box = (60, 40, 120, 120)
+    monkeypatch.setattr(frame_quality.face_detection, "detect_faces_fast", lambda gray: [box])
+
+    eyes = [
+        [(20, 30, 20, 20), (80, 30, 20, 20)],  # level and centred
+        [(20, 10, 20, 20), (80, 50, 20, 20)],  # ~34 degree roll
+        [(0, 30, 20, 20), (40, 30, 20, 20)],  # midpoint far off the face centre
+        [(20, 30, 20, 20)],  # one eye: pose is not judged
+    ]
+    monkeypatch.setattr(frame_quality.face_detection, "detect_eyes", lambda gray, face: eyes.pop(0))
+
+    level = assess_frame_quality(frame)
+    assert level.ok and level.face_box == box and level.eyes is not None
+    assert level.metrics["rollDegrees"] == 0.0
+    assert assess_frame_quality(frame).reason == "head_tilted"
+    assert assess_frame_quality(frame).reason == "face_turned"
+    assert assess_frame_quality(frame).ok
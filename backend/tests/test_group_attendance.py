@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from backend import group_attendance
+from backend.group_attendance import assign_faces, student_distance_matrix
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_distance_matrix_uses_each_students_closest_template():
+    templates = np.stack([_unit(1, 0, 0), _unit(0, 1, 0), _unit(0.9, 0.1, 0), _unit(0, 0, 1)])
+    owners = ["s2", "s1", "s2", "s3"]
+    faces = np.stack([_unit(0.9, 0.1, 0), _unit(0, 0, 1)])
+
+    distances, student_ids = student_distance_matrix(faces, templates, owners)
+
+    assert student_ids == ["s1", "s2", "s3"]
+    assert distances.shape == (2, 3)
+    assert distances[0, 1] == pytest.approx(0.0, abs=1e-6)
+    assert distances[1, 2] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_assignment_never_credits_one_student_twice():
+    # Both faces are nearest to s1; the closer one gets s1 and the other
+    # takes its next acceptable student.
+    distances = np.array([[0.10, 0.50], [0.20, 0.30]], dtype=np.float32)
+    matches, unmatched = assign_faces(distances, ["s1", "s2"], threshold=0.6)
+
+    assert [student for _, student, _ in matches] == ["s1", "s2"]
+    assert unmatched == []
+
+
+def test_faces_beyond_threshold_stay_unmatched():
+    distances = np.array([[0.10, 0.90], [0.15, 0.95], [0.80, 0.85]], dtype=np.float32)
+    matches, unmatched = assign_faces(distances, ["s1", "s2"], threshold=0.6)
+
+    assert matches == [(0, "s1", pytest.approx(0.10))]
+    assert unmatched == [1, 2]
+
+
+def test_greedy_fallback_is_one_to_one(monkeypatch):
+    monkeypatch.setattr(group_attendance, "linear_sum_assignment", None)
+    distances = np.array([[0.10, 0.20, 0.30], [0.12, 0.50, 0.25]], dtype=np.float32)
+    matches, unmatched = assign_faces(distances, ["s1", "s2", "s3"], threshold=0.6)
+
+    assert [(face, student) for face, student, _ in matches] == [(0, "s1"), (1, "s3")]
+    assert unmatched == []
+
+
+def test_hungarian_assignment_minimises_total_distance():
+    pytest.importorskip("scipy")
+    # Greedy would pair face 0 with s1 (0.10) and leave face 1 with s2 (0.55);
+    # the optimal pairing totals 0.15 + 0.20.
+    distances = np.array([[0.10, 0.15], [0.20, 0.55]], dtype=np.float32)
+    matches, _ = assign_faces(distances, ["s1", "s2"], threshold=0.6)
+
+    assert [(face, student) for face, student, _ in matches] == [(0, "s2"), (1, "s1")]
+
+
+def test_no_faces_or_no_students():
+    assert assign_faces(np.zeros((0, 2), dtype=np.float32), ["s1", "s2"], 0.6) == ([], [])
+    assert assign_faces(np.zeros((2, 0), dtype=np.float32), [], 0.6) == ([], [0, 1])
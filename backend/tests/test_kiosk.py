@@ -0,0 +1,151 @@
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from backend import kiosk
+from backend.kiosk import FaceTracker, FrameStreamError, KioskSession, KioskSessionRegistry, read_frames
+
+
+def _frame_stream(*payloads, terminator=True):
+    buffer = io.BytesIO()
+    for payload in payloads:
+        buffer.write(struct.pack(">I", len(payload)))
+        buffer.write(payload)
+    if terminator:
+        buffer.write(struct.pack(">I", 0))
+    buffer.seek(0)
+    return buffer
+
+
+def test_read_frames_parses_length_prefixed_payloads():
+    assert list(read_frames(_frame_stream(b"one", b"two"), max_frame_bytes=10)) == [b"one", b"two"]
+    assert list(read_frames(_frame_stream(b"one", terminator=False), max_frame_bytes=10)) == [b"one"]
+
+
+def test_read_frames_rejects_oversized_and_truncated_frames():
+    with pytest.raises(FrameStreamError):
+        list(read_frames(_frame_stream(b"x" * 11), max_frame_bytes=10))
+
+    truncated = io.BytesIO(struct.pack(">I", 5) + b"ab")
+    with pytest.raises(FrameStreamError):
+        list(read_frames(truncated, max_frame_bytes=10))
+
+
+def test_tracker_keeps_identity_for_overlapping_boxes():
+    tracker = FaceTracker(max_missing_frames=2)
+    first = tracker.update([(100, 100, 50, 50)], 1)[0]
+    moved = tracker.update([(105, 102, 50, 50), (300, 300, 40, 40)], 2)
+
+    assert moved[0] is first
+    assert moved[1].track_id != first.track_id
+
+    tracker.update([], 5)
+    assert tracker.update([(105, 102, 50, 50)], 6)[0] is not first
+
+
+def test_session_embeds_each_face_once_and_records_once(monkeypatch):
+    boxes = [[(10, 10, 40, 40)], [(12, 11, 40, 40)], [], [(200, 10, 40, 40)]]
+    monkeypatch.setattr(kiosk.face_detection, "detect_faces_fast", lambda gray: boxes.pop(0))
+    monkeypatch.setattr(kiosk.face_detection, "laplacian_variance", lambda gray, box: 100.0)
+    monkeypatch.setattr(kiosk.face_detection, "eye_centers", lambda gray, box: ((20, 25), (40, 25)))
+
+    identified = []
+    recorded = []
+
+    def identify(image, box, eyes):
+        assert eyes == ((20, 25), (40, 25))
+        identified.append(box)
+        return "A1", 0.2
+
+    def record(student_id, distance):
+        recorded.append(student_id)
+        return {"status": "pending"}, 202
+
+    session = KioskSession(identify, record)
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    events = [event for _ in range(4) for event in session.process_frame(frame)]
+
+    # One embedding per track; the second track is the same student re-entering.
+    assert len(identified) == 2
+    assert recorded == ["A1"]
+    assert [event.get("duplicate", False) for event in events] == [False, True]
+    assert session.summary()["identified"] == ["A1"]
+
+
+def test_session_skips_blurry_faces_and_gives_up_after_retries(monkeypatch):
+    sharpness = iter([10.0, 100.0, 100.0, 100.0, 100.0, 100.0, 100.0])
+    monkeypatch.setattr(kiosk.face_detection, "detect_faces_fast", lambda gray: [(10, 10, 40, 40)])
+    monkeypatch.setattr(kiosk.face_detection, "laplacian_variance", lambda gray, box: next(sharpness))
+    monkeypatch.setattr(kiosk.face_detection, "eye_centers", lambda gray, box: ((20, 25), (40, 25)))
+
+    attempts = []
+    session = KioskSession(
+        lambda image, box, eyes: attempts.append(box) or (None, 0.9),
+        lambda student_id, distance: ({}, 200),
+        retry_interval_frames=1,
+        max_attempts=2,
+    )
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    events = [event for _ in range(6) for event in session.process_frame(frame)]
+
+    assert len(attempts) == 2
+    assert [event["event"] for event in events] == ["unrecognized"]
+
+
+def test_session_waits_for_eye_landmarks_before_embedding(monkeypatch):
+    eyes = iter([None, None, ((20, 25), (40, 25))])
+    monkeypatch.setattr(kiosk.face_detection, "detect_faces_fast", lambda gray: [(10, 10, 40, 40)])
+    monkeypatch.setattr(kiosk.face_detection, "laplacian_variance", lambda gray, box: 100.0)
+    monkeypatch.setattr(kiosk.face_detection, "eye_centers", lambda gray, box: next(eyes))
+
+    attempts = []
+    session = KioskSession(
+        lambda image, box, eyes: attempts.append(eyes) or (None, 0.9),
+        lambda student_id, distance: ({}, 200),
+        max_attempts=1,
+    )
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    events = [event for _ in range(3) for event in session.process_frame(frame)]
+
+    # Eyeless frames do not use up the track's attempts.
+    assert attempts == [((20, 25), (40, 25))]
+    assert [event["event"] for event in events] == ["unrecognized"]
+
+
+def test_session_retries_failed_writes_without_embedding_again(monkeypatch):
+    monkeypatch.setattr(kiosk.face_detection, "detect_faces_fast", lambda gray: [(10, 10, 40, 40)])
+    monkeypatch.setattr(kiosk.face_detection, "laplacian_variance", lambda gray, box: 100.0)
+    monkeypatch.setattr(kiosk.face_detection, "eye_centers", lambda gray, box: ((20, 25), (40, 25)))
+
+    attempts = []
+    outcomes = iter([({"status": "error"}, 500), ({"status": "pending"}, 202)])
+    session = KioskSession(
+        lambda image, box, eyes: attempts.append(box) or ("A1", 0.2),
+        lambda student_id, distance: next(outcomes),
+        retry_interval_frames=2,
+    )
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    events = [event for _ in range(5) for event in session.process_frame(frame)]
+
+    assert len(attempts) == 1
+    assert [(event["httpStatus"], event.get("retrying", False)) for event in events] == [(500, True), (202, False)]
+    assert session.recorded == {"A1": {"status": "pending"}}
+
+
+def test_registry_keeps_sessions_until_they_idle_out():
+    now = [0.0]
+    registry = KioskSessionRegistry(ttl_seconds=10, max_sessions=2, clock=lambda: now[0])
+    first = registry.get("door-1", object)
+
+    registry.get("door-2", object)
+    now[0] = 8.0
+    assert registry.get("door-1", object) is first
+    # door-2 is now the least recently used, so the cap pushes it out.
+    registry.get("door-3", object)
+    assert list(registry._sessions) == ["door-1", "door-3"]
+    now[0] = 19.0
+    assert registry.get("door-1", object) is not first
+    now[0] = 40.0
+    assert registry.get("door-1", object) is not first
@@ -0,0 +1,135 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from backend.attendance_stream import AttendanceStatusBroadcaster
+from backend.memory_store import InMemoryBucket, InMemoryFirestore, NotFound, verify_id_token
+from backend.seed_data import load_firestore_seed, mint_emulator_id_token, read_firestore_seed, synthetic_seed, write_firestore_seed
+
+
+CENTRAL_TZ = ZoneInfo("America/Chicago")
+SERVER_TIMESTAMP = object()
+DELETE_FIELD = object()
+
+
+def _at(day, hour, minute=0):
+    return datetime.datetime(2024, 4, day, hour, minute, tzinfo=CENTRAL_TZ)
+
+
+@pytest.fixture
+def db():
+    store = InMemoryFirestore(server_timestamp=SERVER_TIMESTAMP, delete_field=DELETE_FIELD)
+    attendance = store.collection("attendance")
+    attendance.document("c1_a").set({"classID": "c1", "studentID": "a", "date": _at(1, 9), "status": "Present"})
+    attendance.document("c1_b").set({"classID": "c1", "studentID": "b", "date": _at(1, 9, 20), "status": "Late"})
+    attendance.document("c1_c").set({"classID": "c1", "studentID": "c", "date": _at(3, 9), "status": "Present"})
+    attendance.document("c2_a").set({"classID": "c2", "studentID": "a", "date": _at(2, 9), "status": "Present"})
+    attendance.document("c1_nodate").set({"classID": "c1", "studentID": "d", "status": "Present"})
+    return store
+
+
+def test_where_chains_and_range_filters(db):
+    query = (
+        db.collection("attendance")
+        .where("classID", "==", "c1")
+        .where("date", ">=", _at(1, 0))
+        .where("date", "<=", _at(2, 23))
+    )
+    assert [doc.id for doc in query.stream()] == ["c1_a", "c1_b"]
+    assert [doc.id for doc in db.collection("attendance").where("status", "in", ["Late"]).stream()] == ["c1_b"]
+
+
+def test_order_by_cursor_pagination_and_projection(db):
+    base = db.collection("attendance").where("classID", "==", "c1").order_by("date", direction="DESCENDING")
+
+    first_page = list(base.limit(2).select(["status"]).stream())
+    assert [doc.id for doc in first_page] == ["c1_c", "c1_b"]
+    assert first_page[0].to_dict() == {"status": "Present"}
+
+    # Documents without the ordered field are excluded, as in Firestore.
+    second_page = list(base.start_after({"date": _at(1, 9, 20)}).stream())
+    assert [doc.id for doc in second_page] == ["c1_a"]
+
+    # Cursors from a projected snapshot still work.
+    after_snapshot = list(base.start_after(db.collection("attendance").document("c1_c").get()).limit(1).stream())
+    assert [doc.id for doc in after_snapshot] == ["c1_b"]
+
+
+def test_sentinels_updates_and_batches(db):
+    ref = db.collection("attendance").document("c1_a")
+    ref.update({"isPending": True, "updatedAt": SERVER_TIMESTAMP, "verification.distance": 0.2})
+    ref.update({"isPending": DELETE_FIELD})
+    data = ref.get().to_dict()
+    assert "isPending" not in data
+    assert isinstance(data["updatedAt"], datetime.datetime)
+    assert data["verification"] == {"distance": 0.2}
+
+    batch = db.batch()
+    batch.update(db.collection("attendance").document("c1_b"), {"status": "Excused"})
+    batch.update(db.collection("attendance").document("missing"), {"status": "Excused"})
+    with pytest.raises(NotFound):
+        batch.commit()
+    # The failed batch wrote nothing.
+    assert db.collection("attendance").document("c1_b").get().to_dict()["status"] == "Late"
+
+
+def test_on_snapshot_drives_attendance_broadcaster(db):
+    broadcaster = AttendanceStatusBroadcaster(lambda: db, CENTRAL_TZ)
+    subscription = broadcaster.subscribe("c1", now=_at(1, 8))
+
+    snapshot = subscription._queue.get_nowait()
+    assert snapshot[0] == "snapshot"
+    assert {record["recordId"] for record in snapshot[1]["records"]} == {"c1_a", "c1_b", "c1_c"}
+
+    db.collection("attendance").document("c1_b").update({"status": "Excused"})
+    event_name, payload = subscription._queue.get_nowait()
+    assert (event_name, payload["recordId"], payload["status"]) == ("status", "c1_b", "Excused")
+
+    broadcaster.unsubscribe(subscription)
+    assert db._watches == []
+
+
+def test_bucket_round_trip(tmp_path):
+    bucket = InMemoryBucket("demo")
+    bucket.blob("known_faces/a.jpg").upload_from_string(b"jpeg-bytes", content_type="image/jpeg")
+
+    assert bucket.blob("known_faces/a.jpg").exists()
+    assert [blob.name for blob in bucket.list_blobs(prefix="known_faces/")] == ["known_faces/a.jpg"]
+    assert bucket.blob("known_faces/a.jpg").download_as_bytes(start=0, end=3) == b"jpeg"
+
+    target = tmp_path / "a.jpg"
+    bucket.blob("known_faces/a.jpg").download_to_filename(str(target))
+    assert target.read_bytes() == b"jpeg-bytes"
+
+
+def test_seed_files_round_trip_timestamps(tmp_path):
+    seed = synthetic_seed(class_count=1, students_per_class=3, days=7, start_date=datetime.date(2024, 4, 1))
+    path = tmp_path / "seed.json"
+    write_firestore_seed(str(path), seed)
+
+    store = InMemoryFirestore()
+    assert load_firestore_seed(store, read_firestore_seed(str(path))) == sum(len(docs) for docs in seed.values())
+
+    records = list(
+        store.collection("attendance")
+        .where("classID", "==", "CLS000")
+        .where("date", ">=", _at(3, 0))
+        .stream()
+    )
+    assert records and all(doc.to_dict()["date"] >= _at(3, 0) for doc in records)
+
+
+def test_verify_id_token_accepts_minted_tokens_only():
+    token = mint_emulator_id_token("teacher000", "teacher000@example.edu", "demo-attendance")
+
+    claims = verify_id_token(token, "demo-attendance")
+    assert claims["uid"] == "teacher000"
+    assert claims["email"] == "teacher000@example.edu"
+
+    with pytest.raises(ValueError):
+        verify_id_token(token, "other-project")
+    with pytest.raises(ValueError):
+        verify_id_token(token, "demo-attendance", now=claims["exp"] + 1)
+    with pytest.raises(ValueError):
+        verify_id_token("not-a-token", "demo-attendance")
@@ -0,0 +1,89 @@
+import sys
+import tracemalloc
+import types
+
+from backend import memory_watchdog
+from backend.memory_watchdog import MemoryWatchdog, current_rss_bytes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_current_rss_is_reported():
+    rss = current_rss_bytes()
+    assert rss is None or rss > 0
+
+
+def test_recycles_only_after_consecutive_checks_over_ceiling():
+    readings = iter([50, 150, 80, 150, 160, 170])
+    recycled = []
+    clock = FakeClock()
+    watchdog = MemoryWatchdog(
+        ceiling_bytes=100,
+        consecutive_checks=2,
+        recycle_jitter=0,
+        on_exceed=recycled.append,
+        rss_reader=lambda: next(readings),
+        clock=clock,
+    )
+
+    results = []
+    for _ in range(6):
+        clock.now += 15
+        results.append(watchdog.check())
+
+    # A single spike (150 then 80) does not count; 150, 160 does, and the
+    # recycle is requested only once.
+    assert results == [False, False, False, False, True, False]
+    assert recycled == [160]
+    assert [rss for _, rss in watchdog.history()] == [50, 150, 80, 150, 160, 170]
+
+
+def test_no_ceiling_never_recycles():
+    watchdog = MemoryWatchdog(ceiling_bytes=0, on_exceed=lambda rss: 1 / 0, rss_reader=lambda: 10**12)
+    assert watchdog.check() is False
+
+
+def test_report_includes_growth_tracemalloc_and_tensorflow(monkeypatch):
+    readings = iter([100 * 2**20, 110 * 2**20, 120 * 2**20])
+    clock = FakeClock()
+    watchdog = MemoryWatchdog(rss_reader=lambda: next(readings), clock=clock)
+    watchdog.check()
+    clock.now += 1800
+    watchdog.check()
+
+    class Device:
+        name = "/device:GPU:0"
+        device_type = "GPU"
+
+    fake_tf = types.SimpleNamespace(config=types.SimpleNamespace(
+        list_logical_devices=lambda: [Device()],
+        experimental=types.SimpleNamespace(get_memory_info=lambda name: {"current": 5, "peak": 9}),
+    ))
+    monkeypatch.setitem(sys.modules, "tensorflow", fake_tf)
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(1)
+    try:
+        report = watchdog.report(tracemalloc_limit=3)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    assert report["rssBytes"] == 120 * 2**20
+    assert report["rssGrowthBytesPerHour"] == 20 * 2**20
+    assert report["tensorflow"] == {
+        "devices": [{"device": "/device:GPU:0", "type": "GPU", "currentBytes": 5, "peakBytes": 9}]
+    }
+    assert 0 < len(report["tracemalloc"]["top"]) <= 3
+
+
+def test_tensorflow_stats_absent_when_not_loaded(monkeypatch):
+    monkeypatch.delitem(sys.modules, "tensorflow", raising=False)
+    assert memory_watchdog.tensorflow_memory_stats() is None
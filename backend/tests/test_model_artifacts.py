@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from backend import model_artifacts
+from backend.model_artifacts import ModelArtifactError, ModelArtifactManager, required_weight_files
+
+
+def _prepare(root, files):
+    weights = root / ".deepface" / "weights"
+    weights.mkdir(parents=True)
+    for name, data in files.items():
+        (weights / name).write_bytes(data)
+    return weights
+
+
+def test_required_weight_files():
+    assert required_weight_files("VGG-Face", ["retinaface", "opencv", "unknown"]) == [
+        "retinaface.h5",
+        "vgg_face_weights.h5",
+    ]
+
+
+def test_verify_accepts_matching_files_and_activates(tmp_path, monkeypatch):
+    _prepare(tmp_path, {"vgg_face_weights.h5": b"vgg" * 100, "retinaface.h5": b"rf"})
+    manager = ModelArtifactManager(str(tmp_path), required=["vgg_face_weights.h5", "retinaface.h5"])
+    manifest = manager.write_manifest()
+    assert set(manifest["files"]) == {".deepface/weights/vgg_face_weights.h5", ".deepface/weights/retinaface.h5"}
+
+    monkeypatch.setenv("DEEPFACE_HOME", "/nowhere")
+    assert manager.activate() == 2
+    assert os.environ["DEEPFACE_HOME"] == str(tmp_path)
+
+
+def test_verify_reports_missing_corrupt_and_unlisted_files(tmp_path):
+    weights = _prepare(tmp_path, {"vgg_face_weights.h5": b"good", "retinaface.h5": b"rf"})
+    manager = ModelArtifactManager(str(tmp_path), required=["vgg_face_weights.h5", "arcface_weights.h5"])
+    manager.write_manifest()
+
+    (weights / "vgg_face_weights.h5").write_bytes(b"bad!")
+    (weights / "retinaface.h5").unlink()
+
+    with pytest.raises(ModelArtifactError) as excinfo:
+        manager.verify()
+    message = str(excinfo.value)
+    assert "arcface_weights.h5 is required" in message
+    assert "retinaface.h5 is missing" in message
+    assert "vgg_face_weights.h5 has checksum" in message
+
+
+def test_no_manifest_fails_fast(tmp_path):
+    with pytest.raises(ModelArtifactError, match="No model manifest"):
+        ModelArtifactManager(str(tmp_path)).verify()
+    assert model_artifacts.main(["verify", "--dir", str(tmp_path)]) == 1
+
+
+def test_unchanged_files_are_not_rehashed(tmp_path, monkeypatch):
+    _prepare(tmp_path, {"vgg_face_weights.h5": b"vgg"})
+    manager = ModelArtifactManager(str(tmp_path), required=["vgg_face_weights.h5"])
+    manager.write_manifest()
+    manager.verify()
+
+    calls = []
+    original = model_artifacts.file_sha256
+    monkeypatch.setattr(model_artifacts, "file_sha256", lambda path: calls.append(path) or original(path))
+    manager.verify()
+    assert calls == []
+
+    weights_file = tmp_path / ".deepface" / "weights" / "vgg_face_weights.h5"
+    os.utime(weights_file, ns=(0, 0))
+    manager.verify()
+    assert len(calls) == 1
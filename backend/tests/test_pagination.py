@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from backend.memory_store import InMemoryFirestore
+from backend.pagination import (
+    PageTokenError,
+    decode_page_token,
+    encode_page_token,
+    fetch_page,
+    query_fingerprint,
+)
+
+
+def _seed(db):
+    attendance = db.collection("attendance")
+    base = datetime.datetime(2024, 4, 1, 9, tzinfo=datetime.timezone.utc)
+    for index in range(7):
+        # Two records share each timestamp so the document-ID tiebreak matters.
+        attendance.document(f"c1_{index}").set({"classID": "c1", "date": base + datetime.timedelta(days=index // 2)})
+    attendance.document("c2_0").set({"classID": "c2", "date": base})
+    return attendance
+
+
+def test_pages_cover_every_record_once_newest_first():
+    db = InMemoryFirestore()
+    attendance = _seed(db)
+    query = attendance.where("classID", "==", "c1").select(["date"])
+    fingerprint = query_fingerprint(classId="c1")
+
+    seen = []
+    token = None
+    while True:
+        cursor = decode_page_token(token, fingerprint) if token else None
+        snapshots, next_cursor = fetch_page(query, attendance, "date", 3, cursor)
+        seen.extend(snapshot.id for snapshot in snapshots)
+        if next_cursor is None:
+            break
+        token = encode_page_token(*next_cursor, fingerprint)
+
+    assert seen == ["c1_6", "c1_5", "c1_4", "c1_3", "c1_2", "c1_1", "c1_0"]
+
+
+def test_tokens_are_bound_to_their_query():
+    moment = datetime.datetime(2024, 4, 1, 9, tzinfo=datetime.timezone.utc)
+    token = encode_page_token(moment, "c1_3", query_fingerprint(classId="c1"))
+
+    assert decode_page_token(token, query_fingerprint(classId="c1")) == (moment, "c1_3")
+    with pytest.raises(PageTokenError):
+        decode_page_token(token, query_fingerprint(classId="c2"))
+    with pytest.raises(PageTokenError):
+        decode_page_token("not-a-token", query_fingerprint(classId="c1"))
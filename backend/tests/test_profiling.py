@@ -0,0 +1,63 @@
+import random
+import time
+
+from backend.profiling import RequestProfiler
+
+
+def _busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+
+def test_profile_writes_collapsed_stacks_and_lists_them(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), interval=0.001)
+
+    with profiler.profile("export_attendance"):
+        _busy_loop(0.05)
+
+    profiles = profiler.list_profiles()
+    assert len(profiles) == 1
+    assert profiles[0]["endpoint"] == "export_attendance"
+    assert profiles[0]["durationMs"] >= 50
+
+    text = profiler.read_profile(profiles[0]["name"])
+    lines = text.strip().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("_busy_loop (test_profiling.py:" in line for line in lines)
+
+
+def test_read_profile_rejects_unknown_and_traversal_names(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    assert profiler.read_profile("../../etc/passwd") is None
+    assert profiler.read_profile("20240101T000000000000Z_x_1ms_1.collapsed") is None
+
+
+def test_sampling_rate_and_retention(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0.25, interval=0.001, max_files=2, rng=random.Random(7))
+    picks = sum(profiler.should_profile() for _ in range(4000))
+    assert 850 < picks < 1150
+    assert RequestProfiler(str(tmp_path)).should_profile() is False
+    assert RequestProfiler(str(tmp_path)).should_profile(forced=True) is True
+
+    for _ in range(3):
+        with profiler.profile("list_attendance"):
+            time.sleep(0.002)
+    assert len(profiler.list_profiles()) == 2
+
+
+def test_started_profile_is_written_once_and_frees_its_slot(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), interval=0.001, max_concurrent=1)
+
+    stop = profiler.start("export_attendance")
+    assert profiler.start("export_attendance") is None
+    _busy_loop(0.02)
+    stop()
+    stop()
+
+    assert len(profiler.list_profiles()) == 1
+    second = profiler.start("export_attendance")
+    assert second is not None
+    second()
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from backend.rate_limit import RequestCoalescer, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_limits():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate_per_minute=6, burst=2, clock=clock)
+
+    assert limiter.try_acquire("student:A1") == (True, 0.0)
+    assert limiter.try_acquire("student:A1") == (True, 0.0)
+
+    allowed, retry_after = limiter.try_acquire("student:A1")
+    assert not allowed
+    assert retry_after == 10.0
+
+    clock.now = 10.0
+    assert limiter.try_acquire("student:A1")[0]
+
+
+def test_token_bucket_acquires_all_keys_or_none():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=1, clock=clock)
+
+    assert limiter.try_acquire("ip:10.0.0.1")[0]
+    allowed, _ = limiter.try_acquire("ip:10.0.0.1", "student:A1")
+    assert not allowed
+
+    # The student bucket was not charged by the rejected attempt.
+    assert limiter.try_acquire("student:A1")[0]
+
+
+def test_token_bucket_scopes_have_their_own_limits():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=5, clock=clock, scopes={"student": (6, 1)})
+
+    assert limiter.try_acquire("ip:10.0.0.1", "student:A1")[0]
+    allowed, retry_after = limiter.try_acquire("ip:10.0.0.1", "student:A1")
+    assert not allowed and retry_after == 10.0
+
+    # Only the accepted request was charged to the IP bucket.
+    for _ in range(4):
+        assert limiter.try_acquire("ip:10.0.0.1")[0]
+    assert not limiter.try_acquire("ip:10.0.0.1")[0]
+
+
+def test_checked_buckets_are_charged_separately():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=5, clock=clock, scopes={"student": (6, 1)})
+
+    for _ in range(3):
+        assert limiter.try_acquire("ip:10.0.0.1", check=["student:A1"])[0]
+    limiter.charge("student:A1")
+    allowed, retry_after = limiter.try_acquire("ip:10.0.0.1", check=["student:A1"])
+    assert not allowed and retry_after == 10.0
+
+    # Charging an empty bucket does not push it further into debt.
+    limiter.charge("student:A1")
+    clock.now = 10.0
+    assert limiter.try_acquire("ip:10.0.0.1", check=["student:A1"])[0]
+
+
+def test_coalescer_shares_result_between_concurrent_callers():
+    coalescer = RequestCoalescer()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(coalescer.run("key", slow_call)))
+    leader.start()
+    started.wait(5)
+
+    follower = threading.Thread(target=lambda: results.append(coalescer.run("key", slow_call)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False), ("result", True)]
+    assert coalescer.in_flight() == 0
@@ -0,0 +1,59 @@
+from backend.memory_store import InMemoryFirestore
+from backend.record_keys import (
+    candidate_record_ids,
+    find_record,
+    hashed_record_id,
+    legacy_record_id,
+    migrate_records,
+    other_layout_id,
+    record_id,
+)
+
+
+def test_hashed_ids_are_deterministic_and_spread_a_class_burst():
+    assert record_id("c1", "s1", "2024-04-01", "legacy") == "c1_s1_2024-04-01"
+    hashed = hashed_record_id("c1", "s1", "2024-04-01")
+    assert hashed == hashed_record_id("c1", "s1", "2024-04-01")
+    assert hashed.endswith("_c1_s1_2024-04-01") and len(hashed.split("_")[0]) == 4
+
+    prefixes = {hashed_record_id("c1", f"s{n}", "2024-04-01")[:1] for n in range(200)}
+    assert len(prefixes) > 10
+    assert candidate_record_ids("c1", "s1", "2024-04-01", "hashed") == [hashed, "c1_s1_2024-04-01"]
+
+
+def test_other_layout_id_converts_both_ways():
+    hashed = hashed_record_id("c1", "s1", "2024-04-01")
+    assert other_layout_id("c1_s1_2024-04-01") == hashed
+    assert other_layout_id(hashed) == "c1_s1_2024-04-01"
+    # A class ID that merely looks like a hash prefix is still treated as legacy.
+    assert other_layout_id("abcd_s1_2024-04-01") == hashed_record_id("abcd", "s1", "2024-04-01")
+
+
+def test_find_record_falls_back_to_the_other_layout():
+    db = InMemoryFirestore()
+    db.collection("attendance").document(legacy_record_id("c1", "s1", "2024-04-01")).set({"status": "Present"})
+
+    snapshot = find_record(db, "attendance", "c1", "s1", "2024-04-01", layout="hashed")
+    assert snapshot.id == "c1_s1_2024-04-01"
+    assert find_record(db, "attendance", "c1", "s2", "2024-04-01", layout="hashed") is None
+
+
+def test_migration_moves_records_and_skips_unparseable_ones():
+    db = InMemoryFirestore()
+    attendance = db.collection("attendance")
+    attendance.document("c1_s1_2024-04-01").set({"classID": "c1", "studentID": "s1", "day": "2024-04-01"})
+    attendance.document(hashed_record_id("c1", "s2", "2024-04-01")).set(
+        {"classID": "c1", "studentID": "s2", "day": "2024-04-01"}
+    )
+    attendance.document("manual-entry").set({"classID": "c1", "studentID": "s3", "day": "2024-04-01"})
+    record_date = lambda record: record.get("day")
+
+    dry = migrate_records(db, "hashed", record_date, dry_run=True, logger=lambda _msg: None)
+    assert dry == {"scanned": 3, "moved": 1, "skipped": 1}
+    assert attendance.document("c1_s1_2024-04-01").get().exists
+
+    migrate_records(db, "hashed", record_date, logger=lambda _msg: None)
+    assert not attendance.document("c1_s1_2024-04-01").get().exists
+    moved = attendance.document(hashed_record_id("c1", "s1", "2024-04-01")).get()
+    assert moved.to_dict()["studentID"] == "s1"
+    assert attendance.document("manual-entry").get().exists
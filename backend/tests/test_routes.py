@@ -0,0 +1,374 @@
+import datetime
+import io
+import json
+import time
+import types
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from backend.allowed_networks import UNT_EAGLENET_NETWORKS
+from backend.detector_cascade import Detection
+from backend.memory_store import InMemoryBucket, InMemoryFirestore
+from backend.profiling import RequestProfiler
+from backend.rate_limit import TokenBucketLimiter
+
+
+CENTRAL = ZoneInfo("America/Chicago")
+ALLOWED_IP = str(UNT_EAGLENET_NETWORKS[0].network_address)
+SERVER_TIMESTAMP = object()
+TEACHER = {"Authorization": "Bearer teacher-token"}
+
+
+def _request(app_module, payload=None, ip=ALLOWED_IP, args=None, headers=None, body=b"", method="POST"):
+    app_module.request = types.SimpleNamespace(
+        method=method,
+        headers={"X-Forwarded-For": ip, **(headers or {})},
+        remote_addr=ip,
+        args=args or {},
+        files={},
+        stream=io.BytesIO(body),
+        get_json=lambda silent=True: payload,
+    )
+
+
+def _teacher_app(load_app, monkeypatch):
+    """The app on an in-memory Firestore where the token's teacher teaches CSCE1."""
+
+    app_module, _fake_db = load_app({})
+    monkeypatch.setattr(app_module.firestore, "SERVER_TIMESTAMP", SERVER_TIMESTAMP, raising=False)
+    db = InMemoryFirestore(server_timestamp=SERVER_TIMESTAMP, delete_field=app_module.firestore.DELETE_FIELD)
+    app_module.db = db
+    db.collection("users").document("fake-teacher").set({"role": "teacher", "id": "T1"})
+    for student_id in ("s1", "s2", "s3"):
+        db.collection("users").document(student_id).set({"role": "student", "id": student_id})
+    db.collection("classes").document("CSCE1").set({"teacher": "T1", "students": ["s1", "s2", "s3"]})
+    monkeypatch.setattr(app_module, "_attendance_status_now", lambda *args: ("Present", None))
+    return app_module, db
+
+
+def _attendance(db, student_id, day, status="Present", hour=9):
+    doc_id = f"CSCE1_{student_id}_{day.isoformat()}"
+    db.collection("attendance").document(doc_id).set({
+        "studentID": student_id,
+        "classID": "CSCE1",
+        "date": datetime.datetime.combine(day, datetime.time(hour), tzinfo=CENTRAL),
+        "status": status,
+    })
+    return doc_id
+
+
+def test_face_recognition_rate_limit_charges_students_only_for_verified_scans(load_app):
+    app_module, _fake_db = load_app({})
+    app_module.face_scan_limiter = TokenBucketLimiter(
+        rate_per_minute=60, burst=3, scopes={"student": (6, 1)},
+    )
+    verified = {"A1"}
+    scored = []
+
+    def process():
+        student_id = app_module.request.get_json()["studentId"]
+        scored.append(student_id)
+        if student_id not in verified:
+            return {"status": "fail"}, 404
+        app_module.face_scan_limiter.charge(f"student:{student_id}")
+        return {"status": "success"}, 200
+
+    app_module._process_face_recognition_request = process
+
+    # A scan claiming A1 whose face does not match leaves A1's allowance alone.
+    verified.clear()
+    _request(app_module, {"classId": "CSCE1", "studentId": "A1", "image": "someone-else"})
+    assert app_module.face_recognition()[1] == 404
+    verified.add("A1")
+    _request(app_module, {"classId": "CSCE1", "studentId": "A1", "image": "frame-1"})
+    assert app_module.face_recognition() == ({"status": "success"}, 200)
+
+    _request(app_module, {"classId": "CSCE1", "studentId": "A1", "image": "frame-2"})
+    payload, status_code, headers = app_module.face_recognition()
+    assert status_code == 429
+    assert payload["status"] == "rate_limited"
+    assert headers == {"Retry-After": "10"}
+
+    # The refused request did not spend the shared IP's token.
+    _request(app_module, {"classId": "CSCE1", "studentId": "B2", "image": "frame-3"})
+    assert app_module.face_recognition()[1] == 404
+    assert scored == ["A1", "A1", "B2"]
+
+
+class _StreamedResponse:
+    is_streamed = True
+
+    def __init__(self, body):
+        self.body = body
+        self.on_close = []
+
+    def call_on_close(self, func):
+        self.on_close.append(func)
+
+
+def _generate_rows():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        yield "row\n"
+
+
+def test_profiled_streamed_response_is_profiled_until_closed(load_app, tmp_path):
+    app_module, _fake_db = load_app({})
+    app_module.request_profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, interval=0.001)
+    _request(app_module)
+
+    view = app_module.profiled(lambda: _StreamedResponse(_generate_rows()))
+    response = view()
+    assert app_module.request_profiler.list_profiles() == []
+
+    assert all(chunk == "row\n" for chunk in response.body)
+    for func in response.on_close:
+        func()
+
+    [profile] = app_module.request_profiler.list_profiles()
+    assert profile["durationMs"] >= 50
+    assert "_generate_rows (test_routes.py:" in app_module.request_profiler.read_profile(profile["name"])
+
+
+def test_list_attendance_pages_with_tokens_bound_to_the_query(load_app, monkeypatch):
+    app_module, db = _teacher_app(load_app, monkeypatch)
+    for day in range(1, 6):
+        _attendance(db, "s1", datetime.date(2025, 3, day))
+    _attendance(db, "s2", datetime.date(2025, 3, 3))
+
+    seen = []
+    args = {"classId": "CSCE1", "pageSize": "4", "startDate": "2025-03-02"}
+    while True:
+        _request(app_module, args=args, headers=TEACHER, method="GET")
+        payload, status_code = app_module.list_attendance()
+        assert status_code == 200
+        seen.extend(record["recordId"] for record in payload["records"])
+        if not payload["nextPageToken"]:
+            break
+        args = dict(args, pageToken=payload["nextPageToken"])
+
+    assert len(seen) == 5 and len(set(seen)) == 5
+    assert seen[0] == "CSCE1_s1_2025-03-05"
+    assert set(payload["records"][0]) == {"recordId", "studentID", "date", "status", "proposedStatus", "isPending"}
+
+    # A token only continues the query it came from.
+    _request(app_module, args=dict(args, startDate="2025-03-01"), headers=TEACHER, method="GET")
+    payload, status_code = app_module.list_attendance()
+    assert status_code == 400
+
+    _request(app_module, args={"classId": "CSCE1", "fields": "secret"}, headers=TEACHER, method="GET")
+    assert app_module.list_attendance()[1] == 400
+    _request(app_module, args={"classId": "CSCE1"}, method="GET")
+    assert app_module.list_attendance()[1] == 401
+
+
+def test_export_job_routes_submit_report_and_download(load_app, monkeypatch, tmp_path):
+    app_module, db = _teacher_app(load_app, monkeypatch)
+    app_module.export_jobs = app_module.ExportJobRunner(
+        lambda: app_module.db, lambda: None, str(tmp_path), progress_interval=0,
+    )
+    _attendance(db, "s1", datetime.date(2025, 3, 3))
+    _attendance(db, "s2", datetime.date(2025, 3, 4), status="Late")
+
+    _request(app_module, args={"classId": "CSCE1", "startDate": "2025-03-01", "endDate": "2025-03-31"},
+             headers=TEACHER)
+    payload, status_code = app_module.submit_export_job()
+    assert status_code == 202
+    job_id = payload["jobId"]
+
+    _request(app_module, headers=TEACHER, method="GET")
+    deadline = time.monotonic() + 5
+    while True:
+        status, status_code = app_module.export_job_status(job_id)
+        assert status_code == 200
+        if status["state"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    assert status["state"] == "succeeded" and status["progress"] == 1.0
+    assert status["downloadUrl"].endswith(f"/{job_id}/download")
+
+    response = app_module.download_export_job(job_id)
+    assert response.status_code == 200
+    lines = b"".join(response.iterable).decode("utf-8").splitlines()
+    assert lines[0].startswith("studentName,studentId,date,status")
+    assert [line.split(",")[1] for line in lines[1:]] == ["s1", "s2"]
+
+    _request(app_module, headers={"Range": "bytes=0-10", **TEACHER}, method="GET")
+    partial = app_module.download_export_job(job_id)
+    assert partial.status_code == 206 and len(b"".join(partial.iterable)) == 11
+
+    _request(app_module, method="GET")
+    assert app_module.export_job_status(job_id)[1] == 401
+    assert app_module.export_job_status("missing")[1] == 404
+
+
+def test_admin_routes_require_the_token_and_serve_profiles(load_app, tmp_path):
+    app_module, _fake_db = load_app({})
+    app_module.ADMIN_API_TOKEN = "admin-secret"
+    app_module.request_profiler = RequestProfiler(str(tmp_path), interval=0.001)
+    with app_module.request_profiler.profile("list_attendance"):
+        time.sleep(0.005)
+
+    _request(app_module, headers={"X-Admin-Token": "wrong"}, method="GET")
+    assert app_module.list_request_profiles()[1] == 403
+    assert app_module.get_worker_memory()[1] == 403
+    assert app_module.get_inference_stats()[1] == 403
+
+    _request(app_module, headers={"X-Admin-Token": "admin-secret"}, args={"top": "5"}, method="GET")
+    payload, status_code = app_module.list_request_profiles()
+    assert status_code == 200
+    [profile] = payload["profiles"]
+    assert profile["endpoint"] == "list_attendance"
+
+    response = app_module.get_request_profile(profile["name"])
+    assert response.headers["Content-Disposition"] == f"attachment; filename=\"{profile['name']}\""
+    assert app_module.get_request_profile("../etc/passwd")[1] == 404
+
+    payload, status_code = app_module.get_worker_memory()
+    assert status_code == 200 and "rssBytes" in payload["memory"]
+
+    app_module.face_detector._record([("haar", 0.002)], "haar")
+    payload, status_code = app_module.get_inference_stats()
+    assert status_code == 200
+    assert payload["detector"]["stages"]["haar"]["hitRate"] == 1.0
+
+
+def test_group_photo_records_new_matches_and_reports_existing_ones(load_app, monkeypatch):
+    app_module, db = _teacher_app(load_app, monkeypatch)
+    today = datetime.datetime.now(CENTRAL).date()
+    existing_id = _attendance(db, "s2", today, status="Late")
+
+    axes = np.eye(4, dtype=np.float32)
+    templates = {"s1": axes[0:1], "s2": axes[1:2], "s3": axes[2:3]}
+    monkeypatch.setattr(app_module, "_decode_data_url_image", lambda image: np.zeros((8, 8, 3), np.uint8))
+    monkeypatch.setattr(app_module, "_student_templates", lambda student_id: (templates.get(student_id), 1))
+    # Largest face first: s3, a stranger, s1 and s2.
+    faces = [Detection(axis, {"x": 0, "y": 0, "w": 50 - index, "h": 50 - index}, 0.99)
+             for index, axis in enumerate((axes[2], axes[3], axes[0], axes[1]))]
+    monkeypatch.setattr(app_module, "face_detector", types.SimpleNamespace(detect=lambda image: (faces, "retinaface")))
+    monkeypatch.setattr(app_module.face_embeddings, "embed_faces", lambda crops: np.stack(crops))
+    # One write per batch, so the recorded students span two commits.
+    monkeypatch.setattr(app_module, "FIRESTORE_BATCH_LIMIT", 1)
+
+    _request(app_module, {"image": "data:image/jpeg;base64,AAAA"}, args={"classId": "CSCE1"}, headers=TEACHER)
+    payload, status_code = app_module.group_photo_attendance()
+
+    assert status_code == 200
+    assert payload["facesDetected"] == 4
+    assert sorted(entry["studentId"] for entry in payload["recorded"]) == ["s1", "s3"]
+    assert payload["alreadyRecorded"] == [{"studentId": "s2", "recordId": existing_id, "status": "Late"}]
+    assert len(payload["unmatchedFaces"]) == 1 and payload["notRecognized"] == []
+
+    for entry in payload["recorded"]:
+        record = db.collection("attendance").document(entry["recordId"]).get().to_dict()
+        assert record["status"] == "Present" and record["decisionMethod"] == "group_photo"
+        assert record["verification"]["detector"] == "retinaface"
+    assert db.collection("attendance").document(existing_id).get().to_dict()["status"] == "Late"
+
+    _request(app_module, {}, args={"classId": "CSCE1"}, headers=TEACHER)
+    assert app_module.group_photo_attendance()[1] == 400
+
+
+def test_import_route_resolves_students_against_users_and_the_roster(load_app, monkeypatch):
+    app_module, db = _teacher_app(load_app, monkeypatch)
+    db.collection("users").document("u-outsider").set({"role": "student", "id": "s9"})
+    existing_id = _attendance(db, "s2", datetime.date(2025, 3, 4), status="Late")
+    csv_body = (
+        "studentName,studentId,date,status,checkInAt,decidedAt,decisionMethod\n"
+        "Ada,s1,2025-03-04,Present,2025-03-04T09:02:00-06:00,,\n"
+        "Alan,s2,2025-03-04,Absent,,,\n"
+        "Outsider,s9,2025-03-04,Present,,,\n"
+        "Nobody,s404,2025-03-04,Present,,,\n"
+    ).encode("utf-8")
+
+    _request(app_module, args={"classId": "CSCE1", "dryRun": "1"}, headers=TEACHER, body=csv_body)
+    payload, status_code = app_module.import_attendance()
+    assert status_code == 200 and payload["dryRun"] is True
+    assert db.collection("attendance").document(existing_id).get().to_dict()["status"] == "Late"
+
+    _request(app_module, args={"classId": "CSCE1"}, headers=TEACHER, body=csv_body)
+    payload, status_code = app_module.import_attendance()
+
+    assert status_code == 200
+    assert payload["status"] == "partial"
+    assert (payload["rows"], payload["created"], payload["updated"], payload["failed"]) == (4, 1, 1, 2)
+    errors = {error["studentId"]: error["errors"][0] for error in payload["errors"]}
+    # s9 is a user (matched by its id field) but not on the roster; s404 is nobody.
+    assert errors == {"s9": "Student s9 is not enrolled in this class.", "s404": "Unknown student s404."}
+    assert db.collection("attendance").document(existing_id).get().to_dict()["status"] == "Absent"
+    assert db.collection("attendance").document("CSCE1_s1_2025-03-04").get().exists
+
+    _request(app_module, args={"classId": "CSCE1"}, headers=TEACHER, body=b"studentId,date\ns1,2025-03-04\n")
+    assert app_module.import_attendance()[1] == 400
+
+
+def test_repeat_scan_does_not_replace_a_deferred_frame(load_app, monkeypatch):
+    app_module, db = _teacher_app(load_app, monkeypatch)
+    bucket = InMemoryBucket()
+    monkeypatch.setattr(app_module, "bucket", bucket)
+    monkeypatch.setattr(app_module.deferred_verifier, "submit", lambda doc_id: True)
+    _request(app_module, {})
+
+    first = np.zeros((16, 16, 3), np.uint8)
+    payload, status_code = app_module._defer_verification("CSCE1", "s1", first, "queue_depth")
+    assert status_code == 202
+    frame_path = db.collection("attendance").document(payload["record_id"]).get().to_dict()["deferredFrame"]
+    stored = bucket.blob(frame_path).download_as_bytes()
+
+    repeat = np.full((16, 16, 3), 255, np.uint8)
+    payload, status_code = app_module._defer_verification("CSCE1", "s1", repeat, "queue_depth")
+    assert status_code == 202 and payload["pending"] is True
+    assert bucket.blob(frame_path).download_as_bytes() == stored
+
+
+def test_kiosk_stream_identifies_roster_faces_across_batches(load_app, monkeypatch):
+    app_module, db = _teacher_app(load_app, monkeypatch)
+    axes = np.eye(4, dtype=np.float32)
+    store = types.SimpleNamespace(embeddings_for={"s1": axes[0:1], "s2": axes[1:2]}.get)
+    monkeypatch.setattr(app_module, "known_face_store", types.SimpleNamespace(get=lambda: store))
+
+    # A frame is one pixel saying whether the face shows both eyes; b"x" does not decode.
+    frames = {b"0": np.zeros((1, 1, 3), np.uint8), b"1": np.ones((1, 1, 3), np.uint8)}
+    monkeypatch.setattr(app_module.cv2, "imdecode", lambda buffer, flags: frames.get(buffer.tobytes()))
+    face_detection = app_module.face_detection
+    monkeypatch.setattr(face_detection, "detect_faces_fast", lambda gray: [(0, 0, 40, 40)])
+    monkeypatch.setattr(face_detection, "laplacian_variance", lambda gray, box: 100.0)
+    # The first frame shows the face turned away, so it is not embedded yet.
+    monkeypatch.setattr(face_detection, "eye_centers", lambda gray, box: ((10, 15), (30, 15)) if gray[0, 0] else None)
+    monkeypatch.setattr(face_detection, "aligned_face_rgb", lambda image, box, eyes, margin: axes[0])
+    monkeypatch.setattr(app_module.face_embeddings, "embed_faces", lambda crops: np.stack(crops))
+
+    def batch(*frame_keys, **args):
+        body = b"".join(len(frame).to_bytes(4, "big") + frame for frame in frame_keys) + bytes(4)
+        _request(app_module, args={"classId": "CSCE1", **args}, headers=TEACHER, body=body)
+        response = app_module.kiosk_stream()
+        return response, [json.loads(line) for line in response.iterable]
+
+    response, events = batch(b"0", b"1", b"x", b"1", sessionId="door-1")
+
+    assert response.mimetype == "application/x-ndjson"
+    assert [event["event"] for event in events] == ["identified", "error", "summary"]
+    assert events[0]["studentId"] == "s1" and events[0]["httpStatus"] == 202
+    # The tracked face is not embedded again once identified.
+    assert events[-1] == {"event": "summary", "frames": 3, "detections": 3, "embeddings": 1, "identified": ["s1"]}
+    record = db.collection("attendance").document(events[0]["attendance"]["record_id"]).get().to_dict()
+    assert record["studentID"] == "s1" and record["status"] == "pending"
+
+    # The next batch of the same kiosk keeps tracking the face.
+    _response, events = batch(b"1", b"1", sessionId="door-1")
+    assert events == [{"event": "summary", "frames": 5, "detections": 5, "embeddings": 1, "identified": ["s1"]}]
+
+    # A campus-index match outside the roster is refused.
+    monkeypatch.setattr(app_module, "known_face_store", types.SimpleNamespace(get=lambda: None))
+    index = types.SimpleNamespace(search=lambda embedding, k: [("s9", 0.1)])
+    monkeypatch.setattr(app_module, "campus_face_index", types.SimpleNamespace(get=lambda: index))
+    _response, events = batch(b"1")
+    assert events[0]["studentId"] == "s9" and events[0]["httpStatus"] == 403
+    assert not db.collection("attendance").document(app_module._attendance_doc_id(
+        "CSCE1", "s9", datetime.datetime.now(CENTRAL).strftime("%Y-%m-%d"))).get().exists
+
+    _request(app_module, args={"classId": "CSCE1"})
+    assert app_module.kiosk_stream()[1] == 401
+    _request(app_module, args={"classId": "CSCE1"}, headers=TEACHER, ip="10.0.0.1")
+    assert app_module.kiosk_stream()[1] == 403
@@ -0,0 +1,120 @@
+import datetime
+
+import pytest
+
+from zoneinfo import ZoneInfo
+
+from backend.schedule import (
+    ScheduleIndex,
+    build_schedule_index,
+    get_attendance_status,
+    parse_days,
+    schedule_for_class,
+)
+
+
+CENTRAL_TZ = ZoneInfo("America/Chicago")
+
+# 2024-04-01 is a Monday.
+MONDAY = datetime.date(2024, 4, 1)
+TUESDAY = datetime.date(2024, 4, 2)
+
+
+def _at(day, hour, minute):
+    return datetime.datetime.combine(day, datetime.time(hour, minute), tzinfo=CENTRAL_TZ)
+
+
+class FakeClassSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def test_parse_days_handles_letters_and_abbreviations():
+    assert parse_days("MWF") == {0, 2, 4}
+    assert parse_days("TR") == {1, 3}
+    assert parse_days("TuTh") == {1, 3}
+    with pytest.raises(ValueError):
+        parse_days("MXF")
+
+
+def test_parse_days_reads_day_names_as_whole_tokens():
+    assert parse_days("Tue") == {1}
+    assert parse_days("Thu") == {3}
+    assert parse_days("Tuesday") == {1}
+    assert parse_days("Tue/Thu") == {1, 3}
+    assert parse_days("Tues, Thurs") == {1, 3}
+    assert parse_days("Monday Wednesday Friday") == {0, 2, 4}
+    assert parse_days("Sat") == {5}
+
+
+def test_legacy_schedule_rejects_days_the_class_does_not_meet():
+    schedule = schedule_for_class({"schedule": "MWF 8:30AM - 9:50AM"}, CENTRAL_TZ)
+
+    assert schedule.session_for(_at(TUESDAY, 8, 45)) is None
+
+    block = schedule.session_for(_at(MONDAY, 8, 45))
+    start_dt, end_dt = block.on_date(MONDAY, CENTRAL_TZ)
+    assert get_attendance_status(_at(MONDAY, 8, 45), start_dt, end_dt) == ("Present", None)
+
+
+def test_schedule_without_days_meets_every_day():
+    schedule = schedule_for_class({"schedule": "8:30AM - 9:50AM"}, CENTRAL_TZ)
+    assert schedule.session_for(_at(TUESDAY, 9, 0)) is not None
+
+
+def test_multiple_blocks_pick_the_governing_session():
+    schedule = schedule_for_class(
+        {"schedule": [
+            {"days": "MW", "start": "8:30AM", "end": "9:50AM"},
+            {"days": "M", "start": "1:00PM", "end": "2:20PM"},
+        ]},
+        CENTRAL_TZ,
+    )
+
+    assert schedule.session_for(_at(MONDAY, 12, 0)).start == datetime.time(13, 0)
+    assert schedule.session_for(_at(MONDAY, 15, 0)).start == datetime.time(13, 0)
+    assert schedule.session_for(_at(MONDAY, 7, 0)).start == datetime.time(8, 30)
+
+
+def test_term_bounds_and_holidays():
+    schedule = schedule_for_class(
+        {
+            "schedule": "MWF 8:30AM - 9:50AM",
+            "termStart": "2024-01-15",
+            "termEnd": "2024-05-10",
+            "holidays": ["2024-03-11..2024-03-15", datetime.date(2024, 4, 1)],
+        },
+        CENTRAL_TZ,
+    )
+
+    assert not schedule.meets_on(MONDAY)
+    assert not schedule.meets_on(datetime.date(2024, 3, 13))
+    assert not schedule.meets_on(datetime.date(2024, 5, 13))
+    assert schedule.meets_on(datetime.date(2024, 4, 3))
+
+
+def test_schedule_index_lists_open_classes():
+    index = build_schedule_index(
+        [
+            FakeClassSnapshot("CPSC101", {"schedule": "MWF 8:30AM - 9:50AM"}),
+            FakeClassSnapshot("MATH200", {"schedule": "MW 9:00AM - 10:20AM"}),
+            FakeClassSnapshot("HIST300", {"schedule": "TR 8:30AM - 9:50AM"}),
+            FakeClassSnapshot("BROKEN", {"schedule": "sometime"}),
+        ],
+        CENTRAL_TZ,
+    )
+
+    assert len(index) == 3
+    assert {class_id for class_id, _ in index.open_classes(_at(MONDAY, 8, 26))} == {"CPSC101"}
+    assert {class_id for class_id, _ in index.open_classes(_at(MONDAY, 9, 30))} == {"CPSC101", "MATH200"}
+    assert {class_id for class_id, _ in index.open_classes(_at(MONDAY, 10, 0))} == {"MATH200"}
+    assert index.open_classes(_at(MONDAY, 11, 0)) == []
+    assert {class_id for class_id, _ in index.open_classes(_at(TUESDAY, 9, 0))} == {"HIST300"}
+
+
+def test_empty_schedule_index():
+    assert ScheduleIndex({}).open_classes(_at(MONDAY, 9, 0)) == []
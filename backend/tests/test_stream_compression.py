@@ -0,0 +1,53 @@
+import gzip
+import zlib
+
+import pytest
+
+from backend import stream_compression
+from backend.stream_compression import compress_stream, negotiate_encoding
+
+
+def test_negotiation_honours_q_values_and_server_preference():
+    supported = ("zstd", "gzip")
+    assert negotiate_encoding("gzip, deflate, br, zstd", supported) == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, zstd;q=0.5", supported) == "gzip"
+    assert negotiate_encoding("zstd;q=0, *", supported) == "gzip"
+    assert negotiate_encoding("gzip;q=0", supported) is None
+    assert negotiate_encoding("identity", supported) is None
+    assert negotiate_encoding(None, supported) is None
+    assert negotiate_encoding("gzip, zstd", ("gzip",)) == "gzip"
+
+
+def _rows():
+    yield "studentName,studentId,status\n"
+    for index in range(2000):
+        yield f"Student {index % 30},S{index % 30},present\n"
+
+
+def test_gzip_stream_flushes_at_chunk_boundaries():
+    pieces = list(compress_stream(_rows(), "gzip", flush_bytes=4096))
+    body = b"".join(pieces)
+    expected = "".join(_rows()).encode("utf-8")
+
+    assert gzip.decompress(body) == expected
+    assert len(body) < len(expected) / 5
+    assert len(pieces) > 2
+
+    # Everything before the trailer decodes on its own, so clients can
+    # render the rows as they arrive.
+    partial = zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(b"".join(pieces[:-1]))
+    assert expected.startswith(partial)
+    assert len(partial) > len(expected) - 4096
+
+
+def test_zstd_stream_round_trips():
+    zstandard = pytest.importorskip("zstandard")
+    body = b"".join(compress_stream(_rows(), "zstd", flush_bytes=4096))
+    reader = zstandard.ZstdDecompressor().decompressobj()
+    assert reader.decompress(body) == "".join(_rows()).encode("utf-8")
+
+
+def test_zstd_is_not_offered_without_the_package(monkeypatch):
+    monkeypatch.setattr(stream_compression, "zstandard", None)
+    assert negotiate_encoding("zstd, gzip") == "gzip"
+    assert negotiate_encoding("zstd") is None
@@ -132,6 +132,17 @@ const FaceScanner = ({ selectedClass, studentId }) => {
 
         if (!isMountedRef.current) return;
 
+        if (response.status === 409 && result?.status === "verification_pending") {
+          setNotification({
+            type: "info",
+            message: "Your face check is still being processed. We'll try again shortly.",
+          });
+          finalizeTimeoutRef.current = setTimeout(() => {
+            finalizeAttendance(recordId);
+          }, (result.retryAfter || 30) * 1000);
+          return;
+        }
+
         if (!response.ok) {
           throw new Error(result?.message || "Unable to finalize attendance");
         }
@@ -240,6 +251,14 @@ const FaceScanner = ({ selectedClass, studentId }) => {
 
       if (!isMountedRef.current) return;
 
+      if (result?.status === "retry") {
+        setNotification({
+          type: "warning",
+          message: result.message || "Please adjust your position and try again.",
+        });
+        return;
+      }
+
       if (!response.ok) {
         throw new Error(result?.message || "Face recognition failed");
       }
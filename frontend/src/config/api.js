@@ -14,13 +14,23 @@ if (trimmedBase.endsWith(faceRecognitionSuffix)) {
 export const API_BASE = apiBase;
 export const FACE_RECOGNITION_ENDPOINT = `${API_BASE}/api/face-recognition`;
 export const FINALIZE_ATTENDANCE_ENDPOINT = `${API_BASE}/api/attendance/finalize`;
+export const ATTENDANCE_ENDPOINT = `${API_BASE}/api/attendance`;
 export const EXPORT_ATTENDANCE_ENDPOINT = `${API_BASE}/api/attendance/export`;
+export const EXPORT_JOBS_ENDPOINT = `${API_BASE}/api/attendance/export/jobs`;
+export const ATTENDANCE_STREAM_ENDPOINT = `${API_BASE}/api/attendance/stream`;
+export const IMPORT_ATTENDANCE_ENDPOINT = `${API_BASE}/api/attendance/import`;
+export const GROUP_PHOTO_ENDPOINT = `${API_BASE}/api/attendance/group-photo`;
 export const PENDING_VERIFICATION_MINUTES = 45;
 
 export default {
   API_BASE,
   FACE_RECOGNITION_ENDPOINT,
   FINALIZE_ATTENDANCE_ENDPOINT,
+  ATTENDANCE_ENDPOINT,
   EXPORT_ATTENDANCE_ENDPOINT,
+  EXPORT_JOBS_ENDPOINT,
+  ATTENDANCE_STREAM_ENDPOINT,
+  IMPORT_ATTENDANCE_ENDPOINT,
+  GROUP_PHOTO_ENDPOINT,
   PENDING_VERIFICATION_MINUTES,
 };